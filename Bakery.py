@@ -1,11 +1,21 @@
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from export import ask_export
+import tracing
+from query_executor import QueryExecutor, show_loading
+from report_cache import ReportCache
+from tree_sync import sync_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-from tkcalendar import DateEntry
+from lazy_widgets import DateEntry
 
 def create_database():
-    conn = sqlite3.connect('bakery.db')
+    conn = get_connection('bakery.db')
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS menu
                  (id INTEGER PRIMARY KEY AUTOINCREMENT, 
@@ -22,10 +32,55 @@ def create_database():
                   name TEXT, 
                   address TEXT)''')
     conn.commit()
-    conn.close()
+    migrate(conn, 'bakery.db')
 
 create_database()
 
+ORDERS_QUERY = '''SELECT orders.id AS id, menu.name AS item, orders.quantity AS quantity,
+                         orders.status AS status,
+                         strftime('%d.%m.%Y %H:%M', orders.created_at) AS time,
+                         orders.created_at AS created_at
+                  FROM orders 
+                  JOIN menu ON orders.item_id = menu.id'''
+
+# Отчет по дням и позициям для выгрузки
+REPORT_EXPORT_QUERY = '''SELECT daily_sales.day AS day, menu.name AS item, daily_sales.orders AS orders,
+                                daily_sales.quantity AS quantity, menu.price * daily_sales.quantity AS revenue
+                         FROM daily_sales
+                         JOIN menu ON daily_sales.product_id = menu.id
+                         WHERE daily_sales.day BETWEEN ? AND ?
+                         ORDER BY daily_sales.day, menu.name'''
+
+
+class BakeryService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_menu_item(self, name, price):
+        self.add_menu_items([(name, price)])
+
+    def add_menu_items(self, records):
+        run_write(self.conn, lambda conn: conn.executemany("INSERT INTO menu (name, price) VALUES (?, ?)", records))
+
+    def create_order(self, item_name, quantity):
+        self.create_orders([(item_name, quantity)])
+
+    def create_orders(self, records):
+        # records - [(позиция меню, количество)]; неизвестная позиция отменяет все
+        def write(conn):
+            for item_name, quantity in records:
+                row = conn.execute("SELECT id FROM menu WHERE name = ?", (item_name,)).fetchone()
+                if row is None:
+                    raise LookupError(f"Позиция '{item_name}' не найдена в меню")
+                conn.execute("INSERT INTO orders (item_id, quantity, status) VALUES (?, ?, 'Новый')",
+                             (row[0], quantity))
+        run_write(self.conn, write)
+
+    def save_settings(self, name, address):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO settings (id, name, address) VALUES (1, ?, ?)", (name, address)))
+
+
 class BakeryApp:
     def __init__(self, root):
         self.root = root
@@ -33,10 +88,14 @@ class BakeryApp:
         self.root.geometry("1000x700")
         
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(root, 'Bakery')
         self.configure_styles()
+        self.queries = QueryExecutor(root, 'bakery.db')
+        self.service = BakeryService(get_connection('bakery.db'))
+        self.report_cache = ReportCache('orders', ('menu',))
         
-        self.notebook = ttk.Notebook(root)
+        self.notebook = LazyNotebook(root)
         self.notebook.pack(fill='both', expand=True)
 
         self.tabs = {
@@ -46,22 +105,22 @@ class BakeryApp:
             'Настройки': ttk.Frame(self.notebook)
         }
 
-        for name, tab in self.tabs.items():
-            self.notebook.add(tab, text=name)
-
-        self.init_menu_tab()
-        self.init_orders_tab()
-        self.init_reports_tab()
-        self.init_settings_tab()
+        self.notebook.add_lazy(self.tabs['Меню'], self.init_menu_tab, self.load_menu, text='Меню')
+        self.notebook.add_lazy(self.tabs['Заказы'], self.init_orders_tab,
+                               (self.update_order_items, self.load_orders), text='Заказы')
+        self.notebook.add_lazy(self.tabs['Отчеты'], self.init_reports_tab, text='Отчеты')
+        self.notebook.add_lazy(self.tabs['Настройки'], self.init_settings_tab, self.load_settings,
+                               text='Настройки')
+        add_search_tab(self.notebook, self.queries)
 
     def configure_styles(self):
-        self.style.configure('TFrame', background='#F5F5F5')
-        self.style.configure('TButton', font=('Arial', 10), padding=6, background='#4CAF50', foreground='white')
-        self.style.configure('TLabel', font=('Arial', 11), background='#F5F5F5', foreground='#333333')
-        self.style.configure('Header.TLabel', font=('Arial', 14, 'bold'), background='#607D8B', foreground='white')
-        self.style.configure('Treeview.Heading', font=('Arial', 11, 'bold'), background='#B0BEC5')
-        self.style.configure('Treeview', font=('Arial', 11), rowheight=25)
-        self.style.map('TButton',
+        self.style.configure('Bakery.TFrame', background='#F5F5F5')
+        self.style.configure('Bakery.TButton', font=('Arial', 10), padding=6, background='#4CAF50', foreground='white')
+        self.style.configure('Bakery.TLabel', font=('Arial', 11), background='#F5F5F5', foreground='#333333')
+        self.style.configure('Header.Bakery.TLabel', font=('Arial', 14, 'bold'), background='#607D8B', foreground='white')
+        self.style.configure('Bakery.Treeview.Heading', font=('Arial', 11, 'bold'), background='#B0BEC5')
+        self.style.configure('Bakery.Treeview', font=('Arial', 11), rowheight=25)
+        self.style.map('Bakery.TButton',
             background=[('active', '#45A049'), ('disabled', '#C8E6C9')],
             foreground=[('disabled', '#757575')]
         )
@@ -70,7 +129,7 @@ class BakeryApp:
         frame = ttk.Frame(self.tabs['Меню'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Управление меню", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Управление меню", style='Header.Bakery.TLabel').pack(fill='x', pady=(0, 15))
         
         self.menu_tree = ttk.Treeview(frame, columns=('name', 'price'), show='headings')
         self.menu_tree.heading('name', text='Название')
@@ -96,7 +155,7 @@ class BakeryApp:
         frame = ttk.Frame(self.tabs['Заказы'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Создание заказа", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Создание заказа", style='Header.Bakery.TLabel').pack(fill='x', pady=(0, 15))
         
         order_frame = ttk.Frame(frame)
         order_frame.pack(fill='x', pady=10)
@@ -111,9 +170,11 @@ class BakeryApp:
         
         ttk.Button(order_frame, text="Создать заказ", command=self.create_order).pack(side='left', padx=10)
         
-        ttk.Label(frame, text="История заказов", style='Header.TLabel').pack(fill='x', pady=(20, 10))
+        ttk.Label(frame, text="История заказов", style='Header.Bakery.TLabel').pack(fill='x', pady=(20, 10))
         
-        self.orders_tree = ttk.Treeview(frame, columns=('id', 'item', 'quantity', 'status', 'time'), show='headings')
+        self.orders_tree = VirtualTreeview(frame, get_connection('bakery.db'), ORDERS_QUERY,
+                                           columns=('id', 'item', 'quantity', 'status', 'time'),
+                                           sort_map={'time': 'created_at'})
         self.orders_tree.heading('id', text='ID')
         self.orders_tree.heading('item', text='Товар')
         self.orders_tree.heading('quantity', text='Количество')
@@ -130,7 +191,7 @@ class BakeryApp:
         frame = ttk.Frame(self.tabs['Отчеты'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Генерация отчетов", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Генерация отчетов", style='Header.Bakery.TLabel').pack(fill='x', pady=(0, 15))
         
         date_frame = ttk.Frame(frame)
         date_frame.pack(pady=10)
@@ -144,6 +205,7 @@ class BakeryApp:
         self.end_date.pack(side='left', padx=5)
         
         ttk.Button(frame, text="Сгенерировать отчет", command=self.generate_report).pack(pady=10)
+        ttk.Button(frame, text="Экспорт в CSV/NDJSON", command=self.export_report).pack()
         
         self.report_text = tk.Text(frame, height=12, width=80, font=('Arial', 11), padx=10, pady=10)
         self.report_text.pack(fill='both', expand=True)
@@ -152,7 +214,7 @@ class BakeryApp:
         frame = ttk.Frame(self.tabs['Настройки'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Настройки пекарни", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Настройки пекарни", style='Header.Bakery.TLabel').pack(fill='x', pady=(0, 15))
         
         form_frame = ttk.Frame(frame)
         form_frame.pack(fill='x', pady=10)
@@ -169,7 +231,7 @@ class BakeryApp:
         
         ttk.Button(frame, text="Сохранить", command=self.save_settings).pack(pady=10)
         
-        ttk.Label(frame, text="Сохраненные настройки", style='Header.TLabel').pack(fill='x', pady=(20, 10))
+        ttk.Label(frame, text="Сохраненные настройки", style='Header.Bakery.TLabel').pack(fill='x', pady=(20, 10))
         
         self.settings_tree = ttk.Treeview(frame, columns=('id', 'name', 'address'), show='headings')
         self.settings_tree.heading('id', text='ID')
@@ -181,44 +243,35 @@ class BakeryApp:
         self.load_settings()
 
     def load_menu(self):
-        for i in self.menu_tree.get_children():
-            self.menu_tree.delete(i)
-        conn = sqlite3.connect('bakery.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM menu")
-        for row in c.fetchall():
-            self.menu_tree.insert('', 'end', values=(row[1], f"{row[2]} руб."))
-        conn.close()
+        show_loading(self.menu_tree, keep_rows=True)
+        self.queries.submit('menu', "SELECT * FROM menu", on_done=self.fill_menu)
+
+    def fill_menu(self, rows):
+        sync_tree(self.menu_tree, rows, values=lambda row: (row[1], f"{row[2]} руб."))
 
     def add_item(self):
         name = self.item_name.get()
         price = self.item_price.get()
         if name and price:
             try:
-                conn = sqlite3.connect('bakery.db')
-                c = conn.cursor()
-                c.execute("INSERT INTO menu (name, price) VALUES (?, ?)", (name, float(price)))
-                conn.commit()
+                self.service.add_menu_item(name, float(price))
                 self.load_menu()
                 self.item_name.delete(0, 'end')
                 self.item_price.delete(0, 'end')
-                self.update_order_items()
+                self.notebook.mark_stale(self.tabs['Заказы'])
             except ValueError:
                 messagebox.showerror("Ошибка", "Неверный формат цены")
-            finally:
-                conn.close()
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
 
     def update_order_items(self):
-        conn = sqlite3.connect('bakery.db')
+        conn = get_connection('bakery.db')
         c = conn.cursor()
         c.execute("SELECT name FROM menu")
         items = [row[0] for row in c.fetchall()]
         self.order_item['values'] = items
         if items:
             self.order_item.current(0)
-        conn.close()
 
     def create_order(self):
         item_name = self.order_item.get()
@@ -226,63 +279,58 @@ class BakeryApp:
         if item_name and quantity:
             try:
                 quantity = int(quantity)
-                conn = sqlite3.connect('bakery.db')
-                c = conn.cursor()
-                c.execute("SELECT id FROM menu WHERE name = ?", (item_name,))
-                item_id = c.fetchone()[0]
-                c.execute("INSERT INTO orders (item_id, quantity, status) VALUES (?, ?, 'Новый')", 
-                         (item_id, quantity))
-                conn.commit()
-                conn.close()
+                self.service.create_order(item_name, quantity)
                 self.load_orders()
                 self.order_quantity.delete(0, 'end')
                 messagebox.showinfo("Успех", "Заказ создан")
             except ValueError:
                 messagebox.showerror("Ошибка", "Неверное количество")
+            except LookupError as e:
+                messagebox.showerror("Ошибка", str(e))
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
 
     def load_orders(self):
-        for i in self.orders_tree.get_children():
-            self.orders_tree.delete(i)
-        conn = sqlite3.connect('bakery.db')
-        c = conn.cursor()
-        c.execute('''SELECT orders.id, menu.name, orders.quantity, orders.status, 
-                    strftime('%d.%m.%Y %H:%M', orders.created_at)
-                 FROM orders 
-                 JOIN menu ON orders.item_id = menu.id''')
-        for row in c.fetchall():
-            self.orders_tree.insert('', 'end', values=row)
-        conn.close()
+        self.orders_tree.refresh()
+
+    def export_report(self):
+        start = self.start_date.get_date()
+        end = self.end_date.get_date()
+        ask_export(self.root, 'bakery.db', REPORT_EXPORT_QUERY, (start, end), "Экспорт отчета")
 
     def generate_report(self):
         start = self.start_date.get_date()
         end = self.end_date.get_date()
-        
-        conn = sqlite3.connect('bakery.db')
-        c = conn.cursor()
-        
-        c.execute('''SELECT COUNT(*) FROM orders 
-                  WHERE date(created_at) BETWEEN ? AND ?''',
-                  (start, end))
-        total_orders = c.fetchone()[0]
-        
-        c.execute('''SELECT SUM(menu.price * orders.quantity) 
-                  FROM orders 
-                  JOIN menu ON orders.item_id = menu.id 
-                  WHERE date(orders.created_at) BETWEEN ? AND ?''',
-                  (start, end))
-        total_revenue = c.fetchone()[0] or 0
-        
-        c.execute('''SELECT menu.name, SUM(orders.quantity) 
-                  FROM orders 
-                  JOIN menu ON orders.item_id = menu.id 
-                  WHERE date(orders.created_at) BETWEEN ? AND ?
-                  GROUP BY menu.name 
-                  ORDER BY 2 DESC LIMIT 3''',
-                  (start, end))
-        popular_items = c.fetchall()
-        
+
+        def query(conn):
+            c = conn.cursor()
+            
+            c.execute('''SELECT SUM(orders) FROM daily_sales 
+                      WHERE day BETWEEN ? AND ?''',
+                      (start, end))
+            total_orders = c.fetchone()[0] or 0
+            
+            c.execute('''SELECT SUM(menu.price * daily_sales.quantity) 
+                      FROM daily_sales 
+                      JOIN menu ON daily_sales.product_id = menu.id 
+                      WHERE daily_sales.day BETWEEN ? AND ?''',
+                      (start, end))
+            total_revenue = c.fetchone()[0] or 0
+            
+            c.execute('''SELECT menu.name, SUM(daily_sales.quantity) 
+                      FROM daily_sales 
+                      JOIN menu ON daily_sales.product_id = menu.id 
+                      WHERE daily_sales.day BETWEEN ? AND ?
+                      GROUP BY menu.name 
+                      ORDER BY 2 DESC LIMIT 3''',
+                      (start, end))
+            return total_orders, total_revenue, c.fetchall()
+
+        show_loading(self.report_text)
+        self.queries.submit('report', self.report_cache.query('sales', start, end, query),
+                            on_done=lambda result: self.show_report(start, end, *result))
+
+    def show_report(self, start, end, total_orders, total_revenue, popular_items):
         report = f"Отчет за период с {start} по {end}:\n\n"
         report += f"Всего заказов: {total_orders}\n"
         report += f"Общая выручка: {total_revenue:.2f} руб.\n\n"
@@ -292,10 +340,9 @@ class BakeryApp:
         
         self.report_text.delete(1.0, 'end')
         self.report_text.insert('end', report)
-        conn.close()
 
     def load_settings(self):
-        conn = sqlite3.connect('bakery.db')
+        conn = get_connection('bakery.db')
         c = conn.cursor()
         c.execute("SELECT * FROM settings")
         
@@ -312,18 +359,12 @@ class BakeryApp:
             self.setting_name.insert(0, settings[1])
             self.setting_address.delete(0, 'end')
             self.setting_address.insert(0, settings[2])
-        conn.close()
 
     def save_settings(self):
         name = self.setting_name.get()
         address = self.setting_address.get()
         if name and address:
-            conn = sqlite3.connect('bakery.db')
-            c = conn.cursor()
-            c.execute("INSERT OR REPLACE INTO settings (id, name, address) VALUES (1, ?, ?)", 
-                     (name, address))
-            conn.commit()
-            conn.close()
+            self.service.save_settings(name, address)
             self.load_settings()
             messagebox.showinfo("Успех", "Настройки сохранены")
         else:
@@ -332,4 +373,5 @@ class BakeryApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = BakeryApp(root)
+    tracing.install(root)
     root.mainloop()
@@ -1,11 +1,19 @@
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+from query_executor import QueryExecutor, show_loading
+from tree_sync import sync_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-from tkcalendar import DateEntry
+from lazy_widgets import DateEntry
 
 def create_database():
-    conn = sqlite3.connect('cleaning.db')
+    conn = get_connection('cleaning.db')
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS services
                  (id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -28,10 +36,60 @@ def create_database():
                   address TEXT,
                   phone TEXT)''')
     conn.commit()
-    conn.close()
+    migrate(conn, 'cleaning.db')
 
 create_database()
 
+ORDERS_QUERY = '''SELECT orders.id AS id, services.name AS service, employees.name AS employee,
+                         orders.client AS client, orders.date AS date, orders.status AS status
+                  FROM orders 
+                  JOIN services ON orders.service_id = services.id
+                  LEFT JOIN employees ON orders.employee_id = employees.id'''
+
+
+class CleaningService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_service(self, name, price):
+        self.add_services([(name, price)])
+
+    def add_services(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO services (name, price) VALUES (?, ?)", records))
+
+    def add_employee(self, name, phone):
+        self.add_employees([(name, phone)])
+
+    def add_employees(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO employees (name, phone) VALUES (?, ?)", records))
+
+    def create_order(self, service, employee, client, date):
+        self.create_orders([(service, employee, client, date)])
+
+    def create_orders(self, records):
+        # records - [(услуга, сотрудник или None, клиент, дата)]; сотрудник, которого
+        # нет в базе, не назначается, неизвестная услуга отменяет весь список
+        def write(conn):
+            for service, employee, client, date in records:
+                row = conn.execute("SELECT id FROM services WHERE name = ?", (service,)).fetchone()
+                if row is None:
+                    raise LookupError(f"Услуга '{service}' не найдена")
+                employee_id = None
+                if employee:
+                    result = conn.execute("SELECT id FROM employees WHERE name = ?", (employee,)).fetchone()
+                    if result:
+                        employee_id = result[0]
+                conn.execute('''INSERT INTO orders (service_id, employee_id, client, date)
+                                VALUES (?, ?, ?, ?)''', (row[0], employee_id, client, date))
+        run_write(self.conn, write)
+
+    def save_company(self, name, address, phone):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO company (id, name, address, phone) VALUES (1, ?, ?, ?)", (name, address, phone)))
+
+
 class CleaningApp:
     def __init__(self, root):
         self.root = root
@@ -39,10 +97,13 @@ class CleaningApp:
         self.root.geometry("1280x840")
         
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(root, 'Cleaning')
         self.configure_styles()
+        self.queries = QueryExecutor(root, 'cleaning.db')
+        self.service = CleaningService(get_connection('cleaning.db'))
         
-        self.notebook = ttk.Notebook(root)
+        self.notebook = LazyNotebook(root)
         self.notebook.pack(fill='both', expand=True)
 
         self.tabs = {
@@ -52,22 +113,22 @@ class CleaningApp:
             'Компания': ttk.Frame(self.notebook)
         }
 
-        for name, tab in self.tabs.items():
-            self.notebook.add(tab, text=name)
-
-        self.init_services_tab()
-        self.init_orders_tab()
-        self.init_employees_tab()
-        self.init_company_tab()
+        self.notebook.add_lazy(self.tabs['Услуги'], self.init_services_tab, self.load_services, text='Услуги')
+        self.notebook.add_lazy(self.tabs['Заказы'], self.init_orders_tab,
+                               (self.update_order_combos, self.load_orders), text='Заказы')
+        self.notebook.add_lazy(self.tabs['Сотрудники'], self.init_employees_tab, self.load_employees,
+                               text='Сотрудники')
+        self.notebook.add_lazy(self.tabs['Компания'], self.init_company_tab, self.load_company, text='Компания')
+        add_search_tab(self.notebook, self.queries)
 
     def configure_styles(self):
-        self.style.configure('TFrame', background='#F5F5F5')
-        self.style.configure('TButton', font=('Arial', 10), padding=6, background='#2196F3', foreground='white')
-        self.style.configure('TLabel', font=('Arial', 11), background='#F5F5F5', foreground='#333333')
-        self.style.configure('Header.TLabel', font=('Arial', 14, 'bold'), background='#607D8B', foreground='white')
-        self.style.configure('Treeview.Heading', font=('Arial', 11, 'bold'), background='#B0BEC5')
-        self.style.configure('Treeview', font=('Arial', 11), rowheight=25)
-        self.style.map('TButton',
+        self.style.configure('Cleaning.TFrame', background='#F5F5F5')
+        self.style.configure('Cleaning.TButton', font=('Arial', 10), padding=6, background='#2196F3', foreground='white')
+        self.style.configure('Cleaning.TLabel', font=('Arial', 11), background='#F5F5F5', foreground='#333333')
+        self.style.configure('Header.Cleaning.TLabel', font=('Arial', 14, 'bold'), background='#607D8B', foreground='white')
+        self.style.configure('Cleaning.Treeview.Heading', font=('Arial', 11, 'bold'), background='#B0BEC5')
+        self.style.configure('Cleaning.Treeview', font=('Arial', 11), rowheight=25)
+        self.style.map('Cleaning.TButton',
             background=[('active', '#1976D2'), ('disabled', '#BBDEFB')],
             foreground=[('disabled', '#757575')]
         )
@@ -76,7 +137,7 @@ class CleaningApp:
         frame = ttk.Frame(self.tabs['Услуги'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Управление услугами", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Управление услугами", style='Header.Cleaning.TLabel').pack(fill='x', pady=(0, 15))
         
         self.services_tree = ttk.Treeview(frame, columns=('name', 'price'), show='headings')
         self.services_tree.heading('name', text='Название услуги')
@@ -102,7 +163,7 @@ class CleaningApp:
         frame = ttk.Frame(self.tabs['Заказы'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Создание заказа", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Создание заказа", style='Header.Cleaning.TLabel').pack(fill='x', pady=(0, 15))
         
         form_frame = ttk.Frame(frame)
         form_frame.pack(fill='x', pady=10)
@@ -125,9 +186,10 @@ class CleaningApp:
         
         ttk.Button(form_frame, text="Создать заказ", command=self.create_order).grid(row=4, column=1, pady=10, sticky='w')
         
-        ttk.Label(frame, text="Активные заказы", style='Header.TLabel').pack(fill='x', pady=(20, 10))
+        ttk.Label(frame, text="Активные заказы", style='Header.Cleaning.TLabel').pack(fill='x', pady=(20, 10))
         
-        self.orders_tree = ttk.Treeview(frame, columns=('id', 'service', 'employee', 'client', 'date', 'status'), show='headings')
+        self.orders_tree = VirtualTreeview(frame, get_connection('cleaning.db'), ORDERS_QUERY,
+                                           columns=('id', 'service', 'employee', 'client', 'date', 'status'))
         self.orders_tree.heading('id', text='ID')
         self.orders_tree.heading('service', text='Услуга')
         self.orders_tree.heading('employee', text='Сотрудник')
@@ -146,7 +208,7 @@ class CleaningApp:
         frame = ttk.Frame(self.tabs['Сотрудники'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Управление сотрудниками", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Управление сотрудниками", style='Header.Cleaning.TLabel').pack(fill='x', pady=(0, 15))
         
         self.employees_tree = ttk.Treeview(frame, columns=('name', 'phone'), show='headings')
         self.employees_tree.heading('name', text='ФИО')
@@ -171,7 +233,7 @@ class CleaningApp:
         frame = ttk.Frame(self.tabs['Компания'], padding=15)
         frame.pack(fill='both', expand=True)
 
-        ttk.Label(frame, text="Информация о компании", style='Header.TLabel').pack(fill='x', pady=(0, 15))
+        ttk.Label(frame, text="Информация о компании", style='Header.Cleaning.TLabel').pack(fill='x', pady=(0, 15))
         
         form_frame = ttk.Frame(frame)
         form_frame.pack(fill='x', pady=10)
@@ -195,51 +257,32 @@ class CleaningApp:
         self.load_company()
 
     def load_services(self):
-        for i in self.services_tree.get_children():
-            self.services_tree.delete(i)
-        conn = sqlite3.connect('cleaning.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM services")
-        for row in c.fetchall():
-            self.services_tree.insert('', 'end', values=(row[1], f"{row[2]} руб."))
-        conn.close()
+        show_loading(self.services_tree, keep_rows=True)
+        self.queries.submit('services', "SELECT * FROM services", on_done=self.fill_services)
+
+    def fill_services(self, rows):
+        sync_tree(self.services_tree, rows, values=lambda row: (row[1], f"{row[2]} руб."))
 
     def add_service(self):
         name = self.service_name.get()
         price = self.service_price.get()
         if name and price:
             try:
-                conn = sqlite3.connect('cleaning.db')
-                c = conn.cursor()
-                c.execute("INSERT INTO services (name, price) VALUES (?, ?)", (name, float(price)))
-                conn.commit()
+                self.service.add_service(name, float(price))
                 self.load_services()
                 self.service_name.delete(0, 'end')
                 self.service_price.delete(0, 'end')
-                self.update_order_combos()
+                self.notebook.mark_stale(self.tabs['Заказы'])
             except ValueError:
                 messagebox.showerror("Ошибка", "Неверный формат стоимости")
-            finally:
-                conn.close()
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
 
     def load_orders(self):
-        for i in self.orders_tree.get_children():
-            self.orders_tree.delete(i)
-        conn = sqlite3.connect('cleaning.db')
-        c = conn.cursor()
-        c.execute('''SELECT orders.id, services.name, employees.name, orders.client, 
-                    orders.date, orders.status
-                 FROM orders 
-                 JOIN services ON orders.service_id = services.id
-                 LEFT JOIN employees ON orders.employee_id = employees.id''')
-        for row in c.fetchall():
-            self.orders_tree.insert('', 'end', values=row)
-        conn.close()
+        self.orders_tree.refresh()
 
     def update_order_combos(self):
-        conn = sqlite3.connect('cleaning.db')
+        conn = get_connection('cleaning.db')
         c = conn.cursor()
         
         c.execute("SELECT name FROM services")
@@ -250,7 +293,6 @@ class CleaningApp:
         employees = [row[0] for row in c.fetchall()]
         self.order_employee['values'] = employees
         
-        conn.close()
 
     def create_order(self):
         service = self.order_service.get()
@@ -260,26 +302,7 @@ class CleaningApp:
         
         if service and client and date:
             try:
-                conn = sqlite3.connect('cleaning.db')
-                c = conn.cursor()
-                
-                c.execute("SELECT id FROM services WHERE name = ?", (service,))
-                service_id = c.fetchone()[0]
-                
-                employee_id = None
-                if employee:
-                    c.execute("SELECT id FROM employees WHERE name = ?", (employee,))
-                    result = c.fetchone()
-                    if result:
-                        employee_id = result[0]
-                
-                c.execute('''INSERT INTO orders 
-                          (service_id, employee_id, client, date)
-                          VALUES (?, ?, ?, ?)''',
-                          (service_id, employee_id, client, date))
-                
-                conn.commit()
-                conn.close()
+                self.service.create_order(service, employee, client, date)
                 self.load_orders()
                 messagebox.showinfo("Успех", "Заказ создан")
             except Exception as e:
@@ -288,33 +311,26 @@ class CleaningApp:
             messagebox.showwarning("Ошибка", "Заполните обязательные поля")
 
     def load_employees(self):
-        for i in self.employees_tree.get_children():
-            self.employees_tree.delete(i)
-        conn = sqlite3.connect('cleaning.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM employees")
-        for row in c.fetchall():
-            self.employees_tree.insert('', 'end', values=(row[1], row[2]))
-        conn.close()
+        show_loading(self.employees_tree, keep_rows=True)
+        self.queries.submit('employees', "SELECT * FROM employees", on_done=self.fill_employees)
+
+    def fill_employees(self, rows):
+        sync_tree(self.employees_tree, rows, values=lambda row: (row[1], row[2]))
 
     def add_employee(self):
         name = self.employee_name.get()
         phone = self.employee_phone.get()
         if name and phone:
-            conn = sqlite3.connect('cleaning.db')
-            c = conn.cursor()
-            c.execute("INSERT INTO employees (name, phone) VALUES (?, ?)", (name, phone))
-            conn.commit()
-            conn.close()
+            self.service.add_employee(name, phone)
             self.load_employees()
             self.employee_name.delete(0, 'end')
             self.employee_phone.delete(0, 'end')
-            self.update_order_combos()
+            self.notebook.mark_stale(self.tabs['Заказы'])
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
 
     def load_company(self):
-        conn = sqlite3.connect('cleaning.db')
+        conn = get_connection('cleaning.db')
         c = conn.cursor()
         c.execute("SELECT * FROM company WHERE id = 1")
         company = c.fetchone()
@@ -322,21 +338,13 @@ class CleaningApp:
             self.company_name.insert(0, company[1])
             self.company_address.insert(0, company[2])
             self.company_phone.insert(0, company[3])
-        conn.close()
 
     def save_company(self):
         name = self.company_name.get()
         address = self.company_address.get()
         phone = self.company_phone.get()
         if name and address and phone:
-            conn = sqlite3.connect('cleaning.db')
-            c = conn.cursor()
-            c.execute('''INSERT OR REPLACE INTO company 
-                      (id, name, address, phone) 
-                      VALUES (1, ?, ?, ?)''', 
-                      (name, address, phone))
-            conn.commit()
-            conn.close()
+            self.service.save_company(name, address, phone)
             messagebox.showinfo("Успех", "Данные компании сохранены")
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
@@ -344,4 +352,5 @@ class CleaningApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = CleaningApp(root)
+    tracing.install(root)
     root.mainloop()
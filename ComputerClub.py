@@ -1,37 +1,83 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from tkcalendar import DateEntry
+from lazy_widgets import DateEntry
 from datetime import datetime, timedelta
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from archive import spanning
+import tracing
+from query_executor import QueryExecutor, show_loading
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 
-class ComputerClubApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+
+class ComputerClubService:
+    # Пересечение броней проверяется под блокировкой записи: две кассы не продадут одно место дважды
+    def __init__(self, conn):
+        self.conn = conn
+
+    def saveComputer(self, name, description):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO Computers (name, description) VALUES (?, ?)", (name, description)))
+
+    def saveRoom(self, name, computer_id, quantity, price_per_hour):
+        run_write(self.conn, lambda conn: conn.execute(
+            '''INSERT INTO Rooms (name, computer_id, quantity, price_per_hour)
+               VALUES (?, ?, ?, ?)''', (name, computer_id, quantity, price_per_hour)))
+
+    def book(self, room_id, computer_number, start_time, end_time):
+        self.bookMany([(room_id, computer_number, start_time, end_time)])
+
+    def bookMany(self, bookings):
+        # bookings - [(помещение, номер компьютера, начало, конец)]; при
+        # пересечении с любой бронью не проводится ни одна
+        def write(conn):
+            for room_id, computer_number, start_time, end_time in bookings:
+                if self.hasConflict(conn, room_id, computer_number, start_time, end_time):
+                    raise ValueError("Компьютер уже забронирован на это время")
+                conn.execute('''INSERT INTO Bookings (room_id, computer_number, start_time, end_time)
+                                VALUES (?, ?, ?, ?)''', (room_id, computer_number, start_time, end_time))
+        run_write(self.conn, write)
+
+    def hasConflict(self, conn, room_id, computer_number, start, end):
+        cursor = conn.execute('''SELECT * FROM Bookings 
+                                WHERE room_id=? AND computer_number=?
+                                AND ((start_time BETWEEN ? AND ?) 
+                                OR (end_time BETWEEN ? AND ?) 
+                                OR (? BETWEEN start_time AND end_time))''',
+                             (room_id, computer_number, start, end, start, end, start))
+        return bool(cursor.fetchone())
+
+
+class ComputerClubApp(tk.Toplevel):
+    def __init__(self, root):
+        super().__init__(root)
         self.title("Управление компьютерным клубом")
         self.geometry("1000x700")
         self.configure(bg='#F0F0F0')
         
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(self, 'ComputerClub')
         self.setupStyles()
         self.createDatabase()
+        self.queries = QueryExecutor(self, 'computer_club.db')
         self.setupUI()
-        self.updateComputersList()
-        self.updateRoomsList()
 
     def setupStyles(self):
-        self.style.configure('TNotebook', background='#F0F0F0')
-        self.style.configure('TFrame', background='#F0F0F0')
-        self.style.configure('TButton', foreground='white', background='#4CAF50', 
+        self.style.configure('ComputerClub.TNotebook', background='#F0F0F0')
+        self.style.configure('ComputerClub.TFrame', background='#F0F0F0')
+        self.style.configure('ComputerClub.TButton', foreground='white', background='#4CAF50', 
                             font=('Arial', 10), padding=5)
-        self.style.map('TButton', background=[('active', '#45a049')])
-        self.style.configure('Header.TLabel', font=('Arial', 12, 'bold'), 
+        self.style.map('ComputerClub.TButton', background=[('active', '#45a049')])
+        self.style.configure('Header.ComputerClub.TLabel', font=('Arial', 12, 'bold'), 
                             foreground='#333333', background='#F0F0F0')
-        self.style.configure('Red.TButton', background='#ff4444', foreground='white')
-        self.style.map('Red.TButton', background=[('active', '#cc0000')])
+        self.style.configure('Red.ComputerClub.TButton', background='#ff4444', foreground='white')
+        self.style.map('Red.ComputerClub.TButton', background=[('active', '#cc0000')])
 
     def createDatabase(self):
-        conn = sqlite3.connect('computer_club.db')
+        conn = get_connection('computer_club.db')
         cursor = conn.cursor()
         cursor.execute('''CREATE TABLE IF NOT EXISTS Computers (
                         id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -52,31 +98,26 @@ class ComputerClubApp(tk.Tk):
                         end_time DATETIME,
                         FOREIGN KEY (room_id) REFERENCES Rooms(id))''')
         conn.commit()
-        conn.close()
+        migrate(conn, 'computer_club.db')
+        self.service = ComputerClubService(conn)
 
     def setupUI(self):
-        self.notebook = ttk.Notebook(self)
-        self.createComputersTab()
-        self.createRoomsTab()
-        self.createBookingTab()
-        self.createReportsTab()
+        self.notebook = LazyNotebook(self)
+        self.tabs = {name: ttk.Frame(self.notebook)
+                     for name in ('Компьютеры', 'Помещения', 'Бронирование', 'Отчеты')}
+        self.notebook.add_lazy(self.tabs['Компьютеры'], self.createComputersTab, text='Компьютеры')
+        self.notebook.add_lazy(self.tabs['Помещения'], self.createRoomsTab, self.updateComputersList,
+                               text='Помещения')
+        self.notebook.add_lazy(self.tabs['Бронирование'], self.createBookingTab, self.updateRoomsList,
+                               text='Бронирование')
+        self.notebook.add_lazy(self.tabs['Отчеты'], self.createReportsTab, self.generateReport, text='Отчеты')
+        add_search_tab(self.notebook, self.queries)
         self.notebook.pack(expand=True, fill='both')
-        self.notebook.bind("<<NotebookTabChanged>>", self.onTabChange)
-
-    def onTabChange(self, event):
-        current_tab = self.notebook.tab(self.notebook.select(), 'text')
-        if current_tab == 'Помещения':
-            self.updateComputersList()
-        elif current_tab == 'Бронирование':
-            self.updateRoomsList()
-        elif current_tab == 'Отчеты':
-            self.generateReport()
 
     def createComputersTab(self):
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text='Компьютеры')
+        frame = self.tabs['Компьютеры']
         
-        ttk.Label(frame, text='Добавление компьютера', style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text='Добавление компьютера', style='Header.ComputerClub.TLabel').pack(pady=10)
         
         form_frame = ttk.Frame(frame)
         form_frame.pack(pady=20, padx=30)
@@ -92,16 +133,13 @@ class ComputerClubApp(tk.Tk):
         ttk.Button(form_frame, text='Сохранить', command=self.saveComputer).grid(row=2, columnspan=2, pady=15)
 
     def createRoomsTab(self):
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text='Помещения')
+        frame = self.tabs['Помещения']
         
-        ttk.Label(frame, text='Добавление помещения', style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text='Добавление помещения', style='Header.ComputerClub.TLabel').pack(pady=10)
         
         self.room_form_frame = ttk.Frame(frame)
         self.room_form_frame.pack(pady=20, padx=30)
         
-        self.updateComputersList()
-        
         ttk.Label(self.room_form_frame, text='Название:').grid(row=0, column=0, padx=10, pady=5, sticky='e')
         self.room_name = ttk.Entry(self.room_form_frame, width=30)
         self.room_name.grid(row=0, column=1, padx=10, pady=5)
@@ -119,12 +157,12 @@ class ComputerClubApp(tk.Tk):
         self.room_price.grid(row=3, column=1, padx=10, pady=5)
         
         ttk.Button(self.room_form_frame, text='Сохранить', command=self.saveRoom).grid(row=4, columnspan=2, pady=15)
+        self.updateComputersList()
 
     def createBookingTab(self):
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text='Бронирование')
+        frame = self.tabs['Бронирование']
         
-        ttk.Label(frame, text='Выберите помещение', style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text='Выберите помещение', style='Header.ComputerClub.TLabel').pack(pady=10)
         
         self.room_combo = ttk.Combobox(frame, width=40)
         self.room_combo.pack(pady=10)
@@ -132,12 +170,12 @@ class ComputerClubApp(tk.Tk):
         
         self.computers_frame = ttk.Frame(frame)
         self.computers_frame.pack(pady=20, padx=30)
+        self.updateRoomsList()
 
     def createReportsTab(self):
-        frame = ttk.Frame(self.notebook)
-        self.notebook.add(frame, text='Отчеты')
+        frame = self.tabs['Отчеты']
         
-        ttk.Label(frame, text='Генерация отчета', style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text='Генерация отчета', style='Header.ComputerClub.TLabel').pack(pady=10)
         
         form_frame = ttk.Frame(frame)
         form_frame.pack(pady=20)
@@ -154,6 +192,7 @@ class ComputerClubApp(tk.Tk):
         
         self.report_text = tk.Text(frame, height=12, width=70, font=('Arial', 10), bg='white', bd=2)
         self.report_text.pack(pady=20, padx=30)
+        self.generateReport()
 
     def saveComputer(self):
         name = self.computer_name.get()
@@ -162,23 +201,18 @@ class ComputerClubApp(tk.Tk):
             messagebox.showerror("Ошибка", "Введите название компьютера")
             return
         
-        conn = sqlite3.connect('computer_club.db')
-        cursor = conn.cursor()
-        cursor.execute("INSERT INTO Computers (name, description) VALUES (?, ?)", (name, desc))
-        conn.commit()
-        conn.close()
+        self.service.saveComputer(name, desc)
         
         self.computer_name.delete(0, tk.END)
         self.computer_desc.delete(0, tk.END)
-        self.updateComputersList()
+        self.notebook.mark_stale(self.tabs['Помещения'])
         messagebox.showinfo("Успех", "Компьютер успешно добавлен")
 
     def updateComputersList(self):
-        conn = sqlite3.connect('computer_club.db')
+        conn = get_connection('computer_club.db')
         cursor = conn.cursor()
         cursor.execute("SELECT id, name FROM Computers")
         self.computers = cursor.fetchall()
-        conn.close()
         
         if hasattr(self, 'computer_combo'):
             self.computer_combo['values'] = [c[1] for c in self.computers]
@@ -199,25 +233,19 @@ class ComputerClubApp(tk.Tk):
             messagebox.showerror("Ошибка", "Выберите компьютер из списка")
             return
         
-        conn = sqlite3.connect('computer_club.db')
-        cursor = conn.cursor()
-        cursor.execute('''INSERT INTO Rooms (name, computer_id, quantity, price_per_hour)
-                        VALUES (?, ?, ?, ?)''', (name, computer_id, quantity, float(price)))
-        conn.commit()
-        conn.close()
+        self.service.saveRoom(name, computer_id, quantity, float(price))
         
         self.room_name.delete(0, tk.END)
         self.room_quantity.delete(0, tk.END)
         self.room_price.delete(0, tk.END)
-        self.updateRoomsList()
+        self.notebook.mark_stale(self.tabs['Бронирование'], self.tabs['Отчеты'])
         messagebox.showinfo("Успех", "Помещение успешно добавлено")
 
     def updateRoomsList(self):
-        conn = sqlite3.connect('computer_club.db')
+        conn = get_connection('computer_club.db')
         cursor = conn.cursor()
         cursor.execute("SELECT id, name FROM Rooms")
         self.rooms = cursor.fetchall()
-        conn.close()
         
         if hasattr(self, 'room_combo'):
             self.room_combo['values'] = [r[1] for r in self.rooms]
@@ -232,26 +260,27 @@ class ComputerClubApp(tk.Tk):
         except StopIteration:
             return
         
-        conn = sqlite3.connect('computer_club.db')
-        cursor = conn.cursor()
-        cursor.execute("SELECT quantity FROM Rooms WHERE id=?", (room_id,))
-        quantity = cursor.fetchone()[0]
-        conn.close()
-        
+        def query(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT quantity FROM Rooms WHERE id=?", (room_id,))
+            quantity = cursor.fetchone()[0]
+            # Занятые компьютеры одним запросом вместо запроса на каждую кнопку
+            cursor.execute('''SELECT DISTINCT computer_number FROM Bookings 
+                            WHERE room_id=? AND end_time > datetime('now')''', (room_id,))
+            return quantity, {row[0] for row in cursor.fetchall()}
+
+        self.queries.submit('computers', query,
+                            on_done=lambda result: self.fillComputers(room_id, *result))
+
+    def fillComputers(self, room_id, quantity, booked):
+        for widget in self.computers_frame.winfo_children():
+            widget.destroy()
         for i in range(quantity):
             btn = ttk.Button(self.computers_frame, text=str(i+1), 
-                            style='Red.TButton' if self.isComputerBooked(room_id, i+1) else 'TButton',
+                            style='Red.ComputerClub.TButton' if i+1 in booked else 'ComputerClub.TButton',
                             command=lambda num=i+1: self.bookComputer(room_id, num))
             btn.grid(row=i//6, column=i%6, padx=5, pady=5)
 
-    def isComputerBooked(self, room_id, computer_number):
-        conn = sqlite3.connect('computer_club.db')
-        cursor = conn.cursor()
-        cursor.execute('''SELECT end_time FROM Bookings 
-                        WHERE room_id=? AND computer_number=? 
-                        AND end_time > datetime('now')''', (room_id, computer_number))
-        return bool(cursor.fetchone())
-
     def bookComputer(self, room_id, computer_number):
         dialog = tk.Toplevel(self)
         dialog.title("Бронирование")
@@ -279,11 +308,10 @@ class ComputerClubApp(tk.Tk):
             room_id = next(r[0] for r in self.rooms if r[1] == self.room_combo.get())
             hours = int(self.hours.get())
             
-            conn = sqlite3.connect('computer_club.db')
+            conn = get_connection('computer_club.db')
             cursor = conn.cursor()
             cursor.execute("SELECT price_per_hour FROM Rooms WHERE id=?", (room_id,))
             price = cursor.fetchone()[0]
-            conn.close()
             
             total = hours * price
             self.price_label.config(text=f"Стоимость: {total:.2f} руб.")
@@ -295,66 +323,50 @@ class ComputerClubApp(tk.Tk):
             hours = int(self.hours.get())
             start_time = datetime.now()
             end_time = start_time + timedelta(hours=hours)
-            
-            if self.checkBookingConflict(room_id, computer_number, start_time, end_time):
-                messagebox.showerror("Ошибка", "Компьютер уже забронирован на это время")
-                return
-            
-            conn = sqlite3.connect('computer_club.db')
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO Bookings (room_id, computer_number, start_time, end_time)
-                            VALUES (?, ?, ?, ?)''', 
-                         (room_id, computer_number, start_time, end_time))
-            conn.commit()
-            conn.close()
-            
-            messagebox.showinfo("Успех", "Бронирование подтверждено")
-            dialog.destroy()
-            self.showComputers()
-            self.generateReport()
+            self.service.book(room_id, computer_number, start_time, end_time)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка бронирования: {str(e)}")
-
-    def checkBookingConflict(self, room_id, computer_number, start, end):
-        conn = sqlite3.connect('computer_club.db')
-        cursor = conn.cursor()
-        cursor.execute('''SELECT * FROM Bookings 
-                        WHERE room_id=? AND computer_number=?
-                        AND ((start_time BETWEEN ? AND ?) 
-                        OR (end_time BETWEEN ? AND ?) 
-                        OR (? BETWEEN start_time AND end_time))''',
-                     (room_id, computer_number, start, end, start, end, start))
-        result = bool(cursor.fetchone())
-        conn.close()
-        return result
+            return
+        messagebox.showinfo("Успех", "Бронирование подтверждено")
+        dialog.destroy()
+        self.showComputers()
+        self.notebook.mark_stale(self.tabs['Отчеты'])
 
     def generateReport(self):
-        try:
-            start = self.start_date.get()
-            end = self.end_date.get() + " 23:59:59"
-            
-            conn = sqlite3.connect('computer_club.db')
-            cursor = conn.cursor()
-            cursor.execute('''
-                SELECT 
-                    COUNT(*), 
-                    SUM((strftime('%s', end_time) - strftime('%s', start_time))/3600.0 * r.price_per_hour)
-                FROM Bookings b
-                JOIN Rooms r ON b.room_id = r.id
-                WHERE b.start_time >= ? AND b.start_time <= ?
-            ''', (start, end))
-            result = cursor.fetchone()
-            total_bookings = result[0] or 0
-            total_profit = result[1] or 0.0
-            conn.close()
-            
-            self.report_text.delete(1.0, tk.END)
-            self.report_text.insert(tk.END, f"▪ Всего бронирований: {total_bookings}\n")
-            self.report_text.insert(tk.END, f"▪ Общая прибыль: {total_profit:.2f} руб.\n\n")
-            self.report_text.insert(tk.END, f"Период: {self.start_date.get()} — {self.end_date.get()}")
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
+        start = self.start_date.get()
+        end = self.end_date.get() + " 23:59:59"
+        period = f"Период: {self.start_date.get()} — {self.end_date.get()}"
+
+        def query(conn):
+            with spanning(conn, 'Bookings', start, end, ('room_id', 'start_time', 'end_time')) as bookings:
+                return conn.execute(f'''
+                    SELECT 
+                        COUNT(*), 
+                        SUM((strftime('%s', end_time) - strftime('%s', start_time))/3600.0 * r.price_per_hour)
+                    FROM {bookings} b
+                    JOIN Rooms r ON b.room_id = r.id
+                    WHERE b.start_time >= ? AND b.start_time <= ?
+                ''', (start, end)).fetchone()
+
+        show_loading(self.report_text)
+        self.queries.submit('report', query, on_done=lambda result: self.showReport(result, period))
+
+    def showReport(self, result, period):
+        total_bookings = result[0] or 0
+        total_profit = result[1] or 0.0
+        
+        self.report_text.delete(1.0, tk.END)
+        self.report_text.insert(tk.END, f"▪ Всего бронирований: {total_bookings}\n")
+        self.report_text.insert(tk.END, f"▪ Общая прибыль: {total_profit:.2f} руб.\n\n")
+        self.report_text.insert(tk.END, period)
 
 if __name__ == "__main__":
-    app = ComputerClubApp()
-    app.mainloop()
+    root = tk.Tk()
+    root.withdraw()
+    app = ComputerClubApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    tracing.install(app)
+    root.mainloop()
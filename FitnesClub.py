@@ -1,8 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+from query_executor import QueryExecutor, show_loading
+from tree_sync import sync_tree, stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles, CLASSES
+from autocomplete import AutocompleteCombobox
 from datetime import datetime, timedelta
-from tkintermapview import TkinterMapView
+from lazy_widgets import TkinterMapView
 
 COLORS = {
     "primary": "#2A3D4C",
@@ -16,7 +25,7 @@ COLORS = {
 
 
 def connect_db():
-    return sqlite3.connect('fitness_club.db')
+    return get_connection('fitness_club.db')
 
 
 def create_tables():
@@ -54,7 +63,58 @@ def create_tables():
                         text TEXT)''')
     
     conn.commit()
-    conn.close()
+    migrate(conn, 'fitness_club.db')
+
+
+SALES_COLUMNS = ("ID", "Участник", "Абонемент", "Начало", "Окончание", "Осталось")
+
+SALES_QUERY = '''SELECT p.id AS "ID", c.name AS "Участник", s.name AS "Абонемент", p.purchase_date AS "Начало", 
+                        DATE(p.purchase_date, '+'||s.duration||' days') AS "Окончание", 
+                        julianday(DATE(p.purchase_date, '+'||s.duration||' days')) - julianday('now') AS "Осталось"
+                        FROM purchases p
+                        JOIN clients c ON p.client_id = c.id
+                        JOIN subscriptions s ON p.subscription_id = s.id'''
+
+
+def format_sale(row):
+    days_left = int(float(row[5])) if row[5] else 0
+    return (row[0], row[1], row[2], row[3], row[4], days_left)
+
+
+class FitnessService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_member(self, name, phone, age):
+        self.add_members([(name, phone, age)])
+
+    def add_members(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO clients (name, phone, age) VALUES (?, ?, ?)", records))
+
+    def add_subscription(self, name, type, duration, price):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO subscriptions (name, type, duration, price) VALUES (?, ?, ?, ?)",
+            (name, type, duration, price)))
+
+    def sell_subscription(self, client_id, subscription, discount=0, purchase_date=None):
+        self.sell_subscriptions([(client_id, subscription, discount, purchase_date)])
+
+    def sell_subscriptions(self, records):
+        # records - [(участник, название абонемента, скидка, дата или None - сегодня)]
+        def write(conn):
+            for client_id, subscription, discount, purchase_date in records:
+                row = conn.execute("SELECT id FROM subscriptions WHERE name = ?", (subscription,)).fetchone()
+                if row is None:
+                    raise LookupError(f"Абонемент '{subscription}' не найден")
+                conn.execute('''INSERT INTO purchases (client_id, subscription_id, purchase_date, discount)
+                                VALUES (?, ?, COALESCE(?, DATE('now')), ?)''',
+                             (client_id, row[0], purchase_date, discount))
+        run_write(self.conn, write)
+
+    def add_marker(self, latitude, longitude, text):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO markers (latitude, longitude, text) VALUES (?, ?, ?)", (latitude, longitude, text)))
 
 
 class FitnessApp:
@@ -64,88 +124,97 @@ class FitnessApp:
         self.root.title("Fitness Club Manager")
         self.root.configure(bg=COLORS["background"])
         self.configure_styles()
+        self.queries = QueryExecutor(root, 'fitness_club.db')
+        create_tables()
+        self.service = FitnessService(connect_db())
         
         self.main_container = ttk.Frame(root)
         self.main_container.pack(fill="both", expand=True)
         
-        self.notebook = ttk.Notebook(self.main_container)
+        self.notebook = LazyNotebook(self.main_container)
         self.notebook.pack(expand=True, fill="both", padx=20, pady=20)
         
-        self.create_members_tab()
-        self.create_subscriptions_tab()
-        self.create_sales_tab()
-        self.create_management_tab()
-        self.create_map_tab()
-        
-        create_tables()
-        self.load_initial_data()
+        # Вкладки (и карта) строятся и загружают данные при первом открытии
+        self.tabs = {name: ttk.Frame(self.notebook)
+                     for name in ("Участники", "Абонементы", "Продажи", "Администрирование", "Локация")}
+        self.notebook.add_lazy(self.tabs["Участники"], self.create_members_tab, self.load_members,
+                               text="Участники")
+        self.notebook.add_lazy(self.tabs["Абонементы"], self.create_subscriptions_tab, self.load_subscriptions,
+                               text="Абонементы")
+        self.notebook.add_lazy(self.tabs["Продажи"], self.create_sales_tab, self.load_sales, text="Продажи")
+        self.notebook.add_lazy(self.tabs["Администрирование"], self.create_management_tab, self.update_stats,
+                               text="Администрирование")
+        self.notebook.add_lazy(self.tabs["Локация"], self.create_map_tab, text="Локация")
+        add_search_tab(self.notebook, self.queries)
 
 
     def configure_styles(self):
         style = ttk.Style()
-        style.theme_use("clam")
-        
-        style.configure(".", background=COLORS["background"], foreground=COLORS["text"])
-        style.configure("TNotebook", background=COLORS["background"], borderwidth=0)
-        style.configure("TNotebook.Tab", 
+        use_theme(style, "clam")
+        scope_styles(self.root, 'Fitness')
+        
+        # Цвета по умолчанию для всех стилей окна (вместо общего стиля ".")
+        for name in CLASSES:
+            style.configure(f"Fitness.{name}", background=COLORS["background"], foreground=COLORS["text"])
+        style.configure("Fitness.TNotebook", background=COLORS["background"], borderwidth=0)
+        style.configure("Fitness.TNotebook.Tab", 
                        font=('Arial', 10, 'bold'), 
                        padding=15,
                        background=COLORS["secondary"],
                        foreground="white")
-        style.map("TNotebook.Tab", 
+        style.map("Fitness.TNotebook.Tab", 
                  background=[("selected", COLORS["primary"])],
                  foreground=[("selected", "white")])
         
-        style.configure("TButton", 
+        style.configure("Fitness.TButton", 
                        font=('Arial', 10, 'bold'), 
                        padding=8,
                        borderwidth=2,
                        relief="flat",
                        background=COLORS["primary"],
                        foreground="white")
-        style.map("TButton", 
+        style.map("Fitness.TButton", 
                  background=[('active', COLORS["secondary"]), ('disabled', '#D3D3D3')],
                  relief=[('active', 'sunken'), ('!active', 'flat')])
         
-        style.configure("Treeview",
+        style.configure("Fitness.Treeview",
                        font=('Arial', 10),
                        rowheight=30,
                        borderwidth=1,
                        relief="solid",
                        fieldbackground=COLORS["background"])
-        style.configure("Treeview.Heading", 
+        style.configure("Fitness.Treeview.Heading", 
                        font=('Arial', 11, 'bold'),
                        background=COLORS["primary"],
                        foreground="white",
                        relief="flat")
-        style.map("Treeview.Heading", 
+        style.map("Fitness.Treeview.Heading", 
                  background=[('active', COLORS["secondary"])])
         
-        style.configure("Header.TLabel", 
+        style.configure("Header.Fitness.TLabel", 
                        font=('Arial', 16, 'bold'), 
                        foreground=COLORS["primary"],
                        background=COLORS["background"])
-        style.configure("Secondary.TLabel",
+        style.configure("Secondary.Fitness.TLabel",
                        font=('Arial', 12),
                        foreground=COLORS["text"],
                        background=COLORS["background"])
         
-        style.configure("TEntry",
+        style.configure("Fitness.TEntry",
                         fieldbackground="white",
                         bordercolor=COLORS["primary"],
                         lightcolor=COLORS["primary"],
                         darkcolor=COLORS["primary"])
-        style.map("TEntry",
+        style.map("Fitness.TEntry",
                  fieldbackground=[("readonly", "#F0F0F0")])
 
 
     def create_members_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Участники")
+        tab = self.tabs["Участники"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill="x", padx=20, pady=10)
-        ttk.Label(header_frame, text="Управление участниками", style="Header.TLabel").pack(side="left")
+        ttk.Label(header_frame, text="Управление участниками", style="Header.Fitness.TLabel").pack(side="left")
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -161,16 +230,16 @@ class FitnessApp:
         btn_frame.pack(pady=10)
         
         ttk.Button(btn_frame, text="Обновить список", command=self.load_members).pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="Добавить участника", command=self.add_member_dialog, style="Accent.TButton").pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Добавить участника", command=self.add_member_dialog, style="Accent.Fitness.TButton").pack(side="left", padx=5)
+        self.load_members()
 
 
     def create_subscriptions_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Абонементы")
+        tab = self.tabs["Абонементы"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill="x", padx=20, pady=10)
-        ttk.Label(header_frame, text="Доступные абонементы", style="Header.TLabel").pack(side="left")
+        ttk.Label(header_frame, text="Доступные абонементы", style="Header.Fitness.TLabel").pack(side="left")
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill="both", expand=True, padx=20, pady=10)
@@ -186,24 +255,25 @@ class FitnessApp:
         btn_frame.pack(pady=10)
         
         ttk.Button(btn_frame, text="Обновить список", command=self.load_subscriptions).pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="Добавить абонемент", command=self.add_subscription_dialog, style="Accent.TButton").pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Добавить абонемент", command=self.add_subscription_dialog, style="Accent.Fitness.TButton").pack(side="left", padx=5)
+        self.load_subscriptions()
 
 
     def create_sales_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Продажи")
+        tab = self.tabs["Продажи"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill="x", padx=20, pady=10)
-        ttk.Label(header_frame, text="Активные абонементы", style="Header.TLabel").pack(side="left")
+        ttk.Label(header_frame, text="Активные абонементы", style="Header.Fitness.TLabel").pack(side="left")
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill="both", expand=True, padx=20, pady=10)
         
-        self.sales_tree = ttk.Treeview(content_frame, columns=("ID", "Участник", "Абонемент", "Начало", "Окончание", "Осталось"), show="headings")
+        self.sales_tree = VirtualTreeview(content_frame, connect_db(), SALES_QUERY, columns=SALES_COLUMNS,
+                                          key="ID", format_row=format_sale)
         self.sales_tree.pack(fill="both", expand=True, pady=10)
         
-        for col in ("ID", "Участник", "Абонемент", "Начало", "Окончание", "Осталось"):
+        for col in SALES_COLUMNS:
             self.sales_tree.heading(col, text=col)
             self.sales_tree.column(col, width=120, anchor="center")
             
@@ -211,38 +281,37 @@ class FitnessApp:
         btn_frame.pack(pady=10)
         
         ttk.Button(btn_frame, text="Обновить данные", command=self.load_sales).pack(side="left", padx=5)
-        ttk.Button(btn_frame, text="Оформить продажу", command=self.create_sale_dialog, style="Accent.TButton").pack(side="left", padx=5)
+        ttk.Button(btn_frame, text="Оформить продажу", command=self.create_sale_dialog, style="Accent.Fitness.TButton").pack(side="left", padx=5)
 
 
     def create_management_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Администрирование")
+        tab = self.tabs["Администрирование"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill="x", padx=20, pady=10)
-        ttk.Label(header_frame, text="Статистика клуба", style="Header.TLabel").pack(side="left")
+        ttk.Label(header_frame, text="Статистика клуба", style="Header.Fitness.TLabel").pack(side="left")
         
         stats_frame = ttk.Frame(tab)
         stats_frame.pack(fill="both", expand=True, padx=20, pady=20)
         
-        stat_card = ttk.Frame(stats_frame, style="Card.TFrame")
+        stat_card = ttk.Frame(stats_frame, style="Card.Fitness.TFrame")
         stat_card.pack(pady=10, fill="x", padx=20)
-        ttk.Label(stat_card, text="Всего участников:", style="Secondary.TLabel").pack(side="left", padx=10, pady=5)
-        self.total_members_label = ttk.Label(stat_card, text="0", style="Secondary.TLabel", font=('Arial', 14, 'bold'))
+        ttk.Label(stat_card, text="Всего участников:", style="Secondary.Fitness.TLabel").pack(side="left", padx=10, pady=5)
+        self.total_members_label = ttk.Label(stat_card, text="0", style="Secondary.Fitness.TLabel", font=('Arial', 14, 'bold'))
         self.total_members_label.pack(side="left", padx=10)
         
-        stat_card = ttk.Frame(stats_frame, style="Card.TFrame")
+        stat_card = ttk.Frame(stats_frame, style="Card.Fitness.TFrame")
         stat_card.pack(pady=10, fill="x", padx=20)
-        ttk.Label(stat_card, text="Активных абонементов:", style="Secondary.TLabel").pack(side="left", padx=10, pady=5)
-        self.active_subs_label = ttk.Label(stat_card, text="0", style="Secondary.TLabel", font=('Arial', 14, 'bold'))
+        ttk.Label(stat_card, text="Активных абонементов:", style="Secondary.Fitness.TLabel").pack(side="left", padx=10, pady=5)
+        self.active_subs_label = ttk.Label(stat_card, text="0", style="Secondary.Fitness.TLabel", font=('Arial', 14, 'bold'))
         self.active_subs_label.pack(side="left", padx=10)
         
         ttk.Button(stats_frame, text="Обновить статистику", command=self.update_stats).pack(pady=20)
+        self.update_stats()
 
 
     def create_map_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Локация")
+        tab = self.tabs["Локация"]
         
         control_frame = ttk.Frame(tab)
         control_frame.pack(pady=10, padx=20, fill="x")
@@ -266,7 +335,7 @@ class FitnessApp:
             control_frame, 
             text="Добавить точку", 
             command=self.add_marker,
-            style="Accent.TButton"
+            style="Accent.Fitness.TButton"
         ).pack(side="left", padx=10)
         
         self.map_widget = TkinterMapView(tab, width=1200, height=600, corner_radius=15)
@@ -275,69 +344,41 @@ class FitnessApp:
         self.map_widget.set_zoom(15)
         marker = self.map_widget.set_marker(55.7558, 37.6173, text="Fitness Club")
         marker.set_text("Главный фитнес-клуб")
-
-
-    def load_initial_data(self):
-        self.load_members()
-        self.load_subscriptions()
-        self.load_sales()
-        self.update_stats()
         self.load_markers()
 
 
     def load_members(self):
-        for row in self.members_tree.get_children():
-            self.members_tree.delete(row)
-            
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, phone, age FROM clients")
-        for row in cursor.fetchall():
-            self.members_tree.insert("", "end", values=row)
-        conn.close()
-
+        show_loading(self.members_tree, keep_rows=True)
+        stream_tree(self.queries, 'members', self.members_tree, "SELECT id, name, phone, age FROM clients")
 
     def load_subscriptions(self):
-        for row in self.subs_tree.get_children():
-            self.subs_tree.delete(row)
-            
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute("SELECT id, name, type, duration, price FROM subscriptions")
-        for row in cursor.fetchall():
-            self.subs_tree.insert("", "end", values=row)
-        conn.close()
+        show_loading(self.subs_tree, keep_rows=True)
+        self.queries.submit('subscriptions', "SELECT id, name, type, duration, price FROM subscriptions",
+                            on_done=self.fill_subscriptions)
+
+
+    def fill_subscriptions(self, rows):
+        sync_tree(self.subs_tree, rows)
 
 
     def load_sales(self):
-        for row in self.sales_tree.get_children():
-            self.sales_tree.delete(row)
-            
-        conn = connect_db()
-        cursor = conn.cursor()
-        cursor.execute('''SELECT p.id, c.name, s.name, p.purchase_date, 
-                        DATE(p.purchase_date, '+'||s.duration||' days'), 
-                        julianday(DATE(p.purchase_date, '+'||s.duration||' days')) - julianday('now') 
-                        FROM purchases p
-                        JOIN clients c ON p.client_id = c.id
-                        JOIN subscriptions s ON p.subscription_id = s.id''')
-        for row in cursor.fetchall():
-            days_left = int(float(row[5])) if row[5] else 0
-            self.sales_tree.insert("", "end", values=(row[0], row[1], row[2], row[3], row[4], days_left))
-        conn.close()
+        self.sales_tree.refresh()
 
 
     def update_stats(self):
-        conn = connect_db()
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT COUNT(*) FROM clients")
-        self.total_members_label.config(text=cursor.fetchone()[0])
-        
-        cursor.execute("SELECT COUNT(*) FROM purchases")
-        self.active_subs_label.config(text=cursor.fetchone()[0])
-        
-        conn.close()
+        def query(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT COUNT(*) FROM clients")
+            members = cursor.fetchone()[0]
+            cursor.execute("SELECT COUNT(*) FROM purchases")
+            return members, cursor.fetchone()[0]
+
+        self.queries.submit('stats', query, on_done=self.show_stats)
+
+
+    def show_stats(self, result):
+        self.total_members_label.config(text=result[0])
+        self.active_subs_label.config(text=result[1])
 
 
     def add_member_dialog(self):
@@ -358,12 +399,7 @@ class FitnessApp:
         
         def save_member():
             if name_entry.get() and phone_entry.get() and age_entry.get():
-                conn = connect_db()
-                cursor = conn.cursor()
-                cursor.execute("INSERT INTO clients (name, phone, age) VALUES (?, ?, ?)", 
-                             (name_entry.get(), phone_entry.get(), age_entry.get()))
-                conn.commit()
-                conn.close()
+                self.service.add_member(name_entry.get(), phone_entry.get(), age_entry.get())
                 self.load_members()
                 dialog.destroy()
             else:
@@ -394,15 +430,8 @@ class FitnessApp:
         
         def save_subscription():
             if all([name_entry.get(), type_combobox.get(), duration_entry.get(), price_entry.get()]):
-                conn = connect_db()
-                cursor = conn.cursor()
-                cursor.execute('''INSERT INTO subscriptions 
-                               (name, type, duration, price) 
-                               VALUES (?, ?, ?, ?)''',
-                               (name_entry.get(), type_combobox.get(), 
-                                duration_entry.get(), price_entry.get()))
-                conn.commit()
-                conn.close()
+                self.service.add_subscription(name_entry.get(), type_combobox.get(),
+                                              duration_entry.get(), price_entry.get())
                 self.load_subscriptions()
                 dialog.destroy()
             else:
@@ -416,7 +445,7 @@ class FitnessApp:
         dialog.title("Оформить продажу")
         
         ttk.Label(dialog, text="Участник:").grid(row=0, column=0, padx=10, pady=5)
-        client_combobox = ttk.Combobox(dialog)
+        client_combobox = AutocompleteCombobox(dialog, self.queries, 'clients')
         client_combobox.grid(row=0, column=1, padx=10, pady=5)
         
         ttk.Label(dialog, text="Абонемент:").grid(row=1, column=0, padx=10, pady=5)
@@ -427,49 +456,31 @@ class FitnessApp:
         discount_entry = ttk.Entry(dialog)
         discount_entry.grid(row=2, column=1, padx=10, pady=5)
         
-        def load_clients():
-            conn = connect_db()
-            cursor = conn.cursor()
-            cursor.execute("SELECT name FROM clients")
-            client_combobox['values'] = [row[0] for row in cursor.fetchall()]
-            conn.close()
-            
         def load_subs():
             conn = connect_db()
             cursor = conn.cursor()
             cursor.execute("SELECT name FROM subscriptions")
             sub_combobox['values'] = [row[0] for row in cursor.fetchall()]
-            conn.close()
             
-        load_clients()
+        client_combobox.refresh()
         load_subs()
         
         def process_sale():
-            client = client_combobox.get()
+            client_id = client_combobox.get_id()
             subscription = sub_combobox.get()
             discount = discount_entry.get() or 0
             
-            if client and subscription:
-                conn = connect_db()
-                cursor = conn.cursor()
-                
-                cursor.execute("SELECT id FROM clients WHERE name = ?", (client,))
-                client_id = cursor.fetchone()[0]
-                
-                cursor.execute("SELECT id FROM subscriptions WHERE name = ?", (subscription,))
-                sub_id = cursor.fetchone()[0]
-                
-                cursor.execute('''INSERT INTO purchases 
-                               (client_id, subscription_id, purchase_date, discount)
-                               VALUES (?, ?, DATE('now'), ?)''',
-                               (client_id, sub_id, discount))
-                conn.commit()
-                conn.close()
+            if client_id is not None and subscription:
+                try:
+                    self.service.sell_subscription(client_id, subscription, discount)
+                except LookupError as e:
+                    messagebox.showerror("Ошибка", str(e))
+                    return
                 self.load_sales()
-                self.update_stats()
+                self.notebook.mark_stale(self.tabs["Администрирование"])
                 dialog.destroy()
             else:
-                messagebox.showerror("Ошибка", "Выберите участника и абонемент")
+                messagebox.showerror("Ошибка", "Выберите участника из списка и абонемент")
         
         ttk.Button(dialog, text="Оформить", command=process_sale).grid(row=3, column=0, columnspan=2, pady=10)
 
@@ -485,12 +496,7 @@ class FitnessApp:
             
             self.map_widget.set_marker(lat_float, lon_float, text=text)
             
-            conn = connect_db()
-            cursor = conn.cursor()
-            cursor.execute('''INSERT INTO markers (latitude, longitude, text)
-                            VALUES (?, ?, ?)''', (lat_float, lon_float, text))
-            conn.commit()
-            conn.close()
+            self.service.add_marker(lat_float, lon_float, text)
             
             self.lat_entry.delete(0, "end")
             self.lon_entry.delete(0, "end")
@@ -505,9 +511,9 @@ class FitnessApp:
         cursor.execute("SELECT latitude, longitude, text FROM markers")
         for row in cursor.fetchall():
             self.map_widget.set_marker(row[0], row[1], text=row[2])
-        conn.close()
         
 if __name__ == "__main__":
     root = tk.Tk()
     app = FitnessApp(root)
+    tracing.install(root)
     root.mainloop()
@@ -1,11 +1,21 @@
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from export import ask_export
+import tracing
+from query_executor import QueryExecutor, show_loading
+from report_cache import ReportCache
+from tree_sync import sync_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-from tkcalendar import DateEntry
+from lazy_widgets import DateEntry
 
 def create_database():
-    conn = sqlite3.connect('jewelry.db')
+    conn = get_connection('jewelry.db')
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS products
                  (id INTEGER PRIMARY KEY AUTOINCREMENT, 
@@ -22,10 +32,58 @@ def create_database():
                  (id INTEGER PRIMARY KEY AUTOINCREMENT, 
                   address TEXT)''')
     conn.commit()
-    conn.close()
+    migrate(conn, 'jewelry.db')
 
 create_database()
 
+ORDERS_QUERY = '''SELECT orders.id AS id, products.name AS product, orders.quantity AS quantity,
+                         orders.status AS status,
+                         strftime('%d.%m.%Y %H:%M', orders.created_at) AS time,
+                         orders.created_at AS created_at
+                  FROM orders 
+                  JOIN products ON orders.product_id = products.id'''
+
+# Отчет по дням и позициям для выгрузки
+REPORT_EXPORT_QUERY = '''SELECT daily_sales.day AS day, products.name AS product, daily_sales.orders AS orders,
+                                daily_sales.quantity AS quantity, products.price * daily_sales.quantity AS revenue
+                         FROM daily_sales
+                         JOIN products ON daily_sales.product_id = products.id
+                         WHERE daily_sales.day BETWEEN ? AND ?
+                         ORDER BY daily_sales.day, products.name'''
+
+
+class JewelryStoreService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_product(self, name, price, description):
+        self.add_products([(name, price, description)])
+
+    def add_products(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO products (name, price, description) VALUES (?, ?, ?)", records))
+
+    def create_order(self, product_name, quantity):
+        self.create_orders([(product_name, quantity)])
+
+    def create_orders(self, records):
+        # records - [(изделие, количество)]; неизвестное изделие отменяет все
+        def write(conn):
+            for product_name, quantity in records:
+                row = conn.execute("SELECT id FROM products WHERE name = ?", (product_name,)).fetchone()
+                if row is None:
+                    raise LookupError(f"Изделие '{product_name}' не найдено")
+                conn.execute("INSERT INTO orders (product_id, quantity, status) VALUES (?, ?, 'Новый')",
+                             (row[0], quantity))
+        run_write(self.conn, write)
+
+    def add_address(self, address):
+        run_write(self.conn, lambda conn: conn.execute("INSERT INTO addresses (address) VALUES (?)", (address,)))
+
+    def delete_address(self, address):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM addresses WHERE address=?", (address,)))
+
+
 class JewelryStoreApp:
     def __init__(self, root):
         self.root = root
@@ -33,10 +91,14 @@ class JewelryStoreApp:
         self.root.geometry("1280x640")
         
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(root, 'Jewelry')
         self.configure_styles()
+        self.queries = QueryExecutor(root, 'jewelry.db')
+        self.service = JewelryStoreService(get_connection('jewelry.db'))
+        self.report_cache = ReportCache('orders', ('products',))
         
-        self.notebook = ttk.Notebook(root)
+        self.notebook = LazyNotebook(root)
         self.notebook.pack(fill='both', expand=True)
 
         self.tabs = {
@@ -46,20 +108,20 @@ class JewelryStoreApp:
             'Настройки': ttk.Frame(self.notebook)
         }
 
-        for name, tab in self.tabs.items():
-            self.notebook.add(tab, text=name)
-
-        self.init_products_tab()
-        self.init_orders_tab()
-        self.init_reports_tab()
-        self.init_settings_tab()
+        self.notebook.add_lazy(self.tabs['Товары'], self.init_products_tab, self.load_products, text='Товары')
+        self.notebook.add_lazy(self.tabs['Заказы'], self.init_orders_tab,
+                               (self.update_order_products, self.load_orders), text='Заказы')
+        self.notebook.add_lazy(self.tabs['Отчеты'], self.init_reports_tab, text='Отчеты')
+        self.notebook.add_lazy(self.tabs['Настройки'], self.init_settings_tab, self.load_addresses,
+                               text='Настройки')
+        add_search_tab(self.notebook, self.queries)
 
     def configure_styles(self):
-        self.style.configure('TFrame', background='#F8F9FA')
-        self.style.configure('TButton', font=('Arial', 10), padding=5)
-        self.style.configure('TLabel', font=('Arial', 11), background='#F8F9FA')
-        self.style.configure('Header.TLabel', font=('Arial', 14, 'bold'))
-        self.style.map('TButton',
+        self.style.configure('Jewelry.TFrame', background='#F8F9FA')
+        self.style.configure('Jewelry.TButton', font=('Arial', 10), padding=5)
+        self.style.configure('Jewelry.TLabel', font=('Arial', 11), background='#F8F9FA')
+        self.style.configure('Header.Jewelry.TLabel', font=('Arial', 14, 'bold'))
+        self.style.map('Jewelry.TButton',
             foreground=[('active', '!disabled', 'white'), ('!active', 'black')],
             background=[('active', '#0056b3'), ('!active', '#007BFF')]
         )
@@ -68,7 +130,7 @@ class JewelryStoreApp:
         frame = ttk.Frame(self.tabs['Товары'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Управление товарами", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Управление товарами", style='Header.Jewelry.TLabel').pack(pady=10)
         
         self.products_tree = ttk.Treeview(frame, columns=('name', 'price', 'description'), show='headings')
         self.products_tree.heading('name', text='Название')
@@ -98,7 +160,7 @@ class JewelryStoreApp:
         frame = ttk.Frame(self.tabs['Заказы'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Оформление заказа", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Оформление заказа", style='Header.Jewelry.TLabel').pack(pady=10)
         
         order_frame = ttk.Frame(frame)
         order_frame.pack(fill='x', pady=10)
@@ -113,9 +175,11 @@ class JewelryStoreApp:
         
         ttk.Button(order_frame, text="Оформить заказ", command=self.create_order).pack(side='left', padx=5)
         
-        ttk.Label(frame, text="История заказов", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="История заказов", style='Header.Jewelry.TLabel').pack(pady=10)
         
-        self.orders_tree = ttk.Treeview(frame, columns=('id', 'product', 'quantity', 'status', 'time'), show='headings')
+        self.orders_tree = VirtualTreeview(frame, get_connection('jewelry.db'), ORDERS_QUERY,
+                                           columns=('id', 'product', 'quantity', 'status', 'time'),
+                                           sort_map={'time': 'created_at'})
         self.orders_tree.heading('id', text='ID')
         self.orders_tree.heading('product', text='Товар')
         self.orders_tree.heading('quantity', text='Количество')
@@ -130,7 +194,7 @@ class JewelryStoreApp:
         frame = ttk.Frame(self.tabs['Отчеты'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Финансовые отчеты", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Финансовые отчеты", style='Header.Jewelry.TLabel').pack(pady=10)
         
         date_frame = ttk.Frame(frame)
         date_frame.pack(pady=10)
@@ -144,6 +208,7 @@ class JewelryStoreApp:
         self.end_date.pack(side='left', padx=5)
         
         ttk.Button(frame, text="Сгенерировать отчет", command=self.generate_report).pack(pady=5)
+        ttk.Button(frame, text="Экспорт в CSV/NDJSON", command=self.export_report).pack()
         
         self.report_text = tk.Text(frame, height=10, width=60)
         self.report_text.pack(pady=10)
@@ -152,7 +217,7 @@ class JewelryStoreApp:
         frame = ttk.Frame(self.tabs['Настройки'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Управление адресами", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Управление адресами", style='Header.Jewelry.TLabel').pack(pady=10)
         
         input_frame = ttk.Frame(frame)
         input_frame.pack(fill='x', pady=5)
@@ -171,14 +236,11 @@ class JewelryStoreApp:
         self.load_addresses()
 
     def load_products(self):
-        for i in self.products_tree.get_children():
-            self.products_tree.delete(i)
-        conn = sqlite3.connect('jewelry.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM products")
-        for row in c.fetchall():
-            self.products_tree.insert('', 'end', values=(row[1], f"{row[2]} руб.", row[3]))
-        conn.close()
+        show_loading(self.products_tree, keep_rows=True)
+        self.queries.submit('products', "SELECT * FROM products", on_done=self.fill_products)
+
+    def fill_products(self, rows):
+        sync_tree(self.products_tree, rows, values=lambda row: (row[1], f"{row[2]} руб.", row[3]))
 
     def add_product(self):
         name = self.product_name.get()
@@ -186,32 +248,25 @@ class JewelryStoreApp:
         description = self.product_description.get()
         if name and price:
             try:
-                conn = sqlite3.connect('jewelry.db')
-                c = conn.cursor()
-                c.execute("INSERT INTO products (name, price, description) VALUES (?, ?, ?)", 
-                         (name, float(price), description))
-                conn.commit()
+                self.service.add_product(name, float(price), description)
                 self.load_products()
                 self.product_name.delete(0, 'end')
                 self.product_price.delete(0, 'end')
                 self.product_description.delete(0, 'end')
-                self.update_order_products()
+                self.notebook.mark_stale(self.tabs['Заказы'])
             except ValueError:
                 messagebox.showerror("Ошибка", "Неверный формат цены")
-            finally:
-                conn.close()
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
 
     def update_order_products(self):
-        conn = sqlite3.connect('jewelry.db')
+        conn = get_connection('jewelry.db')
         c = conn.cursor()
         c.execute("SELECT name FROM products")
         products = [row[0] for row in c.fetchall()]
         self.order_product['values'] = products
         if products:
             self.order_product.current(0)
-        conn.close()
 
     def create_order(self):
         product_name = self.order_product.get()
@@ -219,63 +274,58 @@ class JewelryStoreApp:
         if product_name and quantity:
             try:
                 quantity = int(quantity)
-                conn = sqlite3.connect('jewelry.db')
-                c = conn.cursor()
-                c.execute("SELECT id FROM products WHERE name = ?", (product_name,))
-                product_id = c.fetchone()[0]
-                c.execute("INSERT INTO orders (product_id, quantity, status) VALUES (?, ?, 'Новый')", 
-                         (product_id, quantity))
-                conn.commit()
-                conn.close()
+                self.service.create_order(product_name, quantity)
                 self.load_orders()
                 self.order_quantity.delete(0, 'end')
                 messagebox.showinfo("Успех", "Заказ оформлен")
             except ValueError:
                 messagebox.showerror("Ошибка", "Неверное количество")
+            except LookupError as e:
+                messagebox.showerror("Ошибка", str(e))
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
 
     def load_orders(self):
-        for i in self.orders_tree.get_children():
-            self.orders_tree.delete(i)
-        conn = sqlite3.connect('jewelry.db')
-        c = conn.cursor()
-        c.execute('''SELECT orders.id, products.name, orders.quantity, orders.status, 
-                    strftime('%d.%m.%Y %H:%M', orders.created_at)
-                 FROM orders 
-                 JOIN products ON orders.product_id = products.id''')
-        for row in c.fetchall():
-            self.orders_tree.insert('', 'end', values=row)
-        conn.close()
+        self.orders_tree.refresh()
+
+    def export_report(self):
+        start = self.start_date.get_date()
+        end = self.end_date.get_date()
+        ask_export(self.root, 'jewelry.db', REPORT_EXPORT_QUERY, (start, end), "Экспорт отчета")
 
     def generate_report(self):
         start = self.start_date.get_date()
         end = self.end_date.get_date()
         
-        conn = sqlite3.connect('jewelry.db')
-        c = conn.cursor()
-        
-        c.execute('''SELECT COUNT(*) FROM orders 
-                  WHERE date(created_at) BETWEEN ? AND ?''',
-                  (start, end))
-        total_orders = c.fetchone()[0]
+        def query(conn):
+            c = conn.cursor()
+            
+            c.execute('''SELECT SUM(orders) FROM daily_sales 
+                      WHERE day BETWEEN ? AND ?''',
+                      (start, end))
+            total_orders = c.fetchone()[0] or 0
         
-        c.execute('''SELECT SUM(products.price * orders.quantity) 
-                  FROM orders 
-                  JOIN products ON orders.product_id = products.id 
-                  WHERE date(orders.created_at) BETWEEN ? AND ?''',
-                  (start, end))
-        total_revenue = c.fetchone()[0] or 0
-        
-        c.execute('''SELECT products.name, SUM(orders.quantity) 
-                  FROM orders 
-                  JOIN products ON orders.product_id = products.id 
-                  WHERE date(orders.created_at) BETWEEN ? AND ?
-                  GROUP BY products.name 
-                  ORDER BY 2 DESC LIMIT 3''',
-                  (start, end))
-        popular_items = c.fetchall()
+            c.execute('''SELECT SUM(products.price * daily_sales.quantity) 
+                      FROM daily_sales 
+                      JOIN products ON daily_sales.product_id = products.id 
+                      WHERE daily_sales.day BETWEEN ? AND ?''',
+                      (start, end))
+            total_revenue = c.fetchone()[0] or 0
         
+            c.execute('''SELECT products.name, SUM(daily_sales.quantity) 
+                      FROM daily_sales 
+                      JOIN products ON daily_sales.product_id = products.id 
+                      WHERE daily_sales.day BETWEEN ? AND ?
+                      GROUP BY products.name 
+                      ORDER BY 2 DESC LIMIT 3''',
+                      (start, end))
+            return total_orders, total_revenue, c.fetchall()
+
+        show_loading(self.report_text)
+        self.queries.submit('report', self.report_cache.query('sales', start, end, query),
+                            on_done=lambda result: self.show_report(start, end, *result))
+
+    def show_report(self, start, end, total_orders, total_revenue, popular_items):
         report = f"Отчет за период с {start} по {end}:\n\n"
         report += f"Всего заказов: {total_orders}\n"
         report += f"Общая выручка: {total_revenue:.2f} руб.\n\n"
@@ -285,16 +335,11 @@ class JewelryStoreApp:
         
         self.report_text.delete(1.0, 'end')
         self.report_text.insert('end', report)
-        conn.close()
 
     def add_address(self):
         address = self.address_entry.get()
         if address:
-            conn = sqlite3.connect('jewelry.db')
-            c = conn.cursor()
-            c.execute("INSERT INTO addresses (address) VALUES (?)", (address,))
-            conn.commit()
-            conn.close()
+            self.service.add_address(address)
             self.address_entry.delete(0, 'end')
             self.load_addresses()
         else:
@@ -305,26 +350,20 @@ class JewelryStoreApp:
         if selected:
             item = self.addresses_tree.item(selected[0])
             address = item['values'][0]
-            conn = sqlite3.connect('jewelry.db')
-            c = conn.cursor()
-            c.execute("DELETE FROM addresses WHERE address=?", (address,))
-            conn.commit()
-            conn.close()
+            self.service.delete_address(address)
             self.load_addresses()
         else:
             messagebox.showwarning("Ошибка", "Выберите адрес для удаления")
 
     def load_addresses(self):
-        for i in self.addresses_tree.get_children():
-            self.addresses_tree.delete(i)
-        conn = sqlite3.connect('jewelry.db')
-        c = conn.cursor()
-        c.execute("SELECT address FROM addresses")
-        for row in c.fetchall():
-            self.addresses_tree.insert('', 'end', values=row)
-        conn.close()
+        show_loading(self.addresses_tree, keep_rows=True)
+        self.queries.submit('addresses', "SELECT id, address FROM addresses", on_done=self.fill_addresses)
+
+    def fill_addresses(self, rows):
+        sync_tree(self.addresses_tree, rows, values=lambda row: row[1:])
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = JewelryStoreApp(root)
+    tracing.install(root)
     root.mainloop()
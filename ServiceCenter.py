@@ -2,8 +2,52 @@ import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
 import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+from query_executor import QueryExecutor, show_loading, clear
+from tree_sync import sync_tree, stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from autocomplete import AutocompleteCombobox
 from datetime import datetime
 
+REQUESTS_QUERY = '''SELECT requests.id AS id, clients.name AS client, equipment.name AS equipment, 
+                            requests.description AS "desc", requests.created_date AS date, requests.status AS status
+                            FROM requests
+                            JOIN clients ON requests.client_id = clients.id
+                            JOIN equipment ON requests.equipment_id = equipment.id'''
+
+
+class ServiceCenterService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_client(self, name, phone, email):
+        self.add_clients([(name, phone, email)])
+
+    def add_clients(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO clients (name, phone, email) VALUES (?, ?, ?)", records))
+
+    def add_equipment(self, name, serial_number, client_id):
+        # Повторный серийный номер - sqlite3.IntegrityError
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO equipment (name, serial_number, client_id) VALUES (?, ?, ?)", (name, serial_number, client_id)))
+
+    def open_request(self, client_id, equipment_id, description, created_date):
+        self.open_requests([(client_id, equipment_id, description, created_date)])
+
+    def open_requests(self, records):
+        # records - [(клиент, оборудование, описание, дата)]
+        run_write(self.conn, lambda conn: conn.executemany(
+            '''INSERT INTO requests (description, created_date, status, client_id, equipment_id)
+               VALUES (?, ?, 'В обработке', ?, ?)''',
+            [(description, created_date, client_id, equipment_id)
+             for client_id, equipment_id, description, created_date in records]))
+
+
 class ServiceCenterApp:
     def __init__(self, root):
         self.root = root
@@ -11,10 +55,11 @@ class ServiceCenterApp:
         self.root.geometry("1000x600")
         
         self.create_database()
+        self.queries = QueryExecutor(root, 'service_center.db')
         self.setup_ui()
         
     def create_database(self):
-        self.conn = sqlite3.connect('service_center.db')
+        self.conn = get_connection('service_center.db')
         self.cursor = self.conn.cursor()
         
         self.cursor.execute('''CREATE TABLE IF NOT EXISTS clients (
@@ -40,27 +85,26 @@ class ServiceCenterApp:
                             FOREIGN KEY(client_id) REFERENCES clients(id),
                             FOREIGN KEY(equipment_id) REFERENCES equipment(id))''')
         self.conn.commit()
+        migrate(self.conn, 'service_center.db')
+        self.service = ServiceCenterService(self.conn)
     
     def setup_ui(self):
-        self.notebook = ttk.Notebook(self.root)
+        self.notebook = LazyNotebook(self.root)
         
         self.clients_tab = ttk.Frame(self.notebook)
         self.equipment_tab = ttk.Frame(self.notebook)
         self.requests_tab = ttk.Frame(self.notebook)
         self.reports_tab = ttk.Frame(self.notebook)
         
-        self.setup_clients_tab()
-        self.setup_equipment_tab()
-        self.setup_requests_tab()
-        self.setup_reports_tab()
-        
-        self.notebook.add(self.clients_tab, text="Клиенты")
-        self.notebook.add(self.equipment_tab, text="Оборудование")
-        self.notebook.add(self.requests_tab, text="Заявки")
-        self.notebook.add(self.reports_tab, text="Отчеты")
+        self.notebook.add_lazy(self.clients_tab, self.setup_clients_tab, self.load_clients, text="Клиенты")
+        self.notebook.add_lazy(self.equipment_tab, self.setup_equipment_tab,
+                               (self.load_clients_combobox, self.load_equipment), text="Оборудование")
+        self.notebook.add_lazy(self.requests_tab, self.setup_requests_tab,
+                               (self.load_clients_combobox, self.load_equipment_combobox, self.load_requests),
+                               text="Заявки")
+        self.notebook.add_lazy(self.reports_tab, self.setup_reports_tab, text="Отчеты")
+        add_search_tab(self.notebook, self.queries)
         self.notebook.pack(expand=True, fill='both')
-        
-        self.load_clients_combobox()
 
     def setup_clients_tab(self):
         ttk.Label(self.clients_tab, text="Имя:").grid(row=0, column=0, padx=5, pady=5)
@@ -100,7 +144,7 @@ class ServiceCenterApp:
         self.equip_serial.grid(row=1, column=1, padx=5, pady=5)
         
         ttk.Label(self.equipment_tab, text="Клиент:").grid(row=2, column=0, padx=5, pady=5)
-        self.equip_client = ttk.Combobox(self.equipment_tab, width=27)
+        self.equip_client = AutocompleteCombobox(self.equipment_tab, self.queries, 'clients', width=27)
         self.equip_client.grid(row=2, column=1, padx=5, pady=5)
         
         ttk.Button(self.equipment_tab, text="Добавить оборудование", command=self.add_equipment).grid(row=3, column=1, pady=10)
@@ -117,14 +161,16 @@ class ServiceCenterApp:
         self.equipment_tab.grid_rowconfigure(4, weight=1)
         
         self.load_equipment()
+        self.load_clients_combobox()
 
     def setup_requests_tab(self):
         ttk.Label(self.requests_tab, text="Клиент:").grid(row=0, column=0, padx=5, pady=5)
-        self.request_client = ttk.Combobox(self.requests_tab, width=27)
+        self.request_client = AutocompleteCombobox(self.requests_tab, self.queries, 'clients', width=27)
         self.request_client.grid(row=0, column=1, padx=5, pady=5)
         
         ttk.Label(self.requests_tab, text="Оборудование:").grid(row=1, column=0, padx=5, pady=5)
-        self.request_equipment = ttk.Combobox(self.requests_tab, width=27)
+        self.request_equipment = AutocompleteCombobox(self.requests_tab, self.queries, 'equipment',
+                                                      "name || ' (' || serial_number || ')'", 'name', width=27)
         self.request_equipment.grid(row=1, column=1, padx=5, pady=5)
         
         ttk.Label(self.requests_tab, text="Описание проблемы:").grid(row=2, column=0, padx=5, pady=5)
@@ -133,9 +179,8 @@ class ServiceCenterApp:
         
         ttk.Button(self.requests_tab, text="Создать заявку", command=self.add_request).grid(row=3, column=1, pady=10)
         
-        self.requests_tree = ttk.Treeview(self.requests_tab, 
-                                       columns=('id', 'client', 'equipment', 'desc', 'date', 'status'), 
-                                       show='headings')
+        self.requests_tree = VirtualTreeview(self.requests_tab, self.conn, REQUESTS_QUERY,
+                                             columns=('id', 'client', 'equipment', 'desc', 'date', 'status'))
         self.requests_tree.heading('id', text='ID')
         self.requests_tree.heading('client', text='Клиент')
         self.requests_tree.heading('equipment', text='Оборудование')
@@ -149,6 +194,8 @@ class ServiceCenterApp:
         self.requests_tab.grid_rowconfigure(4, weight=1)
         
         self.load_requests()
+        self.load_clients_combobox()
+        self.load_equipment_combobox()
 
     def setup_reports_tab(self):
         ttk.Label(self.reports_tab, text="Выберите тип отчета:").grid(row=0, column=0, padx=5, pady=5)
@@ -177,37 +224,38 @@ class ServiceCenterApp:
             self.report_tree.heading('data2', text='Количество заявок')
             self.report_tree.heading('data3', text='')
             
-            self.cursor.execute('''SELECT clients.name, COUNT(requests.id) 
-                                FROM clients 
-                                LEFT JOIN requests ON clients.id = requests.client_id 
-                                GROUP BY clients.id''')
-            data = self.cursor.fetchall()
-            for row in data:
-                self.report_tree.insert('', 'end', values=row)
+            query = '''SELECT clients.name, COUNT(requests.id) 
+                       FROM clients 
+                       LEFT JOIN requests ON clients.id = requests.client_id 
+                       GROUP BY clients.id'''
         
         elif report_type == "Список оборудования по клиентам":
             self.report_tree.heading('data1', text='Клиент')
             self.report_tree.heading('data2', text='Оборудование')
             self.report_tree.heading('data3', text='Серийный номер')
             
-            self.cursor.execute('''SELECT clients.name, equipment.name, equipment.serial_number 
-                                FROM equipment 
-                                JOIN clients ON equipment.client_id = clients.id''')
-            data = self.cursor.fetchall()
-            for row in data:
-                self.report_tree.insert('', 'end', values=row)
+            query = '''SELECT clients.name, equipment.name, equipment.serial_number 
+                       FROM equipment 
+                       JOIN clients ON equipment.client_id = clients.id'''
         
         elif report_type == "Заявки по статусам":
             self.report_tree.heading('data1', text='Статус')
             self.report_tree.heading('data2', text='Количество')
             self.report_tree.heading('data3', text='')
             
-            self.cursor.execute('''SELECT status, COUNT(id) 
-                                FROM requests 
-                                GROUP BY status''')
-            data = self.cursor.fetchall()
-            for row in data:
-                self.report_tree.insert('', 'end', values=row)
+            query = '''SELECT status, COUNT(id) 
+                       FROM requests 
+                       GROUP BY status'''
+        else:
+            return
+
+        show_loading(self.report_tree)
+        self.queries.submit('report', query, on_done=self.fill_report)
+
+    def fill_report(self, rows):
+        clear(self.report_tree)
+        for row in rows:
+            self.report_tree.insert('', 'end', values=row)
 
     def add_client(self):
         name = self.client_name.get()
@@ -218,98 +266,76 @@ class ServiceCenterApp:
             messagebox.showerror("Ошибка", "Имя и телефон обязательны для заполнения")
             return
             
-        self.cursor.execute("INSERT INTO clients (name, phone, email) VALUES (?, ?, ?)",
-                          (name, phone, email))
-        self.conn.commit()
+        self.service.add_client(name, phone, email)
         self.load_clients()
-        self.load_clients_combobox()
+        self.notebook.mark_stale(self.equipment_tab, self.requests_tab)
         self.client_name.delete(0, 'end')
         self.client_phone.delete(0, 'end')
         self.client_email.delete(0, 'end')
 
     def load_clients(self):
-        for row in self.clients_tree.get_children():
-            self.clients_tree.delete(row)
-            
-        self.cursor.execute("SELECT * FROM clients")
-        clients = self.cursor.fetchall()
-        for client in clients:
-            self.clients_tree.insert('', 'end', values=client)
+        show_loading(self.clients_tree, keep_rows=True)
+        stream_tree(self.queries, 'clients', self.clients_tree, "SELECT * FROM clients")
 
     def add_equipment(self):
         name = self.equip_name.get()
         serial = self.equip_serial.get()
-        client = self.equip_client.get().split(':')[0]
+        client = self.equip_client.get_id()
         
         if not name or not serial:
             messagebox.showerror("Ошибка", "Название и серийный номер обязательны")
             return
+        if client is None:
+            messagebox.showerror("Ошибка", "Выберите клиента из списка")
+            return
             
         try:
-            self.cursor.execute("INSERT INTO equipment (name, serial_number, client_id) VALUES (?, ?, ?)",
-                              (name, serial, client))
-            self.conn.commit()
+            self.service.add_equipment(name, serial, client)
             self.load_equipment()
             self.equip_name.delete(0, 'end')
             self.equip_serial.delete(0, 'end')
-            self.load_equipment_combobox()
+            self.notebook.mark_stale(self.requests_tab)
         except sqlite3.IntegrityError:
             messagebox.showerror("Ошибка", "Серийный номер должен быть уникальным")
 
     def load_equipment(self):
-        for row in self.equipment_tree.get_children():
-            self.equipment_tree.delete(row)
-            
-        self.cursor.execute('''SELECT equipment.id, equipment.name, equipment.serial_number, clients.name 
+        show_loading(self.equipment_tree, keep_rows=True)
+        self.queries.submit('equipment', '''SELECT equipment.id, equipment.name, equipment.serial_number, clients.name 
                             FROM equipment 
-                            JOIN clients ON equipment.client_id = clients.id''')
-        equipment = self.cursor.fetchall()
-        for item in equipment:
-            self.equipment_tree.insert('', 'end', values=item)
+                            JOIN clients ON equipment.client_id = clients.id''', on_done=self.fill_equipment)
+
+    def fill_equipment(self, equipment):
+        sync_tree(self.equipment_tree, equipment)
 
     def add_request(self):
-        client = self.request_client.get().split(':')[0]
-        equipment = self.request_equipment.get().split(':')[0]
+        client = self.request_client.get_id()
+        equipment = self.request_equipment.get_id()
         desc = self.request_desc.get()
         date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         
-        if not client or not equipment or not desc:
-            messagebox.showerror("Ошибка", "Все поля обязательны для заполнения")
+        if client is None or equipment is None or not desc:
+            messagebox.showerror("Ошибка", "Все поля обязательны для заполнения, клиент и оборудование - из списка")
             return
             
-        self.cursor.execute('''INSERT INTO requests 
-                            (description, created_date, status, client_id, equipment_id)
-                            VALUES (?, ?, ?, ?, ?)''',
-                          (desc, date, 'В обработке', client, equipment))
-        self.conn.commit()
+        self.service.open_request(client, equipment, desc, date)
         self.load_requests()
         self.request_desc.delete(0, 'end')
 
     def load_requests(self):
-        for row in self.requests_tree.get_children():
-            self.requests_tree.delete(row)
-            
-        self.cursor.execute('''SELECT requests.id, clients.name, equipment.name, 
-                            requests.description, requests.created_date, requests.status
-                            FROM requests
-                            JOIN clients ON requests.client_id = clients.id
-                            JOIN equipment ON requests.equipment_id = equipment.id''')
-        requests = self.cursor.fetchall()
-        for req in requests:
-            self.requests_tree.insert('', 'end', values=req)
+        self.requests_tree.refresh()
 
     def load_clients_combobox(self):
-        self.cursor.execute("SELECT id, name FROM clients")
-        clients = [f"{row[0]}: {row[1]}" for row in self.cursor.fetchall()]
-        self.equip_client['values'] = clients
-        self.request_client['values'] = clients
+        # Комбобоксы есть только на уже построенных вкладках
+        if self.notebook.is_built(self.equipment_tab):
+            self.equip_client.refresh()
+        if self.notebook.is_built(self.requests_tab):
+            self.request_client.refresh()
 
     def load_equipment_combobox(self):
-        self.cursor.execute("SELECT id, name FROM equipment")
-        equipment = [f"{row[0]}: {row[1]}" for row in self.cursor.fetchall()]
-        self.request_equipment['values'] = equipment
+        self.request_equipment.refresh()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = ServiceCenterApp(root)
+    tracing.install(root)
     root.mainloop()
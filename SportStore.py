@@ -1,11 +1,22 @@
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from bulk_import import ask_import
+from export import ask_export
+import tracing
+from query_executor import QueryExecutor, show_loading
+from report_cache import ReportCache
+from tree_sync import sync_tree, stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 import tkinter as tk
 from tkinter import ttk, messagebox
 from datetime import datetime
-from tkcalendar import DateEntry
+from lazy_widgets import DateEntry
 
 def create_database():
-    conn = sqlite3.connect('sports_store.db')
+    conn = get_connection('sports_store.db')
     c = conn.cursor()
     c.execute('''CREATE TABLE IF NOT EXISTS products
                  (id INTEGER PRIMARY KEY AUTOINCREMENT, 
@@ -27,10 +38,67 @@ def create_database():
                   phone TEXT,
                   email TEXT)''')
     conn.commit()
-    conn.close()
+    migrate(conn, 'sports_store.db')
 
 create_database()
 
+ORDERS_QUERY = '''SELECT orders.id AS id, products.name AS product, orders.quantity AS quantity,
+                         orders.status AS status,
+                         strftime('%d.%m.%Y %H:%M', orders.created_at) AS time,
+                         orders.created_at AS created_at
+                  FROM orders 
+                  JOIN products ON orders.product_id = products.id'''
+
+# Отчет по дням и позициям для выгрузки
+REPORT_EXPORT_QUERY = '''SELECT daily_sales.day AS day, products.name AS product, daily_sales.orders AS orders,
+                                daily_sales.quantity AS quantity, products.price * daily_sales.quantity AS revenue
+                         FROM daily_sales
+                         JOIN products ON daily_sales.product_id = products.id
+                         WHERE daily_sales.day BETWEEN ? AND ?
+                         ORDER BY daily_sales.day, products.name'''
+
+
+class SportsStoreService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_product(self, name, price):
+        self.add_products([(name, price)])
+
+    def add_products(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO products (name, price) VALUES (?, ?)", records))
+
+    def create_order(self, cart):
+        self.create_orders([cart])
+
+    def create_orders(self, carts):
+        # carts - список корзин [(товар, количество)]; неизвестный товар отменяет все
+        def write(conn):
+            for cart in carts:
+                for product_name, quantity in cart:
+                    row = conn.execute("SELECT id FROM products WHERE name = ?", (product_name,)).fetchone()
+                    if row is None:
+                        raise LookupError(f"Товар '{product_name}' не найден")
+                    conn.execute("INSERT INTO orders (product_id, quantity, status) VALUES (?, ?, 'Новый')",
+                                 (row[0], quantity))
+        run_write(self.conn, write)
+
+    def add_client(self, name, phone, email):
+        self.add_clients([(name, phone, email)])
+
+    def add_clients(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO clients (name, phone, email) VALUES (?, ?, ?)", records))
+
+    def delete_client(self, name):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM clients WHERE name = ?", (name,)))
+
+    def save_settings(self, name, address):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT OR REPLACE INTO settings (id, name, address) VALUES (1, ?, ?)", (name, address)))
+
+
 class SportsStoreApp:
     def __init__(self, root):
         self.root = root
@@ -39,10 +107,14 @@ class SportsStoreApp:
         self.cart = []
         
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(root, 'SportStore')
         self.configure_styles()
+        self.queries = QueryExecutor(root, 'sports_store.db')
+        self.service = SportsStoreService(get_connection('sports_store.db'))
+        self.report_cache = ReportCache('orders', ('products',))
         
-        self.notebook = ttk.Notebook(root)
+        self.notebook = LazyNotebook(root)
         self.notebook.pack(fill='both', expand=True)
 
         self.tabs = {
@@ -53,22 +125,22 @@ class SportsStoreApp:
             'Настройки': ttk.Frame(self.notebook)
         }
 
-        for name, tab in self.tabs.items():
-            self.notebook.add(tab, text=name)
-
-        self.init_products_tab()
-        self.init_orders_tab()
-        self.init_clients_tab()
-        self.init_reports_tab()
-        self.init_settings_tab()
+        self.notebook.add_lazy(self.tabs['Товары'], self.init_products_tab, self.load_products, text='Товары')
+        self.notebook.add_lazy(self.tabs['Заказы'], self.init_orders_tab,
+                               (self.update_order_products, self.load_orders), text='Заказы')
+        self.notebook.add_lazy(self.tabs['Клиенты'], self.init_clients_tab, self.load_clients, text='Клиенты')
+        self.notebook.add_lazy(self.tabs['Отчеты'], self.init_reports_tab, text='Отчеты')
+        self.notebook.add_lazy(self.tabs['Настройки'], self.init_settings_tab, self.load_settings,
+                               text='Настройки')
+        add_search_tab(self.notebook, self.queries)
 
     def configure_styles(self):
-        self.style.configure('TFrame', background='#F0F8FF')
-        self.style.configure('TButton', font=('Arial', 10), padding=5, borderwidth=1)
-        self.style.configure('TLabel', font=('Arial', 11), background='#F0F8FF', foreground='#2F4F4F')
-        self.style.configure('Header.TLabel', font=('Arial', 14, 'bold'), foreground='#2F4F4F')
-        self.style.configure('Treeview', background='#E6E6FA', fieldbackground='#E6E6FA')
-        self.style.map('TButton',
+        self.style.configure('SportStore.TFrame', background='#F0F8FF')
+        self.style.configure('SportStore.TButton', font=('Arial', 10), padding=5, borderwidth=1)
+        self.style.configure('SportStore.TLabel', font=('Arial', 11), background='#F0F8FF', foreground='#2F4F4F')
+        self.style.configure('Header.SportStore.TLabel', font=('Arial', 14, 'bold'), foreground='#2F4F4F')
+        self.style.configure('SportStore.Treeview', background='#E6E6FA', fieldbackground='#E6E6FA')
+        self.style.map('SportStore.TButton',
             foreground=[('active', 'white'), ('!active', '#2F4F4F')],
             background=[('active', '#4682B4'), ('!active', '#87CEEB')]
         )
@@ -77,7 +149,7 @@ class SportsStoreApp:
         frame = ttk.Frame(self.tabs['Товары'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Управление товарами", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Управление товарами", style='Header.SportStore.TLabel').pack(pady=10)
         
         self.products_tree = ttk.Treeview(frame, columns=('name', 'price'), show='headings')
         self.products_tree.heading('name', text='Название')
@@ -96,13 +168,14 @@ class SportsStoreApp:
         self.product_price.pack(side='left', padx=5)
         
         ttk.Button(control_frame, text="Добавить", command=self.add_product).pack(side='left', padx=5)
+        ttk.Button(control_frame, text="Импорт из CSV", command=self.import_products).pack(side='left', padx=5)
         self.load_products()
 
     def init_orders_tab(self):
         frame = ttk.Frame(self.tabs['Заказы'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Создание заказа", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Создание заказа", style='Header.SportStore.TLabel').pack(pady=10)
         
         order_frame = ttk.Frame(frame)
         order_frame.pack(fill='x', pady=10)
@@ -118,7 +191,7 @@ class SportsStoreApp:
         
         ttk.Button(order_frame, text="Добавить в корзину", command=self.add_to_cart).pack(side='left', padx=5)
         
-        ttk.Label(frame, text="Корзина", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Корзина", style='Header.SportStore.TLabel').pack(pady=10)
         self.cart_tree = ttk.Treeview(frame, columns=('product', 'quantity'), show='headings', height=4)
         self.cart_tree.heading('product', text='Товар')
         self.cart_tree.heading('quantity', text='Количество')
@@ -126,8 +199,10 @@ class SportsStoreApp:
         
         ttk.Button(frame, text="Оформить заказ", command=self.create_order).pack(pady=10)
         
-        ttk.Label(frame, text="История заказов", style='Header.TLabel').pack(pady=10)
-        self.orders_tree = ttk.Treeview(frame, columns=('id', 'product', 'quantity', 'status', 'time'), show='headings')
+        ttk.Label(frame, text="История заказов", style='Header.SportStore.TLabel').pack(pady=10)
+        self.orders_tree = VirtualTreeview(frame, get_connection('sports_store.db'), ORDERS_QUERY,
+                                           columns=('id', 'product', 'quantity', 'status', 'time'),
+                                           sort_map={'time': 'created_at'})
         self.orders_tree.heading('id', text='ID')
         self.orders_tree.heading('product', text='Товар')
         self.orders_tree.heading('quantity', text='Количество')
@@ -142,7 +217,7 @@ class SportsStoreApp:
         frame = ttk.Frame(self.tabs['Клиенты'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Управление клиентами", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Управление клиентами", style='Header.SportStore.TLabel').pack(pady=10)
         
         self.clients_tree = ttk.Treeview(frame, columns=('name', 'phone', 'email'), show='headings')
         self.clients_tree.heading('name', text='Имя')
@@ -173,7 +248,7 @@ class SportsStoreApp:
         frame = ttk.Frame(self.tabs['Отчеты'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Генерация отчетов", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Генерация отчетов", style='Header.SportStore.TLabel').pack(pady=10)
         
         date_frame = ttk.Frame(frame)
         date_frame.pack(pady=10)
@@ -187,6 +262,7 @@ class SportsStoreApp:
         self.end_date.pack(side='left', padx=5)
         
         ttk.Button(frame, text="Сгенерировать отчет", command=self.generate_report).pack(pady=5)
+        ttk.Button(frame, text="Экспорт в CSV/NDJSON", command=self.export_report).pack()
         
         self.report_text = tk.Text(frame, height=10, width=60, bg='#F5F5F5')
         self.report_text.pack(pady=10)
@@ -195,7 +271,7 @@ class SportsStoreApp:
         frame = ttk.Frame(self.tabs['Настройки'])
         frame.pack(padx=20, pady=20, fill='both', expand=True)
 
-        ttk.Label(frame, text="Настройки магазина", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="Настройки магазина", style='Header.SportStore.TLabel').pack(pady=10)
         
         input_frame = ttk.Frame(frame)
         input_frame.pack(fill='x')
@@ -210,7 +286,7 @@ class SportsStoreApp:
         
         ttk.Button(input_frame, text="Сохранить", command=self.save_settings).grid(row=2, column=1, pady=10, sticky='w')
         
-        ttk.Label(frame, text="История настроек", style='Header.TLabel').pack(pady=10)
+        ttk.Label(frame, text="История настроек", style='Header.SportStore.TLabel').pack(pady=10)
         self.settings_tree = ttk.Treeview(frame, columns=('id', 'name', 'address'), show='headings')
         self.settings_tree.heading('id', text='ID')
         self.settings_tree.heading('name', text='Название')
@@ -219,44 +295,41 @@ class SportsStoreApp:
         self.load_settings()
 
     def load_products(self):
-        for i in self.products_tree.get_children():
-            self.products_tree.delete(i)
-        conn = sqlite3.connect('sports_store.db')
-        c = conn.cursor()
-        c.execute("SELECT * FROM products")
-        for row in c.fetchall():
-            self.products_tree.insert('', 'end', values=(row[1], f"{row[2]} руб."))
-        conn.close()
+        show_loading(self.products_tree, keep_rows=True)
+        self.queries.submit('products', "SELECT * FROM products", on_done=self.fill_products)
+
+    def fill_products(self, rows):
+        sync_tree(self.products_tree, rows, values=lambda row: (row[1], f"{row[2]} руб."))
 
     def add_product(self):
         name = self.product_name.get()
         price = self.product_price.get()
         if name and price:
             try:
-                conn = sqlite3.connect('sports_store.db')
-                c = conn.cursor()
-                c.execute("INSERT INTO products (name, price) VALUES (?, ?)", (name, float(price)))
-                conn.commit()
+                self.service.add_product(name, float(price))
                 self.load_products()
                 self.product_name.delete(0, 'end')
                 self.product_price.delete(0, 'end')
-                self.update_order_products()
+                self.notebook.mark_stale(self.tabs['Заказы'])
             except ValueError:
                 messagebox.showerror("Ошибка", "Неверный формат цены")
-            finally:
-                conn.close()
         else:
             messagebox.showwarning("Ошибка", "Заполните все поля")
 
+    def import_products(self):
+        def done(result):
+            self.load_products()
+            self.notebook.mark_stale(self.tabs['Заказы'])
+        ask_import(self.root, self.queries, 'sports_store.db', on_done=done)
+
     def update_order_products(self):
-        conn = sqlite3.connect('sports_store.db')
+        conn = get_connection('sports_store.db')
         c = conn.cursor()
         c.execute("SELECT name FROM products")
         products = [row[0] for row in c.fetchall()]
         self.order_product['values'] = products
         if products:
             self.order_product.current(0)
-        conn.close()
 
     def add_to_cart(self):
         product = self.order_product.get()
@@ -277,16 +350,7 @@ class SportsStoreApp:
             return
             
         try:
-            conn = sqlite3.connect('sports_store.db')
-            c = conn.cursor()
-            for item in self.cart:
-                product_name, quantity = item
-                c.execute("SELECT id FROM products WHERE name = ?", (product_name,))
-                product_id = c.fetchone()[0]
-                c.execute("INSERT INTO orders (product_id, quantity, status) VALUES (?, ?, 'Новый')", 
-                         (product_id, quantity))
-            conn.commit()
-            conn.close()
+            self.service.create_order(self.cart)
             self.cart.clear()
             self.cart_tree.delete(*self.cart_tree.get_children())
             self.load_orders()
@@ -295,39 +359,19 @@ class SportsStoreApp:
             messagebox.showerror("Ошибка", str(e))
 
     def load_orders(self):
-        for i in self.orders_tree.get_children():
-            self.orders_tree.delete(i)
-        conn = sqlite3.connect('sports_store.db')
-        c = conn.cursor()
-        c.execute('''SELECT orders.id, products.name, orders.quantity, orders.status, 
-                    strftime('%d.%m.%Y %H:%M', orders.created_at)
-                 FROM orders 
-                 JOIN products ON orders.product_id = products.id''')
-        for row in c.fetchall():
-            self.orders_tree.insert('', 'end', values=row)
-        conn.close()
+        self.orders_tree.refresh()
 
     def load_clients(self):
-        for i in self.clients_tree.get_children():
-            self.clients_tree.delete(i)
-        conn = sqlite3.connect('sports_store.db')
-        c = conn.cursor()
-        c.execute("SELECT name, phone, email FROM clients")
-        for row in c.fetchall():
-            self.clients_tree.insert('', 'end', values=row)
-        conn.close()
+        show_loading(self.clients_tree, keep_rows=True)
+        stream_tree(self.queries, 'clients', self.clients_tree, "SELECT id, name, phone, email FROM clients",
+                    values=lambda row: row[1:])
 
     def add_client(self):
         name = self.client_name.get()
         phone = self.client_phone.get()
         email = self.client_email.get()
         if name and phone:
-            conn = sqlite3.connect('sports_store.db')
-            c = conn.cursor()
-            c.execute("INSERT INTO clients (name, phone, email) VALUES (?, ?, ?)",
-                     (name, phone, email))
-            conn.commit()
-            conn.close()
+            self.service.add_client(name, phone, email)
             self.load_clients()
             self.client_name.delete(0, 'end')
             self.client_phone.delete(0, 'end')
@@ -340,41 +384,47 @@ class SportsStoreApp:
         if selected:
             item = self.clients_tree.item(selected[0])
             name = item['values'][0]
-            conn = sqlite3.connect('sports_store.db')
-            c = conn.cursor()
-            c.execute("DELETE FROM clients WHERE name = ?", (name,))
-            conn.commit()
-            conn.close()
+            self.service.delete_client(name)
             self.load_clients()
 
+    def export_report(self):
+        start = self.start_date.get_date()
+        end = self.end_date.get_date()
+        ask_export(self.root, 'sports_store.db', REPORT_EXPORT_QUERY, (start, end), "Экспорт отчета")
+
     def generate_report(self):
         start = self.start_date.get_date()
         end = self.end_date.get_date()
         
-        conn = sqlite3.connect('sports_store.db')
-        c = conn.cursor()
-        
-        c.execute('''SELECT COUNT(*) FROM orders 
-                  WHERE date(created_at) BETWEEN ? AND ?''',
-                  (start, end))
-        total_orders = c.fetchone()[0]
-        
-        c.execute('''SELECT SUM(products.price * orders.quantity) 
-                  FROM orders 
-                  JOIN products ON orders.product_id = products.id 
-                  WHERE date(orders.created_at) BETWEEN ? AND ?''',
-                  (start, end))
-        total_revenue = c.fetchone()[0] or 0
-        
-        c.execute('''SELECT products.name, SUM(orders.quantity) 
-                  FROM orders 
-                  JOIN products ON orders.product_id = products.id 
-                  WHERE date(orders.created_at) BETWEEN ? AND ?
-                  GROUP BY products.name 
-                  ORDER BY 2 DESC LIMIT 3''',
-                  (start, end))
-        popular_items = c.fetchall()
-        
+        def query(conn):
+            c = conn.cursor()
+            
+            c.execute('''SELECT SUM(orders) FROM daily_sales 
+                      WHERE day BETWEEN ? AND ?''',
+                      (start, end))
+            total_orders = c.fetchone()[0] or 0
+        
+            c.execute('''SELECT SUM(products.price * daily_sales.quantity) 
+                      FROM daily_sales 
+                      JOIN products ON daily_sales.product_id = products.id 
+                      WHERE daily_sales.day BETWEEN ? AND ?''',
+                      (start, end))
+            total_revenue = c.fetchone()[0] or 0
+        
+            c.execute('''SELECT products.name, SUM(daily_sales.quantity) 
+                      FROM daily_sales 
+                      JOIN products ON daily_sales.product_id = products.id 
+                      WHERE daily_sales.day BETWEEN ? AND ?
+                      GROUP BY products.name 
+                      ORDER BY 2 DESC LIMIT 3''',
+                      (start, end))
+            return total_orders, total_revenue, c.fetchall()
+
+        show_loading(self.report_text)
+        self.queries.submit('report', self.report_cache.query('sales', start, end, query),
+                            on_done=lambda result: self.show_report(start, end, *result))
+
+    def show_report(self, start, end, total_orders, total_revenue, popular_items):
         report = f"Отчет за период с {start} по {end}:\n\n"
         report += f"Всего заказов: {total_orders}\n"
         report += f"Общая выручка: {total_revenue:.2f} руб.\n\n"
@@ -384,12 +434,11 @@ class SportsStoreApp:
         
         self.report_text.delete(1.0, 'end')
         self.report_text.insert('end', report)
-        conn.close()
 
     def load_settings(self):
         for i in self.settings_tree.get_children():
             self.settings_tree.delete(i)
-        conn = sqlite3.connect('sports_store.db')
+        conn = get_connection('sports_store.db')
         c = conn.cursor()
         c.execute("SELECT * FROM settings")
         for row in c.fetchall():
@@ -398,18 +447,12 @@ class SportsStoreApp:
             self.setting_name.insert(0, row[1])
             self.setting_address.delete(0, 'end')
             self.setting_address.insert(0, row[2])
-        conn.close()
 
     def save_settings(self):
         name = self.setting_name.get()
         address = self.setting_address.get()
         if name and address:
-            conn = sqlite3.connect('sports_store.db')
-            c = conn.cursor()
-            c.execute("INSERT OR REPLACE INTO settings (id, name, address) VALUES (1, ?, ?)", 
-                     (name, address))
-            conn.commit()
-            conn.close()
+            self.service.save_settings(name, address)
             self.load_settings()
             messagebox.showinfo("Успех", "Настройки сохранены")
         else:
@@ -418,4 +461,5 @@ class SportsStoreApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = SportsStoreApp(root)
+    tracing.install(root)
     root.mainloop()
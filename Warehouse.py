@@ -1,9 +1,77 @@
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+from query_executor import QueryExecutor, show_loading, clear
+from tree_sync import sync_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
+from autocomplete import AutocompleteCombobox
 from tkinter import *
 from tkinter import ttk, messagebox
-from tkcalendar import DateEntry
+from lazy_widgets import DateEntry
 from datetime import datetime
 
+ZONE_GOODS_QUERY = '''SELECT id, name, quantity, date_added AS date
+                      FROM goods WHERE zone_id=?'''
+
+
+class WarehouseService:
+    # receive_goods_many проверяет место с учетом уже принятых строк поставки
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_zone(self, name, capacity):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO zones (name, capacity) VALUES (?, ?)", (name, capacity)))
+
+    def add_supplier(self, name, contact):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO suppliers (name, contact) VALUES (?, ?)", (name, contact)))
+
+    def delete_supplier(self, supplier_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM suppliers WHERE id=?", (supplier_id,)))
+
+    def receive_goods(self, name, supplier_id, zone_name, quantity, date):
+        self.receive_goods_many([(name, supplier_id, zone_name, quantity, date)])
+
+    def receive_goods_many(self, records):
+        # records - [(товар, id поставщика, название зоны, количество, дата)]
+        def write(conn):
+            for name, supplier_id, zone_name, quantity, date in records:
+                self._receive(conn, name, supplier_id, zone_name, quantity, date)
+        run_write(self.conn, write)
+
+    def _receive(self, conn, name, supplier_id, zone_name, quantity, date):
+        if quantity <= 0:
+            raise ValueError("Количество должно быть положительным числом")
+        zone = conn.execute("SELECT id, capacity, occupied FROM zones WHERE name=?", (zone_name,)).fetchone()
+        if zone is None:
+            raise LookupError(f"Зона '{zone_name}' не найдена")
+        zone_id, zone_capacity, zone_occupied = zone
+        if zone_occupied + quantity > zone_capacity:
+            raise ValueError("В выбранной зоне недостаточно места")
+        total_capacity, total_occupied = conn.execute("SELECT SUM(capacity), SUM(occupied) FROM zones").fetchone()
+        if (total_occupied or 0) + quantity > (total_capacity or 0):
+            raise ValueError("На складе закончилось свободное место")
+        conn.execute('''INSERT INTO goods (name, supplier_id, zone_id, quantity, date_added)
+                        VALUES (?, ?, ?, ?, ?)''', (name, supplier_id, zone_id, quantity, date))
+        conn.execute("UPDATE zones SET occupied = occupied + ? WHERE id=?", (quantity, zone_id))
+
+    def delete_goods(self, zone_id, goods_ids):
+        # Удалить товары зоны и освободить занятое ими место
+        def write(conn):
+            freed = 0
+            for goods_id in goods_ids:
+                row = conn.execute("SELECT quantity FROM goods WHERE id=? AND zone_id=?", (goods_id, zone_id)).fetchone()
+                if row is not None:
+                    conn.execute("DELETE FROM goods WHERE id=?", (goods_id,))
+                    freed += row[0]
+            conn.execute("UPDATE zones SET occupied = occupied - ? WHERE id=?", (freed, zone_id))
+        run_write(self.conn, write)
+
+
 class WarehouseApp:
     def __init__(self, master):
         self.master = master
@@ -12,54 +80,64 @@ class WarehouseApp:
         self.master.configure(bg='#f0f0f0')
         
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(master, 'Warehouse')
         self.configure_styles()
         
-        self.conn = sqlite3.connect('warehouse.db')
+        self.conn = get_connection('warehouse.db')
         self.c = self.conn.cursor()
         self.create_tables()
-        
-        self.notebook = ttk.Notebook(master, style='Custom.TNotebook')
-        self.create_dashboard_tab()
-        self.create_zones_tab()
-        self.create_suppliers_tab()
-        self.create_goods_tab()
-        self.create_reports_tab()
+        self.queries = QueryExecutor(master, 'warehouse.db')
+        
+        self.notebook = LazyNotebook(master, style='Custom.Warehouse.TNotebook')
+        self.dashboard_tab = Frame(self.notebook, bg='#f0f0f0')
+        self.zones_tab = Frame(self.notebook, bg='#f0f0f0')
+        self.suppliers_tab = Frame(self.notebook, bg='#f0f0f0')
+        self.goods_tab = Frame(self.notebook, bg='#f0f0f0')
+        self.reports_tab = Frame(self.notebook, bg='#f0f0f0')
+        self.notebook.add_lazy(self.dashboard_tab, self.create_dashboard_tab, self.update_progress, text="📊 Обзор")
+        self.notebook.add_lazy(self.zones_tab, self.create_zones_tab, self.update_zones_list, text="📦 Зоны")
+        self.notebook.add_lazy(self.suppliers_tab, self.create_suppliers_tab, self.update_suppliers_list,
+                               text="🏭 Поставщики")
+        self.notebook.add_lazy(self.goods_tab, self.create_goods_tab,
+                               (self.update_suppliers_combo, self.update_zones_combo), text="📦 Товары")
+        self.notebook.add_lazy(self.reports_tab, self.create_reports_tab, text="📄 Отчеты")
+        add_search_tab(self.notebook, self.queries)
         self.notebook.pack(expand=1, fill='both', padx=10, pady=10)
         
     def configure_styles(self):
-        self.style.configure('Custom.TNotebook', background='#f0f0f0')
-        self.style.configure('Custom.TNotebook.Tab', 
+        self.style.configure('Custom.Warehouse.TNotebook', background='#f0f0f0')
+        self.style.configure('Custom.Warehouse.TNotebook.Tab', 
                            font=('Helvetica', 10, 'bold'),
                            padding=[20, 5],
                            background='#d3d3d3',
                            foreground='#333333')
-        self.style.map('Custom.TNotebook.Tab',
+        self.style.map('Custom.Warehouse.TNotebook.Tab',
                      background=[('selected', '#4a90d9')],
                      foreground=[('selected', 'white')])
         
-        self.style.configure('Treeview', 
+        self.style.configure('Warehouse.Treeview', 
                            font=('Helvetica', 9),
                            rowheight=25,
                            background='#ffffff',
                            fieldbackground='#ffffff')
-        self.style.configure('Treeview.Heading', 
+        self.style.configure('Warehouse.Treeview.Heading', 
                            font=('Helvetica', 10, 'bold'),
                            background='#4a90d9',
                            foreground='white')
-        self.style.configure('TButton', 
+        self.style.configure('Warehouse.TButton', 
                            font=('Helvetica', 10, 'bold'),
                            padding=6,
                            background='#4a90d9',
                            foreground='white')
-        self.style.configure('TLabel', 
+        self.style.configure('Warehouse.TLabel', 
                            font=('Helvetica', 10),
                            background='#f0f0f0',
                            foreground='#333333')
-        self.style.configure('TEntry', 
+        self.style.configure('Warehouse.TEntry', 
                            font=('Helvetica', 10),
                            padding=5)
-        self.style.configure('Horizontal.TProgressbar', 
+        self.style.configure('Warehouse.Horizontal.TProgressbar', 
                            thickness=20,
                            troughcolor='#d3d3d3',
                            background='#4a90d9')
@@ -82,10 +160,11 @@ class WarehouseApp:
                         quantity INTEGER,
                         date_added TEXT)''')
         self.conn.commit()
+        migrate(self.conn, 'warehouse.db')
+        self.service = WarehouseService(self.conn)
     
     def create_dashboard_tab(self):
-        tab = Frame(self.notebook, bg='#f0f0f0')
-        self.notebook.add(tab, text="📊 Обзор")
+        tab = self.dashboard_tab
         
         container = Frame(tab, bg='#ffffff', bd=2, relief=GROOVE)
         container.pack(pady=20, padx=20, fill='both', expand=True)
@@ -98,13 +177,12 @@ class WarehouseApp:
         self.load_label.pack(pady=10)
         
         self.progress = ttk.Progressbar(container, length=400, 
-                                      style='Horizontal.TProgressbar')
+                                      style='Warehouse.Horizontal.TProgressbar')
         self.progress.pack(pady=5)
         self.update_progress()
     
     def create_zones_tab(self):
-        tab = Frame(self.notebook, bg='#f0f0f0')
-        self.notebook.add(tab, text="📦 Зоны")
+        tab = self.zones_tab
         
         left_frame = Frame(tab, bg='#ffffff', bd=2, relief=GROOVE)
         left_frame.pack(side=LEFT, padx=10, pady=10, fill='y')
@@ -148,17 +226,13 @@ class WarehouseApp:
         Label(goods_frame, text="Товары в выбранной зоне", font=('Helvetica', 12, 'bold'), 
              bg='#ffffff').pack(pady=5)
         
-        self.zone_goods_tree = ttk.Treeview(goods_frame, columns=('id', 'name', 'quantity', 'date'), 
-                                          show='headings')
+        self.zone_goods_tree = VirtualTreeview(goods_frame, self.conn, ZONE_GOODS_QUERY,
+                                               columns=('id', 'name', 'quantity', 'date'), params=(None,))
         self.zone_goods_tree.heading('id', text='ID')
         self.zone_goods_tree.heading('name', text='Товар')
         self.zone_goods_tree.heading('quantity', text='Количество')
         self.zone_goods_tree.heading('date', text='Дата')
-        
-        goods_vsb = ttk.Scrollbar(goods_frame, orient="vertical", command=self.zone_goods_tree.yview)
-        self.zone_goods_tree.configure(yscrollcommand=goods_vsb.set)
         self.zone_goods_tree.pack(side=LEFT, fill='both', expand=True)
-        goods_vsb.pack(side=RIGHT, fill='y')
         
         delete_btn = ttk.Button(goods_frame, text="Удалить выбранные\nтовары", 
                               command=self.delete_selected_goods)
@@ -174,13 +248,10 @@ class WarehouseApp:
         self.load_zone_goods(zone_id)
     
     def load_zone_goods(self, zone_id):
-        for item in self.zone_goods_tree.get_children():
-            self.zone_goods_tree.delete(item)
-        
-        goods = self.c.execute('''SELECT id, name, quantity, date_added 
-                               FROM goods WHERE zone_id=?''', (zone_id,)).fetchall()
-        for good in goods:
-            self.zone_goods_tree.insert('', 'end', values=good)
+        if self.zone_goods_tree.params == (zone_id,):
+            self.zone_goods_tree.refresh()
+        else:
+            self.zone_goods_tree.set_query(ZONE_GOODS_QUERY, (zone_id,))
 
     def delete_selected_goods(self):
         selected_goods = self.zone_goods_tree.selection()
@@ -194,39 +265,25 @@ class WarehouseApp:
             return
             
         zone_id = self.zones_tree.item(selected_zone[0], 'values')[0]
-        total_quantity = 0
         
         try:
-            goods_to_delete = []
-            for item in selected_goods:
-                goods_id = self.zone_goods_tree.item(item, 'values')[0]
-                quantity = self.zone_goods_tree.item(item, 'values')[2]
-                goods_to_delete.append(goods_id)
-                total_quantity += int(quantity)
+            goods_to_delete = [self.zone_goods_tree.item(item, 'values')[0] for item in selected_goods]
             
             if not messagebox.askyesno("Подтверждение", f"Удалить {len(goods_to_delete)} товаров?"):
                 return
                 
-            self.c.executemany("DELETE FROM goods WHERE id=?", 
-                             [(gid,) for gid in goods_to_delete])
-            
-            self.c.execute('''UPDATE zones SET occupied = occupied - ?
-                           WHERE id=?''', (total_quantity, zone_id))
-            
-            self.conn.commit()
+            self.service.delete_goods(zone_id, goods_to_delete)
             
             self.load_zone_goods(zone_id)
             self.update_zones_list()
-            self.update_progress()
+            self.notebook.mark_stale(self.dashboard_tab)
             messagebox.showinfo("Успех", "Товары успешно удалены")
             
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка при удалении: {str(e)}")
-            self.conn.rollback()
 
     def create_suppliers_tab(self):
-        tab = Frame(self.notebook, bg='#f0f0f0')
-        self.notebook.add(tab, text="🏭 Поставщики")
+        tab = self.suppliers_tab
         
         left_frame = Frame(tab, bg='#ffffff', bd=2, relief=GROOVE)
         left_frame.pack(side=LEFT, padx=10, pady=10, fill='y')
@@ -265,8 +322,7 @@ class WarehouseApp:
         self.update_suppliers_list()
     
     def create_goods_tab(self):
-        tab = Frame(self.notebook, bg='#f0f0f0')
-        self.notebook.add(tab, text="📦 Товары")
+        tab = self.goods_tab
         
         form_frame = Frame(tab, bg='#ffffff', bd=2, relief=GROOVE)
         form_frame.pack(pady=10, padx=10, fill='x')
@@ -279,7 +335,7 @@ class WarehouseApp:
         self.goods_name.grid(row=1, column=1, padx=5, pady=5)
         
         ttk.Label(form_frame, text="Поставщик:").grid(row=2, column=0, padx=5, pady=5)
-        self.supplier_combo = ttk.Combobox(form_frame)
+        self.supplier_combo = AutocompleteCombobox(form_frame, self.queries, 'suppliers')
         self.supplier_combo.grid(row=2, column=1, padx=5, pady=5)
         self.update_suppliers_combo()
         
@@ -300,8 +356,7 @@ class WarehouseApp:
             row=6, column=0, columnspan=2, pady=10)
     
     def create_reports_tab(self):
-        tab = Frame(self.notebook, bg='#f0f0f0')
-        self.notebook.add(tab, text="📄 Отчеты")
+        tab = self.reports_tab
         
         control_frame = Frame(tab, bg='#ffffff', bd=2, relief=GROOVE)
         control_frame.pack(pady=10, padx=10, fill='x')
@@ -342,10 +397,9 @@ class WarehouseApp:
             messagebox.showerror("Ошибка", "Заполните все поля")
             return
         try:
-            self.c.execute("INSERT INTO zones (name, capacity) VALUES (?, ?)", (name, int(capacity)))
-            self.conn.commit()
+            self.service.add_zone(name, int(capacity))
             self.update_zones_list()
-            self.update_zones_combo()
+            self.notebook.mark_stale(self.goods_tab, self.dashboard_tab)
             self.zone_name.delete(0, END)
             self.zone_capacity.delete(0, END)
         except:
@@ -358,10 +412,9 @@ class WarehouseApp:
             messagebox.showerror("Ошибка", "Заполните все поля")
             return
         try:
-            self.c.execute("INSERT INTO suppliers (name, contact) VALUES (?, ?)", (name, contact))
-            self.conn.commit()
+            self.service.add_supplier(name, contact)
             self.update_suppliers_list()
-            self.update_suppliers_combo()
+            self.notebook.mark_stale(self.goods_tab)
             self.supplier_name.delete(0, END)
             self.supplier_contact.delete(0, END)
         except:
@@ -373,10 +426,9 @@ class WarehouseApp:
             return
         supplier_id = self.suppliers_tree.item(selected[0], 'values')[0]
         try:
-            self.c.execute("DELETE FROM suppliers WHERE id=?", (supplier_id,))
-            self.conn.commit()
+            self.service.delete_supplier(supplier_id)
             self.update_suppliers_list()
-            self.update_suppliers_combo()
+            self.notebook.mark_stale(self.goods_tab)
         except:
             messagebox.showerror("Ошибка", "Нельзя удалить используемого поставщика")
     
@@ -399,45 +451,33 @@ class WarehouseApp:
             messagebox.showerror("Ошибка", "Количество должно быть положительным числом")
             return
         
+        supplier_id = self.supplier_combo.get_id()
+        if supplier_id is None:
+            messagebox.showerror("Ошибка", "Выберите поставщика из списка")
+            return
+        
         try:
-            supplier_id = self.c.execute("SELECT id FROM suppliers WHERE name=?", (supplier,)).fetchone()[0]
-            zone_id = self.c.execute("SELECT id FROM zones WHERE name=?", (zone,)).fetchone()[0]
-            
-            zone_info = self.c.execute("SELECT capacity, occupied FROM zones WHERE id=?", (zone_id,)).fetchone()
-            zone_capacity, zone_occupied = zone_info
-            if zone_occupied + quantity > zone_capacity:
-                messagebox.showerror("Ошибка", "В выбранной зоне недостаточно места")
-                return
-            
-            total_capacity = self.c.execute("SELECT SUM(capacity) FROM zones").fetchone()[0] or 0
-            total_occupied = self.c.execute("SELECT SUM(occupied) FROM zones").fetchone()[0] or 0
-            if (total_occupied + quantity) > total_capacity:
-                messagebox.showerror("Ошибка", "На складе закончилось свободное место")
-                return
-            
-            self.c.execute('''INSERT INTO goods 
-                        (name, supplier_id, zone_id, quantity, date_added)
-                        VALUES (?, ?, ?, ?, ?)''',
-                        (name, supplier_id, zone_id, quantity, date))
-            
-            self.c.execute("UPDATE zones SET occupied = occupied + ? WHERE id=?", (quantity, zone_id))
-            self.conn.commit()
+            self.service.receive_goods(name, supplier_id, zone, quantity, date)
             
-            self.update_progress()
+            self.notebook.mark_stale(self.dashboard_tab, self.zones_tab)
             self.goods_name.delete(0, END)
             self.goods_quantity.delete(0, END)
             messagebox.showinfo("Успех", "Товар успешно добавлен")
             
+        except (LookupError, ValueError) as e:
+            messagebox.showerror("Ошибка", str(e))
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка при добавлении товара: {str(e)}")
     
     def generate_report(self):
         start = self.start_date.get_date()
         end = self.end_date.get_date()
-        for row in self.report_tree.get_children():
-            self.report_tree.delete(row)
-        goods = self.c.execute('''SELECT name, quantity, date_added FROM goods
-                               WHERE date_added BETWEEN ? AND ?''', (start, end)).fetchall()
+        show_loading(self.report_tree)
+        self.queries.submit('report', '''SELECT name, quantity, date_added FROM goods
+                               WHERE date_added BETWEEN ? AND ?''', (start, end), on_done=self.fill_report)
+
+    def fill_report(self, goods):
+        clear(self.report_tree)
         for good in goods:
             self.report_tree.insert('', END, values=good)
     
@@ -452,29 +492,31 @@ class WarehouseApp:
             messagebox.showerror("Ошибка", f"Ошибка обновления статистики: {str(e)}")
     
     def update_zones_list(self):
-        for row in self.zones_tree.get_children():
-            self.zones_tree.delete(row)
-        zones = self.c.execute("SELECT id, name, capacity, occupied FROM zones").fetchall()
-        for zone in zones:
-            self.zones_tree.insert('', END, values=zone)
+        show_loading(self.zones_tree, keep_rows=True)
+        self.queries.submit('zones', "SELECT id, name, capacity, occupied FROM zones",
+                            on_done=self.fill_zones_list)
+
+    def fill_zones_list(self, zones):
+        sync_tree(self.zones_tree, zones)
     
     def update_zones_combo(self):
         zones = self.c.execute("SELECT name FROM zones").fetchall()
         self.zone_combo['values'] = [zone[0] for zone in zones]
     
     def update_suppliers_combo(self):
-        suppliers = self.c.execute("SELECT name FROM suppliers").fetchall()
-        self.supplier_combo['values'] = [supplier[0] for supplier in suppliers]
+        self.supplier_combo.refresh()
     
     def update_suppliers_list(self):
-        for row in self.suppliers_tree.get_children():
-            self.suppliers_tree.delete(row)
-        suppliers = self.c.execute("SELECT id, name, contact FROM suppliers").fetchall()
-        for supplier in suppliers:
-            self.suppliers_tree.insert('', END, values=supplier)
+        show_loading(self.suppliers_tree, keep_rows=True)
+        self.queries.submit('suppliers', "SELECT id, name, contact FROM suppliers",
+                            on_done=self.fill_suppliers_list)
+
+    def fill_suppliers_list(self, suppliers):
+        sync_tree(self.suppliers_tree, suppliers)
 
 if __name__ == "__main__":
     root = Tk()
     app = WarehouseApp(root)
+    tracing.install(root)
     root.mainloop()
     
@@ -1,8 +1,17 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
 import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+from query_executor import QueryExecutor, show_loading
+from tree_sync import sync_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles, CLASSES
 from datetime import datetime
-from tkintermapview import TkinterMapView
+from lazy_widgets import TkinterMapView
 
 COLORS = {
     "primary": "#6DB8D1",
@@ -14,6 +23,59 @@ COLORS = {
     "danger": "#1F2E33" 
 }
 
+ORDERS_QUERY = '''
+            SELECT orders.id AS "ID", employees.name AS "Сотрудник", orders.order_date AS "Дата Заказа",
+                   orders.total_amount AS "Сумма"
+            FROM orders 
+            JOIN employees ON orders.employee_id = employees.id
+        '''
+
+
+def place_order(conn, employee_id, items, total_amount, order_date):
+    # Заказ и списание по одной единице каждого товара items [(id, название)]
+    # (вызывается внутри run_write: остатки проверяются под блокировкой записи)
+    for item_id, name in items:
+        quantity = conn.execute("SELECT quantity FROM inventory WHERE id = ?", (item_id,)).fetchone()[0]
+        if quantity <= 0:
+            raise ValueError(f"Товар '{name}' отсутствует на складе!")
+    order_id = conn.execute("INSERT INTO orders (employee_id, order_date, total_amount) VALUES (?, ?, ?)",
+                            (employee_id, order_date, total_amount)).lastrowid
+    for item_id, name in items:
+        conn.execute("UPDATE inventory SET quantity = quantity - 1 WHERE id = ?", (item_id,))
+    return order_id
+
+
+class CoffeeService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_employee(self, name, position, salary):
+        self.add_employees([(name, position, salary)])
+
+    def add_employees(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO employees (name, position, salary) VALUES (?, ?, ?)", records))
+
+    def add_item(self, item_name, quantity, price):
+        self.add_items([(item_name, quantity, price)])
+
+    def add_items(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO inventory (item_name, quantity, price) VALUES (?, ?, ?)", records))
+
+    def add_point(self, name, latitude, longitude):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO points (name, latitude, longitude) VALUES (?, ?, ?)", (name, latitude, longitude)))
+
+    def place_order(self, employee_id, items, total_amount, order_date):
+        return self.place_orders([(employee_id, items, total_amount, order_date)])[0]
+
+    def place_orders(self, orders):
+        # orders - [(сотрудник, [(id товара, название)], сумма, дата)] -> id заказов;
+        # если какого-то товара не хватило, не проводится ни один заказ
+        return run_write(self.conn, lambda conn: [place_order(conn, *order) for order in orders])
+
+
 class CoffeeApp:
     def __init__(self, root):
         self.root = root
@@ -27,72 +89,81 @@ class CoffeeApp:
         self.main_container = ttk.Frame(root)
         self.main_container.pack(fill=tk.BOTH, expand=True)
         
-        self.notebook = ttk.Notebook(self.main_container)
+        self.notebook = LazyNotebook(self.main_container)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
         
         self.create_tables()
-        self.create_employee_tab()
-        self.create_order_tab()
-        self.create_inventory_tab()
-        self.create_report_tab()
-        self.create_map_tab()
-        self.create_points_tab()
+        self.queries = QueryExecutor(root, "YaCoffeeBAZA.db")
+        self.tabs = {text: ttk.Frame(self.notebook)
+                     for text in ('Сотрудники', 'Заказы', 'Инвентарь', 'Отчеты', 'Карта', 'Точки')}
+        self.notebook.add_lazy(self.tabs['Сотрудники'], self.create_employee_tab, self.update_employee_list,
+                               text='Сотрудники')
+        self.notebook.add_lazy(self.tabs['Заказы'], self.create_order_tab, self.update_order_widgets, text="Заказы")
+        self.notebook.add_lazy(self.tabs['Инвентарь'], self.create_inventory_tab, self.update_inventory_list,
+                               text="Инвентарь")
+        self.notebook.add_lazy(self.tabs['Отчеты'], self.create_report_tab, text="Отчеты")
+        self.notebook.add_lazy(self.tabs['Карта'], self.create_map_tab, self.update_map_points, text="Карта")
+        self.notebook.add_lazy(self.tabs['Точки'], self.create_points_tab, self.update_points_list, text="Точки")
+        add_search_tab(self.notebook, self.queries)
 
     def configure_styles(self):
-        self.style.theme_use("clam")
-        
-        self.style.configure(".", background=COLORS["background"], foreground=COLORS["text"])
-        self.style.configure("TNotebook", background=COLORS["background"])
-        self.style.configure("TNotebook.Tab", 
+        use_theme(self.style, "clam")
+        scope_styles(self.root, 'Coffee')
+        
+        # Цвета по умолчанию для всех стилей окна (вместо общего стиля ".")
+        for name in CLASSES:
+            self.style.configure(f"Coffee.{name}", background=COLORS["background"], foreground=COLORS["text"])
+        self.style.configure("Coffee.TNotebook", background=COLORS["background"])
+        self.style.configure("Coffee.TNotebook.Tab", 
                             font=('Helvetica', 12, 'bold'), 
                             padding=[15, 5],
                             background=COLORS["secondary"],
                             foreground="white")
-        self.style.map("TNotebook.Tab", 
+        self.style.map("Coffee.TNotebook.Tab", 
                       background=[("selected", COLORS["primary"])],
                       foreground=[("selected", "white")])
         
-        self.style.configure("TButton", 
+        self.style.configure("Coffee.TButton", 
                             font=('Helvetica', 12, 'bold'), 
                             padding=8,
                             borderwidth=2,
                             relief="flat",
                             background=COLORS["primary"],
                             foreground="white")
-        self.style.map("TButton", 
+        self.style.map("Coffee.TButton", 
                       background=[('active', COLORS["secondary"]), ('disabled', '#D3D3D3')],
                       relief=[('active', 'sunken'), ('!active', 'flat')])
         
-        self.style.configure("TLabel", 
+        self.style.configure("Coffee.TLabel", 
                             font=('Helvetica', 12), 
                             background=COLORS["background"],
                             foreground=COLORS["text"])
-        self.style.configure("Header.TLabel", 
+        self.style.configure("Header.Coffee.TLabel", 
                             font=('Helvetica', 14, 'bold'), 
                             foreground=COLORS["primary"])
         
-        self.style.configure("TEntry",
+        self.style.configure("Coffee.TEntry",
                             fieldbackground="white",
                             bordercolor=COLORS["primary"],
                             lightcolor=COLORS["primary"],
                             darkcolor=COLORS["primary"])
         
-        self.style.configure("Treeview",
+        self.style.configure("Coffee.Treeview",
                             font=('Helvetica', 11),
                             rowheight=30,
                             borderwidth=1,
                             relief="solid",
                             fieldbackground=COLORS["background"])
-        self.style.configure("Treeview.Heading", 
+        self.style.configure("Coffee.Treeview.Heading", 
                             font=('Helvetica', 12, 'bold'),
                             background=COLORS["primary"],
                             foreground="white",
                             relief="flat")
-        self.style.map("Treeview.Heading", 
+        self.style.map("Coffee.Treeview.Heading", 
                       background=[('active', COLORS["secondary"])])
 
     def create_tables(self):
-        self.conn = sqlite3.connect("YaCoffeeBAZA.db") 
+        self.conn = get_connection("YaCoffeeBAZA.db") 
         self.cursor = self.conn.cursor()
         self.cursor.execute(''' 
             CREATE TABLE IF NOT EXISTS employees ( 
@@ -127,14 +198,15 @@ class CoffeeApp:
                 longitude REAL NOT NULL 
             ) 
         ''')
+        migrate(self.conn, 'YaCoffeeBAZA.db')
+        self.service = CoffeeService(self.conn)
 
     def create_employee_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text='Сотрудники')
+        tab = self.tabs['Сотрудники']
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill=tk.X, padx=20, pady=10)
-        ttk.Label(header_frame, text="Управление сотрудниками", style="Header.TLabel").pack(side=tk.LEFT)
+        ttk.Label(header_frame, text="Управление сотрудниками", style="Header.Coffee.TLabel").pack(side=tk.LEFT)
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -170,12 +242,11 @@ class CoffeeApp:
         self.update_employee_list()
     
     def create_order_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Заказы")
+        tab = self.tabs["Заказы"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill=tk.X, padx=20, pady=10)
-        ttk.Label(header_frame, text="Управление заказами", style="Header.TLabel").pack(side=tk.LEFT)
+        ttk.Label(header_frame, text="Управление заказами", style="Header.Coffee.TLabel").pack(side=tk.LEFT)
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -208,7 +279,8 @@ class CoffeeApp:
         ttk.Button(btn_frame, text="Добавить заказ", command=self.add_order).pack(side=tk.LEFT, padx=5)
         ttk.Button(btn_frame, text="Обновить списки", command=self.update_order_widgets).pack(side=tk.LEFT, padx=5)
         
-        self.orders_tree = ttk.Treeview(content_frame, columns=("ID", "Сотрудник", "Дата Заказа", "Сумма"), show="headings")
+        self.orders_tree = VirtualTreeview(content_frame, self.conn, ORDERS_QUERY,
+                                           columns=("ID", "Сотрудник", "Дата Заказа", "Сумма"), key="ID")
         self.orders_tree.heading("ID", text="ID")
         self.orders_tree.heading("Сотрудник", text="Сотрудник")
         self.orders_tree.heading("Дата Заказа", text="Дата Заказа")
@@ -219,12 +291,11 @@ class CoffeeApp:
         self.items_listbox.bind('<<ListboxSelect>>', self.calculate_total_amount)
     
     def create_inventory_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Инвентарь")
+        tab = self.tabs["Инвентарь"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill=tk.X, padx=20, pady=10)
-        ttk.Label(header_frame, text="Управление инвентарем", style="Header.TLabel").pack(side=tk.LEFT)
+        ttk.Label(header_frame, text="Управление инвентарем", style="Header.Coffee.TLabel").pack(side=tk.LEFT)
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -260,12 +331,11 @@ class CoffeeApp:
         self.update_inventory_list()
 
     def create_report_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Отчеты")
+        tab = self.tabs["Отчеты"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill=tk.X, padx=20, pady=10)
-        ttk.Label(header_frame, text="Финансовые отчеты", style="Header.TLabel").pack(side=tk.LEFT)
+        ttk.Label(header_frame, text="Финансовые отчеты", style="Header.Coffee.TLabel").pack(side=tk.LEFT)
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -276,12 +346,11 @@ class CoffeeApp:
         ttk.Button(content_frame, text="Создать отчет", command=self.generate_report).pack(pady=10)
 
     def create_map_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Карта")
+        tab = self.tabs["Карта"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill=tk.X, padx=20, pady=10)
-        ttk.Label(header_frame, text="Карта кофеен", style="Header.TLabel").pack(side=tk.LEFT)
+        ttk.Label(header_frame, text="Карта кофеен", style="Header.Coffee.TLabel").pack(side=tk.LEFT)
         
         self.map_widget = TkinterMapView(tab, width=800, height=600, corner_radius=15)
         self.map_widget.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -290,12 +359,11 @@ class CoffeeApp:
         self.update_map_points()
 
     def create_points_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Точки")
+        tab = self.tabs["Точки"]
         
         header_frame = ttk.Frame(tab)
         header_frame.pack(fill=tk.X, padx=20, pady=10)
-        ttk.Label(header_frame, text="Управление точками", style="Header.TLabel").pack(side=tk.LEFT)
+        ttk.Label(header_frame, text="Управление точками", style="Header.Coffee.TLabel").pack(side=tk.LEFT)
         
         content_frame = ttk.Frame(tab)
         content_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
@@ -334,17 +402,16 @@ class CoffeeApp:
         name = self.employee_name_entry.get()
         position = self.employee_position_entry.get()
         salary = self.employee_salary_entry.get()
-        self.cursor.execute("INSERT INTO employees (name, position, salary) VALUES (?, ?, ?)", (name, position, salary))
-        self.conn.commit()
+        self.service.add_employee(name, position, salary)
         self.update_employee_list()
+        self.notebook.mark_stale(self.tabs['Заказы'])
         
     def update_employee_list(self):
-        for row in self.employee_tree.get_children():
-            self.employee_tree.delete(row)
-        self.cursor.execute("SELECT * FROM employees")
-        employees = self.cursor.fetchall()
-        for employee in employees:
-            self.employee_tree.insert("", tk.END, values=employee)
+        show_loading(self.employee_tree, keep_rows=True)
+        self.queries.submit('employee', "SELECT * FROM employees", on_done=self.fill_employee_list)
+
+    def fill_employee_list(self, employees):
+        sync_tree(self.employee_tree, employees)
 
     def add_order(self):
         employee_str = self.employee_combobox.get()
@@ -368,50 +435,26 @@ class CoffeeApp:
             messagebox.showerror("Ошибка", "Некорректная сумма заказа!")
             return
 
-        for idx in selected_items:
-            item_id = self.inventory_items[idx][0]
-            self.cursor.execute("SELECT quantity FROM inventory WHERE id = ?", (item_id,))
-            quantity = self.cursor.fetchone()[0]
-            if quantity <= 0:
-                messagebox.showerror("Ошибка", f"Товар '{self.inventory_items[idx][1]}' отсутствует на складе!")
-                return
-
+        items = [self.inventory_items[idx][:2] for idx in selected_items]
         order_date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         try:
-            self.cursor.execute(
-                "INSERT INTO orders (employee_id, order_date, total_amount) VALUES (?, ?, ?)",
-                (employee_id, order_date, total_amount)
-            )
-            order_id = self.cursor.lastrowid
-
-            for idx in selected_items:
-                item_id = self.inventory_items[idx][0]
-                self.cursor.execute("UPDATE inventory SET quantity = quantity - 1 WHERE id = ?", (item_id,))
-            
-            self.conn.commit()
+            self.service.place_order(employee_id, items, total_amount, order_date)
+        except ValueError as e:
+            messagebox.showerror("Ошибка", str(e))
+            return
         except sqlite3.Error as e:
             messagebox.showerror("Ошибка БД", str(e))
             return
         
-        self.update_orders_list()
-        self.update_inventory_list()
         self.update_order_widgets()
+        self.notebook.mark_stale(self.tabs['Инвентарь'])
         self.employee_combobox.set('')
         self.items_listbox.selection_clear(0, tk.END)
         self.order_amount_var.set('0.00')
         messagebox.showinfo("Успех", "Заказ успешно добавлен!")
         
     def update_orders_list(self):
-        for row in self.orders_tree.get_children():
-            self.orders_tree.delete(row)
-        self.cursor.execute('''
-            SELECT orders.id, employees.name, orders.order_date, orders.total_amount 
-            FROM orders 
-            JOIN employees ON orders.employee_id = employees.id
-        ''')
-        orders = self.cursor.fetchall()
-        for order in orders:
-            self.orders_tree.insert("", tk.END, values=order)
+        self.orders_tree.refresh()
 
     def update_order_widgets(self):
         self.update_employee_combobox()
@@ -442,23 +485,29 @@ class CoffeeApp:
         item_name = self.item_name_entry.get()
         quantity = self.item_quantity_entry.get()
         price = self.item_price_entry.get()
-        self.cursor.execute("INSERT INTO inventory (item_name, quantity, price) VALUES (?, ?, ?)", (item_name, quantity, price))
-        self.conn.commit()
+        self.service.add_item(item_name, quantity, price)
         self.update_inventory_list()
+        self.notebook.mark_stale(self.tabs['Заказы'])
 
     def update_inventory_list(self):
-        for row in self.inventory_tree.get_children():
-            self.inventory_tree.delete(row)
-        self.cursor.execute("SELECT * FROM inventory")
-        inventory = self.cursor.fetchall()
-        for item in inventory:
-            self.inventory_tree.insert("", tk.END, values=item)
+        show_loading(self.inventory_tree, keep_rows=True)
+        self.queries.submit('inventory', "SELECT * FROM inventory", on_done=self.fill_inventory_list)
+
+    def fill_inventory_list(self, inventory):
+        sync_tree(self.inventory_tree, inventory)
             
     def generate_report(self):
-        self.cursor.execute("SELECT SUM(total_amount) FROM orders")
-        total_amount = self.cursor.fetchone()[0]
-        self.cursor.execute("SELECT SUM(quantity * price) FROM inventory")
-        total_inventory = self.cursor.fetchone()[0]
+        def query(conn):
+            cursor = conn.cursor()
+            cursor.execute("SELECT SUM(revenue) FROM daily_sales")
+            total_amount = cursor.fetchone()[0]
+            cursor.execute("SELECT SUM(quantity * price) FROM inventory")
+            return total_amount, cursor.fetchone()[0]
+
+        show_loading(self.report_label)
+        self.queries.submit('report', query, on_done=lambda result: self.show_report(*result))
+
+    def show_report(self, total_amount, total_inventory):
         report_text = f"Общая сумма заказов: {total_amount}\nОбщая стоимость инвенторя: {total_inventory}"
         if total_amount != None and total_inventory != None:
             self.report_label.config(text=report_text)
@@ -469,18 +518,16 @@ class CoffeeApp:
         name = self.point_name_entry.get()
         latitude = self.point_latitude_entry.get()
         longitude = self.point_longitude_entry.get()
-        self.cursor.execute("INSERT INTO points (name, latitude, longitude) VALUES (?, ?, ?)", (name, latitude, longitude))
-        self.conn.commit()
+        self.service.add_point(name, latitude, longitude)
         self.update_points_list()
-        self.update_map_points()
+        self.notebook.mark_stale(self.tabs['Карта'])
 
     def update_points_list(self):
-        for row in self.points_tree.get_children():
-            self.points_tree.delete(row)
-        self.cursor.execute("SELECT * FROM points")
-        points = self.cursor.fetchall()
-        for point in points:
-            self.points_tree.insert("", tk.END, values=point)
+        show_loading(self.points_tree, keep_rows=True)
+        self.queries.submit('points', "SELECT * FROM points", on_done=self.fill_points_list)
+
+    def fill_points_list(self, points):
+        sync_tree(self.points_tree, points)
 
     def update_map_points(self):
         self.map_widget.delete_all_marker()
@@ -492,4 +539,5 @@ class CoffeeApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = CoffeeApp(root)
+    tracing.install(root)
     root.mainloop()
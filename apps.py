@@ -0,0 +1,55 @@
+import importlib
+from collections import namedtuple
+
+# Приложения репозитория: модуль, класс главного окна, файл базы и заголовок.
+# toplevel - класс сам является tk.Toplevel и создает свое окно поверх root
+App = namedtuple('App', 'module cls db title toplevel')
+
+APPS = [
+    App('Bakery', 'BakeryApp', 'bakery.db', "Пекарня", False),
+    App('CleaningApp', 'CleaningApp', 'cleaning.db', "Клининговая служба", False),
+    App('ComputerClub', 'ComputerClubApp', 'computer_club.db', "Компьютерный клуб", True),
+    App('FitnesClub', 'FitnessApp', 'fitness_club.db', "Фитнес-клуб", False),
+    App('JewelryStore', 'JewelryStoreApp', 'jewelry.db', "Ювелирный магазин", False),
+    App('ServiceCenter', 'ServiceCenterApp', 'service_center.db', "Сервисный центр", False),
+    App('SportStore', 'SportsStoreApp', 'sports_store.db', "Спортивный магазин", False),
+    App('Warehouse', 'WarehouseApp', 'warehouse.db', "Склад", False),
+    App('YaCofee', 'CoffeeApp', 'YaCoffeeBAZA.db', "Кофейня", False),
+    App('auto', 'AutoSalonApp', 'auto_salon.db', "Автосалон", False),
+    App('fishing', 'FishingShopApp', 'shop.db', "Рыболовный магазин", True),
+    App('flowers', 'FlowerShopApp', 'flowershop.db', "Цветочный магазин", False),
+    App('hookahbar', 'HookahApp', 'hookah.db', "Кальянные", True),
+    App('moto', 'ModernMotoSalon', 'moto_salon.db', "Мотосалон", False),
+    App('musicshop', 'MusicStoreApp', 'music_store.db', "Музыкальный магазин", False),
+    App('pharmacy', 'PharmacyApplication', 'pharmacy_database.db', "Аптека", False),
+    App('restoration', 'FurnitureRestorationApp', 'restoration.db', "Реставрация мебели", False),
+    App('vapeshop', 'VapeShopApp', 'vapeshop.db', "Вейп шоп", False),
+]
+
+
+def get_app(name):
+    # Поиск по имени модуля или файлу базы
+    for app in APPS:
+        if name in (app.module, app.db):
+            return app
+    raise KeyError(name)
+
+
+def source(app):
+    return app.module + '.py'
+
+
+def load_class(app):
+    # Импорт модуля приложения; часть модулей создает таблицы при импорте
+    return getattr(importlib.import_module(app.module), app.cls)
+
+
+def create(app, root):
+    # Обычные приложения строятся прямо в окне root (tk.Tk или tk.Toplevel),
+    # наследники tk.Toplevel создают свое окно с хозяином root
+    return load_class(app)(root)
+
+
+def window(app, instance, root):
+    # Окно, в котором построено приложение
+    return instance if app.toplevel else root
@@ -0,0 +1,165 @@
+import argparse
+import os
+import re
+import sqlite3
+import sys
+import time
+from contextlib import contextmanager
+from datetime import date, timedelta
+
+import apps
+from db_session import database_path
+
+# Архив старых продаж и заказов: строки старше горизонта переносятся в файлы
+# archive/<база>_<год>.db. Списки приложений читают только живые данные, отчеты
+# по строкам за период через spanning() подключают (ATTACH) архивы нужных лет.
+# Сводка daily_sales остается в основной базе целиком: на время переноса триггер,
+# который вычитает удаленные строки из сводки, снимается. Отчеты по сводке не
+# подключают архивы и после архивации работают так же быстро, как до нее
+HORIZON_DAYS = 365
+DIRECTORY = 'archive'
+TABLES = {
+    'bakery.db': [('orders', 'created_at')],
+    'sports_store.db': [('orders', 'created_at')],
+    'jewelry.db': [('orders', 'created_at')],
+    'flowershop.db': [('sales', 'sale_date')],
+    'auto_salon.db': [('sales', 'sale_date')],
+    'moto_salon.db': [('sales', 'sale_date')],
+    'music_store.db': [('sales', 'date')],
+    'pharmacy_database.db': [('sales_records', 'transaction_date')],
+    'computer_club.db': [('Bookings', 'start_time')],
+}
+ARCHIVE = re.compile(r'(.+)_(\d{4})(\.[^.]+)')
+
+
+def archive_path(path, year):
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return os.path.join(os.path.dirname(path), DIRECTORY, f"{stem}_{year}{ext}")
+
+
+def archives(path):
+    # Архивы базы path: [(год, файл)] по возрастанию года
+    stem, ext = os.path.splitext(os.path.basename(path))
+    directory = os.path.join(os.path.dirname(path), DIRECTORY)
+    if not os.path.isdir(directory):
+        return []
+    found = []
+    for name in sorted(os.listdir(directory)):
+        match = ARCHIVE.fullmatch(name)
+        if match and match.group(1) == stem and match.group(3) == ext:
+            found.append((int(match.group(2)), os.path.join(directory, name)))
+    return found
+
+
+def _create_like(conn, table, schema):
+    # Таблица schema.table с тем же определением, что и main.table
+    sql = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone()[0]
+    conn.execute(re.sub(r'^CREATE TABLE\s+("?\w+"?)', f'CREATE TABLE IF NOT EXISTS {schema}.{table}', sql))
+
+
+def _rollup_trigger(conn, table):
+    # SQL триггера, который вычитает удаленные строки table из daily_sales (None - сводки нет)
+    row = conn.execute("SELECT sql FROM main.sqlite_master WHERE type = 'trigger' AND name = ?",
+                       (f'trg_{table}_delete_daily_sales',)).fetchone()
+    return row[0] if row else None
+
+
+def archive(path, horizon_days=HORIZON_DAYS, log=None):
+    # Перенести строки старше horizon_days дней в архивы по годам.
+    # Каждый год переносится одной транзакцией над основной базой и архивом
+    log = log or (lambda message: None)
+    cutoff = (date.today() - timedelta(days=horizon_days)).isoformat()
+    conn = sqlite3.connect(path, isolation_level=None)
+    moved = 0
+    try:
+        for table, column in TABLES[os.path.basename(path)]:
+            where = f"date({column}) < ? AND strftime('%Y', {column}) = ?"
+            years = [row[0] for row in conn.execute(
+                f"SELECT DISTINCT strftime('%Y', {column}) FROM {table} WHERE date({column}) < ?", (cutoff,))]
+            rollup = _rollup_trigger(conn, table)
+            for year in years:
+                target = archive_path(path, year)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                conn.execute("ATTACH DATABASE ? AS archive", (target,))
+                try:
+                    conn.execute("BEGIN IMMEDIATE")
+                    try:
+                        _create_like(conn, table, 'archive')
+                        conn.execute(f"INSERT INTO archive.{table} SELECT * FROM main.{table} WHERE {where}",
+                                     (cutoff, year))
+                        # Сводка не меняется: триггер снимается и возвращается в той же транзакции
+                        if rollup:
+                            conn.execute(f"DROP TRIGGER trg_{table}_delete_daily_sales")
+                        count = conn.execute(f"DELETE FROM main.{table} WHERE {where}", (cutoff, year)).rowcount
+                        if rollup:
+                            conn.execute(rollup)
+                        conn.execute("COMMIT")
+                    except BaseException:
+                        conn.execute("ROLLBACK")
+                        raise
+                finally:
+                    conn.execute("DETACH DATABASE archive")
+                moved += count
+                log(f"{table}: {count} строк за {year} -> {target}")
+    finally:
+        conn.close()
+    return moved
+
+
+def _year(value):
+    return int(str(value)[:4])
+
+
+@contextmanager
+def spanning(conn, table, start=None, end=None, columns=None, path=None):
+    # Выражение для FROM: table основной базы вместе с архивами лет между start
+    # и end (None - без границы). Архивы подключены к conn, пока открыт блок.
+    # columns - столбцы, которые читает запрос (по умолчанию *): UNION ALL
+    # копирует каждую строку, лишние столбцы только замедляют отчет.
+    # path - файл базы, рядом с которым искать архивы, если conn открыт на копии
+    # Пример: with spanning(conn, 'sales', start, end, ('sale_date', 'total_price')) as source:
+    #             conn.execute(f"SELECT SUM(total_price) FROM {source} AS sales WHERE ...")
+    schemas = []
+    try:
+        for year, archive_path in archives(path or database_path(conn)):
+            if (start is not None and year < _year(start)) or (end is not None and year > _year(end)):
+                continue
+            schema = f"archive_{year}"
+            conn.execute(f"ATTACH DATABASE ? AS {schema}", (archive_path,))
+            schemas.append(schema)
+            if conn.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = ?", (table,)).fetchone() is None:
+                schemas.pop()
+                conn.execute(f"DETACH DATABASE {schema}")
+        if schemas:
+            select = ', '.join(columns) if columns else '*'
+            yield '(' + ' UNION ALL '.join(f"SELECT {select} FROM {schema}.{table}"
+                                           for schema in ['main'] + schemas) + ')'
+        else:
+            yield table
+    finally:
+        for schema in schemas:
+            conn.execute(f"DETACH DATABASE {schema}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Перенос старых продаж и заказов в архивы по годам")
+    parser.add_argument('apps', nargs='*', help="модули или файлы баз (по умолчанию все с архивом)")
+    parser.add_argument('--horizon-days', type=int, default=HORIZON_DAYS, help="сколько дней оставлять в базе")
+    args = parser.parse_args()
+
+    paths = [apps.get_app(name).db for name in args.apps] or list(TABLES)
+    for path in paths:
+        if path not in TABLES:
+            print(f"{path}: архив не поддерживается")
+            return 1
+        if not os.path.exists(path):
+            continue
+        start = time.perf_counter()
+        print(f"{path}:")
+        moved = archive(path, args.horizon_days, log=lambda message: print('  ' + message))
+        print(f"  перенесено {moved} строк за {time.perf_counter() - start:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
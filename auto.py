@@ -1,9 +1,61 @@
 import tkinter as tk
-from tkinter import ttk
-import sqlite3
+from tkinter import ttk, messagebox
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from bulk_import import ask_import
+import tracing
+import outbox
+from query_executor import QueryExecutor, show_loading
+from tree_sync import sync_tree, stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
+from autocomplete import AutocompleteCombobox
 from datetime import datetime
-from tkintermapview import TkinterMapView
-from tkcalendar import DateEntry
+from lazy_widgets import TkinterMapView, DateEntry
+
+SALES_QUERY = '''SELECT sales.id AS "ID", clients.name AS "Клиент", cars.model AS "Автомобиль",
+                        cars.trim_level AS "Комплектация", sales.sale_date AS "Дата", sales.amount AS "Сумма"
+                 FROM sales 
+                 JOIN clients ON sales.client_id = clients.id
+                 JOIN cars ON sales.car_id = cars.id'''
+
+
+class AutoSalonService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_client(self, name, phone, reg_date):
+        self.add_clients([(name, phone, reg_date)])
+
+    def add_clients(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO clients (name, phone, reg_date) VALUES (?, ?, ?)", records))
+
+    def add_car(self, brand, model, year, color, engine_type, mileage, trim_level, price, status):
+        self.add_cars([(brand, model, year, color, engine_type, mileage, trim_level, price, status)])
+
+    def add_cars(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            '''INSERT INTO cars (brand, model, year, color, engine_type, mileage, trim_level, price, status)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''', records))
+
+    def delete_car(self, car_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM cars WHERE id=?", (car_id,)))
+
+    def sell(self, client_id, car_id, sale_date, amount):
+        self.sell_many([(client_id, car_id, sale_date, amount)])
+
+    def sell_many(self, records):
+        # records - [(клиент, автомобиль, дата, сумма)]
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO sales (client_id, car_id, sale_date, amount) VALUES (?, ?, ?, ?)", records))
+
+    def add_location(self, name, latitude, longitude):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)", (name, latitude, longitude)))
+
 
 class AutoSalonApp:
     def __init__(self, root):
@@ -14,41 +66,48 @@ class AutoSalonApp:
         self.root.configure(bg="#f0f0f0")
 
         self.style = ttk.Style()
-        self.style.theme_use("clam")
+        use_theme(self.style, "clam")
+        scope_styles(root, 'AutoSalon')
         
-        self.style.configure("TNotebook", background="#2c3e50", padding=0)
-        self.style.configure("TNotebook.Tab", font=('Arial', 12, 'bold'), padding=[15, 5], 
+        self.style.configure("AutoSalon.TNotebook", background="#2c3e50", padding=0)
+        self.style.configure("AutoSalon.TNotebook.Tab", font=('Arial', 12, 'bold'), padding=[15, 5], 
                            background="#34495e", foreground="white")
-        self.style.map("TNotebook.Tab", background=[("selected", "#2c3e50")], 
+        self.style.map("AutoSalon.TNotebook.Tab", background=[("selected", "#2c3e50")], 
                      foreground=[("selected", "white")])
 
-        self.style.configure("TButton", font=('Arial', 12), padding=8, 
+        self.style.configure("AutoSalon.TButton", font=('Arial', 12), padding=8, 
                            background="#3498db", foreground="white")
-        self.style.map("TButton", background=[("active", "#2980b9")])
+        self.style.map("AutoSalon.TButton", background=[("active", "#2980b9")])
 
-        self.style.configure("TLabel", font=('Arial', 12), background="#ecf0f1", 
+        self.style.configure("AutoSalon.TLabel", font=('Arial', 12), background="#ecf0f1", 
                            foreground="#2c3e50")
-        self.style.configure("TEntry", font=('Arial', 12), padding=5, 
+        self.style.configure("AutoSalon.TEntry", font=('Arial', 12), padding=5, 
                            foreground="#2c3e50", fieldbackground="white")
 
-        self.style.configure("Treeview", font=('Arial', 11), background="white", 
+        self.style.configure("AutoSalon.Treeview", font=('Arial', 11), background="white", 
                            foreground="#2c3e50", fieldbackground="white")
-        self.style.configure("Treeview.Heading", font=('Arial', 12, 'bold'), 
+        self.style.configure("AutoSalon.Treeview.Heading", font=('Arial', 12, 'bold'), 
                            background="#34495e", foreground="white")
-        self.style.map("Treeview", background=[("selected", "#3498db")], 
+        self.style.map("AutoSalon.Treeview", background=[("selected", "#3498db")], 
                      foreground=[("selected", "white")])
 
-        self.notebook = ttk.Notebook(root)
+        self.notebook = LazyNotebook(root)
         self.notebook.pack(fill=tk.BOTH, expand=True)
         
         self.create_tables()
-        self.create_clients_tab()
-        self.create_cars_tab()
-        self.create_sales_tab()
-        self.create_map_tab()
+        self.queries = QueryExecutor(root, "auto_salon.db")
+        outbox.start("auto_salon.db")
+        self.tabs = {text: ttk.Frame(self.notebook) for text in ("Клиенты", "Автомобили", "Продажи", "Карта")}
+        self.notebook.add_lazy(self.tabs["Клиенты"], self.create_clients_tab, self.update_clients_list, text="Клиенты")
+        self.notebook.add_lazy(self.tabs["Автомобили"], self.create_cars_tab, self.update_cars_list, text="Автомобили")
+        self.notebook.add_lazy(self.tabs["Продажи"], self.create_sales_tab,
+                               (self.update_comboboxes, self.update_sales_list), text="Продажи")
+        self.notebook.add_lazy(self.tabs["Карта"], self.create_map_tab,
+                               (self.update_locations_list, self.update_map_markers), text="Карта")
+        add_search_tab(self.notebook, self.queries)
 
     def create_tables(self):
-        self.conn = sqlite3.connect("auto_salon.db")
+        self.conn = get_connection("auto_salon.db")
         self.cursor = self.conn.cursor()
         
         self.cursor.execute('''
@@ -95,10 +154,11 @@ class AutoSalonApp:
                 longitude REAL NOT NULL
             )
         ''')
+        migrate(self.conn, 'auto_salon.db')
+        self.service = AutoSalonService(self.conn)
 
     def create_clients_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Клиенты")
+        tab = self.tabs["Клиенты"]
         
         main_frame = ttk.Frame(tab, padding=10)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -135,8 +195,7 @@ class AutoSalonApp:
         self.update_clients_list()
 
     def create_cars_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Автомобили")
+        tab = self.tabs["Автомобили"]
         
         main_frame = ttk.Frame(tab)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -179,6 +238,8 @@ class AutoSalonApp:
                   ).pack(side=tk.TOP, pady=2)
         ttk.Button(btn_frame, text="Удалить", command=self.delete_car, width=12
                   ).pack(side=tk.TOP, pady=2)
+        ttk.Button(btn_frame, text="Импорт из CSV", command=self.import_cars, width=12
+                  ).pack(side=tk.TOP, pady=2)
 
         tree_frame = ttk.Frame(main_frame)
         tree_frame.grid(row=0, column=1, sticky="nswe")
@@ -198,8 +259,7 @@ class AutoSalonApp:
         self.update_cars_list()
 
     def create_sales_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Продажи")
+        tab = self.tabs["Продажи"]
         
         main_frame = ttk.Frame(tab, padding=10)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -208,11 +268,13 @@ class AutoSalonApp:
         input_frame.pack(fill=tk.X, pady=5)
 
         ttk.Label(input_frame, text="Клиент:").grid(row=0, column=0, padx=5, sticky="w")
-        self.client_combobox = ttk.Combobox(input_frame, width=35)
+        self.client_combobox = AutocompleteCombobox(input_frame, self.queries, 'clients', width=35)
         self.client_combobox.grid(row=0, column=1, padx=5, sticky="w")
 
         ttk.Label(input_frame, text="Автомобиль:").grid(row=0, column=2, padx=5, sticky="w")
-        self.car_combobox = ttk.Combobox(input_frame, width=35)
+        self.car_combobox = AutocompleteCombobox(input_frame, self.queries, 'cars',
+                                                 "brand || ' ' || model || ' (' || year || ')'", 'brand',
+                                                 where="status = 'В наличии'", width=35)
         self.car_combobox.grid(row=0, column=3, padx=5, sticky="w")
 
         ttk.Label(input_frame, text="Дата:").grid(row=1, column=0, padx=5, sticky="w")
@@ -232,22 +294,17 @@ class AutoSalonApp:
         tree_frame.pack(fill=tk.BOTH, expand=True)
 
         columns = ("ID", "Клиент", "Автомобиль", "Комплектация", "Дата", "Сумма")
-        self.sales_tree = ttk.Treeview(tree_frame, columns=columns, show="headings")
+        self.sales_tree = VirtualTreeview(tree_frame, self.conn, SALES_QUERY, columns=columns, key="ID")
         for col in columns:
             self.sales_tree.heading(col, text=col)
             self.sales_tree.column(col, width=150, anchor=tk.W)
         
-        vsb = ttk.Scrollbar(tree_frame, orient="vertical", command=self.sales_tree.yview)
-        self.sales_tree.configure(yscrollcommand=vsb.set)
-        
         self.sales_tree.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        vsb.pack(side=tk.RIGHT, fill=tk.Y)
         
         self.update_sales_list()
 
     def create_map_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Карта")
+        tab = self.tabs["Карта"]
         
         main_frame = ttk.Frame(tab)
         main_frame.pack(fill=tk.BOTH, expand=True)
@@ -296,96 +353,83 @@ class AutoSalonApp:
         self.update_map_markers()
 
     def add_client(self):
-        self.cursor.execute("INSERT INTO clients (name, phone, reg_date) VALUES (?, ?, ?)",
-                          (self.client_name_entry.get(),
-                           self.client_phone_entry.get(),
-                           datetime.now().strftime("%Y-%m-%d")))
-        self.conn.commit()
+        self.service.add_client(self.client_name_entry.get(),
+                                self.client_phone_entry.get(),
+                                datetime.now().strftime("%Y-%m-%d"))
         self.update_clients_list()
-        self.update_comboboxes()
+        self.notebook.mark_stale(self.tabs["Продажи"])
 
     def update_clients_list(self):
-        self.clients_tree.delete(*self.clients_tree.get_children())
-        for row in self.cursor.execute("SELECT * FROM clients"):
-            self.clients_tree.insert("", tk.END, values=row)
+        show_loading(self.clients_tree, keep_rows=True)
+        stream_tree(self.queries, 'clients', self.clients_tree, "SELECT * FROM clients")
 
     def add_car(self):
-        self.cursor.execute('''
-            INSERT INTO cars 
-            (brand, model, year, color, engine_type, mileage, trim_level, price, status)
-            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)''',
-                          (self.car_brand_entry.get(),
-                           self.car_model_entry.get(),
-                           self.car_year_entry.get(),
-                           self.car_color_entry.get(),
-                           self.car_engine_entry.get(),
-                           self.car_mileage_entry.get(),
-                           self.car_trim_combobox.get(),
-                           self.car_price_entry.get(),
-                           self.car_status_combobox.get()))
-        self.conn.commit()
+        self.service.add_car(self.car_brand_entry.get(),
+                             self.car_model_entry.get(),
+                             self.car_year_entry.get(),
+                             self.car_color_entry.get(),
+                             self.car_engine_entry.get(),
+                             self.car_mileage_entry.get(),
+                             self.car_trim_combobox.get(),
+                             self.car_price_entry.get(),
+                             self.car_status_combobox.get())
         self.update_cars_list()
-        self.update_comboboxes()
+        self.notebook.mark_stale(self.tabs["Продажи"])
+
+    def import_cars(self):
+        def done(result):
+            self.update_cars_list()
+            self.notebook.mark_stale(self.tabs["Продажи"])
+        ask_import(self.root, self.queries, 'auto_salon.db', on_done=done)
 
     def delete_car(self):
         selected_item = self.cars_tree.selection()
         if selected_item:
             car_id = self.cars_tree.item(selected_item)['values'][0]
-            self.cursor.execute("DELETE FROM cars WHERE id=?", (car_id,))
-            self.conn.commit()
+            self.service.delete_car(car_id)
             self.update_cars_list()
-            self.update_comboboxes()
+            self.notebook.mark_stale(self.tabs["Продажи"])
 
     def update_cars_list(self):
-        self.cars_tree.delete(*self.cars_tree.get_children())
-        for row in self.cursor.execute("SELECT * FROM cars"):
-            self.cars_tree.insert("", tk.END, values=row)
+        show_loading(self.cars_tree, keep_rows=True)
+        self.queries.submit('cars', "SELECT * FROM cars", on_done=self.fill_cars_list)
+
+    def fill_cars_list(self, rows):
+        sync_tree(self.cars_tree, rows)
 
     def add_sale(self):
-        client_id = self.client_combobox.get().split(":")[0]
-        car_id = self.car_combobox.get().split(":")[0]
+        client_id = self.client_combobox.get_id()
+        car_id = self.car_combobox.get_id()
+        if client_id is None or car_id is None:
+            messagebox.showerror("Ошибка", "Выберите клиента и автомобиль из списка")
+            return
         
-        self.cursor.execute("INSERT INTO sales (client_id, car_id, sale_date, amount) VALUES (?, ?, ?, ?)",
-                          (client_id,
-                           car_id,
-                           self.sale_date_entry.get_date(),
-                           self.sale_amount_entry.get()))
-        self.conn.commit()
+        self.service.sell(client_id, car_id, self.sale_date_entry.get_date(), self.sale_amount_entry.get())
         self.update_sales_list()
 
     def update_sales_list(self):
-        self.sales_tree.delete(*self.sales_tree.get_children())
-        query = '''SELECT sales.id, clients.name, cars.model, cars.trim_level, sales.sale_date, sales.amount 
-                   FROM sales 
-                   JOIN clients ON sales.client_id = clients.id
-                   JOIN cars ON sales.car_id = cars.id'''
-        for row in self.cursor.execute(query):
-            self.sales_tree.insert("", tk.END, values=row)
+        self.sales_tree.refresh()
 
     def update_comboboxes(self):
-        clients = [f"{row[0]}: {row[1]}" for row in self.cursor.execute("SELECT id, name FROM clients")]
-        self.client_combobox['values'] = clients
-        
-        cars = [f"{row[0]}: {row[1]} {row[2]} ({row[3]})" 
-               for row in self.cursor.execute("SELECT id, brand, model, year FROM cars WHERE status='В наличии'")]
-        self.car_combobox['values'] = cars
+        self.client_combobox.refresh()
+        self.car_combobox.refresh()
 
     def add_location(self):
         try:
             lat = float(self.location_lat_entry.get())
             lon = float(self.location_lon_entry.get())
-            self.cursor.execute("INSERT INTO locations (name, latitude, longitude) VALUES (?, ?, ?)",
-                              (self.location_name_entry.get(), lat, lon))
-            self.conn.commit()
+            self.service.add_location(self.location_name_entry.get(), lat, lon)
             self.update_map_markers()
             self.update_locations_list()
         except ValueError:
             print("Ошибка: Широта и долгота должны быть числами")
 
     def update_locations_list(self):
-        self.locations_tree.delete(*self.locations_tree.get_children())
-        for row in self.cursor.execute("SELECT * FROM locations"):
-            self.locations_tree.insert("", tk.END, values=row)
+        show_loading(self.locations_tree, keep_rows=True)
+        self.queries.submit('locations', "SELECT * FROM locations", on_done=self.fill_locations_list)
+
+    def fill_locations_list(self, rows):
+        sync_tree(self.locations_tree, rows)
 
     def update_map_markers(self):
         self.map_widget.delete_all_marker()
@@ -400,4 +444,5 @@ class AutoSalonApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = AutoSalonApp(root)
+    tracing.install(root)
     root.mainloop()
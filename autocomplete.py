@@ -0,0 +1,105 @@
+from tkinter import ttk
+
+# Поле выбора с подсказками: вместо загрузки всей таблицы в ['values'] по мере
+# ввода запрашиваются AUTOCOMPLETE_LIMIT записей, начинающихся с набранного
+# текста. Префикс ищется диапазоном по индексу (column >= 'Ива' AND column < 'Ивб'):
+# LIKE 'ива%' не сворачивает регистр кириллицы и по индексу с BINARY не идет,
+# поэтому вместо него проверяются варианты регистра ввода ("ива" -> "ива", "Ива")
+AUTOCOMPLETE_LIMIT = 20
+DEBOUNCE_MS = 150
+NAVIGATION_KEYS = ('Up', 'Down', 'Return', 'KP_Enter', 'Tab', 'Escape', 'Left', 'Right', 'Home', 'End',
+                   'Shift_L', 'Shift_R', 'Control_L', 'Control_R', 'Alt_L', 'Alt_R')
+
+
+def _variants(text):
+    variants = [text, text[:1].upper() + text[1:], text.title(), text.lower()]
+    return [variant for i, variant in enumerate(variants) if variant and variant not in variants[:i]]
+
+
+def _next_prefix(prefix):
+    # Наименьшая строка больше всех строк, начинающихся с prefix
+    return prefix[:-1] + chr(ord(prefix[-1]) + 1)
+
+
+def prefix_query(table, label, column, key='id', where=None, text='', limit=AUTOCOMPLETE_LIMIT):
+    # SQL и параметры: до limit строк (id, подпись) с column, начинающимся с text.
+    # По подзапросу на вариант регистра, каждый - диапазон по индексу с LIMIT
+    condition = f" AND ({where})" if where else ''
+    variants = _variants(text)
+    if not variants:
+        return (f"SELECT {key}, {label} FROM {table} WHERE {column} IS NOT NULL{condition} "
+                f"ORDER BY {column} LIMIT ?", (limit,))
+    parts = []
+    params = []
+    for variant in variants:
+        parts.append(f"SELECT * FROM (SELECT {key} AS key, {label} AS label, {column} AS sort FROM {table} "
+                     f"WHERE {column} >= ? AND {column} < ?{condition} ORDER BY {column} LIMIT ?)")
+        params += [variant, _next_prefix(variant), limit]
+    return f"SELECT key, label FROM ({' UNION '.join(parts)}) ORDER BY sort LIMIT ?", tuple(params) + (limit,)
+
+
+class AutocompleteCombobox(ttk.Combobox):
+    # Combobox с подсказками из table: label - выражение подписи, column -
+    # индексированный столбец для поиска по префиксу (по умолчанию label),
+    # where - постоянное условие. Выбранная запись - get_id(), без повторного
+    # поиска id по имени. Запросы идут через QueryExecutor приложения
+    def __init__(self, master, queries, table, label='name', column=None, key='id', where=None,
+                 limit=AUTOCOMPLETE_LIMIT, **options):
+        super().__init__(master, **options)
+        self.queries = queries
+        self.table = table
+        self.label = label
+        self.column = column or label
+        self.key = key
+        self.where = where
+        self.limit = limit
+        self._ids = {}
+        self._selected = (None, None)
+        self._after_id = None
+        self.bind('<KeyRelease>', self._on_key, add='+')
+        self.bind('<<ComboboxSelected>>', lambda e: self._remember(self.get()), add='+')
+
+    def _on_key(self, event):
+        if event.keysym in NAVIGATION_KEYS:
+            return
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(DEBOUNCE_MS, self.refresh)
+
+    def refresh(self):
+        # Перезапросить подсказки для текущего текста (и после изменения таблицы)
+        self._after_id = None
+        sql, params = prefix_query(self.table, self.label, self.column, self.key, self.where,
+                                   self.get().strip(), self.limit)
+        self.queries.submit(f'autocomplete-{self}', sql, params, on_done=self._fill)
+
+    def _fill(self, rows):
+        labels = [str(label) for key, label in rows]
+        ids = {}
+        for (key, label), text in zip(rows, labels):
+            # Одинаковые подписи (тезки) различаются по id
+            if labels.count(text) > 1:
+                text = f"{text} (#{key})"
+            ids[text] = key
+        self._ids = ids
+        self['values'] = list(ids)
+
+    def _remember(self, label):
+        self._selected = (label, self._ids.get(label))
+
+    def get_id(self):
+        # id выбранной записи; None, если текст не совпадает ни с одной подсказкой
+        text = self.get()
+        if text in self._ids:
+            return self._ids[text]
+        return self._selected[1] if self._selected[0] == text else None
+
+    def select(self, key, label):
+        # Показать запись, выбранную в другом месте (например, строку дерева)
+        label = '' if label is None else str(label)
+        self._selected = (label, key)
+        self.set(label)
+
+    def clear(self):
+        self._selected = (None, None)
+        self.set('')
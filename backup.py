@@ -0,0 +1,234 @@
+import argparse
+import os
+import re
+import shutil
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+import apps
+from outbox import renew_epoch
+
+# Резервные копии баз без закрытия приложений через sqlite3 backup API.
+# В режиме WAL база копируется за один шаг: чтение снимка не мешает записи.
+# В режиме с журналом отката чтение блокирует коммиты, поэтому копия идет по
+# PAGES_PER_STEP страниц, между шагами блокировка отпускается, а пауза PAUSE_S
+# дает транзакциям приложения пройти. Если в базу пишет другое соединение,
+# SQLite начинает копирование заново - снимок всегда согласован. После
+# MAX_RESTARTS перезапусков шаг увеличивается в STEP_GROWTH раз (до всей базы
+# за шаг), чтобы копия завершалась и при частых продажах
+PAGES_PER_STEP = 256
+PAUSE_S = 0.005
+MAX_RESTARTS = 3
+STEP_GROWTH = 8
+DIRECTORY = 'backups'
+KEEP = 7
+INTERVAL_S = 3600
+STAMP = '%Y%m%d-%H%M%S'
+SNAPSHOT = re.compile(r'(.+)-\d{8}-\d{6}(\.[^.]+)')
+
+
+class _Restarted(Exception):
+    def __init__(self, total):
+        self.total = total
+
+
+def copy_database(source, target, pages=PAGES_PER_STEP, pause=PAUSE_S, progress=None):
+    # Скопировать базу source в файл target через backup API.
+    # Возвращает число перезапусков копирования из-за записи в source
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(target)
+    try:
+        if src.execute("PRAGMA journal_mode").fetchone()[0] == 'wal':
+            pages = -1
+        restarts = 0
+        while True:
+            remaining = None
+            attempt_restarts = 0
+
+            def step(status, left, total):
+                nonlocal remaining, attempt_restarts
+                # Шаг без продвижения - тоже перезапуск: запись между шагами
+                # может каждый раз возвращать копию к той же странице
+                if remaining is not None and left >= remaining:
+                    attempt_restarts += 1
+                    if attempt_restarts > MAX_RESTARTS and pages > 0:
+                        raise _Restarted(total)
+                remaining = left
+                if progress:
+                    progress(total - left, total)
+                if pause and left:
+                    time.sleep(pause)
+
+            try:
+                src.backup(dst, pages=pages, progress=step)
+                return restarts + attempt_restarts
+            except _Restarted as e:
+                restarts += attempt_restarts
+                pages = -1 if pages * STEP_GROWTH >= e.total else pages * STEP_GROWTH
+    finally:
+        dst.close()
+        src.close()
+
+
+def snapshot_name(path, moment=None):
+    stem, ext = os.path.splitext(os.path.basename(path))
+    return f"{stem}-{(moment or datetime.now()).strftime(STAMP)}{ext}"
+
+
+def database_name(snapshot):
+    # Имя файла базы, с которой снят снимок
+    match = SNAPSHOT.fullmatch(os.path.basename(snapshot))
+    return match.group(1) + match.group(2) if match else None
+
+
+def snapshots(path, directory=DIRECTORY):
+    # Снимки базы path от старых к новым
+    if not os.path.isdir(directory):
+        return []
+    name = os.path.basename(path)
+    return [os.path.join(directory, snapshot) for snapshot in sorted(os.listdir(directory))
+            if database_name(snapshot) == name]
+
+
+def backup(path, directory=DIRECTORY, keep=KEEP, **options):
+    # Снимок базы path в directory; хранятся keep последних снимков.
+    # Снимок пишется во временный файл и переименовывается только целым
+    os.makedirs(directory, exist_ok=True)
+    target = os.path.join(directory, snapshot_name(path))
+    partial = target + '.part'
+    try:
+        restarts = copy_database(path, partial, **options)
+        os.replace(partial, target)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    for old in snapshots(path, directory)[:-keep] if keep else []:
+        os.remove(old)
+    return target, restarts
+
+
+def restore(snapshot, path, **options):
+    # Вернуть базу path к снимку. Копирование идет через backup API в саму
+    # базу, поэтому открытые соединения приложения увидят восстановленные данные
+    # после своей текущей транзакции. У outbox после восстановления новая эпоха:
+    # id outbox откатываются вместе с базой. Эпоха меняется во временной копии
+    # снимка до копирования в базу, чтобы продажа сразу после восстановления не
+    # получила старую эпоху
+    check = sqlite3.connect(f"file:{os.path.abspath(snapshot)}?mode=ro", uri=True)
+    try:
+        if check.execute("PRAGMA quick_check").fetchone()[0] != 'ok':
+            raise sqlite3.DatabaseError(f"снимок поврежден: {snapshot}")
+    finally:
+        check.close()
+    with tempfile.TemporaryDirectory() as tmp:
+        copy = os.path.join(tmp, os.path.basename(path))
+        shutil.copyfile(snapshot, copy)
+        conn = sqlite3.connect(copy)
+        try:
+            with conn:
+                renew_epoch(conn)
+        finally:
+            conn.close()
+        return copy_database(copy, path, **options)
+
+
+class BackupScheduler:
+    # Фоновый поток: раз в interval_s секунд снимки всех существующих баз paths
+    def __init__(self, paths, directory=DIRECTORY, interval_s=INTERVAL_S, keep=KEEP, log=None):
+        self.paths = list(paths)
+        self.directory = directory
+        self.interval_s = interval_s
+        self.keep = keep
+        self.log = log or (lambda message: None)
+        self.last = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='backup', daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.wait(self.interval_s):
+            self.backup_all()
+
+    def backup_all(self):
+        for path in self.paths:
+            if self._stop.is_set():
+                break
+            if not os.path.exists(path):
+                continue
+            try:
+                start = time.perf_counter()
+                target, restarts = backup(path, self.directory, self.keep)
+                self.last[path] = target
+                self.log(f"{path} -> {target} за {time.perf_counter() - start:.1f} с, перезапусков: {restarts}")
+            except (sqlite3.Error, OSError) as e:
+                self.log(f"{path}: ошибка резервного копирования: {e}")
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Резервные копии баз приложений")
+    parser.add_argument('--dir', default=DIRECTORY, help="каталог снимков")
+    commands = parser.add_subparsers(dest='command', required=True)
+    backup_parser = commands.add_parser('backup', help="снять снимки баз")
+    backup_parser.add_argument('apps', nargs='*', help="модули или файлы баз (по умолчанию все)")
+    backup_parser.add_argument('--keep', type=int, default=KEEP, help="сколько снимков хранить")
+    schedule_parser = commands.add_parser('schedule', help="снимать снимки по расписанию")
+    schedule_parser.add_argument('apps', nargs='*')
+    schedule_parser.add_argument('--keep', type=int, default=KEEP)
+    schedule_parser.add_argument('--interval', type=float, default=INTERVAL_S, help="интервал, с")
+    list_parser = commands.add_parser('list', help="список снимков")
+    list_parser.add_argument('apps', nargs='*')
+    restore_parser = commands.add_parser('restore', help="восстановить базу из снимка")
+    restore_parser.add_argument('snapshot')
+    restore_parser.add_argument('--db', help="файл базы (по умолчанию по имени снимка)")
+    args = parser.parse_args()
+
+    if args.command == 'restore':
+        path = args.db or database_name(args.snapshot)
+        if not path:
+            print(f"Не удалось определить базу снимка {args.snapshot}, укажите --db")
+            return 1
+        try:
+            restore(args.snapshot, path)
+        except sqlite3.Error as e:
+            print(f"Не удалось восстановить {path}: {e}")
+            return 1
+        print(f"{path} восстановлена из {args.snapshot}")
+        return 0
+
+    paths = [apps.get_app(name).db for name in args.apps] or [app.db for app in apps.APPS]
+    if args.command == 'list':
+        for path in paths:
+            for snapshot in snapshots(path, args.dir):
+                print(f"{snapshot}  {os.path.getsize(snapshot) // 1024} КБ")
+        return 0
+    scheduler = BackupScheduler(paths, args.dir, keep=args.keep, log=print)
+    if args.command == 'backup':
+        scheduler.backup_all()
+        return 0
+    scheduler.interval_s = args.interval
+    scheduler.backup_all()
+    scheduler.start()
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        scheduler.stop()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
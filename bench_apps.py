@@ -0,0 +1,394 @@
+import argparse
+import csv
+import json
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import tkinter as tk
+from collections import namedtuple
+from datetime import date, timedelta
+from tkinter import ttk, messagebox
+
+import apps
+import datagen
+from lazy_tabs import LazyNotebook
+from query_executor import QueryExecutor
+
+# Действие сценария: вид (startup/refresh/report/write), метод приложения,
+# значения полей ввода перед вызовом, подготовка (не замеряется) и аргументы
+Action = namedtuple('Action', 'kind name fields setup args', defaults=((), None, ()))
+# Значение поля: первый элемент списка, комбобокса или дерева
+FIRST = object()
+TODAY = date.today()
+PERIOD = {'start_date': TODAY - timedelta(days=90), 'end_date': TODAY}
+
+SCENARIOS = {
+    'Bakery': [
+        Action('refresh', 'load_menu'),
+        Action('refresh', 'load_orders'),
+        Action('report', 'generate_report', PERIOD),
+        Action('write', 'create_order', {'order_item': FIRST, 'order_quantity': 2}),
+        Action('write', 'add_item', {'item_name': "Круассан", 'item_price': 120}),
+    ],
+    'CleaningApp': [
+        Action('refresh', 'load_services'),
+        Action('refresh', 'load_orders'),
+        Action('refresh', 'load_employees'),
+        Action('write', 'create_order', {'order_service': FIRST, 'order_employee': FIRST,
+                                         'order_client': "Иванов Иван", 'order_date': TODAY}),
+        Action('write', 'add_service', {'service_name': "Мойка окон", 'service_price': 1500}),
+    ],
+    'ComputerClub': [
+        Action('refresh', 'updateComputersList'),
+        Action('refresh', 'updateRoomsList'),
+        Action('refresh', 'showComputers', {'room_combo': FIRST}),
+        Action('report', 'generateReport', PERIOD),
+        Action('write', 'saveComputer', {'computer_name': "ПК", 'computer_desc': "RTX 4060"}),
+        Action('write', 'saveRoom', {'room_name': "Зал", 'computer_combo': FIRST,
+                                     'room_quantity': 10, 'room_price': 150}),
+    ],
+    'FitnesClub': [
+        Action('refresh', 'load_members'),
+        Action('refresh', 'load_subscriptions'),
+        Action('refresh', 'load_sales'),
+        Action('report', 'update_stats'),
+        Action('write', 'add_marker', {'lat_entry': 55.75, 'lon_entry': 37.62, 'marker_text_entry': "Зал"}),
+    ],
+    'JewelryStore': [
+        Action('refresh', 'load_products'),
+        Action('refresh', 'load_orders'),
+        Action('refresh', 'load_addresses'),
+        Action('report', 'generate_report', PERIOD),
+        Action('write', 'create_order', {'order_product': FIRST, 'order_quantity': 1}),
+        Action('write', 'add_product', {'product_name': "Кольцо", 'product_price': 25000,
+                                        'product_description': "Золото 585"}),
+    ],
+    'ServiceCenter': [
+        Action('refresh', 'load_clients'),
+        Action('refresh', 'load_equipment'),
+        Action('refresh', 'load_requests'),
+        Action('report', 'generate_report', {'report_type': FIRST}),
+        Action('write', 'add_request', {'request_client': FIRST, 'request_equipment': FIRST,
+                                        'request_desc': "Не включается"}),
+        Action('write', 'add_client', {'client_name': "Иванов Иван", 'client_phone': "+7 900 000-00-00",
+                                       'client_email': "ivanov@mail.ru"}),
+    ],
+    'SportStore': [
+        Action('refresh', 'load_products'),
+        Action('refresh', 'load_orders'),
+        Action('refresh', 'load_clients'),
+        Action('report', 'generate_report', PERIOD),
+        Action('write', 'create_order', {'order_product': FIRST, 'order_quantity': 1},
+               setup=lambda app: app.add_to_cart()),
+        Action('write', 'add_client', {'client_name': "Иванов Иван", 'client_phone': "+7 900 000-00-00",
+                                       'client_email': "ivanov@mail.ru"}),
+    ],
+    'Warehouse': [
+        Action('refresh', 'update_zones_list'),
+        Action('refresh', 'update_suppliers_list'),
+        Action('refresh', 'load_zone_goods', args=(1,)),
+        Action('report', 'generate_report', PERIOD),
+        Action('write', 'add_goods', {'goods_name': "Паллета", 'goods_quantity': 10, 'supplier_combo': FIRST,
+                                      'zone_combo': FIRST, 'goods_date': TODAY}),
+    ],
+    'YaCofee': [
+        Action('refresh', 'update_employee_list'),
+        Action('refresh', 'update_orders_list'),
+        Action('refresh', 'update_inventory_list'),
+        Action('refresh', 'update_points_list'),
+        Action('report', 'generate_report'),
+        Action('write', 'add_order', {'employee_combobox': FIRST, 'items_listbox': FIRST,
+                                      'order_amount_var': 350}),
+        Action('write', 'add_item', {'item_name_entry': "Латте", 'item_price_entry': 250,
+                                     'item_quantity_entry': 100}),
+    ],
+    'auto': [
+        Action('refresh', 'update_clients_list'),
+        Action('refresh', 'update_cars_list'),
+        Action('refresh', 'update_sales_list'),
+        Action('refresh', 'update_locations_list'),
+        Action('write', 'add_sale', {'client_combobox': FIRST, 'car_combobox': FIRST,
+                                     'sale_amount_entry': 2500000, 'sale_date_entry': TODAY}),
+        Action('write', 'add_car', {'car_brand_entry': "Kia", 'car_model_entry': "Rio", 'car_year_entry': 2023,
+                                    'car_color_entry': "Белый", 'car_engine_entry': "Бензин",
+                                    'car_mileage_entry': 0, 'car_price_entry': 1900000,
+                                    'car_trim_combobox': FIRST, 'car_status_combobox': FIRST}),
+    ],
+    'fishing': [
+        Action('refresh', 'update_products_tree'),
+        Action('refresh', 'update_suppliers_tree'),
+        Action('refresh', 'update_customers_tree'),
+        Action('refresh', 'update_orders_tree'),
+        Action('write', 'create_order', {'order_customer': FIRST, 'order_product': FIRST, 'order_quantity': 1}),
+        Action('write', 'add_customer', {'customer_name': "Иванов Иван", 'customer_phone': "+7 900 000-00-00",
+                                         'customer_email': "ivanov@mail.ru"}),
+    ],
+    'flowers': [
+        Action('refresh', 'update_flowers_tree'),
+        Action('refresh', 'update_suppliers_tree'),
+        Action('refresh', 'update_employees_tree'),
+        Action('refresh', 'update_sales_tree'),
+        Action('refresh', 'update_purchases_tree'),
+        Action('refresh', 'update_locations_tree'),
+        Action('report', 'generate_sales_report', PERIOD),
+        Action('report', 'generate_purchases_report', PERIOD),
+        Action('write', 'add_sale', {'sale_flower': FIRST, 'sale_quantity': 1}),
+        Action('write', 'add_purchase', {'purchase_flower': FIRST, 'purchase_quantity': 50,
+                                         'purchase_supplier': FIRST}),
+    ],
+    'hookahbar': [
+        Action('refresh', 'update_tobacco_list'),
+        Action('refresh', 'update_hookah_list'),
+        Action('refresh', 'update_establishment_list'),
+        Action('report', 'generate_report', PERIOD),
+        Action('write', 'add_tobacco', {'t_name': "Табак", 't_strength': 5, 't_grams': 100}),
+        Action('write', 'add_establishment', {'e_name': "Кальянная", 'e_quantity': 10,
+                                              'e_address': "ул. Мира, д. 1", 'hookah_select': FIRST}),
+    ],
+    'moto': [
+        Action('refresh', 'update_clients_list'),
+        Action('refresh', 'update_bikes_list'),
+        Action('refresh', 'update_sales_list'),
+        Action('report', 'update_stats'),
+        Action('write', 'add_sale', {'sale_entries.client_id': 1, 'sale_entries.bike_id': 1,
+                                     'sale_entries.amount': 500000, 'sale_date': TODAY}),
+        Action('write', 'add_client', {'client_entries.name': "Иванов Иван",
+                                       'client_entries.phone': "+7 900 000-00-00"}),
+    ],
+    'musicshop': [
+        Action('refresh', 'update_products_list'),
+        Action('refresh', 'update_customers_list'),
+        Action('refresh', 'update_sales_list'),
+        Action('report', 'update_stats'),
+        Action('write', 'make_sale', {'customer_combo': FIRST, 'product_combo': FIRST, 'sale_quantity': 1}),
+        Action('write', 'add_product', {'product_name': "Гитара", 'product_price': 15000, 'product_quantity': 5}),
+    ],
+    'pharmacy': [
+        Action('refresh', 'refresh_medicines_list'),
+        Action('refresh', 'refresh_sales_history'),
+        Action('report', 'refresh_statistics'),
+        Action('write', 'process_sale_transaction', {'medicine_selection_combobox': FIRST,
+                                                     'quantity_selection_spinbox': 1,
+                                                     'transaction_date_picker': TODAY}),
+        Action('write', 'add_new_medicine', {'medicine_input_fields.Название препарата:': "Парацетамол",
+                                             'medicine_input_fields.Производитель:': "Фармстандарт",
+                                             'medicine_input_fields.Дата окончания срока:': TODAY + timedelta(days=365),
+                                             'medicine_input_fields.Цена за единицу:': 50,
+                                             'medicine_input_fields.Количество на складе:': 100}),
+    ],
+    'restoration': [
+        Action('refresh', 'update_orders_list'),
+        Action('refresh', 'update_reports_list'),
+        Action('refresh', 'update_report_orders'),
+        Action('write', 'save_order', {'entry_name': "Иванов Иван", 'entry_phone': "+7 900 000-00-00",
+                                       'entry_desc': "Перетяжка кресла", 'entry_order_date': TODAY,
+                                       'entry_deadline': TODAY + timedelta(days=14)}),
+        Action('write', 'save_report', {'report_order_var': "1 - отчет", 'report_text': "Этап выполнен"}),
+    ],
+    'vapeshop': [
+        Action('refresh', 'update_order_trees'),
+        Action('refresh', 'update_vapes_list'),
+        Action('refresh', 'update_liquids_list'),
+        Action('report', 'generate_report'),
+        Action('write', 'checkout', {'vapes_tree': FIRST}, setup=lambda app: app.add_to_cart('vape')),
+        Action('write', 'add_vape', {'vape_entries.Название:': "Вейп", 'vape_entries.Цена:': 2500,
+                                     'vape_entries.Количество:': 10}),
+    ],
+}
+
+
+def resolve(app, path):
+    # 'sale_entries.amount' -> app.sale_entries['amount']
+    name, _, key = path.partition('.')
+    widget = getattr(app, name)
+    return widget[key] if key else widget
+
+
+def set_field(app, path, value):
+    widget = resolve(app, path)
+    if isinstance(widget, tk.Variable):
+        widget.set(value)
+    elif isinstance(widget, tk.Listbox):
+        widget.selection_clear(0, tk.END)
+        widget.selection_set(0)
+    elif isinstance(widget, ttk.Treeview):
+        widget.selection_set(widget.get_children()[:1])
+    elif isinstance(widget, tk.Text):
+        widget.delete('1.0', tk.END)
+        widget.insert('1.0', value)
+    elif hasattr(widget, 'set_date'):
+        widget.set_date(value)
+    elif isinstance(widget, ttk.Combobox):
+        widget.set(widget['values'][0] if value is FIRST else value)
+    else:
+        widget.delete(0, tk.END)
+        widget.insert(0, str(value))
+
+
+def executors(app):
+    return [value for value in vars(app).values() if isinstance(value, QueryExecutor)]
+
+
+def notebooks(app):
+    return [value for value in vars(app).values() if isinstance(value, LazyNotebook)]
+
+
+def wait_idle(root, app, timeout=120):
+    # Дождаться результатов фоновых запросов и перерисовки
+    deadline = time.perf_counter() + timeout
+    root.update()
+    while any(q.busy() for q in executors(app)):
+        if time.perf_counter() > deadline:
+            raise TimeoutError(f"{type(app).__name__}: запросы не завершились за {timeout} с")
+        time.sleep(0.001)
+        root.update()
+    root.update_idletasks()
+
+
+def run_action(root, app, action):
+    for path, value in dict(action.fields).items():
+        set_field(app, path, value)
+    if action.setup is not None:
+        action.setup(app)
+        wait_idle(root, app)
+    start = time.perf_counter()
+    getattr(app, action.name)(*action.args)
+    wait_idle(root, app)
+    return (time.perf_counter() - start) * 1000
+
+
+def silence_dialogs():
+    # Диалоги ждут нажатия кнопки - в замерах они не нужны
+    for name in ('showinfo', 'showwarning', 'showerror'):
+        setattr(messagebox, name, lambda *args, **kwargs: 'ok')
+    for name in ('askyesno', 'askokcancel', 'askquestion'):
+        setattr(messagebox, name, lambda *args, **kwargs: True)
+
+
+def start_display():
+    # Без DISPLAY запускаем виртуальный X-сервер, если он установлен
+    if os.environ.get('DISPLAY') or sys.platform in ('win32', 'darwin'):
+        return None
+    if shutil.which('Xvfb') is None:
+        sys.exit("Нет DISPLAY и не найден Xvfb")
+    display = ':99'
+    server = subprocess.Popen(['Xvfb', display, '-screen', '0', '1600x1000x24'],
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    os.environ['DISPLAY'] = display
+    time.sleep(1)
+    return server
+
+
+def bench_app(app, repeat, log):
+    root = tk.Tk()
+    root.withdraw()
+    results = []
+    try:
+        start = time.perf_counter()
+        instance = apps.create(app, root)
+        window = apps.window(app, instance, root)
+        window.withdraw()
+        wait_idle(window, instance)
+        # __init__ - время до первого интерактивного кадра (строится только первая вкладка);
+        # build_all - достройка остальных вкладок, которые нужны сценарию
+        results.append(('startup', '__init__', [(time.perf_counter() - start) * 1000]))
+        start = time.perf_counter()
+        for notebook in notebooks(instance):
+            notebook.build_all()
+        wait_idle(window, instance)
+        results.append(('startup', 'build_all', [(time.perf_counter() - start) * 1000]))
+
+        for action in SCENARIOS[app.module]:
+            times = []
+            for _ in range(repeat):
+                times.append(run_action(window, instance, action))
+            results.append((action.kind, action.name, times))
+        for queries in executors(instance):
+            queries.close()
+    finally:
+        root.destroy()
+
+    rows = []
+    for kind, name, times in results:
+        row = {'app': app.module, 'kind': kind, 'action': name, 'runs': len(times),
+               'median_ms': round(statistics.median(times), 2), 'max_ms': round(max(times), 2)}
+        rows.append(row)
+        log(f"  {kind:<8}{name:<28}{row['median_ms']:>10.1f}{row['max_ms']:>10.1f}")
+    return rows
+
+
+def commit_id():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                              cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        return ''
+
+
+def compare(rows, baseline_path):
+    # Сравнение с результатами прошлого запуска (JSON)
+    with open(baseline_path, encoding='utf-8') as f:
+        baseline = {(r['app'], r['kind'], r['action']): r['median_ms'] for r in json.load(f)['results']}
+    print(f"\nСравнение с {baseline_path}:")
+    for row in rows:
+        old = baseline.get((row['app'], row['kind'], row['action']))
+        if old:
+            change = (row['median_ms'] - old) / old * 100
+            print(f"  {row['app']:<14}{row['action']:<28}{old:>10.1f}{row['median_ms']:>10.1f}{change:>+9.0f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры приложений на синтетических данных")
+    parser.add_argument('apps', nargs='*', help="модули приложений (по умолчанию все)")
+    parser.add_argument('--dir', help="каталог с базами datagen (по умолчанию временный)")
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', help="файл результатов JSON")
+    parser.add_argument('--csv', help="файл результатов CSV")
+    parser.add_argument('--baseline', help="JSON прошлого запуска для сравнения")
+    args = parser.parse_args()
+
+    selected = [apps.get_app(name) for name in args.apps] or apps.APPS
+    output = {name: os.path.abspath(path) for name, path in (('json', args.json), ('csv', args.csv),
+                                                             ('baseline', args.baseline)) if path}
+    directory = os.path.abspath(args.dir) if args.dir else tempfile.mkdtemp(prefix='bench_')
+    os.makedirs(directory, exist_ok=True)
+    server = start_display()
+    silence_dialogs()
+    # Приложения открывают базы по относительным путям
+    os.chdir(directory)
+    rows = []
+    try:
+        for app in selected:
+            if not os.path.exists(app.db):
+                datagen.generate(app, directory, args.clients, args.products, args.rows)
+            print(f"{app.module} ({app.db}):")
+            rows.extend(bench_app(app, args.repeat, print))
+    finally:
+        if server is not None:
+            server.terminate()
+
+    meta = {'commit': commit_id(), 'clients': args.clients, 'products': args.products, 'rows': args.rows,
+            'repeat': args.repeat, 'time': time.strftime('%Y-%m-%d %H:%M:%S')}
+    if 'json' in output:
+        with open(output['json'], 'w', encoding='utf-8') as f:
+            json.dump({'meta': meta, 'results': rows}, f, ensure_ascii=False, indent=2)
+    if 'csv' in output:
+        with open(output['csv'], 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=['commit', 'app', 'kind', 'action', 'runs', 'median_ms', 'max_ms'])
+            writer.writeheader()
+            for row in rows:
+                writer.writerow(dict(row, commit=meta['commit']))
+    if 'baseline' in output:
+        compare(rows, output['baseline'])
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,77 @@
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import apps
+import archive
+import datagen
+from bench_report_cache import REPORT_QUERIES
+
+# Список заказов Bakery (VirtualTreeview считает строки и читает страницу по created_at)
+ORDERS_QUERY = '''SELECT orders.id AS id, menu.name AS item, orders.quantity AS quantity, orders.status AS status,
+                         orders.created_at AS created_at FROM orders JOIN menu ON orders.item_id = menu.id'''
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def measure(conn, repeat):
+    today = date.today()
+    results = {}
+
+    def orders_list():
+        conn.execute(f"SELECT COUNT(*) FROM ({ORDERS_QUERY})").fetchone()
+        conn.execute(f"SELECT * FROM ({ORDERS_QUERY}) ORDER BY created_at DESC LIMIT 100").fetchall()
+
+    def report(days):
+        def run():
+            start, end = today - timedelta(days=days), today
+            for sql in REPORT_QUERIES:
+                conn.execute(sql, (start, end)).fetchall()
+        return run
+
+    results['список заказов'] = timed(orders_list, repeat)
+    results['отчет за месяц'] = timed(report(30), repeat)
+    results['отчет за 2 года'] = timed(report(730), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Списки и отчеты Bakery до и после архивации")
+    parser.add_argument('--rows', type=int, default=400000)
+    parser.add_argument('--days', type=int, default=1460, help="период дат заказов")
+    parser.add_argument('--horizon-days', type=int, default=archive.HORIZON_DAYS)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('Bakery')
+        path = datagen.generate(app, tmp, rows=args.rows, days=args.days, log=lambda *a: None)
+        conn = sqlite3.connect(path)
+        before = measure(conn, args.repeat)
+        start = time.perf_counter()
+        moved = archive.archive(path, args.horizon_days)
+        elapsed = time.perf_counter() - start
+        after = measure(conn, args.repeat)
+        live = conn.execute("SELECT COUNT(*) FROM orders").fetchone()[0]
+        conn.close()
+
+    print(f"{args.rows} заказов за {args.days} дн.; в архив перенесено {moved} за {elapsed:.1f} с, в базе {live}")
+    print(f"{'':<20}{'до, мс':>10}{'после, мс':>12}")
+    for name in before:
+        print(f"{name:<20}{before[name]:>10.2f}{after[name]:>12.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
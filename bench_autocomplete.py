@@ -0,0 +1,56 @@
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import apps
+import autocomplete
+import datagen
+
+# Список клиентов service_center.db для поля выбора: вся таблица в ['values']
+# (как было) и AUTOCOMPLETE_LIMIT подсказок по набранному префиксу
+TERMS = ["", "в", "ва", "вас", "Васильев", "петр", "ИВАНОВ", "нет такого"]
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def load_all(conn):
+    return [f"{row[0]}: {row[1]}" for row in conn.execute("SELECT id, name FROM clients")]
+
+
+def suggest(conn, text):
+    sql, params = autocomplete.prefix_query('clients', 'name', 'name', text=text)
+    return conn.execute(sql, params).fetchall()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Подсказки клиентов: вся таблица и поиск по префиксу")
+    parser.add_argument('--clients', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('ServiceCenter')
+        path = datagen.generate(app, tmp, clients=args.clients, rows=1000, log=lambda *a: None)
+        conn = sqlite3.connect(path)
+        print(f"{app.db}: {args.clients} клиентов")
+        print(f"{'ввод':<16}{'мс':>10}{'строк':>9}")
+        print(f"{'вся таблица':<16}{timed(lambda: load_all(conn), args.repeat):>10.2f}{len(load_all(conn)):>9}")
+        for term in TERMS:
+            ms = timed(lambda: suggest(conn, term), args.repeat)
+            print(f"{term!r:<16}{ms:>10.2f}{len(suggest(conn, term)):>9}")
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+import apps
+import backup
+import datagen
+
+SALE = '''INSERT INTO sales_records (medicine_identifier, sold_quantity, transaction_date, total_amount)
+          VALUES (1, 1, date('now'), 10)'''
+
+
+def till(path, interval, stop, stalls):
+    # Касса: продажа каждые interval секунд; stalls - время каждой транзакции, мс
+    conn = sqlite3.connect(path, timeout=600)
+    while not stop.is_set():
+        start = time.perf_counter()
+        conn.execute(SALE)
+        conn.commit()
+        stalls.append((time.perf_counter() - start) * 1000)
+        stop.wait(interval)
+    conn.close()
+
+
+def run(path, target, interval, repeat, **options):
+    # repeat копий подряд под нагрузкой кассы: среднее время копии, перезапусков
+    # на копию и задержки продаж, пришедшихся на время копирования
+    stop = threading.Event()
+    stalls = []
+    thread = threading.Thread(target=till, args=(path, interval, stop, stalls))
+    thread.start()
+    time.sleep(interval * 3)
+    del stalls[:]
+    start = time.perf_counter()
+    restarts = sum(backup.copy_database(path, target, **options) for _ in range(repeat)) / repeat
+    elapsed = (time.perf_counter() - start) / repeat
+    stop.set()
+    thread.join()
+    if os.path.exists(target):
+        os.remove(target)
+    stalls.sort()
+    return elapsed, restarts, stalls[-1], stalls[int(len(stalls) * 0.99)], statistics.median(stalls)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Задержки кассы (pharmacy) во время резервного копирования")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--interval', type=float, default=0.2, help="пауза между продажами, с")
+    parser.add_argument('--repeat', type=int, default=10, help="копий на замер")
+    parser.add_argument('--pages', type=int, default=backup.PAGES_PER_STEP, help="страниц за шаг")
+    parser.add_argument('--pause', type=float, default=backup.PAUSE_S, help="пауза между шагами, с")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('pharmacy')
+        path = datagen.generate(app, tmp, rows=args.rows, log=lambda *a: None)
+        target = os.path.join(tmp, 'snapshot.db')
+        print(f"{app.db}: {os.path.getsize(path) / 2 ** 20:.0f} МБ, продажа каждые {args.interval * 1000:.0f} мс")
+        print(f"{'':<26}{'копия, с':>10}{'перезапусков':>14}{'макс, мс':>10}{'p99, мс':>10}{'медиана, мс':>13}")
+        for label, options in (("файл целиком", {'pages': -1, 'pause': 0}),
+                               (f"по {args.pages} страниц", {'pages': args.pages, 'pause': args.pause}),
+                               ("WAL, за один шаг", None)):
+            if options is None:
+                conn = sqlite3.connect(path)
+                conn.execute("PRAGMA journal_mode=WAL")
+                conn.close()
+                options = {}
+            elapsed, restarts, worst, p99, median = run(path, target, args.interval, args.repeat, **options)
+            print(f"{label:<26}{elapsed:>10.2f}{restarts:>14.1f}{worst:>10.1f}{p99:>10.1f}{median:>13.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
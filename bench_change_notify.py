@@ -0,0 +1,89 @@
+import argparse
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+
+import apps
+import change_notify
+import datagen
+
+HOUR = 3600
+OLD_INTERVAL = 5
+# Запросы вкладки статистики moto.py (update_stats)
+STATS_QUERIES = [
+    "SELECT COUNT(*) FROM clients",
+    "SELECT COUNT(*) FROM motorcycles WHERE status='В наличии'",
+    "SELECT COUNT(*) FROM motorcycles WHERE status='Продан'",
+    "SELECT SUM(amount) FROM sales",
+]
+
+
+def read_bytes():
+    # Прочитано процессом (rchar, включая страничный кэш ОС); только Linux
+    try:
+        with open('/proc/self/io') as f:
+            return int(next(line for line in f if line.startswith('rchar:')).split()[1])
+    except OSError:
+        return None
+
+
+def measure(tick, ticks):
+    # Стоимость ticks срабатываний таймера подряд: CPU, мс и прочитанные байты
+    bytes_before = read_bytes()
+    cpu_before = time.process_time()
+    for _ in range(ticks):
+        tick()
+    cpu = (time.process_time() - cpu_before) * 1000
+    bytes_after = read_bytes()
+    return cpu / ticks, None if bytes_before is None else (bytes_after - bytes_before) / ticks
+
+
+def watcher_ticks(seconds):
+    # Число опросов data_version за seconds простоя с учетом роста интервала
+    delay, elapsed, ticks = change_notify.POLL_MS, 0, 0
+    while elapsed + delay <= seconds * 1000:
+        elapsed += delay
+        ticks += 1
+        delay = min(delay * 2, change_notify.IDLE_POLL_MS)
+    return ticks
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Стоимость часа простоя вкладки статистики moto.py")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--samples', type=int, default=200, help="срабатываний таймера на замер")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('moto')
+        datagen.generate(app, tmp, clients=args.clients, rows=args.rows, log=lambda *a: None)
+        path = os.path.join(tmp, app.db)
+
+        conn = sqlite3.connect(path)
+
+        def poll_stats():
+            for sql in STATS_QUERIES:
+                conn.execute(sql).fetchone()
+
+        watcher = change_notify.ChangeWatcher(path)
+        old_ticks, new_ticks = HOUR // OLD_INTERVAL, watcher_ticks(HOUR)
+        old_cpu, old_io = measure(poll_stats, args.samples)
+        new_cpu, new_io = measure(watcher.check, args.samples)
+        watcher.stop()
+        conn.close()
+
+    print(f"Час простоя, {args.rows} продаж:")
+    print(f"{'':<28}{'таймер 5 с':>14}{'data_version':>14}")
+    print(f"{'срабатываний':<28}{old_ticks:>14}{new_ticks:>14}")
+    print(f"{'CPU за срабатывание, мс':<28}{old_cpu:>14.3f}{new_cpu:>14.3f}")
+    print(f"{'CPU за час, мс':<28}{old_cpu * old_ticks:>14.0f}{new_cpu * new_ticks:>14.0f}")
+    if old_io is not None:
+        print(f"{'чтение за час, КБ':<28}{old_io * old_ticks / 1024:>14.0f}{new_io * new_ticks / 1024:>14.0f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
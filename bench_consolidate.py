@@ -0,0 +1,43 @@
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import apps
+import consolidate
+import datagen
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводная аналитика: время от числа баз магазинов")
+    parser.add_argument('--rows', type=int, default=20000)
+    parser.add_argument('--copies', type=int, nargs='+', default=[1, 2, 4, 8], help="копий каждой базы (филиалов)")
+    parser.add_argument('--jobs', type=int, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'source')
+        os.makedirs(source)
+        for app in apps.APPS:
+            if app.db in consolidate.SALES:
+                datagen.generate(app, source, rows=args.rows, log=lambda *a: None)
+        print(f"процессов: {args.jobs or os.cpu_count()}, продаж в базе: {args.rows}")
+        print(f"{'баз':>6}{'время, с':>12}{'на базу, мс':>14}")
+        for copies in args.copies:
+            stores = os.path.join(tmp, f'stores{copies}')
+            for i in range(copies):
+                shutil.copytree(source, os.path.join(stores, f'branch{i}'))
+            paths = consolidate.find_stores([stores])
+            start = time.perf_counter()
+            results = consolidate.consolidate(paths, args.jobs)
+            consolidate.write_sqlite(os.path.join(tmp, 'consolidated.db'), results)
+            elapsed = time.perf_counter() - start
+            print(f"{len(paths):>6}{elapsed:>12.2f}{elapsed * 1000 / len(paths):>14.1f}")
+            shutil.rmtree(stores)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
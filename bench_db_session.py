@@ -0,0 +1,76 @@
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import db_session
+
+ROWS = 5000
+REPEAT = 300
+
+# Типичные действия приложений: загрузка меню, поиск по имени, вставка заказа, отчет
+ACTIONS = {
+    'load_menu': ("SELECT * FROM menu", ()),
+    'lookup_item': ("SELECT id FROM menu WHERE name = ?", ('Товар 42',)),
+    'create_order': ("INSERT INTO orders (item_id, quantity, status) VALUES (?, ?, 'Новый')", (42, 1)),
+    'report': ("SELECT COUNT(*) FROM orders WHERE date(created_at) BETWEEN ? AND ?",
+               ('2000-01-01', '2100-01-01')),
+}
+
+
+def prepare(path):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE menu (id INTEGER PRIMARY KEY AUTOINCREMENT, name TEXT, price REAL)")
+    conn.execute('''CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, item_id INTEGER,
+                    quantity INTEGER, status TEXT, created_at DATETIME DEFAULT CURRENT_TIMESTAMP)''')
+    conn.executemany("INSERT INTO menu (name, price) VALUES (?, ?)",
+                     ((f'Товар {i}', i * 1.5) for i in range(ROWS)))
+    conn.executemany("INSERT INTO orders (item_id, quantity, status) VALUES (?, ?, 'Новый')",
+                     ((i % ROWS, 1) for i in range(ROWS)))
+    conn.commit()
+    conn.close()
+
+
+def per_call(path, sql, params):
+    # Как было: новое соединение на каждое действие
+    conn = sqlite3.connect(path)
+    c = conn.cursor()
+    c.execute(sql, params)
+    c.fetchall()
+    conn.commit()
+    conn.close()
+
+
+def shared(path, sql, params):
+    conn = db_session.get_connection(path)
+    c = conn.cursor()
+    c.execute(sql, params)
+    c.fetchall()
+    conn.commit()
+
+
+def measure(func, path, sql, params):
+    samples = []
+    for _ in range(REPEAT):
+        start = time.perf_counter()
+        func(path, sql, params)
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), max(samples)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        prepare(path)
+        print(f"{'действие':<14}{'до, мс':>12}{'после, мс':>12}{'ускорение':>11}")
+        for name, (sql, params) in ACTIONS.items():
+            before, _ = measure(per_call, path, sql, params)
+            after, _ = measure(shared, path, sql, params)
+            print(f"{name:<14}{before:>12.3f}{after:>12.3f}{before / after:>10.1f}x")
+        db_session.close_all()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
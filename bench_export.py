@@ -0,0 +1,65 @@
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import apps
+import datagen
+import export
+
+QUERY = '''SELECT transaction_id, medicine_identifier, sold_quantity, transaction_date, total_amount
+           FROM sales_records ORDER BY transaction_id'''
+
+
+def fetchall_csv(conn, path):
+    # Для сравнения: весь результат в списке, затем запись
+    cursor = conn.execute(QUERY)
+    rows = cursor.fetchall()
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow([d[0] for d in cursor.description])
+        writer.writerows(rows)
+    return len(rows)
+
+
+def measure(func):
+    # Время без трассировки (tracemalloc сильно замедляет), пик памяти - отдельным прогоном
+    start = time.perf_counter()
+    rows = func()
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    func()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return rows, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Выгрузка продаж pharmacy: потоком и через fetchall")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--batch', type=int, default=export.EXPORT_BATCH)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('pharmacy')
+        path = datagen.generate(app, tmp, rows=args.rows, log=lambda *a: None)
+        conn = sqlite3.connect(path)
+        print(f"{'':<22}{'строк':>10}{'время, с':>10}{'строк/с':>12}{'пик памяти, МБ':>16}")
+        for label, func in (
+                ("fetchall + CSV", lambda: fetchall_csv(conn, os.path.join(tmp, 'all.csv'))),
+                ("поток CSV", lambda: export.export_query(conn, QUERY, (), os.path.join(tmp, 'out.csv'),
+                                                          batch=args.batch)),
+                ("поток NDJSON", lambda: export.export_query(conn, QUERY, (), os.path.join(tmp, 'out.ndjson'),
+                                                             batch=args.batch))):
+            rows, elapsed, peak = measure(func)
+            print(f"{label:<22}{rows:>10}{elapsed:>10.2f}{rows / elapsed:>12.0f}{peak / 2 ** 20:>16.1f}")
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,76 @@
+import argparse
+import csv
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import apps
+import bulk_import
+import datagen
+import db_session
+
+
+def price_list(conn, path, rows):
+    # Прайс-лист поставщика: половина позиций уже есть в каталоге (обновление), половина новые
+    names = [row[0] for row in conn.execute("SELECT name FROM products LIMIT ?", (rows // 2,))]
+    suppliers = [row[0] for row in conn.execute("SELECT name FROM suppliers")]
+    names += [f"Новый товар {i}" for i in range(rows - len(names))]
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, delimiter=';')
+        writer.writerow(['name', 'price', 'quantity', 'supplier'])
+        for i, name in enumerate(names):
+            writer.writerow([name, f"{100 + i % 5000},50", i % 300, suppliers[i % len(suppliers)]])
+
+
+def one_by_one(conn, path, rows):
+    # Как форма add_product: запись и commit на каждую строку
+    suppliers = dict(conn.execute("SELECT name, id FROM suppliers"))
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.DictReader(f, delimiter=';')
+        start = time.perf_counter()
+        for count, row in enumerate(reader):
+            if count == rows:
+                break
+            conn.execute("INSERT INTO products (name, price, quantity, supplier_id) VALUES (?, ?, ?, ?)",
+                         (row['name'], float(row['price'].replace(',', '.')), int(row['quantity']),
+                          suppliers[row['supplier']]))
+            conn.commit()
+    return rows / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка прайс-листа в shop.db: по строке и пачками")
+    parser.add_argument('--rows', type=int, default=20000, help="строк в прайс-листе")
+    parser.add_argument('--catalog', type=int, default=50000, help="товаров в каталоге до загрузки")
+    parser.add_argument('--single-rows', type=int, default=1000, help="строк для замера по одной")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('fishing')
+        pristine = datagen.generate(app, tmp, products=args.catalog, rows=10000, log=lambda *a: None)
+        path = os.path.join(tmp, 'work.db')
+        csv_path = os.path.join(tmp, 'prices.csv')
+        conn = db_session.open_connection(pristine)
+        price_list(conn, csv_path, args.rows)
+        conn.close()
+        print(f"{app.db}: {args.catalog} товаров, прайс-лист {args.rows} строк")
+        print(f"{'':<24}{'строк/с':>10}{'добавлено':>11}{'обновлено':>11}")
+
+        shutil.copyfile(pristine, path)
+        conn = db_session.open_connection(path)
+        print(f"{'по строке, commit':<24}{one_by_one(conn, csv_path, args.single_rows):>10.0f}")
+        conn.close()
+        for batch in (100, 1000, bulk_import.IMPORT_BATCH):
+            shutil.copyfile(pristine, path)
+            conn = db_session.open_connection(path)
+            result = bulk_import.import_csv(conn, bulk_import.CATALOGS[app.db], csv_path, batch)
+            conn.close()
+            print(f"{f'пачки по {batch}':<24}{result.rows / result.seconds:>10.0f}"
+                  f"{result.inserted:>11}{result.updated:>11}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
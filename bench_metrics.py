@@ -0,0 +1,49 @@
+import argparse
+import sys
+import time
+import tkinter as tk
+
+import metrics
+
+# Накладные расходы метрик: обработчик Tk без метрик и с ними, отдельное
+# наблюдение гистограммы и выдача /metrics при большом числе серий
+
+
+def per_call(func, calls):
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Накладные расходы метрик на действие и запрос")
+    parser.add_argument('--calls', type=int, default=200000)
+    parser.add_argument('--series', type=int, default=300, help="серий для замера выдачи")
+    args = parser.parse_args()
+
+    class App:
+        def create_order(self):
+            pass
+
+    # CallWrapper без окна: subst=None, widget=None - вызывает функцию как есть
+    callback = tk.CallWrapper(App().create_order, None, None)
+    plain = per_call(callback, args.calls)
+    metrics.enable(port=None)
+    measured = per_call(callback, args.calls)
+    observe = per_call(lambda: metrics.QUERY_SECONDS.observe(0.012, 'shop.db', 'products'), args.calls)
+    print(f"обработчик Tk без метрик    {plain:8.2f} мкс")
+    print(f"обработчик Tk с метриками   {measured:8.2f} мкс (+{measured - plain:.2f})")
+    print(f"наблюдение гистограммы      {observe:8.2f} мкс")
+
+    for i in range(args.series):
+        metrics.ACTION_SECONDS.observe(i / 1000, f"App.action_{i}")
+    start = time.perf_counter()
+    text = metrics.exposition()
+    print(f"выдача /metrics: {len(text.splitlines())} строк, {len(text) / 1024:.0f} КБ "
+          f"за {(time.perf_counter() - start) * 1000:.1f} мс")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
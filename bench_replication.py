@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+import apps
+import collector
+import datagen
+import db_session
+import replication
+
+# Передача продаж flowershop.db сборщику: накопленная история (outbox после
+# миграции) и новые продажи кассы, пока идет отправка. Посередине сборщик
+# останавливается на --outage секунд (обрыв связи с офисом). В конце все
+# продажи должны быть в head_office.db ровно по одному разу
+SALE = "INSERT INTO sales (flower_id, quantity, sale_date, total_price) VALUES (1, 1, date('now'), 100)"
+
+
+def till(path, sales, interval, done):
+    conn = db_session.open_connection(path)
+    for _ in range(sales):
+        conn.execute(SALE)
+        conn.commit()
+        time.sleep(interval)
+    conn.close()
+    done.set()
+
+
+def outage(server_box, head_office, port, start, seconds):
+    # Остановить сборщик через start секунд и поднять снова через seconds
+    time.sleep(start)
+    server = server_box[0]
+    server.shutdown()
+    server.server_close()
+    time.sleep(seconds)
+    server_box[0] = collector.make_server(head_office, port=port)
+    threading.Thread(target=server_box[0].serve_forever, daemon=True).start()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Передача продаж в головной офис через outbox")
+    parser.add_argument('--history', type=int, nargs='+', default=[20000, 100000], help="продаж в базе до отправки")
+    parser.add_argument('--sales', type=int, default=300, help="новых продаж во время отправки")
+    parser.add_argument('--outage', type=float, default=2.0, help="секунд без связи")
+    args = parser.parse_args()
+
+    failed = False
+    print(f"{'история':>8}{'событий':>9}{'событий/с':>11}{'пачек':>7}{'мс/пачку':>10}{'сжатие':>8}"
+          f"{'ошибок связи':>14}{'в офисе':>9}{'память, МБ':>12}")
+    for history in args.history:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = datagen.generate(apps.get_app('flowers'), tmp, rows=history, log=lambda *a: None)
+            head_office = collector.Collector(os.path.join(tmp, collector.DATABASE))
+            server_box = [collector.make_server(head_office, port=0)]
+            port = server_box[0].server_address[1]
+            threading.Thread(target=server_box[0].serve_forever, daemon=True).start()
+            sender = replication.Sender(path, f"http://127.0.0.1:{port}/batches", shop='bench', retry_delay=0.2)
+
+            done = threading.Event()
+            threading.Thread(target=till, args=(path, args.sales, 0.005, done), daemon=True).start()
+            threading.Thread(target=outage, args=(server_box, head_office, port, 0.5, args.outage),
+                             daemon=True).start()
+
+            async def replicate():
+                task = asyncio.create_task(sender.run(idle_delay=0.05))
+                conn = sqlite3.connect(path)
+                while not (done.is_set() and conn.execute("SELECT COUNT(*) FROM outbox").fetchone()[0] == 0):
+                    await asyncio.sleep(0.05)
+                conn.close()
+                sender.stop()
+                await task
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            asyncio.run(replicate())
+            seconds = time.perf_counter() - start
+            peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+            tracemalloc.stop()
+
+            conn = sqlite3.connect(path)
+            sales = conn.execute("SELECT COUNT(*) FROM sales").fetchone()[0]
+            conn.close()
+            received = sum(row[2] for row in head_office.stats())
+            batches = list(sender.metrics)
+            ratio = sum(b.raw_bytes for b in batches) / sum(b.sent_bytes for b in batches)
+            batch_ms = statistics.median(b.seconds for b in batches) * 1000
+            failed |= received != sales
+            print(f"{history:>8}{sender.sent:>9}{sender.sent / seconds:>11.0f}{sender.batches:>7}{batch_ms:>10.1f}"
+                  f"{ratio:>8.1f}{sender.failures:>14}{received:>9}{peak:>12.1f}")
+            server_box[0].shutdown()
+            server_box[0].server_close()
+            head_office.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
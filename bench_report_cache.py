@@ -0,0 +1,84 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import apps
+import datagen
+import db_session
+from report_cache import ReportCache
+
+# Запросы отчета Bakery.generate_report
+REPORT_QUERIES = [
+    "SELECT SUM(orders) FROM daily_sales WHERE day BETWEEN ? AND ?",
+    '''SELECT SUM(menu.price * daily_sales.quantity) FROM daily_sales JOIN menu ON daily_sales.product_id = menu.id
+       WHERE daily_sales.day BETWEEN ? AND ?''',
+    '''SELECT menu.name, SUM(daily_sales.quantity) FROM daily_sales JOIN menu ON daily_sales.product_id = menu.id
+       WHERE daily_sales.day BETWEEN ? AND ? GROUP BY menu.name ORDER BY 2 DESC LIMIT 3''',
+]
+
+
+def report(start, end):
+    def query(conn):
+        return [conn.execute(sql, (start, end)).fetchall() for sql in REPORT_QUERIES]
+    return query
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Кэш отчетов по диапазону дат (Bakery)")
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('Bakery')
+        datagen.generate(app, tmp, rows=args.rows, log=lambda *a: None)
+        path = os.path.join(tmp, app.db)
+        reader = db_session.open_connection(path)
+        writer = sqlite3.connect(path)
+        cache = ReportCache('orders', ('menu',))
+        end = date.today()
+        start = end - timedelta(days=30)
+        query = report(start, end)
+
+        uncached = timed(lambda: query(reader), args.repeat)
+        cache.get(reader, 'sales', start, end, query)
+        cached = timed(lambda: cache.get(reader, 'sales', start, end, query), args.repeat)
+        print(f"отчет за месяц, {args.rows} заказов")
+        print(f"  без кэша          {uncached:8.2f} мс")
+        print(f"  из кэша           {cached:8.2f} мс  ({uncached / cached:.0f}x)")
+
+        # Запись вне диапазона не сбрасывает отчет, внутри диапазона - сбрасывает
+        outside = (start - timedelta(days=90)).isoformat()
+        writer.execute("INSERT INTO orders (item_id, quantity, status, created_at) VALUES (1, 1, 'Новый', ?)",
+                       (outside + ' 12:00:00',))
+        writer.commit()
+        misses = cache.misses
+        cache.get(reader, 'sales', start, end, query)
+        print(f"  заказ вне периода: {'пересчет' if cache.misses > misses else 'из кэша'}")
+        writer.execute("INSERT INTO orders (item_id, quantity, status) VALUES (1, 1, 'Новый')")
+        writer.commit()
+        misses = cache.misses
+        cache.get(reader, 'sales', start, end, query)
+        print(f"  заказ в периоде:   {'пересчет' if cache.misses > misses else 'из кэша'}")
+        print(f"  статистика: {cache.stats()}")
+        writer.close()
+        reader.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
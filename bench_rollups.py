@@ -0,0 +1,75 @@
+import argparse
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+import apps
+import datagen
+from bench_report_cache import REPORT_QUERIES
+
+# Тот же отчет Bakery по заказам (как до сводки daily_sales)
+RAW_QUERIES = [
+    "SELECT COUNT(*) FROM orders WHERE date(created_at) BETWEEN ? AND ?",
+    '''SELECT SUM(menu.price * orders.quantity) FROM orders JOIN menu ON orders.item_id = menu.id
+       WHERE date(orders.created_at) BETWEEN ? AND ?''',
+    '''SELECT menu.name, SUM(orders.quantity) FROM orders JOIN menu ON orders.item_id = menu.id
+       WHERE date(orders.created_at) BETWEEN ? AND ? GROUP BY menu.name ORDER BY 2 DESC LIMIT 3''',
+]
+
+
+def timed(conn, queries, params, repeat):
+    samples = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = [conn.execute(sql, params).fetchall() for sql in queries]
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples), result
+
+
+def write_cost(path, count):
+    # Время вставки count заказов с триггерами сводки, мкс на заказ
+    conn = sqlite3.connect(path)
+    start = time.perf_counter()
+    with conn:
+        conn.executemany("INSERT INTO orders (item_id, quantity, status) VALUES (?, 1, 'Новый')",
+                         [(i % 50 + 1,) for i in range(count)])
+    elapsed = (time.perf_counter() - start) * 1e6 / count
+    conn.close()
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отчет Bakery: заказы против сводки daily_sales")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 400000])
+    parser.add_argument('--days', type=int, default=365, help="период отчета")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    app = apps.get_app('Bakery')
+    end = date.today()
+    params = (end - timedelta(days=args.days), end)
+    print(f"отчет за {args.days} дн.")
+    print(f"{'заказов':>10}{'строк сводки':>14}{'заказы, мс':>12}{'сводка, мс':>12}{'вставка, мкс':>14}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in args.rows:
+            datagen.generate(app, tmp, rows=rows, log=lambda *a: None)
+            path = os.path.join(tmp, app.db)
+            conn = sqlite3.connect(path)
+            raw, raw_result = timed(conn, RAW_QUERIES, params, args.repeat)
+            rollup, rollup_result = timed(conn, REPORT_QUERIES, params, args.repeat)
+            if raw_result[0][0][0] != rollup_result[0][0][0]:
+                print(f"расхождение: {raw_result[0]} != {rollup_result[0]}")
+                return 1
+            summary = conn.execute("SELECT COUNT(*) FROM daily_sales").fetchone()[0]
+            conn.close()
+            print(f"{rows:>10}{summary:>14}{raw:>12.2f}{rollup:>12.2f}{write_cost(path, 1000):>14.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+import argparse
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import apps
+import datagen
+import search
+
+# Поиск в service_center.db: клиенты, оборудование и заявки
+LIKE_QUERY = '''SELECT 'clients', id, name FROM clients WHERE name LIKE :q OR phone LIKE :q OR email LIKE :q
+                UNION ALL
+                SELECT 'equipment', id, name FROM equipment WHERE name LIKE :q OR serial_number LIKE :q
+                UNION ALL
+                SELECT 'requests', id, description FROM requests WHERE description LIKE :q OR status LIKE :q
+                LIMIT 50'''
+TERMS = ["вас", "Васильев дм", "942 220", "client12", "SN0000012", "описание 4242", "устр 99"]
+
+
+def timed(func, repeat):
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Поиск по service_center.db: LIKE '%...%' и FTS5")
+    parser.add_argument('--clients', type=int, default=200000)
+    parser.add_argument('--rows', type=int, default=1000000, help="заявок")
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('ServiceCenter')
+        path = datagen.generate(app, tmp, clients=args.clients, rows=args.rows, log=lambda *a: None)
+        conn = sqlite3.connect(path)
+        indexed = conn.execute("SELECT COUNT(*) FROM search_index").fetchone()[0]
+        print(f"{app.db}: {indexed} записей в индексе")
+        print(f"{'запрос':<16}{'LIKE, мс':>10}{'FTS5, мс':>10}{'найдено':>9}")
+        for term in TERMS:
+            like = timed(lambda: conn.execute(LIKE_QUERY, {'q': f"%{term}%"}).fetchall(), args.repeat)
+            fts = timed(lambda: search.search(conn, term), args.repeat)
+            print(f"{term:<16}{like:>10.1f}{fts:>10.1f}{len(search.search(conn, term)):>9}")
+        conn.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
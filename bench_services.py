@@ -0,0 +1,122 @@
+import argparse
+import importlib
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+import apps
+import datagen
+import db_session
+
+# Пакетные операции через сервисы приложений без Tk: N вызовов по одной
+# операции (как кнопка в окне - транзакция на каждую) против одного вызова
+# *_many со всем списком в одной транзакции. Остатки и место на складе перед
+# замером поднимаются, чтобы продажи и приемки не упирались в проверки
+DAY = '2024-06-01'
+PLENTY = 10 ** 9
+
+
+def pharmacy_case(conn, rng, count):
+    conn.execute("UPDATE medicines_inventory SET stock_quantity = ?", (PLENTY,))
+    names = [row[0] for row in conn.execute("SELECT medicine_name FROM medicines_inventory")]
+    return 'PharmacyService', 'sell', 'sell_many', 'sales_records', [
+        (rng.choice(names), rng.randint(1, 3), DAY) for _ in range(count)]
+
+
+def warehouse_case(conn, rng, count):
+    conn.execute("UPDATE zones SET capacity = occupied + ?", (PLENTY,))
+    zones = [row[0] for row in conn.execute("SELECT name FROM zones")]
+    suppliers = [row[0] for row in conn.execute("SELECT id FROM suppliers")]
+    return 'WarehouseService', 'receive_goods', 'receive_goods_many', 'goods', [
+        (f'Товар {i}', rng.choice(suppliers), rng.choice(zones), rng.randint(1, 50), DAY) for i in range(count)]
+
+
+def flowers_case(conn, rng, count):
+    conn.execute("UPDATE flowers SET quantity = ?", (PLENTY,))
+    flowers = [row[0] for row in conn.execute("SELECT id FROM flowers")]
+    return 'FlowerShopService', 'sell', 'sell_many', 'sales', [
+        (rng.choice(flowers), rng.randint(1, 5), DAY) for _ in range(count)]
+
+
+def musicshop_case(conn, rng, count):
+    conn.execute("UPDATE products SET quantity = ?", (PLENTY,))
+    products = [row[0] for row in conn.execute("SELECT id FROM products")]
+    customers = [row[0] for row in conn.execute("SELECT id FROM customers")]
+    return 'MusicStoreService', 'sell', 'sell_many', 'sales', [
+        (rng.choice(products), rng.choice(customers), rng.randint(1, 2), DAY) for _ in range(count)]
+
+
+def moto_case(conn, rng, count):
+    clients = [row[0] for row in conn.execute("SELECT id FROM clients")]
+    bikes = [row[0] for row in conn.execute("SELECT id FROM motorcycles")]
+    return 'MotoSalonService', 'sell', 'sell_many', 'sales', [
+        (rng.choice(clients), rng.choice(bikes), DAY, rng.randint(300000, 2000000)) for _ in range(count)]
+
+
+# Модуль приложения -> подготовка базы и (сервис, одиночный метод, пакетный
+# метод, таблица, в которую пишут операции, список операций)
+CASES = {
+    'pharmacy': pharmacy_case,
+    'Warehouse': warehouse_case,
+    'flowers': flowers_case,
+    'musicshop': musicshop_case,
+    'moto': moto_case,
+}
+
+
+def run(module, path, case, count, batched, seed=1):
+    # -> (операций в секунду, строк добавилось)
+    conn = db_session.open_connection(path)
+    service_name, single, batch, table, records = case(conn, random.Random(seed), count)
+    conn.commit()
+    service = getattr(module, service_name)(conn)
+    before = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+    start = time.perf_counter()
+    if batched:
+        getattr(service, batch)(records)
+    else:
+        for record in records:
+            getattr(service, single)(*record)
+    seconds = time.perf_counter() - start
+    added = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0] - before
+    conn.close()
+    return count / seconds, added
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетные операции сервисов приложений без интерфейса")
+    parser.add_argument('apps', nargs='*', default=list(CASES), help="модули (по умолчанию: " + ', '.join(CASES) + ")")
+    parser.add_argument('--count', type=int, default=2000, help="операций в замере")
+    parser.add_argument('--rows', type=int, default=20000, help="строк истории в базе")
+    args = parser.parse_args()
+
+    failed = False
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        # Часть модулей создает свою базу при импорте - пусть во временном каталоге
+        os.chdir(tmp)
+        try:
+            print(f"{'приложение':<12}{'способ':<12}{'операций/с':>12}{'строк':>8}")
+            for name in args.apps:
+                app = apps.get_app(name)
+                module = importlib.import_module(app.module)
+                for label, batched in (("по одной", False), ("пакетом", True)):
+                    path = datagen.generate(app, tmp, rows=args.rows, log=lambda *a: None)
+                    try:
+                        rate, added = run(module, path, CASES[app.module], args.count, batched)
+                    except (sqlite3.Error, LookupError, ValueError) as e:
+                        print(f"{app.module:<12}{label:<12}ошибка: {e}")
+                        failed = True
+                        continue
+                    failed |= added != args.count
+                    print(f"{app.module:<12}{label:<12}{rate:>12.0f}{added:>8}")
+        finally:
+            os.chdir(cwd)
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,92 @@
+import argparse
+import sqlite3
+import sys
+import tempfile
+import time
+import tkinter as tk
+import tracemalloc
+from tkinter import ttk
+
+import bench_apps
+from query_executor import QueryExecutor
+from tree_sync import stream_tree, sync_tree
+
+# Загрузка длинного списка клиентов в Treeview: "как было" - fetchall() в фоне и
+# sync_tree всего результата, "пачками" - stream_tree (fetchmany по
+# STREAM_BATCH, одна пачка за тик). Пиковая память - tracemalloc за время
+# загрузки, "замирание" - самый длинный промежуток между тиками таймера
+# интерфейса (after каждые 10 мс), т.е. сколько окно не отвечало
+COLUMNS = ('id', 'name', 'phone', 'email')
+TICK_MS = 10
+
+
+def make_db(path, count):
+    conn = sqlite3.connect(path)
+    conn.execute("CREATE TABLE clients (id INTEGER PRIMARY KEY, name TEXT, phone TEXT, email TEXT)")
+    conn.executemany("INSERT INTO clients VALUES (?, ?, ?, ?)",
+                     ((i, f'Клиент {i}', f'+7900{i:07d}', f'client{i}@mail.ru') for i in range(1, count + 1)))
+    conn.commit()
+    conn.close()
+
+
+def load(root, path, streamed):
+    # -> (секунд, пик памяти МБ, самое длинное замирание мс, строк в дереве)
+    tree = ttk.Treeview(root, columns=COLUMNS, show='headings')
+    queries = QueryExecutor(root, path)
+    done = []
+    ticks = []
+
+    def tick():
+        ticks.append(time.perf_counter())
+        if not done:
+            root.after(TICK_MS, tick)
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    tick()
+    if streamed:
+        stream_tree(queries, 'clients', tree, "SELECT * FROM clients", on_done=done.append)
+    else:
+        queries.submit('clients', "SELECT * FROM clients",
+                       on_done=lambda rows: done.append(sync_tree(tree, rows)))
+    while not done:
+        root.update()
+    seconds = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1] / 2 ** 20
+    tracemalloc.stop()
+    ticks.append(time.perf_counter())
+    freeze = max(b - a for a, b in zip(ticks, ticks[1:])) * 1000
+    rows = len(tree.get_children())
+    queries.close()
+    tree.destroy()
+    return seconds, peak, freeze, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка длинного списка в Treeview пачками")
+    parser.add_argument('--rows', type=int, nargs='+', default=[10000, 100000, 300000])
+    args = parser.parse_args()
+
+    display = bench_apps.start_display()
+    root = tk.Tk()
+    root.withdraw()
+    failed = False
+    try:
+        print(f"{'строк':>8} {'способ':<10}{'с':>8}{'память, МБ':>12}{'замирание, мс':>15}")
+        for count in args.rows:
+            with tempfile.TemporaryDirectory() as tmp:
+                path = f"{tmp}/clients.db"
+                make_db(path, count)
+                for label, streamed in (("как было", False), ("пачками", True)):
+                    seconds, peak, freeze, rows = load(root, path, streamed)
+                    failed |= rows != count
+                    print(f"{count:>8} {label:<10}{seconds:>8.2f}{peak:>12.1f}{freeze:>15.0f}")
+    finally:
+        root.destroy()
+        if display is not None:
+            display.terminate()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
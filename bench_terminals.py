@@ -0,0 +1,118 @@
+import argparse
+import multiprocessing
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+import apps
+import datagen
+import db_session
+import pharmacy
+
+# Несколько касс аптеки на одном pharmacy_database.db, каждая - отдельный
+# процесс: продажа, затем обновление списка препаратов (как в приложении).
+# "как было" - продажа кодом до режима нескольких касс (остаток читается до
+# транзакции и записывается числом), "несколько касс" - WAL и PharmacyService.sell (run_write).
+# Потерянная продажа - ошибка "database is locked" (locked) или списание,
+# которого не видно в остатке (не списано)
+STOCK = 100000
+DAY = '2024-06-01'
+
+
+def old_sale(conn, name, quantity):
+    medicine_id, unit_price, stock = conn.execute('''SELECT medicine_id, unit_price, stock_quantity
+                                                     FROM medicines_inventory WHERE medicine_name=?''',
+                                                  (name,)).fetchone()
+    if quantity > stock:
+        raise ValueError("Недостаточный остаток на складе")
+    conn.execute("UPDATE medicines_inventory SET stock_quantity=? WHERE medicine_id=?", (stock - quantity, medicine_id))
+    conn.execute('''INSERT INTO sales_records (medicine_identifier, sold_quantity, transaction_date, total_amount)
+                    VALUES (?, ?, ?, ?)''', (medicine_id, quantity, DAY, unit_price * quantity))
+    conn.commit()
+
+
+def cashier(path, multi_terminal, sales, seed):
+    # (ошибок блокировки, [мс на продажу], [мс на обновление списка])
+    db_session.MULTI_TERMINAL = multi_terminal
+    conn = db_session.open_connection(path)
+    service = pharmacy.PharmacyService(conn)
+    names = [row[0] for row in conn.execute("SELECT medicine_name FROM medicines_inventory")]
+    rng = random.Random(seed)
+    locked = 0
+    sale_ms, read_ms = [], []
+    for _ in range(sales):
+        name, quantity = rng.choice(names), rng.randint(1, 3)
+        start = time.perf_counter()
+        try:
+            if multi_terminal:
+                service.sell(name, quantity, DAY)
+            else:
+                old_sale(conn, name, quantity)
+        except sqlite3.OperationalError:
+            if conn.in_transaction:
+                conn.rollback()
+            locked += 1
+        sale_ms.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        try:
+            conn.execute("SELECT * FROM medicines_inventory").fetchall()
+        except sqlite3.OperationalError:
+            pass
+        read_ms.append((time.perf_counter() - start) * 1000)
+    conn.close()
+    return locked, sale_ms, read_ms
+
+
+def run(path, multi_terminal, cashiers, sales):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=TRUNCATE")
+    conn.execute("UPDATE medicines_inventory SET stock_quantity = ?", (STOCK,))
+    conn.commit()
+    stock = conn.execute("SELECT SUM(stock_quantity) FROM medicines_inventory").fetchone()[0]
+    records = conn.execute("SELECT COALESCE(SUM(sold_quantity), 0) FROM sales_records").fetchone()[0]
+    conn.close()
+
+    start = time.perf_counter()
+    with multiprocessing.Pool(cashiers) as pool:
+        results = pool.starmap(cashier, [(path, multi_terminal, sales, seed) for seed in range(cashiers)])
+    seconds = time.perf_counter() - start
+
+    conn = sqlite3.connect(path)
+    stock -= conn.execute("SELECT SUM(stock_quantity) FROM medicines_inventory").fetchone()[0]
+    records = conn.execute("SELECT COALESCE(SUM(sold_quantity), 0) FROM sales_records").fetchone()[0] - records
+    conn.close()
+    locked = sum(result[0] for result in results)
+    sale_ms = sorted(ms for result in results for ms in result[1])
+    read_ms = sorted(ms for result in results for ms in result[2])
+    # Продано по чекам, но не списано со склада - перезаписанный чужой остаток
+    return (cashiers * sales / seconds, locked, records - stock,
+            statistics.median(sale_ms), sale_ms[int(len(sale_ms) * 0.99)], read_ms[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Несколько касс на одной базе аптеки")
+    parser.add_argument('--cashiers', type=int, nargs='+', default=[2, 4, 8])
+    parser.add_argument('--sales', type=int, default=300, help="продаж на кассу")
+    args = parser.parse_args()
+
+    failed = False
+    with tempfile.TemporaryDirectory() as tmp:
+        app = apps.get_app('pharmacy')
+        path = datagen.generate(app, tmp, products=200, rows=20000, log=lambda *a: None)
+        print(f"{app.db}: {args.sales} продаж на кассу")
+        print(f"{'режим':<16}{'касс':>5}{'продаж/с':>10}{'locked':>8}{'не списано, шт':>16}"
+              f"{'мс, медиана':>13}{'мс, p99':>9}{'чтение, макс':>14}")
+        for cashiers in args.cashiers:
+            for label, multi_terminal in (("как было", False), ("несколько касс", True)):
+                rate, locked, unsynced, median, p99, read = run(path, multi_terminal, cashiers, args.sales)
+                failed |= multi_terminal and bool(locked or unsynced)
+                print(f"{label:<16}{cashiers:>5}{rate:>10.0f}{locked:>8}{unsynced:>16}"
+                      f"{median:>13.1f}{p99:>9.1f}{read:>14.1f}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+import random
+import statistics
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk
+
+from tree_sync import sync_tree
+
+SIZES = (10_000, 100_000)
+REPEAT = 5
+COLUMNS = ('id', 'name', 'quantity', 'price')
+
+
+def make_rows(count):
+    return [(i, f'Товар {i}', random.randint(1, 100), round(random.uniform(10, 1000), 2))
+            for i in range(1, count + 1)]
+
+
+def after_sale(rows):
+    # Одна продажа: у одного товара уменьшилось количество
+    rows = list(rows)
+    i = random.randrange(len(rows))
+    item_id, name, quantity, price = rows[i]
+    rows[i] = (item_id, name, quantity - 1, price)
+    return rows
+
+
+def after_insert(rows):
+    return rows + [(rows[-1][0] + 1, 'Новый товар', 1, 99.0)]
+
+
+def full_refresh(tree, rows):
+    # Как было: удалить все строки и вставить заново
+    for item in tree.get_children():
+        tree.delete(item)
+    for row in rows:
+        tree.insert('', 'end', values=row)
+
+
+def measure(root, tree, func, rows):
+    start = time.perf_counter()
+    func(tree, rows)
+    root.update_idletasks()
+    return (time.perf_counter() - start) * 1000
+
+
+def main():
+    root = tk.Tk()
+    root.withdraw()
+    print(f"{'строк':>8} {'действие':<10}{'до, мс':>12}{'после, мс':>12}{'ускорение':>11}")
+    for size in SIZES:
+        rows = make_rows(size)
+        for name, change in (('продажа', after_sale), ('новый', after_insert)):
+            before, after = [], []
+            for _ in range(REPEAT):
+                old_tree = ttk.Treeview(root, columns=COLUMNS, show='headings')
+                full_refresh(old_tree, rows)
+                new_tree = ttk.Treeview(root, columns=COLUMNS, show='headings')
+                sync_tree(new_tree, rows)
+                changed = change(rows)
+                before.append(measure(root, old_tree, full_refresh, changed))
+                after.append(measure(root, new_tree, sync_tree, changed))
+                old_tree.destroy()
+                new_tree.destroy()
+            before, after = statistics.median(before), statistics.median(after)
+            print(f"{size:>8} {name:<10}{before:>12.1f}{after:>12.1f}{before / after:>10.1f}x")
+    root.destroy()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
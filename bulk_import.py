@@ -0,0 +1,242 @@
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+from collections import namedtuple
+from datetime import date
+from tkinter import messagebox, filedialog
+
+import apps
+import db_session
+
+# Массовая загрузка справочников и остатков из CSV (прайс-листы поставщиков).
+# Файл читается потоком, строки проверяются и приводятся к типам столбцов и
+# пишутся пачками по IMPORT_BATCH строк: пачка - одна транзакция с executemany.
+# Запись с тем же естественным ключом (название, название + производитель)
+# обновляется, новая - добавляется. Заголовок CSV - имена столбцов таблицы,
+# для ссылок (Lookup) - имя связанной записи, например supplier
+IMPORT_BATCH = 5000
+MAX_ERRORS = 20
+FILETYPES = [("CSV", "*.csv"), ("Все файлы", "*.*")]
+
+Catalog = namedtuple('Catalog', 'table columns key')
+Lookup = namedtuple('Lookup', 'header sql required')
+ImportResult = namedtuple('ImportResult', 'rows inserted updated skipped errors seconds')
+
+
+def text(value):
+    value = value.strip()
+    if not value:
+        raise ValueError("пустое значение")
+    return value
+
+
+def _number(value):
+    return value.strip().replace('\xa0', '').replace(' ', '').replace(',', '.')
+
+
+def integer(value):
+    try:
+        return int(_number(value))
+    except ValueError:
+        raise ValueError(f"не целое число: {value!r}") from None
+
+
+def real(value):
+    try:
+        return float(_number(value))
+    except ValueError:
+        raise ValueError(f"не число: {value!r}") from None
+
+
+def iso_date(value):
+    try:
+        return date.fromisoformat(value.strip()).isoformat()
+    except ValueError:
+        raise ValueError(f"дата не в формате ГГГГ-ММ-ДД: {value!r}") from None
+
+
+SUPPLIER = "SELECT name, id FROM suppliers"
+
+# Файл базы -> таблица, столбцы [(столбец, преобразование)] и естественный ключ.
+# У автомобилей нет VIN или другого номера, поэтому строки только добавляются
+CATALOGS = {
+    'shop.db': Catalog('products', [('name', text), ('price', real), ('quantity', integer),
+                                    ('supplier_id', Lookup('supplier', SUPPLIER, True))], ('name',)),
+    'music_store.db': Catalog('products', [('name', text), ('price', real), ('quantity', integer)], ('name',)),
+    'sports_store.db': Catalog('products', [('name', text), ('price', real)], ('name',)),
+    'pharmacy_database.db': Catalog('medicines_inventory',
+                                    [('medicine_name', text), ('medicine_manufacturer', text),
+                                     ('expiration_date', iso_date), ('unit_price', real), ('stock_quantity', integer)],
+                                    ('medicine_name', 'medicine_manufacturer')),
+    'auto_salon.db': Catalog('cars', [('brand', text), ('model', text), ('year', integer), ('color', text),
+                                      ('engine_type', text), ('mileage', integer), ('trim_level', text),
+                                      ('price', real), ('status', text)], ()),
+    'flowershop.db': Catalog('flowers', [('name', text), ('quantity', integer), ('price', real),
+                                         ('supplier_id', Lookup('supplier', SUPPLIER, False))], ('name',)),
+}
+
+
+def headers(catalog):
+    return [convert.header if isinstance(convert, Lookup) else column for column, convert in catalog.columns]
+
+
+def _lookup(conn, spec):
+    # Имя связанной записи -> id; справочник читается один раз на импорт
+    ids = dict(conn.execute(spec.sql).fetchall())
+
+    def convert(value):
+        value = value.strip()
+        if not value:
+            if spec.required:
+                raise ValueError("пустое значение")
+            return None
+        if value not in ids:
+            raise ValueError(f"не найдено: {value}")
+        return ids[value]
+    return convert
+
+
+def _statements(catalog):
+    columns = [column for column, convert in catalog.columns]
+    names = ', '.join(columns)
+    marks = ', '.join('?' * len(columns))
+    if not catalog.key:
+        return None, f"INSERT INTO {catalog.table} ({names}) VALUES ({marks})"
+    where = ' AND '.join(f"{column} = ?" for column in catalog.key)
+    update = (f"UPDATE {catalog.table} SET {', '.join(f'{column} = ?' for column in columns)} "
+              f"WHERE {where}")
+    insert = (f"INSERT INTO {catalog.table} ({names}) SELECT {marks} "
+              f"WHERE NOT EXISTS (SELECT 1 FROM {catalog.table} WHERE {where})")
+    return update, insert
+
+
+def _write(conn, statements, rows, key_positions):
+    # Одна пачка - одна транзакция: сначала обновить существующие записи,
+    # затем добавить те, которых нет
+    update, insert = statements
+    with conn:
+        if update is None:
+            return conn.executemany(insert, rows).rowcount, 0
+        rows = [row + [row[i] for i in key_positions] for row in rows]
+        updated = conn.executemany(update, rows).rowcount
+        inserted = conn.executemany(insert, rows).rowcount
+    return inserted, updated
+
+
+def _dialect(f):
+    sample = f.read(4096)
+    f.seek(0)
+    try:
+        return csv.Sniffer().sniff(sample, delimiters=',;\t')
+    except csv.Error:
+        return csv.excel
+
+
+def import_csv(conn, catalog, path, batch=IMPORT_BATCH, progress=None):
+    # Загрузить CSV path в таблицу каталога. Ошибочные строки пропускаются
+    # (первые MAX_ERRORS - в errors как (номер строки, текст)); progress(строк)
+    # вызывается после каждой пачки
+    start = time.perf_counter()
+    statements = _statements(catalog)
+    names = headers(catalog)
+    converters = [_lookup(conn, convert) if isinstance(convert, Lookup) else convert
+                  for column, convert in catalog.columns]
+    columns = [column for column, convert in catalog.columns]
+    key_positions = [columns.index(column) for column in catalog.key]
+    rows = inserted = updated = skipped = 0
+    errors = []
+    pending = {}
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f, dialect=_dialect(f))
+        missing = [name for name in names if name not in (reader.fieldnames or [])]
+        if missing:
+            raise ValueError(f"в файле нет столбцов: {', '.join(missing)} (нужны: {', '.join(names)})")
+        for row in reader:
+            rows += 1
+            try:
+                values = [convert(row[name] or '') for name, convert in zip(names, converters)]
+            except ValueError as e:
+                skipped += 1
+                if len(errors) < MAX_ERRORS:
+                    errors.append((reader.line_num, str(e)))
+                continue
+            # Повтор ключа в пачке: остается последняя строка
+            key = tuple(values[i] for i in key_positions) if key_positions else rows
+            pending[key] = values
+            if len(pending) >= batch:
+                added, changed = _write(conn, statements, list(pending.values()), key_positions)
+                inserted, updated = inserted + added, updated + changed
+                pending.clear()
+                if progress:
+                    progress(rows)
+        if pending:
+            added, changed = _write(conn, statements, list(pending.values()), key_positions)
+            inserted, updated = inserted + added, updated + changed
+            if progress:
+                progress(rows)
+    return ImportResult(rows, inserted, updated, skipped, errors, time.perf_counter() - start)
+
+
+def summary(result):
+    lines = [f"Строк в файле: {result.rows}",
+             f"Добавлено: {result.inserted}, обновлено: {result.updated}, пропущено: {result.skipped}",
+             f"{result.rows / max(result.seconds, 1e-9):.0f} строк/с за {result.seconds:.1f} с"]
+    lines += [f"строка {line}: {message}" for line, message in result.errors]
+    return '\n'.join(lines)
+
+
+def ask_import(master, queries, path, on_done=None, title="Импорт из CSV"):
+    # Спросить файл и загрузить его в фоне через QueryExecutor приложения;
+    # on_done(result) - один раз после загрузки (обновить списки)
+    catalog = CATALOGS[os.path.basename(path)]
+    filename = filedialog.askopenfilename(parent=master, title=title, filetypes=FILETYPES)
+    if not filename:
+        return
+
+    def finished(result):
+        messagebox.showinfo(title, summary(result), parent=master)
+        if on_done:
+            on_done(result)
+
+    def load(conn):
+        # Отдельное соединение, а не соединение QueryExecutor: его собственные
+        # коммиты не меняют PRAGMA data_version, и ReportCache не заметил бы импорт
+        own = db_session.open_connection(path)
+        try:
+            return import_csv(own, catalog, filename)
+        finally:
+            own.close()
+
+    queries.submit('import', load, on_done=finished)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Загрузка каталога или остатков из CSV")
+    parser.add_argument('app', help="модуль или файл базы: " + ', '.join(CATALOGS))
+    parser.add_argument('csv')
+    parser.add_argument('--batch', type=int, default=IMPORT_BATCH, help="строк в транзакции")
+    args = parser.parse_args()
+
+    path = apps.get_app(args.app).db
+    if path not in CATALOGS:
+        print(f"{path}: импорт не поддерживается")
+        return 1
+    conn = db_session.open_connection(path)
+    try:
+        result = import_csv(conn, CATALOGS[path], args.csv, args.batch,
+                            progress=lambda rows: print(f"\r{rows} строк", end='', flush=True))
+    except (ValueError, OSError, sqlite3.Error) as e:
+        print(f"Не удалось загрузить {args.csv}: {e}")
+        return 1
+    finally:
+        conn.close()
+    print()
+    print(summary(result))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
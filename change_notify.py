@@ -0,0 +1,94 @@
+import sqlite3
+
+# Уведомления об изменениях таблиц без повторных запросов по таймеру.
+# PRAGMA data_version отдельного соединения меняется после любого коммита в файл
+# базы (из этого процесса или из другого) и почти ничего не стоит. Только когда он
+# изменился, читаются счетчики change_counters, которые увеличивают триггеры
+# таблиц, - по ним видно, какие именно таблицы изменились
+POLL_MS = 500
+IDLE_POLL_MS = 5000
+
+
+def change_counters_sql(tables):
+    # SQL для миграции: таблица счетчиков и триггеры на запись в tables
+    lines = ["CREATE TABLE IF NOT EXISTS change_counters (tbl TEXT PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0);"]
+    for table in tables:
+        lines.append(f"INSERT OR IGNORE INTO change_counters (tbl) VALUES ('{table}');")
+        for event in ('INSERT', 'UPDATE', 'DELETE'):
+            lines.append(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_changes AFTER {event} ON {table} "
+                         f"BEGIN UPDATE change_counters SET version = version + 1 WHERE tbl = '{table}'; END;")
+    return '\n'.join(lines)
+
+
+def day_changes_sql(table, column):
+    # SQL для миграции: счетчики изменений table по дням column (date(column)).
+    # По ним кэш отчетов узнает, менялись ли строки внутри диапазона дат
+    def upsert(row):
+        return (f"INSERT INTO day_changes (tbl, day, version) VALUES ('{table}', date({row}.{column}), 1) "
+                f"ON CONFLICT (tbl, day) DO UPDATE SET version = version + 1;")
+
+    lines = ["CREATE TABLE IF NOT EXISTS day_changes (tbl TEXT NOT NULL, day TEXT NOT NULL, "
+             "version INTEGER NOT NULL, PRIMARY KEY (tbl, day)) WITHOUT ROWID;"]
+    for event, rows in (('INSERT', ('NEW',)), ('UPDATE', ('OLD', 'NEW')), ('DELETE', ('OLD',))):
+        body = ' '.join(upsert(row) for row in rows)
+        lines.append(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_days AFTER {event} ON {table} "
+                     f"BEGIN {body} END;")
+    return '\n'.join(lines)
+
+
+class ChangeWatcher:
+    # Подписчики вызываются с множеством измененных таблиц. Пока изменений нет,
+    # интервал опроса удваивается до idle_poll_ms, после изменения - снова poll_ms
+    def __init__(self, path, poll_ms=POLL_MS, idle_poll_ms=IDLE_POLL_MS):
+        # Свое соединение без трассировки: data_version не меняется от коммитов
+        # того же соединения, а опрос засорял бы журнал запросов
+        self.conn = sqlite3.connect(path)
+        self.poll_ms = poll_ms
+        self.idle_poll_ms = idle_poll_ms
+        self.delay = poll_ms
+        self._subscribers = []
+        self._data_version = self._read_data_version()
+        self._versions = self._read_counters()
+        self._widget = None
+        self._after_id = None
+
+    def _read_data_version(self):
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _read_counters(self):
+        return dict(self.conn.execute("SELECT tbl, version FROM change_counters"))
+
+    def subscribe(self, tables, callback):
+        self._subscribers.append((frozenset(tables), callback))
+
+    def check(self):
+        # Проверить изменения сейчас; возвращает множество измененных таблиц
+        data_version = self._read_data_version()
+        changed = set()
+        if data_version != self._data_version:
+            self._data_version = data_version
+            versions = self._read_counters()
+            changed = {table for table, version in versions.items() if self._versions.get(table) != version}
+            self._versions = versions
+        if not changed:
+            self.delay = min(self.delay * 2, self.idle_poll_ms)
+            return changed
+        self.delay = self.poll_ms
+        for tables, callback in self._subscribers:
+            if changed & tables:
+                callback(changed & tables)
+        return changed
+
+    def start(self, widget):
+        self._widget = widget
+        self._after_id = widget.after(self.delay, self._tick)
+
+    def _tick(self):
+        self.check()
+        self._after_id = self._widget.after(self.delay, self._tick)
+
+    def stop(self):
+        if self._after_id is not None:
+            self._widget.after_cancel(self._after_id)
+            self._after_id = None
+        self.conn.close()
@@ -0,0 +1,41 @@
+import os
+import sys
+import tempfile
+
+import apps
+import archive
+import consolidate
+import datagen
+
+# Сводка не должна зависеть от того, перенесены ли старые годы в архивы:
+# итоги магазинов и дней до archive() и после должны совпасть. Данные - за
+# DAYS дней, в основной базе остается HORIZON_DAYS, остальное уходит в архивы
+DAYS = 1100
+HORIZON_DAYS = 200
+
+
+def main():
+    failed = 0
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = [datagen.generate(app, tmp, rows=5000, days=DAYS, log=lambda *a: None)
+                 for app in apps.APPS if app.db in archive.TABLES and app.db in consolidate.SALES]
+        before = consolidate.consolidate(paths, jobs=1)
+        moved = sum(archive.archive(path, HORIZON_DAYS) for path in paths)
+        after = consolidate.consolidate(paths, jobs=1)
+        for path, (store, store_days), (archived_store, archived_days) in zip(paths, before, after):
+            name = os.path.basename(path)
+            years = len(archive.archives(path))
+            if not years:
+                print(f"FAIL {name}: архивы не созданы")
+                failed += 1
+            elif (store, store_days) != (archived_store, archived_days):
+                print(f"FAIL {name}: дней {store[2]} -> {archived_store[2]}, заказов {store[3]} -> {archived_store[3]}")
+                failed += 1
+            else:
+                print(f"ok   {name:<24}архивов {years}, дней {store[2]}, заказов {store[3]}")
+        print(f"перенесено в архивы строк: {moved}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
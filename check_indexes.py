@@ -0,0 +1,136 @@
+import sqlite3
+import sys
+
+import migrations
+from autocomplete import prefix_query
+from datagen import create_schema
+
+# Запросы приложений и индекс, который должен использовать каждый из них
+CHECKS = [
+    ('Bakery.py', 'bakery.db', "SELECT id FROM menu WHERE name = ?", 'idx_menu_name'),
+    ('Bakery.py', 'bakery.db', "SELECT SUM(orders) FROM daily_sales WHERE day BETWEEN ? AND ?", 'PRIMARY KEY (day'),
+    ('Bakery.py', 'bakery.db', '''SELECT menu.name, SUM(daily_sales.quantity) FROM daily_sales JOIN menu ON daily_sales.product_id = menu.id
+                                   WHERE daily_sales.day BETWEEN ? AND ? GROUP BY menu.name ORDER BY 2 DESC LIMIT 3''',
+     'PRIMARY KEY (day'),
+    ('Bakery.py', 'bakery.db', "SELECT COUNT(*) FROM orders WHERE item_id = ?", 'idx_orders_item'),
+    ('CleaningApp.py', 'cleaning.db', "SELECT id FROM services WHERE name = ?", 'idx_services_name'),
+    ('CleaningApp.py', 'cleaning.db', "SELECT id FROM employees WHERE name = ?", 'idx_employees_name'),
+    ('CleaningApp.py', 'cleaning.db', "SELECT COUNT(*) FROM orders WHERE service_id = ?", 'idx_orders_service'),
+    ('ComputerClub.py', 'computer_club.db',
+     '''SELECT * FROM Bookings WHERE room_id=? AND computer_number=? AND ((start_time BETWEEN ? AND ?)
+        OR (end_time BETWEEN ? AND ?) OR (? BETWEEN start_time AND end_time))''', 'idx_bookings_computer'),
+    ('ComputerClub.py', 'computer_club.db',
+     "SELECT DISTINCT computer_number FROM Bookings WHERE room_id=? AND end_time > datetime('now')",
+     'idx_bookings_computer'),
+    ('ComputerClub.py', 'computer_club.db',
+     '''SELECT COUNT(*) FROM Bookings b JOIN Rooms r ON b.room_id = r.id
+        WHERE b.start_time >= ? AND b.start_time <= ?''', 'idx_bookings_start'),
+    ('FitnesClub.py', 'fitness_club.db', "SELECT COUNT(*) FROM purchases WHERE client_id = ?", 'idx_purchases_client'),
+    ('FitnesClub.py', 'fitness_club.db', "SELECT id FROM clients WHERE name = ?", 'idx_clients_name'),
+    ('FitnesClub.py', 'fitness_club.db', "SELECT id FROM subscriptions WHERE name = ?", 'idx_subscriptions_name'),
+    ('JewelryStore.py', 'jewelry.db', "SELECT SUM(orders) FROM daily_sales WHERE day BETWEEN ? AND ?", 'PRIMARY KEY (day'),
+    ('JewelryStore.py', 'jewelry.db', "SELECT id FROM products WHERE name = ?", 'idx_products_name'),
+    ('JewelryStore.py', 'jewelry.db', "DELETE FROM addresses WHERE address=?", 'idx_addresses_address'),
+    ('ServiceCenter.py', 'service_center.db',
+     "SELECT clients.name, COUNT(requests.id) FROM clients LEFT JOIN requests ON clients.id = requests.client_id GROUP BY clients.id",
+     'idx_requests_client'),
+    ('ServiceCenter.py', 'service_center.db', "SELECT status, COUNT(id) FROM requests GROUP BY status", 'idx_requests_status'),
+    ('SportStore.py', 'sports_store.db', "SELECT SUM(orders) FROM daily_sales WHERE day BETWEEN ? AND ?", 'PRIMARY KEY (day'),
+    ('SportStore.py', 'sports_store.db', "DELETE FROM clients WHERE name = ?", 'idx_clients_name'),
+    ('SportStore.py', 'sports_store.db', "SELECT id FROM products WHERE name = ?", 'idx_products_name'),
+    ('Warehouse.py', 'warehouse.db', "SELECT id, name, quantity, date_added FROM goods WHERE zone_id=?", 'idx_goods_zone'),
+    ('Warehouse.py', 'warehouse.db', "SELECT name, quantity, date_added FROM goods WHERE date_added BETWEEN ? AND ?", 'idx_goods_date'),
+    ('Warehouse.py', 'warehouse.db', "SELECT id FROM suppliers WHERE name=?", 'idx_suppliers_name'),
+    ('Warehouse.py', 'warehouse.db', "SELECT id FROM zones WHERE name=?", 'idx_zones_name'),
+    ('YaCofee.py', 'YaCoffeeBAZA.db', "SELECT COUNT(*) FROM orders WHERE employee_id = ?", 'idx_orders_employee'),
+    ('auto.py', 'auto_salon.db', "SELECT id, brand, model, year FROM cars WHERE status='В наличии'",
+     'idx_cars_status_brand'),
+    ('auto.py', 'auto_salon.db', "SELECT COUNT(*) FROM sales WHERE car_id = ?", 'idx_sales_car'),
+    ('fishing.py', 'shop.db', "SELECT id FROM customers WHERE name=?", 'idx_customers_name'),
+    ('fishing.py', 'shop.db', "SELECT id FROM products WHERE name=?", 'idx_products_name'),
+    ('fishing.py', 'shop.db', "SELECT COUNT(*) FROM orders WHERE customer_id = ?", 'idx_orders_customer'),
+    ('flowers.py', 'flowershop.db', "SELECT id, sale_date, total_price FROM sales WHERE sale_date BETWEEN ? AND ?", 'idx_sales_date'),
+    ('flowers.py', 'flowershop.db', "SELECT id, purchase_date FROM purchases WHERE purchase_date BETWEEN ? AND ?",
+     'idx_purchases_date'),
+    ('flowers.py', 'flowershop.db', "SELECT COUNT(*) FROM sales WHERE flower_id = ?", 'idx_sales_flower'),
+    ('hookahbar.py', 'hookah.db', "SELECT name FROM tobaccos WHERE date(created_at) BETWEEN ? AND ?", 'idx_tobaccos_day'),
+    ('hookahbar.py', 'hookah.db', "SELECT name FROM hookahs WHERE date(created_at) BETWEEN ? AND ?", 'idx_hookahs_day'),
+    ('hookahbar.py', 'hookah.db', "SELECT name FROM establishments WHERE date(created_at) BETWEEN ? AND ?",
+     'idx_establishments_day'),
+    ('moto.py', 'moto_salon.db', "SELECT COUNT(*) FROM motorcycles WHERE status='Продан'", 'idx_motorcycles_status'),
+    ('moto.py', 'moto_salon.db', "SELECT COUNT(*) FROM sales WHERE bike_id = ?", 'idx_sales_bike'),
+    ('musicshop.py', 'music_store.db',
+     '''SELECT products.name, SUM(daily_sales.quantity), SUM(daily_sales.revenue) FROM daily_sales
+        JOIN products ON daily_sales.product_id = products.id GROUP BY product_id ORDER BY SUM(daily_sales.revenue) DESC''',
+     'INTEGER PRIMARY KEY'),
+    ('pharmacy.py', 'pharmacy_database.db',
+     "SELECT medicine_id, unit_price, stock_quantity FROM medicines_inventory WHERE medicine_name=?", 'idx_medicines_name'),
+    ('pharmacy.py', 'pharmacy_database.db',
+     '''SELECT sales_records.transaction_id FROM sales_records JOIN medicines_inventory
+        ON sales_records.medicine_identifier = medicines_inventory.medicine_id
+        WHERE sales_records.transaction_date BETWEEN ? AND ?''', 'idx_sales_records_date'),
+    ('pharmacy.py', 'pharmacy_database.db',
+     '''SELECT medicines_inventory.medicine_name, SUM(daily_sales.quantity) FROM daily_sales
+        JOIN medicines_inventory ON daily_sales.product_id = medicines_inventory.medicine_id
+        GROUP BY daily_sales.product_id ORDER BY SUM(daily_sales.quantity) DESC LIMIT 5''',
+     'INTEGER PRIMARY KEY'),
+    ('restoration.py', 'restoration.db', "SELECT id, client_name FROM orders WHERE status = ?", 'idx_orders_status'),
+    ('restoration.py', 'restoration.db', "SELECT deadline_date FROM orders WHERE status = 'в работе'", 'idx_orders_status'),
+    ('restoration.py', 'restoration.db', "SELECT client_name, deadline_date FROM orders WHERE deadline_date = ?",
+     'idx_orders_deadline'),
+    ('vapeshop.py', 'vapeshop.db', "UPDATE vapes SET quantity = quantity - 1 WHERE name = ?", 'idx_vapes_name'),
+    ('vapeshop.py', 'vapeshop.db',
+     '''SELECT v.name, SUM(d.orders) as cnt FROM daily_sales d JOIN vapes v ON d.product_id = v.id
+        WHERE d.product_type = 'vape' GROUP BY v.name ORDER BY cnt DESC LIMIT 1''', 'INTEGER PRIMARY KEY'),
+    # bulk_import: поиск записи по естественному ключу
+    ('bulk_import.py', 'shop.db', "UPDATE products SET price = ? WHERE name = ?", 'idx_products_name'),
+    ('bulk_import.py', 'music_store.db', "UPDATE products SET price = ? WHERE name = ?", 'idx_products_name'),
+    ('bulk_import.py', 'sports_store.db', "UPDATE products SET price = ? WHERE name = ?", 'idx_products_name'),
+    ('bulk_import.py', 'flowershop.db', "UPDATE flowers SET price = ? WHERE name = ?", 'idx_flowers_name'),
+    ('bulk_import.py', 'pharmacy_database.db',
+     "UPDATE medicines_inventory SET unit_price = ? WHERE medicine_name = ? AND medicine_manufacturer = ?",
+     'idx_medicines_name'),
+    ('search.py', 'service_center.db', "SELECT kind, ref FROM search_index WHERE search_index MATCH ?",
+     'VIRTUAL TABLE INDEX'),
+    # autocomplete: подсказки по префиксу - диапазон по индексу названия
+    ('autocomplete.py', 'shop.db', prefix_query('customers', 'name', 'name', text='ива')[0], 'idx_customers_name'),
+    ('autocomplete.py', 'shop.db', prefix_query('products', 'name', 'name', text='уд')[0], 'idx_products_name'),
+    ('autocomplete.py', 'auto_salon.db', prefix_query('clients', 'name', 'name', text='ива')[0], 'idx_clients_name'),
+    ('autocomplete.py', 'auto_salon.db',
+     prefix_query('cars', "brand || ' ' || model", 'brand', where="status = 'В наличии'", text='то')[0],
+     'idx_cars_status_brand'),
+    ('autocomplete.py', 'service_center.db', prefix_query('clients', 'name', 'name', text='ива')[0],
+     'idx_clients_name'),
+    ('autocomplete.py', 'service_center.db', prefix_query('equipment', 'name', 'name', text='но')[0],
+     'idx_equipment_name'),
+    ('autocomplete.py', 'flowershop.db', prefix_query('suppliers', 'name', 'name', text='цв')[0], 'idx_suppliers_name'),
+    ('autocomplete.py', 'flowershop.db', prefix_query('flowers', 'name', 'name', text='ро')[0], 'idx_flowers_name'),
+    ('autocomplete.py', 'warehouse.db', prefix_query('suppliers', 'name', 'name', text='ро')[0], 'idx_suppliers_name'),
+    ('autocomplete.py', 'fitness_club.db', prefix_query('clients', 'name', 'name', text='ива')[0], 'idx_clients_name'),
+]
+
+
+def main():
+    schemas = {}
+    failed = 0
+    for source, name, query, index in CHECKS:
+        conn = schemas.get(name)
+        if conn is None:
+            conn = sqlite3.connect(':memory:')
+            create_schema(conn, source)
+            migrations.migrate(conn, name)
+            schemas[name] = conn
+        plan = conn.execute("EXPLAIN QUERY PLAN " + query, (None,) * query.count('?')).fetchall()
+        details = ' | '.join(row[-1] for row in plan)
+        ok = index in details
+        failed += not ok
+        print(f"{'ok  ' if ok else 'FAIL'} {name:<22}{index:<28}{details}")
+    for name in migrations.MIGRATIONS:
+        if name not in schemas:
+            print(f"FAIL {name:<22}нет проверок")
+            failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
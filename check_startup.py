@@ -0,0 +1,79 @@
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+
+import apps
+
+# Холодный старт приложения: импорт модуля со всеми зависимостями в новом процессе
+# (python -X importtime). Календарь и карта не должны импортироваться при запуске -
+# они загружаются при построении вкладки (lazy_widgets); asyncio отправки в офис -
+# только если задан адрес сборщика (outbox.start), http.server - при включенных метриках
+ROOT = os.path.dirname(os.path.abspath(__file__))
+BUDGET_MS = 300
+DEFERRED = ('tkcalendar', 'tkintermapview', 'asyncio', 'http.server')
+
+
+def import_times(module, cwd):
+    # Возвращает [(уровень вложенности, модуль, суммарное время импорта, мкс)]
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.environ.get('PYTHONPATH')])))
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', f"import {module}"],
+                            capture_output=True, text=True, cwd=cwd, env=env)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1])
+    times = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Вложенные импорты отмечены отступом, их время уже входит в родителя
+        level = (len(name) - len(name.lstrip()) - 1) // 2
+        times.append((level, name.strip(), int(cumulative)))
+    return times
+
+
+def check_app(app, budget, repeat, cwd):
+    runs = []
+    for _ in range(repeat):
+        times = import_times(app.module, cwd)
+        runs.append((sum(us for level, name, us in times if level == 0) / 1000, times))
+    total_ms, times = min(runs, key=lambda run: run[0])
+    problems = []
+    if total_ms > budget:
+        problems.append(f"старт {total_ms:.0f} мс > {budget} мс")
+    imported = {name for level, name, us in times}
+    for module in DEFERRED:
+        if module in imported:
+            problems.append(f"{module} импортируется при запуске")
+    # Самые тяжелые прямые зависимости приложения
+    slowest = sorted((item for item in times if item[0] == 1), key=lambda item: item[2], reverse=True)[:4]
+    details = ', '.join(f"{name} {us / 1000:.0f}" for level, name, us in slowest)
+    print(f"{'FAIL' if problems else 'ok  '} {app.module:<16}{total_ms:>8.0f} мс  ({details})")
+    for problem in problems:
+        print(f"     {problem}")
+    return not problems
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Проверка времени холодного старта приложений")
+    parser.add_argument('apps', nargs='*', help="модули приложений (по умолчанию все)")
+    parser.add_argument('--budget', type=int, default=BUDGET_MS, help="допустимое время импорта, мс")
+    parser.add_argument('--repeat', type=int, default=3, help="число запусков, берется лучший")
+    args = parser.parse_args()
+
+    selected = [apps.get_app(name) for name in args.apps] if args.apps else apps.APPS
+    failed = 0
+    # Приложения создают базы данных при импорте - запускаем во временном каталоге
+    with tempfile.TemporaryDirectory() as cwd:
+        for app in selected:
+            try:
+                failed += not check_app(app, args.budget, args.repeat, cwd)
+            except RuntimeError as e:
+                print(f"FAIL {app.module:<16}{e}")
+                failed += 1
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,134 @@
+import argparse
+import gzip
+import json
+import sqlite3
+import sys
+import threading
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Сборщик головного офиса: принимает пачки продаж от replication.py (POST
+# /batches, JSON в gzip) и складывает события в head_office.db. Ключ события -
+# (магазин, база, эпоха, id в outbox магазина), поэтому повторно присланная пачка
+# ничего не добавляет, а новые продажи после восстановления базы из снимка с теми
+# же id outbox не теряются (эпоха - outbox.py). GET /stats - число событий по
+# магазинам и базам
+DATABASE = 'head_office.db'
+MAX_BODY = 16 * 1024 * 1024
+
+SCHEMA = '''CREATE TABLE IF NOT EXISTS events (
+                shop TEXT NOT NULL,
+                db TEXT NOT NULL,
+                epoch TEXT NOT NULL,
+                outbox_id INTEGER NOT NULL,
+                tbl TEXT NOT NULL,
+                row_id INTEGER NOT NULL,
+                created_at TEXT,
+                received_at TEXT NOT NULL,
+                data TEXT NOT NULL,
+                PRIMARY KEY (shop, db, epoch, outbox_id)) WITHOUT ROWID'''
+
+# head_office.db без эпохи: события переносятся с пустой эпохой - с ней
+# отправители присылают строки outbox, накопленные до появления эпохи
+UPGRADE = '''ALTER TABLE events RENAME TO events_old;
+{schema};
+INSERT INTO events SELECT shop, db, '', outbox_id, tbl, row_id, created_at, received_at, data FROM events_old;
+DROP TABLE events_old;'''
+
+
+class Collector:
+    def __init__(self, path=DATABASE):
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute(SCHEMA)
+        if 'epoch' not in [column[1] for column in self.conn.execute("PRAGMA table_info(events)")]:
+            self.conn.executescript(f"BEGIN;\n{UPGRADE.format(schema=SCHEMA)}\nCOMMIT;")
+        self.lock = threading.Lock()
+
+    def store(self, batch):
+        # Записать пачку -> (принято, повторов)
+        received = datetime.now().isoformat(sep=' ', timespec='seconds')
+        rows = [(batch['shop'], batch['db'], event.get('epoch', ''), event['id'], event['table'], event['row_id'],
+                 event.get('created_at'), received, json.dumps(event['data'], ensure_ascii=False))
+                for event in batch['events']]
+        with self.lock, self.conn:
+            accepted = self.conn.executemany("INSERT OR IGNORE INTO events VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                                             rows).rowcount
+        return accepted, len(rows) - accepted
+
+    def stats(self):
+        with self.lock:
+            return self.conn.execute("SELECT shop, db, COUNT(*), MAX(outbox_id) FROM events "
+                                     "GROUP BY shop, db ORDER BY shop, db").fetchall()
+
+    def close(self):
+        self.conn.close()
+
+
+class Handler(BaseHTTPRequestHandler):
+    def _reply(self, status, content):
+        body = json.dumps(content, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if self.path != '/batches':
+            return self._reply(404, {'error': "неизвестный адрес"})
+        length = int(self.headers.get('Content-Length') or 0)
+        if length > MAX_BODY:
+            return self._reply(413, {'error': "пачка слишком большая"})
+        body = self.rfile.read(length)
+        try:
+            if self.headers.get('Content-Encoding') == 'gzip':
+                body = gzip.decompress(body)
+            batch = json.loads(body)
+            accepted, duplicates = self.server.collector.store(batch)
+        except (OSError, EOFError, ValueError, KeyError, TypeError) as e:
+            return self._reply(400, {'error': str(e)})
+        except sqlite3.Error as e:
+            return self._reply(503, {'error': str(e)})
+        self._reply(200, {'accepted': accepted, 'duplicates': duplicates})
+
+    def do_GET(self):
+        if self.path != '/stats':
+            return self._reply(404, {'error': "неизвестный адрес"})
+        self._reply(200, [{'shop': shop, 'db': db, 'events': count, 'last': last}
+                          for shop, db, count, last in self.server.collector.stats()])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def make_server(collector, host='127.0.0.1', port=8765):
+    # HTTP-сервер сборщика; port=0 - свободный порт (server.server_address)
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    server.collector = collector
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сборщик продаж магазинов для головного офиса")
+    parser.add_argument('--db', default=DATABASE)
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8765)
+    args = parser.parse_args()
+
+    collector = Collector(args.db)
+    server = make_server(collector, args.host, args.port)
+    print(f"Сборщик: http://{args.host}:{args.port}/batches -> {args.db}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        collector.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
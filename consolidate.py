@@ -0,0 +1,171 @@
+import argparse
+import csv
+import os
+import sqlite3
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import ExitStack
+
+import apps
+from archive import TABLES as ARCHIVED, spanning
+
+# Продажи по файлам баз: запрос возвращает (день, товар, продаж, единиц, выручка)
+# по дням и товарам. В service_center.db, warehouse.db, hookah.db и restoration.db
+# продаж с суммами нет - они не сводятся. Таблицы, которые archive.py переносит в
+# архивы по годам, записаны как {таблица}: на их место подставляется таблица
+# вместе с архивами (archive.spanning), иначе из сводки выпали бы старые годы
+SALES = {
+    'bakery.db': '''SELECT date(o.created_at), m.name, COUNT(*), SUM(o.quantity), SUM(o.quantity * m.price)
+                    FROM {orders} o LEFT JOIN menu m ON o.item_id = m.id GROUP BY 1, 2''',
+    'cleaning.db': '''SELECT date(o.date), s.name, COUNT(*), COUNT(*), SUM(s.price)
+                      FROM orders o LEFT JOIN services s ON o.service_id = s.id GROUP BY 1, 2''',
+    'computer_club.db': '''SELECT date(b.start_time), r.name, COUNT(*), COUNT(*),
+                                  SUM((strftime('%s', b.end_time) - strftime('%s', b.start_time)) / 3600.0 * r.price_per_hour)
+                           FROM {Bookings} b LEFT JOIN Rooms r ON b.room_id = r.id GROUP BY 1, 2''',
+    'fitness_club.db': '''SELECT date(p.purchase_date), s.name, COUNT(*), COUNT(*),
+                                 SUM(s.price * (1 - COALESCE(p.discount, 0) / 100.0))
+                          FROM purchases p LEFT JOIN subscriptions s ON p.subscription_id = s.id GROUP BY 1, 2''',
+    'jewelry.db': '''SELECT date(o.created_at), p.name, COUNT(*), SUM(o.quantity), SUM(o.quantity * p.price)
+                     FROM {orders} o LEFT JOIN products p ON o.product_id = p.id GROUP BY 1, 2''',
+    'sports_store.db': '''SELECT date(o.created_at), p.name, COUNT(*), SUM(o.quantity), SUM(o.quantity * p.price)
+                          FROM {orders} o LEFT JOIN products p ON o.product_id = p.id GROUP BY 1, 2''',
+    'YaCoffeeBAZA.db': '''SELECT date(order_date), NULL, COUNT(*), COUNT(*), SUM(total_amount)
+                          FROM orders GROUP BY 1''',
+    'auto_salon.db': '''SELECT date(s.sale_date), c.brand || ' ' || c.model, COUNT(*), COUNT(*), SUM(s.amount)
+                        FROM {sales} s LEFT JOIN cars c ON s.car_id = c.id GROUP BY 1, 2''',
+    'shop.db': '''SELECT date(o.date), p.name, COUNT(*), SUM(o.quantity), SUM(o.quantity * p.price)
+                  FROM orders o LEFT JOIN products p ON o.product_id = p.id GROUP BY 1, 2''',
+    'flowershop.db': '''SELECT date(s.sale_date), f.name, COUNT(*), SUM(s.quantity), SUM(s.total_price)
+                        FROM {sales} s LEFT JOIN flowers f ON s.flower_id = f.id GROUP BY 1, 2''',
+    'moto_salon.db': '''SELECT date(s.sale_date), m.model, COUNT(*), COUNT(*), SUM(s.amount)
+                        FROM {sales} s LEFT JOIN motorcycles m ON s.bike_id = m.id GROUP BY 1, 2''',
+    'music_store.db': '''SELECT date(s.date), p.name, COUNT(*), SUM(s.quantity), SUM(s.total)
+                         FROM {sales} s LEFT JOIN products p ON s.product_id = p.id GROUP BY 1, 2''',
+    'pharmacy_database.db': '''SELECT date(s.transaction_date), m.medicine_name, COUNT(*), SUM(s.sold_quantity),
+                                      SUM(s.total_amount)
+                               FROM {sales_records} s
+                               LEFT JOIN medicines_inventory m ON s.medicine_identifier = m.medicine_id GROUP BY 1, 2''',
+    'vapeshop.db': '''SELECT date(o.date), COALESCE(v.name, l.name), COUNT(*), SUM(o.quantity), SUM(o.total)
+                      FROM orders o
+                      LEFT JOIN vapes v ON o.product_type = 'vape' AND o.product_id = v.id
+                      LEFT JOIN liquids l ON o.product_type = 'liquid' AND o.product_id = l.id GROUP BY 1, 2''',
+}
+
+STORE_DAYS = ('store', 'app', 'day', 'orders', 'units', 'revenue', 'top_product')
+STORES = ('store', 'app', 'days', 'orders', 'units', 'revenue', 'top_product')
+
+
+def find_stores(paths):
+    # Файлы баз с известной схемой продаж: сами файлы и базы внутри каталогов
+    found = []
+    for path in paths:
+        if os.path.isdir(path):
+            for directory, dirs, files in os.walk(path):
+                dirs.sort()
+                found.extend(os.path.join(directory, name) for name in sorted(files) if name in SALES)
+        elif os.path.basename(path) in SALES:
+            found.append(path)
+        else:
+            raise ValueError(f"неизвестная схема продаж: {path}")
+    return found
+
+
+def top(products):
+    # Товар с наибольшей выручкой
+    return max(products.items(), key=lambda item: item[1])[0] if products else None
+
+
+def scan_store(path):
+    # Выполняется в процессе пула: база открывается только на чтение, наружу
+    # уходят итоги по дням и по магазину, а не строки продаж
+    app = apps.get_app(os.path.basename(path))
+    conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True)
+    try:
+        conn.execute("PRAGMA query_only = ON")
+        with ExitStack() as stack:
+            sources = {table: stack.enter_context(spanning(conn, table)) for table, column in ARCHIVED.get(app.db, ())}
+            rows = conn.execute(SALES[app.db].format(**sources)).fetchall()
+    finally:
+        conn.close()
+    days = {}
+    products = {}
+    for day, product, orders, units, revenue in rows:
+        units, revenue = units or 0, revenue or 0
+        totals = days.setdefault(day, [0, 0, 0, {}])
+        totals[0] += orders
+        totals[1] += units
+        totals[2] += revenue
+        if product is not None:
+            totals[3][product] = totals[3].get(product, 0) + revenue
+            products[product] = products.get(product, 0) + revenue
+    store_days = [(path, app.title, day, orders, units, revenue, top(day_products))
+                  for day, (orders, units, revenue, day_products) in sorted(days.items(), key=lambda d: d[0] or '')]
+    store = (path, app.title, len(days), sum(d[3] for d in store_days), sum(d[4] for d in store_days),
+             sum(d[5] for d in store_days), top(products))
+    return store, store_days
+
+
+def consolidate(paths, jobs=None):
+    # Итоги магазинов и дней; файлы обрабатываются параллельно, порядок результатов - порядок paths
+    if jobs == 1:
+        return [scan_store(path) for path in paths]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return list(pool.map(scan_store, paths))
+
+
+def write_sqlite(path, results):
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute(f"CREATE TABLE stores ({', '.join(STORES)}, PRIMARY KEY (store))")
+        conn.execute(f"CREATE TABLE store_days ({', '.join(STORE_DAYS)}, PRIMARY KEY (store, day))")
+        conn.executemany(f"INSERT INTO stores VALUES ({', '.join('?' * len(STORES))})",
+                         (store for store, store_days in results))
+        for store, store_days in results:
+            conn.executemany(f"INSERT INTO store_days VALUES ({', '.join('?' * len(STORE_DAYS))})", store_days)
+        conn.execute('''CREATE VIEW days AS SELECT day, COUNT(*) AS stores, SUM(orders) AS orders,
+                        SUM(units) AS units, SUM(revenue) AS revenue FROM store_days GROUP BY day''')
+        conn.commit()
+    finally:
+        conn.close()
+
+
+def write_csv(path, results):
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f)
+        writer.writerow(STORE_DAYS)
+        for store, store_days in results:
+            writer.writerows(store_days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сводная аналитика продаж по базам всех магазинов")
+    parser.add_argument('paths', nargs='*', default=['.'], help="файлы баз или каталоги с ними (по умолчанию текущий)")
+    parser.add_argument('--out', default='consolidated.db', help="файл результата: .db/.sqlite или .csv")
+    parser.add_argument('--jobs', type=int, default=None, help="процессов (по умолчанию по числу ядер)")
+    args = parser.parse_args()
+
+    try:
+        paths = find_stores(args.paths)
+    except ValueError as e:
+        print(e)
+        return 1
+    if not paths:
+        print("Базы магазинов не найдены")
+        return 1
+    start = time.perf_counter()
+    results = consolidate(paths, args.jobs)
+    if args.out.endswith('.csv'):
+        write_csv(args.out, results)
+    else:
+        write_sqlite(args.out, results)
+    for (store, title, days, orders, units, revenue, top_product), store_days in results:
+        print(f"{title:<22}{store:<40}{orders:>10}{units:>10}{revenue:>18.2f}  {top_product or ''}")
+    print(f"{len(paths)} баз за {time.perf_counter() - start:.2f} с -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,340 @@
+import argparse
+import ast
+import json
+import math
+import os
+import random
+import sqlite3
+import sys
+import time
+from datetime import datetime, timedelta
+
+import apps
+import migrations
+
+# Таблицы операций (продажи, заказы, брони): в них --rows строк
+FACT_TABLES = {'orders', 'sales', 'purchases', 'Bookings', 'requests', 'sales_records', 'reports',
+               'goods'}
+# Клиенты: --clients строк; остальные справочники - --products строк
+CLIENT_TABLES = {'clients', 'customers'}
+# Небольшие справочники с фиксированным числом строк
+SMALL_TABLES = {
+    'settings': 1, 'company': 1, 'Computers': 10, 'Rooms': 8, 'zones': 40, 'subscriptions': 12,
+    'employees': 40, 'suppliers': 150, 'locations': 30, 'points': 30, 'markers': 30, 'addresses': 30,
+}
+# Внешние ключи, не объявленные через REFERENCES: (таблица, столбец) -> таблица
+REFERENCES = {
+    ('orders', 'item_id'): 'menu',
+    ('orders', 'service_id'): 'services',
+    ('orders', 'employee_id'): 'employees',
+    ('orders', 'product_id'): 'products',
+    ('orders', 'customer_id'): 'customers',
+    ('products', 'supplier_id'): 'suppliers',
+    ('goods', 'supplier_id'): 'suppliers',
+    ('goods', 'zone_id'): 'zones',
+    ('flowers', 'supplier_id'): 'suppliers',
+    ('sales', 'flower_id'): 'flowers',
+    ('sales', 'product_id'): 'products',
+    ('sales', 'customer_id'): 'customers',
+    ('purchases', 'flower_id'): 'flowers',
+    ('purchases', 'supplier_id'): 'suppliers',
+}
+# В vapeshop заказ ссылается на вейп или жидкость - таблицы одного размера
+DB_REFERENCES = {
+    ('vapeshop.db', 'orders', 'product_id'): 'vapes',
+}
+# Столбцы дат: по умолчанию дата со временем, как пишет datetime.now()
+DATE_COLUMNS = {
+    'created_at', 'created_date', 'order_date', 'sale_date', 'purchase_date', 'date', 'start_time',
+    'end_time', 'report_date', 'reg_date', 'deadline_date', 'date_added', 'transaction_date',
+    'expiration_date',
+}
+# Столбцы, куда приложения пишут только дату (DateEntry, DATE('now'))
+DATE_ONLY = {
+    ('cleaning.db', 'orders', 'date'),
+    ('fitness_club.db', 'purchases', 'purchase_date'),
+    ('warehouse.db', 'goods', 'date_added'),
+    ('auto_salon.db', 'clients', 'reg_date'),
+    ('auto_salon.db', 'sales', 'sale_date'),
+    ('moto_salon.db', 'clients', 'reg_date'),
+    ('moto_salon.db', 'sales', 'sale_date'),
+    ('pharmacy_database.db', 'medicines_inventory', 'expiration_date'),
+    ('pharmacy_database.db', 'sales_records', 'transaction_date'),
+    ('restoration.db', 'orders', 'order_date'),
+    ('restoration.db', 'orders', 'deadline_date'),
+}
+# Подписи для названий позиций справочников
+LABELS = {
+    'menu': "Выпечка", 'services': "Услуга", 'Computers': "ПК", 'Rooms': "Зал", 'subscriptions': "Абонемент",
+    'products': "Товар", 'equipment': "Устройство", 'zones': "Зона", 'suppliers': "Поставщик",
+    'goods': "Груз", 'inventory': "Позиция", 'points': "Точка", 'locations': "Филиал", 'flowers': "Цветок",
+    'tobaccos': "Табак", 'hookahs': "Кальян", 'establishments': "Кальянная", 'motorcycles': "Модель",
+    'medicines_inventory': "Препарат", 'vapes': "Вейп", 'liquids': "Жидкость", 'markers': "Метка",
+    'addresses': "Адрес",
+}
+PERSON_TABLES = CLIENT_TABLES | {'employees'}
+FIRST_NAMES = ["Александр", "Мария", "Дмитрий", "Анна", "Сергей", "Елена", "Иван", "Ольга", "Андрей",
+               "Наталья", "Михаил", "Татьяна", "Алексей", "Ирина", "Павел", "Екатерина"]
+LAST_NAMES = ["Иванов", "Смирнов", "Кузнецов", "Попов", "Васильев", "Петров", "Соколов", "Михайлов",
+              "Новиков", "Федоров", "Морозов", "Волков", "Алексеев", "Лебедев", "Семенов", "Егоров"]
+STREETS = ["Ленина", "Мира", "Гагарина", "Советская", "Садовая", "Лесная", "Пушкина", "Молодежная"]
+BRANDS = ["Toyota", "Kia", "Hyundai", "Lada", "BMW", "Skoda", "Volkswagen", "Haval"]
+COLORS = ["Белый", "Черный", "Серый", "Красный", "Синий"]
+TASTES = ["Мята", "Яблоко", "Виноград", "Дыня", "Ягоды", "Цитрус"]
+
+
+def person(g, i, row):
+    return f"{g.rnd.choice(LAST_NAMES)} {g.rnd.choice(FIRST_NAMES)}"
+
+
+def phone(g, i, row):
+    return f"+7 9{g.rnd.randint(10, 99)} {g.rnd.randint(100, 999)}-{g.rnd.randint(10, 99)}-{g.rnd.randint(10, 99)}"
+
+
+def address(g, i, row):
+    return f"ул. {g.rnd.choice(STREETS)}, д. {g.rnd.randint(1, 150)}"
+
+
+def money(low, high):
+    return lambda g, i, row: round(g.rnd.uniform(low, high), 2)
+
+
+def number(low, high):
+    return lambda g, i, row: g.rnd.randint(low, high)
+
+
+def choice(*values):
+    return lambda g, i, row: g.rnd.choice(values)
+
+
+# Значения по имени столбца для всех баз
+COLUMN_VALUES = {
+    'phone': phone, 'contact': phone,
+    'email': lambda g, i, row: f"client{i}@mail.ru",
+    'client': person, 'client_name': person, 'full_name': person,
+    'address': address,
+    'price': money(100, 15000), 'unit_price': money(50, 3000), 'price_per_hour': money(80, 400),
+    'amount': money(300000, 5000000), 'total': money(200, 50000), 'total_amount': money(150, 5000),
+    'total_price': money(300, 15000), 'salary': money(30000, 150000), 'discount': choice(0, 0, 5, 10, 15),
+    'quantity': number(1, 5), 'stock_quantity': number(0, 500), 'sold_quantity': number(1, 5),
+    'age': number(16, 70), 'year': number(2005, 2025), 'mileage': number(0, 200000),
+    'latitude': lambda g, i, row: round(g.rnd.uniform(55.55, 55.95), 6),
+    'longitude': lambda g, i, row: round(g.rnd.uniform(37.35, 37.85), 6),
+    'description': lambda g, i, row: f"Описание {i}",
+    'position': choice("Бариста", "Кассир", "Менеджер", "Флорист", "Администратор"),
+    'serial_number': lambda g, i, row: f"SN{i:08d}",
+    'computer_number': number(1, 20),
+    'report_text': lambda g, i, row: f"Этап работ {g.rnd.randint(1, 5)} выполнен",
+}
+# Значения для отдельных баз: (база, таблица, столбец)
+DB_VALUES = {
+    ('bakery.db', 'orders', 'status'): choice("Новый"),
+    ('jewelry.db', 'orders', 'status'): choice("Новый"),
+    ('sports_store.db', 'orders', 'status'): choice("Новый"),
+    ('cleaning.db', 'orders', 'status'): choice("Новый"),
+    ('service_center.db', 'requests', 'status'): choice("В обработке", "В работе", "Готово"),
+    ('computer_club.db', 'Rooms', 'quantity'): number(20, 20),
+    ('computer_club.db', 'Bookings', 'end_time'):
+        lambda g, i, row: row['start_time'] + timedelta(hours=g.rnd.randint(1, 5)),
+    ('fitness_club.db', 'subscriptions', 'type'): choice("дневной", "вечерний", "безлимитный"),
+    ('fitness_club.db', 'subscriptions', 'duration'): choice(30, 90, 180, 365),
+    ('fitness_club.db', 'subscriptions', 'start_time'): choice("07:00", "08:00", "17:00"),
+    ('fitness_club.db', 'subscriptions', 'end_time'): choice("16:00", "23:00"),
+    ('warehouse.db', 'zones', 'capacity'): number(10000, 10000),
+    ('warehouse.db', 'zones', 'occupied'): number(0, 5000),
+    ('warehouse.db', 'goods', 'quantity'): number(1, 200),
+    ('YaCoffeeBAZA.db', 'inventory', 'quantity'): number(0, 300),
+    ('auto_salon.db', 'cars', 'brand'): choice(*BRANDS),
+    ('auto_salon.db', 'cars', 'color'): choice(*COLORS),
+    ('auto_salon.db', 'cars', 'engine_type'): choice("Бензин", "Дизель", "Гибрид", "Электро"),
+    ('auto_salon.db', 'cars', 'trim_level'): choice("Базовая", "Расширенная", "Полная"),
+    ('auto_salon.db', 'cars', 'price'): money(900000, 8000000),
+    ('auto_salon.db', 'cars', 'status'): choice("В наличии", "В наличии", "Продан"),
+    ('moto_salon.db', 'motorcycles', 'price'): money(300000, 2500000),
+    ('moto_salon.db', 'motorcycles', 'status'): choice("В наличии", "В наличии", "Продан"),
+    ('shop.db', 'products', 'quantity'): number(0, 500),
+    ('flowershop.db', 'flowers', 'quantity'): number(0, 1000),
+    ('flowershop.db', 'purchases', 'quantity'): number(10, 300),
+    ('hookah.db', 'tobaccos', 'strength'): number(1, 10),
+    ('hookah.db', 'tobaccos', 'grams'): choice(25, 50, 100, 200),
+    ('hookah.db', 'hookahs', 'tobacco_taste'): choice(*TASTES),
+    ('hookah.db', 'establishments', 'hookahs'):
+        lambda g, i, row: json.dumps([f"{LABELS['hookahs']} {k}"
+                                      for k in g.rnd.sample(range(1, g.counts['hookahs'] + 1),
+                                                            min(3, g.counts['hookahs']))]),
+    ('hookah.db', 'establishments', 'quantities'): number(5, 40),
+    ('music_store.db', 'products', 'quantity'): number(0, 100),
+    ('pharmacy_database.db', 'medicines_inventory', 'medicine_manufacturer'):
+        choice("Фармстандарт", "Биокад", "Отисифарм", "Герофарм"),
+    ('pharmacy_database.db', 'medicines_inventory', 'expiration_date'):
+        lambda g, i, row: g.end + timedelta(days=g.rnd.randint(30, 720)),
+    ('restoration.db', 'orders', 'deadline_date'):
+        lambda g, i, row: row['order_date'] + timedelta(days=g.rnd.randint(7, 60)),
+    ('restoration.db', 'orders', 'status'):
+        lambda g, i, row: "завершено" if row['deadline_date'] < g.end - timedelta(days=14) else "в работе",
+    ('vapeshop.db', 'liquids', 'flavor'): choice(*TASTES),
+    ('vapeshop.db', 'liquids', 'volume'): choice(30, 60, 100),
+    ('vapeshop.db', 'liquids', 'nicotine'): choice(0, 3, 6, 12, 20),
+    ('vapeshop.db', 'liquids', 'quantity'): number(0, 200),
+    ('vapeshop.db', 'vapes', 'quantity'): number(0, 100),
+    ('vapeshop.db', 'orders', 'product_type'): choice("vape", "liquid"),
+    ('vapeshop.db', 'orders', 'quantity'): number(1, 1),
+}
+
+
+def create_schema(conn, source):
+    # Выполнить CREATE TABLE из исходника приложения, не импортируя его (Tk)
+    with open(source, encoding='utf-8') as f:
+        tree = ast.parse(f.read())
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Constant) and isinstance(node.value, str) \
+                and 'CREATE TABLE' in node.value.upper():
+            conn.execute(node.value)
+
+
+class Generator:
+    # Заполняет схему одного приложения: справочники, затем таблицы операций.
+    # Даты операций растут вместе с id и сгущаются к концу периода (рост бизнеса)
+    def __init__(self, conn, db, clients=1000, products=200, rows=100000, days=730, seed=1):
+        self.conn = conn
+        self.db = db
+        self.sizes = {'clients': clients, 'products': products, 'rows': rows}
+        self.rnd = random.Random(seed)
+        self.end = datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+        self.days = days
+        self.counts = {}
+
+    def tables(self):
+        names = [row[0] for row in self.conn.execute(
+            "SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%' ORDER BY rowid")]
+        # Сначала таблицы, на которые ссылаются другие
+        ordered = []
+        while names:
+            for name in names:
+                if not set(self.references(name).values()) & (set(names) - {name}):
+                    break
+            names.remove(name)
+            ordered.append(name)
+        return ordered
+
+    def references(self, table):
+        result = {}
+        for row in self.conn.execute(f"PRAGMA foreign_key_list({table})"):
+            result[row[3]] = row[2]
+        for (name, column), target in REFERENCES.items():
+            if name == table:
+                result.setdefault(column, target)
+        for (db, name, column), target in DB_REFERENCES.items():
+            if db == self.db and name == table:
+                result[column] = target
+        return result
+
+    def count(self, table):
+        if table in FACT_TABLES:
+            return self.sizes['rows']
+        if table in CLIENT_TABLES:
+            return self.sizes['clients']
+        return SMALL_TABLES.get(table, self.sizes['products'])
+
+    def moment(self, i, count):
+        # Доля периода sqrt(i/count): плотность записей растет к концу
+        share = math.sqrt((i + self.rnd.random()) / count)
+        day = self.end - timedelta(days=int(self.days * (1 - share)))
+        return day + timedelta(hours=self.rnd.randint(9, 21), minutes=self.rnd.randint(0, 59),
+                               seconds=self.rnd.randint(0, 59))
+
+    def generators(self, table):
+        references = self.references(table)
+        result = []
+        for cid, column, ctype, notnull, default, pk in self.conn.execute(f"PRAGMA table_info({table})"):
+            if pk:
+                continue
+            func = DB_VALUES.get((self.db, table, column))
+            if func is None and column in references:
+                target = references[column]
+                func = lambda g, i, row, target=target: g.rnd.randint(1, g.counts[target])
+            if func is None and column in DATE_COLUMNS:
+                func = lambda g, i, row, count=self.count(table): g.moment(i, count)
+            if func is None and column == 'name' and table in PERSON_TABLES:
+                func = person
+            if func is None:
+                func = COLUMN_VALUES.get(column)
+            if func is None and ctype.upper() in ('INTEGER', 'REAL'):
+                func = number(1, 100)
+            if func is None:
+                label = LABELS.get(table, column)
+                func = lambda g, i, row, label=label: f"{label} {i}"
+            date_only = (self.db, table, column) in DATE_ONLY
+            result.append((column, func, '%Y-%m-%d' if date_only else '%Y-%m-%d %H:%M:%S'))
+        return result
+
+    def fill_table(self, table, count, batch=10000):
+        columns = self.generators(table)
+        sql = f"INSERT INTO {table} ({', '.join(c[0] for c in columns)}) VALUES ({', '.join('?' * len(columns))})"
+        rows = []
+        for i in range(1, count + 1):
+            row = {}
+            for column, func, date_format in columns:
+                row[column] = func(self, i, row)
+            rows.append(tuple(value.strftime(date_format) if isinstance(value, datetime) else value
+                              for value in (row[c[0]] for c in columns)))
+            if len(rows) >= batch:
+                self.conn.executemany(sql, rows)
+                rows = []
+        if rows:
+            self.conn.executemany(sql, rows)
+        self.counts[table] = count
+
+    def fill(self, log=None):
+        for table in self.tables():
+            start = time.perf_counter()
+            self.fill_table(table, self.count(table))
+            if log:
+                log(f"  {table:<22}{self.counts[table]:>10} строк  {time.perf_counter() - start:6.1f} с")
+        self.conn.commit()
+
+
+def generate(app, directory='.', clients=1000, products=200, rows=100000, days=730, seed=1, log=None):
+    # Создать базу приложения с синтетическими данными в directory.
+    # Индексы миграций строятся после загрузки - так быстрее
+    path = os.path.join(directory, app.db)
+    if os.path.exists(path):
+        os.remove(path)
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode=OFF")
+    conn.execute("PRAGMA synchronous=OFF")
+    try:
+        create_schema(conn, os.path.join(os.path.dirname(os.path.abspath(__file__)), apps.source(app)))
+        generator = Generator(conn, app.db, clients, products, rows, days, seed)
+        generator.fill(log)
+        migrations.migrate(conn, app.db)
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Синтетические данные для баз приложений")
+    parser.add_argument('apps', nargs='*', help="модули или файлы баз (по умолчанию все)")
+    parser.add_argument('--dir', default='bench_data', help="каталог для баз")
+    parser.add_argument('--clients', type=int, default=1000)
+    parser.add_argument('--products', type=int, default=200)
+    parser.add_argument('--rows', type=int, default=100000, help="строк в таблицах продаж и заказов")
+    parser.add_argument('--days', type=int, default=730, help="период дат операций")
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    os.makedirs(args.dir, exist_ok=True)
+    selected = [apps.get_app(name) for name in args.apps] or apps.APPS
+    for app in selected:
+        start = time.perf_counter()
+        print(f"{app.db}:")
+        generate(app, args.dir, args.clients, args.products, args.rows, args.days, args.seed, log=print)
+        print(f"  готово за {time.perf_counter() - start:.1f} с")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+import atexit
+import os
+import random
+import sqlite3
+import sys
+import time
+
+import tracing
+
+JOURNAL_MODE = 'TRUNCATE'
+SYNCHRONOUS = 'NORMAL'
+CACHE_SIZE = -8000
+CACHED_STATEMENTS = 256
+# Ожидание чужой блокировки, прежде чем sqlite3 вернет "database is locked"
+BUSY_TIMEOUT = 2.0
+
+# Режим нескольких касс на одном файле базы: включается переменной окружения
+# KP_MULTI_TERMINAL=1 или флагом --multi-terminal. База переводится в WAL
+# (чтение не ждет записи), продажа пишется в транзакции BEGIN IMMEDIATE,
+# которая при занятой базе повторяется до WRITE_RETRIES раз с растущей паузой.
+# WAL работает только для кас на одном компьютере, не для файла на сетевом диске
+MULTI_TERMINAL_ENV = 'KP_MULTI_TERMINAL'
+MULTI_TERMINAL_FLAG = '--multi-terminal'
+MULTI_TERMINAL = (os.environ.get(MULTI_TERMINAL_ENV, '') not in ('', '0')
+                  or MULTI_TERMINAL_FLAG in sys.argv)
+WRITE_RETRIES = 5
+RETRY_DELAY = 0.05
+
+_connections = {}
+
+
+def open_connection(path, check_same_thread=True):
+    # Отдельное соединение с теми же настройками (для фоновых потоков и утилит)
+    conn = sqlite3.connect(path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS,
+                           check_same_thread=check_same_thread,
+                           factory=tracing.connection_factory())
+    # База, которую уже перевела в WAL другая касса, остается в WAL
+    if MULTI_TERMINAL:
+        conn.execute("PRAGMA journal_mode=WAL")
+    elif conn.execute("PRAGMA journal_mode").fetchone()[0] != 'wal':
+        conn.execute(f"PRAGMA journal_mode={JOURNAL_MODE}")
+    conn.execute(f"PRAGMA synchronous={SYNCHRONOUS}")
+    conn.execute(f"PRAGMA cache_size={CACHE_SIZE}")
+    return conn
+
+
+def get_connection(path):
+    # Одно долгоживущее соединение на файл базы для всего процесса
+    key = os.path.abspath(path)
+    conn = _connections.get(key)
+    if conn is None:
+        conn = open_connection(path)
+        _connections[key] = conn
+    return conn
+
+
+def _busy(error):
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+
+def run_write(conn, func, retries=WRITE_RETRIES):
+    # func(conn) в транзакции BEGIN IMMEDIATE: блокировка записи берется сразу,
+    # поэтому проверки остатков внутри func видят актуальные данные. Если база
+    # занята другой кассой дольше BUSY_TIMEOUT, транзакция откатывается и
+    # повторяется целиком; возвращает результат func. Незавершенная транзакция
+    # вызывающего не фиксируется молча: это ошибка, ее нужно закончить до вызова
+    if conn.in_transaction:
+        raise sqlite3.ProgrammingError("run_write: у соединения уже открыта транзакция")
+    for attempt in range(retries + 1):
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            result = func(conn)
+            conn.commit()
+            return result
+        except sqlite3.Error as error:
+            if conn.in_transaction:
+                conn.rollback()
+            if not _busy(error) or attempt == retries:
+                raise
+        except BaseException:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        time.sleep(RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5))
+
+
+def database_path(conn):
+    # Файл основной базы соединения
+    return next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == 'main')
+
+
+def close_connection(path):
+    conn = _connections.pop(os.path.abspath(path), None)
+    if conn is not None:
+        conn.close()
+
+
+def close_all():
+    while _connections:
+        _, conn = _connections.popitem()
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+
+atexit.register(close_all)
@@ -0,0 +1,206 @@
+import csv
+import json
+import os
+import queue
+import sqlite3
+import tempfile
+import threading
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+
+import db_session
+from backup import copy_database
+
+# Выгрузка списков и отчетов в CSV/NDJSON потоком: строки читаются из курсора
+# пачками по EXPORT_BATCH (fetchmany) и сразу пишутся в файл, поэтому память не
+# зависит от числа строк. Файл пишется под временным именем и переименовывается
+# только целым. В режиме журнала отката (не WAL) окно выгрузки читает из копии
+# базы (snapshot): открытый на всю выгрузку курсор держал бы блокировку SHARED,
+# и продажи с кассы ждали бы конца выгрузки. Копия снимается шагами
+# (backup.copy_database), между шагами касса успевает записать продажу
+EXPORT_BATCH = 1000
+FILETYPES = [("CSV", "*.csv"), ("NDJSON", "*.ndjson")]
+
+
+class ExportCancelled(Exception):
+    pass
+
+
+def stream(cursor, batch=EXPORT_BATCH):
+    while True:
+        rows = cursor.fetchmany(batch)
+        if not rows:
+            return
+        yield rows
+
+
+def _value(value):
+    return value.hex() if isinstance(value, bytes) else value
+
+
+def write_csv(f, columns, batches):
+    writer = csv.writer(f)
+    writer.writerow(columns)
+    for rows in batches:
+        writer.writerows(rows)
+        yield len(rows)
+
+
+def write_ndjson(f, columns, batches):
+    encode = json.JSONEncoder(ensure_ascii=False).encode
+    for rows in batches:
+        f.writelines(encode(dict(zip(columns, map(_value, row)))) + '\n' for row in rows)
+        yield len(rows)
+
+
+WRITERS = {'.csv': write_csv, '.ndjson': write_ndjson}
+
+
+def count_rows(conn, query, params=()):
+    return conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+
+
+def snapshot(path, directory, cancel=None):
+    # Копия базы path в directory по PAGES_PER_STEP страниц за шаг с паузой
+    # (backup.copy_database). cancel - threading.Event для отмены.
+    # Возвращает путь к копии
+    def check(copied, total):
+        if cancel is not None and cancel.is_set():
+            raise ExportCancelled()
+
+    copy = os.path.join(directory, os.path.basename(path))
+    copy_database(path, copy, progress=check)
+    return copy
+
+
+def export_query(conn, query, params, path, progress=None, cancel=None, batch=EXPORT_BATCH):
+    # Выгрузить результат query в path (формат по расширению); progress(строк)
+    # вызывается после каждой пачки, cancel - threading.Event для отмены.
+    # Возвращает число строк
+    writer = WRITERS.get(os.path.splitext(path)[1].lower())
+    if writer is None:
+        raise ValueError(f"неизвестный формат файла: {path}")
+    partial = path + '.part'
+    written = 0
+    try:
+        cursor = conn.execute(query, params)
+        columns = [d[0] for d in cursor.description]
+        with open(partial, 'w', newline='', encoding='utf-8') as f:
+            for count in writer(f, columns, stream(cursor, batch)):
+                written += count
+                if progress:
+                    progress(written)
+                if cancel is not None and cancel.is_set():
+                    raise ExportCancelled()
+        os.replace(partial, path)
+    finally:
+        if os.path.exists(partial):
+            os.remove(partial)
+    return written
+
+
+def ask_export(master, path, query, params=(), title="Экспорт", **options):
+    # Спросить файл и открыть окно выгрузки; None, если пользователь отказался
+    filename = filedialog.asksaveasfilename(parent=master, title=title, defaultextension='.csv',
+                                            filetypes=FILETYPES)
+    if not filename:
+        return None
+    return ExportDialog(master, filename, path, query, params, title, **options)
+
+
+class ExportDialog(tk.Toplevel):
+    # Окно выгрузки в filename: запрос выполняется в фоновом потоке со своим
+    # соединением к базе path, прогресс виден в окне. total - число строк, если
+    # известно (иначе считается перед выгрузкой)
+    def __init__(self, master, filename, path, query, params=(), title="Экспорт", total=None):
+        super().__init__(master)
+        self.title(title)
+        self.resizable(False, False)
+        self.transient(master)
+        self.filename = filename
+        self.path = path
+        self.query = query
+        self.params = tuple(params)
+        self.total = total
+        self._cancel = threading.Event()
+        self._events = queue.Queue()
+        self._conn = None
+
+        self.label = ttk.Label(self, text=f"Выгрузка в {os.path.basename(filename)}...", padding=(10, 10, 10, 4))
+        self.label.pack(fill=tk.X)
+        self.progress = ttk.Progressbar(self, length=320, mode='indeterminate')
+        self.progress.pack(padx=10, pady=4)
+        self.button = ttk.Button(self, text="Отмена", command=self.cancel)
+        self.button.pack(pady=(4, 10))
+        self.protocol("WM_DELETE_WINDOW", self.cancel)
+
+        self.progress.start(15)
+        threading.Thread(target=self._run, name='export', daemon=True).start()
+        self.after(100, self._poll)
+
+    def _run(self):
+        copies = tempfile.TemporaryDirectory()
+        try:
+            self._conn = db_session.open_connection(self.path)
+            if self._conn.execute("PRAGMA journal_mode").fetchone()[0] != 'wal':
+                self._conn.close()
+                self._conn = None
+                copy = snapshot(os.path.abspath(self.path), copies.name, self._cancel)
+                self._conn = db_session.open_connection(copy)
+            if self.total is None:
+                self._events.put(('total', count_rows(self._conn, self.query, self.params)))
+            written = export_query(self._conn, self.query, self.params, self.filename,
+                                   progress=lambda count: self._events.put(('progress', count)),
+                                   cancel=self._cancel)
+            self._events.put(('done', written))
+        except ExportCancelled:
+            self._events.put(('cancelled', None))
+        except (sqlite3.Error, OSError, ValueError) as e:
+            self._events.put(('cancelled' if self._cancel.is_set() else 'error', e))
+        finally:
+            if self._conn is not None:
+                self._conn.close()
+            copies.cleanup()
+
+    def _poll(self):
+        while True:
+            try:
+                event, value = self._events.get_nowait()
+            except queue.Empty:
+                break
+            if event == 'total':
+                self.total = value
+            elif event == 'progress':
+                if self.total:
+                    if str(self.progress['mode']) != 'determinate':
+                        self.progress.stop()
+                        self.progress.config(mode='determinate', maximum=self.total)
+                    self.progress['value'] = value
+                    self.label.config(text=f"Выгружено {value:,} из {self.total:,}".replace(',', ' '))
+                else:
+                    self.label.config(text=f"Выгружено {value:,}".replace(',', ' '))
+            else:
+                self._finish(event, value)
+                return
+        self.after(100, self._poll)
+
+    def _finish(self, event, value):
+        self.progress.stop()
+        if event == 'done':
+            self.progress.config(mode='determinate', maximum=max(value, 1), value=max(value, 1))
+            self.label.config(text=f"Выгружено строк: {value}\n{self.filename}")
+            self.button.config(text="Закрыть", command=self.destroy)
+            self.protocol("WM_DELETE_WINDOW", self.destroy)
+            return
+        if event == 'error':
+            messagebox.showerror("Ошибка", f"Не удалось выгрузить: {value}", parent=self)
+        self.destroy()
+
+    def cancel(self):
+        self._cancel.set()
+        try:
+            if self._conn is not None:
+                self._conn.interrupt()
+        except sqlite3.ProgrammingError:
+            pass
+        self.button.config(state='disabled')
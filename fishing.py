@@ -1,26 +1,92 @@
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from bulk_import import ask_import
+import tracing
+from query_executor import QueryExecutor, show_loading
+from tree_sync import sync_tree, stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
+from autocomplete import AutocompleteCombobox
 import tkinter as tk
 from tkinter import ttk, messagebox
 
-class FishingShopApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+ORDERS_QUERY = """SELECT o.id AS id, c.name AS customer, p.name AS product, o.quantity AS quantity, o.date AS date 
+                 FROM orders o 
+                 JOIN customers c ON o.customer_id = c.id 
+                 JOIN products p ON o.product_id = p.id"""
+
+
+class FishingShopService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_product(self, name, price, quantity, supplier_name):
+        self.add_products([(name, price, quantity, supplier_name)])
+
+    def add_products(self, records):
+        # records - [(товар, цена, количество, название поставщика)]
+        def write(conn):
+            for name, price, quantity, supplier_name in records:
+                supplier = conn.execute("SELECT id FROM suppliers WHERE name=?", (supplier_name,)).fetchone()
+                if supplier is None:
+                    raise LookupError(f"Поставщик '{supplier_name}' не найден")
+                conn.execute("INSERT INTO products (name, price, quantity, supplier_id) VALUES (?, ?, ?, ?)",
+                             (name, price, quantity, supplier[0]))
+        run_write(self.conn, write)
+
+    def delete_product(self, product_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM products WHERE id=?", (product_id,)))
+
+    def add_supplier(self, name, contact):
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO suppliers (name, contact) VALUES (?, ?)", (name, contact)))
+
+    def delete_supplier(self, supplier_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM suppliers WHERE id=?", (supplier_id,)))
+
+    def add_customer(self, name, phone, email):
+        self.add_customers([(name, phone, email)])
+
+    def add_customers(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO customers (name, phone, email) VALUES (?, ?, ?)", records))
+
+    def delete_customer(self, customer_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM customers WHERE id=?", (customer_id,)))
+
+    def create_order(self, customer_id, product_id, quantity, date=None):
+        self.create_orders([(customer_id, product_id, quantity, date)])
+
+    def create_orders(self, records):
+        # records - [(клиент, товар, количество, дата или None - сейчас)]
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO orders (customer_id, product_id, quantity, date) VALUES (?, ?, ?, COALESCE(?, datetime('now')))",
+            records))
+
+
+class FishingShopApp(tk.Toplevel):
+    def __init__(self, root):
+        super().__init__(root)
         self.title("Магазин рыболовных товаров")
         self.geometry("1000x700")
         self.style = ttk.Style()
-        self.style.theme_use("clam")
+        use_theme(self.style, "clam")
+        scope_styles(self, 'Fishing')
         self.configure_style()
         self.create_db()
+        self.queries = QueryExecutor(self, "shop.db")
         self.create_widgets()
 
     def configure_style(self):
-        self.style.configure("TNotebook", background="#f0f0f0")
-        self.style.configure("TFrame", background="#f0f0f0")
-        self.style.configure("TButton", padding=6, font=('Arial', 10))
-        self.style.map("TButton", background=[('active', '#ddd')])
+        self.style.configure("Fishing.TNotebook", background="#f0f0f0")
+        self.style.configure("Fishing.TFrame", background="#f0f0f0")
+        self.style.configure("Fishing.TButton", padding=6, font=('Arial', 10))
+        self.style.map("Fishing.TButton", background=[('active', '#ddd')])
 
     def create_db(self):
-        self.conn = sqlite3.connect("shop.db")
+        self.conn = get_connection("shop.db")
         self.cursor = self.conn.cursor()
         self.cursor.execute("""CREATE TABLE IF NOT EXISTS products 
                             (id INTEGER PRIMARY KEY, 
@@ -41,26 +107,27 @@ class FishingShopApp(tk.Tk):
                              name TEXT, 
                              contact TEXT)""")
         self.conn.commit()
+        migrate(self.conn, 'shop.db')
+        self.service = FishingShopService(self.conn)
 
     def create_widgets(self):
-        self.notebook = ttk.Notebook(self)
+        self.notebook = LazyNotebook(self)
         
         self.tab_products = ttk.Frame(self.notebook)
         self.tab_customers = ttk.Frame(self.notebook)
         self.tab_orders = ttk.Frame(self.notebook)
         self.tab_suppliers = ttk.Frame(self.notebook)
         
-        self.notebook.add(self.tab_products, text="Товары")
-        self.notebook.add(self.tab_customers, text="Клиенты")
-        self.notebook.add(self.tab_orders, text="Заказы")
-        self.notebook.add(self.tab_suppliers, text="Поставщики")
+        self.notebook.add_lazy(self.tab_products, self.create_products_tab,
+                               (self.update_products_tree, self.update_suppliers_combobox), text="Товары")
+        self.notebook.add_lazy(self.tab_customers, self.create_customers_tab, self.update_customers_tree, text="Клиенты")
+        self.notebook.add_lazy(self.tab_orders, self.create_orders_tab,
+                               (self.update_comboboxes, self.update_orders_tree), text="Заказы")
+        self.notebook.add_lazy(self.tab_suppliers, self.create_suppliers_tab, self.update_suppliers_tree,
+                               text="Поставщики")
+        add_search_tab(self.notebook, self.queries)
         self.notebook.pack(expand=True, fill="both")
 
-        self.create_products_tab()
-        self.create_customers_tab()
-        self.create_orders_tab()
-        self.create_suppliers_tab()
-
     def create_products_tab(self):
         frame = ttk.Frame(self.tab_products)
         frame.pack(pady=10)
@@ -84,6 +151,7 @@ class FishingShopApp(tk.Tk):
 
         ttk.Button(frame, text="Добавить", command=self.add_product).grid(row=0, column=8, padx=5)
         ttk.Button(frame, text="Удалить", command=self.delete_product).grid(row=0, column=9, padx=5)
+        ttk.Button(frame, text="Импорт из CSV", command=self.import_products).grid(row=0, column=10, padx=5)
 
         # Таблица товаров
         columns = ("id", "name", "price", "quantity", "supplier")
@@ -98,40 +166,38 @@ class FishingShopApp(tk.Tk):
         self.update_suppliers_combobox()
 
     def add_product(self):
-        supplier_name = self.product_supplier.get()
-        supplier_id = self.cursor.execute("SELECT id FROM suppliers WHERE name=?", (supplier_name,)).fetchone()
-        
-        if not supplier_id:
+        try:
+            self.service.add_product(self.product_name.get(),
+                                     float(self.product_price.get()),
+                                     int(self.product_quantity.get()),
+                                     self.product_supplier.get())
+        except LookupError:
             messagebox.showerror("Ошибка", "Выберите поставщика из списка")
             return
-            
-        self.cursor.execute("""INSERT INTO products 
-                            (name, price, quantity, supplier_id) 
-                            VALUES (?, ?, ?, ?)""",
-                            (self.product_name.get(), 
-                             float(self.product_price.get()), 
-                             int(self.product_quantity.get()),
-                             supplier_id[0]))
-        self.conn.commit()
         self.update_products_tree()
+        self.notebook.mark_stale(self.tab_orders)
+
+    def import_products(self):
+        def done(result):
+            self.update_products_tree()
+            self.notebook.mark_stale(self.tab_orders)
+        ask_import(self, self.queries, 'shop.db', on_done=done)
 
     def delete_product(self):
         selected = self.products_tree.selection()
         if selected:
-            self.cursor.execute("DELETE FROM products WHERE id=?", 
-                               (self.products_tree.item(selected[0], "values")[0],))
-            self.conn.commit()
+            self.service.delete_product(self.products_tree.item(selected[0], "values")[0])
             self.update_products_tree()
+            self.notebook.mark_stale(self.tab_orders)
 
     def update_products_tree(self):
-        for row in self.products_tree.get_children():
-            self.products_tree.delete(row)
-            
-        query = """SELECT p.id, p.name, p.price, p.quantity, s.name 
+        show_loading(self.products_tree, keep_rows=True)
+        self.queries.submit('products', """SELECT p.id, p.name, p.price, p.quantity, s.name 
                  FROM products p 
-                 LEFT JOIN suppliers s ON p.supplier_id = s.id"""
-        for row in self.cursor.execute(query):
-            self.products_tree.insert("", "end", values=row)
+                 LEFT JOIN suppliers s ON p.supplier_id = s.id""", on_done=self.fill_products_tree)
+
+    def fill_products_tree(self, rows):
+        sync_tree(self.products_tree, rows)
 
     def create_suppliers_tab(self):
         frame = ttk.Frame(self.tab_suppliers)
@@ -159,26 +225,23 @@ class FishingShopApp(tk.Tk):
         self.update_suppliers_tree()
 
     def add_supplier(self):
-        self.cursor.execute("INSERT INTO suppliers (name, contact) VALUES (?, ?)",
-                           (self.supplier_name.get(), self.supplier_contact.get()))
-        self.conn.commit()
+        self.service.add_supplier(self.supplier_name.get(), self.supplier_contact.get())
         self.update_suppliers_tree()
-        self.update_suppliers_combobox()
+        self.notebook.mark_stale(self.tab_products)
 
     def delete_supplier(self):
         selected = self.suppliers_tree.selection()
         if selected:
-            self.cursor.execute("DELETE FROM suppliers WHERE id=?", 
-                               (self.suppliers_tree.item(selected[0], "values")[0],))
-            self.conn.commit()
+            self.service.delete_supplier(self.suppliers_tree.item(selected[0], "values")[0])
             self.update_suppliers_tree()
-            self.update_suppliers_combobox()
+            self.notebook.mark_stale(self.tab_products)
 
     def update_suppliers_tree(self):
-        for row in self.suppliers_tree.get_children():
-            self.suppliers_tree.delete(row)
-        for row in self.cursor.execute("SELECT * FROM suppliers"):
-            self.suppliers_tree.insert("", "end", values=row)
+        show_loading(self.suppliers_tree, keep_rows=True)
+        self.queries.submit('suppliers', "SELECT * FROM suppliers", on_done=self.fill_suppliers_tree)
+
+    def fill_suppliers_tree(self, rows):
+        sync_tree(self.suppliers_tree, rows)
 
     def update_suppliers_combobox(self):
         suppliers = [row[1] for row in self.cursor.execute("SELECT * FROM suppliers")]
@@ -214,35 +277,31 @@ class FishingShopApp(tk.Tk):
         self.update_customers_tree()
 
     def add_customer(self):
-        self.cursor.execute("INSERT INTO customers (name, phone, email) VALUES (?, ?, ?)",
-                           (self.customer_name.get(), self.customer_phone.get(), self.customer_email.get()))
-        self.conn.commit()
+        self.service.add_customer(self.customer_name.get(), self.customer_phone.get(), self.customer_email.get())
         self.update_customers_tree()
-        self.update_comboboxes()
+        self.notebook.mark_stale(self.tab_orders)
 
     def delete_customer(self):
         selected = self.customers_tree.selection()
         if selected:
-            self.cursor.execute("DELETE FROM customers WHERE id=?", (self.customers_tree.item(selected[0], "values")[0],))
-            self.conn.commit()
+            self.service.delete_customer(self.customers_tree.item(selected[0], "values")[0])
             self.update_customers_tree()
+            self.notebook.mark_stale(self.tab_orders)
 
     def update_customers_tree(self):
-        for row in self.customers_tree.get_children():
-            self.customers_tree.delete(row)
-        for row in self.cursor.execute("SELECT * FROM customers"):
-            self.customers_tree.insert("", "end", values=row)
+        show_loading(self.customers_tree, keep_rows=True)
+        stream_tree(self.queries, 'customers', self.customers_tree, "SELECT * FROM customers")
 
     def create_orders_tab(self):
         frame = ttk.Frame(self.tab_orders)
         frame.pack(pady=10)
 
         ttk.Label(frame, text="Клиент:").grid(row=0, column=0, padx=5)
-        self.order_customer = ttk.Combobox(frame, state="readonly")
+        self.order_customer = AutocompleteCombobox(frame, self.queries, 'customers')
         self.order_customer.grid(row=0, column=1, padx=5)
 
         ttk.Label(frame, text="Товар:").grid(row=0, column=2, padx=5)
-        self.order_product = ttk.Combobox(frame, state="readonly")
+        self.order_product = AutocompleteCombobox(frame, self.queries, 'products')
         self.order_product.grid(row=0, column=3, padx=5)
 
         ttk.Label(frame, text="Количество:").grid(row=0, column=4, padx=5)
@@ -253,7 +312,7 @@ class FishingShopApp(tk.Tk):
         self.update_comboboxes()
 
         columns = ("id", "customer", "product", "quantity", "date")
-        self.orders_tree = ttk.Treeview(self.tab_orders, columns=columns, show="headings")
+        self.orders_tree = VirtualTreeview(self.tab_orders, self.conn, ORDERS_QUERY, columns=columns)
         self.orders_tree.heading("id", text="ID")
         self.orders_tree.heading("customer", text="Клиент")
         self.orders_tree.heading("product", text="Товар")
@@ -263,29 +322,25 @@ class FishingShopApp(tk.Tk):
         self.update_orders_tree()
 
     def update_comboboxes(self):
-        customers = [row[1] for row in self.cursor.execute("SELECT * FROM customers")]
-        products = [row[1] for row in self.cursor.execute("SELECT * FROM products")]
-        self.order_customer["values"] = customers
-        self.order_product["values"] = products
+        self.order_customer.refresh()
+        self.order_product.refresh()
 
     def create_order(self):
-        customer_id = self.cursor.execute("SELECT id FROM customers WHERE name=?", (self.order_customer.get(),)).fetchone()[0]
-        product_id = self.cursor.execute("SELECT id FROM products WHERE name=?", (self.order_product.get(),)).fetchone()[0]
-        self.cursor.execute("INSERT INTO orders (customer_id, product_id, quantity, date) VALUES (?, ?, ?, datetime('now'))",
-                           (customer_id, product_id, int(self.order_quantity.get())))
-        self.conn.commit()
+        customer_id = self.order_customer.get_id()
+        product_id = self.order_product.get_id()
+        if customer_id is None or product_id is None:
+            messagebox.showerror("Ошибка", "Выберите клиента и товар из списка")
+            return
+        self.service.create_order(customer_id, product_id, int(self.order_quantity.get()))
         self.update_orders_tree()
 
     def update_orders_tree(self):
-        for row in self.orders_tree.get_children():
-            self.orders_tree.delete(row)
-        query = """SELECT o.id, c.name, p.name, o.quantity, o.date 
-                 FROM orders o 
-                 JOIN customers c ON o.customer_id = c.id 
-                 JOIN products p ON o.product_id = p.id"""
-        for row in self.cursor.execute(query):
-            self.orders_tree.insert("", "end", values=row)
+        self.orders_tree.refresh()
 
 if __name__ == "__main__":
-    app = FishingShopApp()
-    app.mainloop()
+    root = tk.Tk()
+    root.withdraw()
+    app = FishingShopApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    tracing.install(app)
+    root.mainloop()
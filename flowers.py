@@ -1,10 +1,106 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from bulk_import import ask_import
+from archive import spanning
+import tracing
+import outbox
+from query_executor import QueryExecutor, show_loading, clear
+from tree_sync import sync_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
+from autocomplete import AutocompleteCombobox
 from datetime import datetime
-from tkintermapview import TkinterMapView
-from tkcalendar import DateEntry
+from lazy_widgets import TkinterMapView, DateEntry
+
+SALES_QUERY = "SELECT sales.id AS ID, flowers.name AS Flower, sales.quantity AS Quantity, sales.sale_date AS Date, sales.total_price AS Total FROM sales JOIN flowers ON sales.flower_id = flowers.id"
+PURCHASES_QUERY = "SELECT purchases.id AS ID, flowers.name AS Flower, purchases.quantity AS Quantity, purchases.purchase_date AS Date, suppliers.name AS Supplier FROM purchases JOIN flowers ON purchases.flower_id = flowers.id JOIN suppliers ON purchases.supplier_id = suppliers.id"
+
+
+class FlowerShopService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def _write(self, sql, params):
+        run_write(self.conn, lambda conn: conn.execute(sql, params))
+
+    def add_flower(self, name, quantity, price, supplier_id):
+        self.add_flowers([(name, quantity, price, supplier_id)])
+
+    def add_flowers(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO flowers (name, quantity, price, supplier_id) VALUES (?, ?, ?, ?)", records))
+
+    def update_flower(self, flower_id, name, quantity, price, supplier_id):
+        self._write("UPDATE flowers SET name=?, quantity=?, price=?, supplier_id=? WHERE id=?",
+                    (name, quantity, price, supplier_id, flower_id))
+
+    def delete_flower(self, flower_id):
+        self._write("DELETE FROM flowers WHERE id=?", (flower_id,))
+
+    def add_supplier(self, name, contact):
+        self._write("INSERT INTO suppliers (name, contact) VALUES (?, ?)", (name, contact))
+
+    def update_supplier(self, supplier_id, name, contact):
+        self._write("UPDATE suppliers SET name=?, contact=? WHERE id=?", (name, contact, supplier_id))
+
+    def delete_supplier(self, supplier_id):
+        self._write("DELETE FROM suppliers WHERE id=?", (supplier_id,))
+
+    def add_employee(self, full_name, position, salary):
+        self._write("INSERT INTO employees (full_name, position, salary) VALUES (?, ?, ?)",
+                    (full_name, position, salary))
+
+    def update_employee(self, employee_id, full_name, position, salary):
+        self._write("UPDATE employees SET full_name=?, position=?, salary=? WHERE id=?",
+                    (full_name, position, salary, employee_id))
+
+    def delete_employee(self, employee_id):
+        self._write("DELETE FROM employees WHERE id=?", (employee_id,))
+
+    def sell(self, flower_id, quantity, date):
+        self.sell_many([(flower_id, quantity, date)])
+
+    def sell_many(self, sales):
+        # sales - [(цветок, количество, дата)]; сумма считается по текущей цене
+        def write(conn):
+            for flower_id, quantity, date in sales:
+                row = conn.execute("SELECT price FROM flowers WHERE id=?", (flower_id,)).fetchone()
+                if row is None:
+                    raise LookupError("Цветок не найден")
+                conn.execute("INSERT INTO sales (flower_id, quantity, sale_date, total_price) VALUES (?, ?, ?, ?)",
+                             (flower_id, quantity, date, row[0] * quantity))
+                conn.execute("UPDATE flowers SET quantity = quantity - ? WHERE id=?", (quantity, flower_id))
+        run_write(self.conn, write)
+
+    def purchase(self, flower_id, supplier_id, quantity, date):
+        self.purchase_many([(flower_id, supplier_id, quantity, date)])
+
+    def purchase_many(self, purchases):
+        # purchases - [(цветок, поставщик, количество, дата)]
+        def write(conn):
+            conn.executemany("INSERT INTO purchases (flower_id, quantity, purchase_date, supplier_id) VALUES (?, ?, ?, ?)",
+                             [(flower_id, quantity, date, supplier_id)
+                              for flower_id, supplier_id, quantity, date in purchases])
+            conn.executemany("UPDATE flowers SET quantity = quantity + ? WHERE id=?",
+                             [(quantity, flower_id) for flower_id, supplier_id, quantity, date in purchases])
+        run_write(self.conn, write)
+
+    def add_location(self, address, latitude, longitude):
+        self._write("INSERT INTO locations (address, latitude, longitude) VALUES (?, ?, ?)",
+                    (address, latitude, longitude))
+
+    def update_location(self, location_id, address, latitude, longitude):
+        self._write("UPDATE locations SET address=?, latitude=?, longitude=? WHERE id=?",
+                    (address, latitude, longitude, location_id))
+
+    def delete_location(self, location_id):
+        self._write("DELETE FROM locations WHERE id=?", (location_id,))
+
 
 class FlowerShopApp:
     def __init__(self, root):
@@ -14,21 +110,23 @@ class FlowerShopApp:
         
         self.set_styles()
         self.create_database()
+        self.queries = QueryExecutor(root, 'flowershop.db')
+        outbox.start('flowershop.db')
         self.create_widgets()
-        self.load_initial_data()
 
     def set_styles(self):
         self.style = ttk.Style()
-        self.style.theme_use('clam')
-        self.style.configure('TFrame', background='#F5F5F5')
-        self.style.configure('TLabel', background='#F5F5F5', font=('Arial', 10))
-        self.style.configure('TButton', font=('Arial', 10), padding=5)
-        self.style.configure('Treeview.Heading', font=('Arial', 10, 'bold'))
-        self.style.configure('Treeview', font=('Arial', 9), rowheight=25)
-        self.style.map('TButton', foreground=[('active', '!disabled', 'white')], background=[('active', '#0052cc')])
+        use_theme(self.style, 'clam')
+        scope_styles(self.root, 'Flowers')
+        self.style.configure('Flowers.TFrame', background='#F5F5F5')
+        self.style.configure('Flowers.TLabel', background='#F5F5F5', font=('Arial', 10))
+        self.style.configure('Flowers.TButton', font=('Arial', 10), padding=5)
+        self.style.configure('Flowers.Treeview.Heading', font=('Arial', 10, 'bold'))
+        self.style.configure('Flowers.Treeview', font=('Arial', 9), rowheight=25)
+        self.style.map('Flowers.TButton', foreground=[('active', '!disabled', 'white')], background=[('active', '#0052cc')])
 
     def create_database(self):
-        self.conn = sqlite3.connect('flowershop.db')
+        self.conn = get_connection('flowershop.db')
         self.cursor = self.conn.cursor()
         
         self.cursor.execute('''
@@ -88,9 +186,11 @@ class FlowerShopApp:
         ''')
         
         self.conn.commit()
+        migrate(self.conn, 'flowershop.db')
+        self.service = FlowerShopService(self.conn)
 
     def create_widgets(self):
-        self.notebook = ttk.Notebook(self.root)
+        self.notebook = LazyNotebook(self.root)
         
         self.flowers_frame = ttk.Frame(self.notebook)
         self.suppliers_frame = ttk.Frame(self.notebook)
@@ -100,23 +200,22 @@ class FlowerShopApp:
         self.reports_frame = ttk.Frame(self.notebook)
         self.map_frame = ttk.Frame(self.notebook)
         
-        self.notebook.add(self.flowers_frame, text="Цветы")
-        self.notebook.add(self.suppliers_frame, text="Поставщики")
-        self.notebook.add(self.employees_frame, text="Сотрудники")
-        self.notebook.add(self.sales_frame, text="Продажи")
-        self.notebook.add(self.purchases_frame, text="Закупки")
-        self.notebook.add(self.reports_frame, text="Отчеты")
-        self.notebook.add(self.map_frame, text="Карта")
+        self.notebook.add_lazy(self.flowers_frame, self.create_flowers_tab,
+                               (self.update_flowers_tree, self.update_supplier_combobox), text="Цветы")
+        self.notebook.add_lazy(self.suppliers_frame, self.create_suppliers_tab, self.update_suppliers_tree,
+                               text="Поставщики")
+        self.notebook.add_lazy(self.employees_frame, self.create_employees_tab, self.update_employees_tree,
+                               text="Сотрудники")
+        self.notebook.add_lazy(self.sales_frame, self.create_sales_tab,
+                               (self.update_sale_combobox, self.update_sales_tree), text="Продажи")
+        self.notebook.add_lazy(self.purchases_frame, self.create_purchases_tab,
+                               (self.update_purchase_comboboxes, self.update_purchases_tree), text="Закупки")
+        self.notebook.add_lazy(self.reports_frame, self.create_reports_tab, text="Отчеты")
+        self.notebook.add_lazy(self.map_frame, self.create_map_tab,
+                               (self.update_locations_tree, self.update_map_markers), text="Карта")
+        add_search_tab(self.notebook, self.queries)
         
         self.notebook.pack(expand=1, fill='both')
-        
-        self.create_flowers_tab()
-        self.create_suppliers_tab()
-        self.create_employees_tab()
-        self.create_sales_tab()
-        self.create_purchases_tab()
-        self.create_reports_tab()
-        self.create_map_tab()
 
     def create_flowers_tab(self):
         frame = ttk.LabelFrame(self.flowers_frame, text="Управление цветами", padding=10)
@@ -135,7 +234,7 @@ class FlowerShopApp:
         self.flower_price.grid(row=2, column=1, pady=2)
 
         ttk.Label(frame, text="Поставщик:").grid(row=3, column=0, sticky='e')
-        self.flower_supplier = ttk.Combobox(frame, width=27)
+        self.flower_supplier = AutocompleteCombobox(frame, self.queries, 'suppliers', width=27)
         self.flower_supplier.grid(row=3, column=1, pady=2)
 
         btn_frame = ttk.Frame(frame)
@@ -143,8 +242,10 @@ class FlowerShopApp:
         ttk.Button(btn_frame, text="Добавить", command=self.add_flower).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Обновить", command=self.update_flower).pack(side='left', padx=5)
         ttk.Button(btn_frame, text="Удалить", command=self.delete_flower).pack(side='left', padx=5)
+        ttk.Button(btn_frame, text="Импорт из CSV", command=self.import_flowers).pack(side='left', padx=5)
 
-        self.flowers_tree = ttk.Treeview(self.flowers_frame, columns=('ID','Name','Quantity','Price','Supplier'), show='headings')
+        self.flowers_tree = ttk.Treeview(self.flowers_frame, columns=('ID','Name','Quantity','Price','Supplier','SupplierID'),
+                                         displaycolumns=('ID','Name','Quantity','Price','Supplier'), show='headings')
         self.flowers_tree.heading('ID', text='ID')
         self.flowers_tree.heading('Name', text='Название')
         self.flowers_tree.heading('Quantity', text='Количество')
@@ -153,6 +254,8 @@ class FlowerShopApp:
         self.flowers_tree.pack(fill='both', expand=True)
         
         self.flowers_tree.bind('<<TreeviewSelect>>', self.load_flower_data)
+        self.update_flowers_tree()
+        self.update_supplier_combobox()
 
     def create_suppliers_tab(self):
         frame = ttk.LabelFrame(self.suppliers_frame, text="Управление поставщиками", padding=10)
@@ -179,6 +282,7 @@ class FlowerShopApp:
         self.suppliers_tree.pack(fill='both', expand=True)
         
         self.suppliers_tree.bind('<<TreeviewSelect>>', self.load_supplier_data)
+        self.update_suppliers_tree()
 
     def create_employees_tab(self):
         frame = ttk.LabelFrame(self.employees_frame, text="Управление сотрудниками", padding=10)
@@ -210,13 +314,14 @@ class FlowerShopApp:
         self.employees_tree.pack(fill='both', expand=True)
         
         self.employees_tree.bind('<<TreeviewSelect>>', self.load_employee_data)
+        self.update_employees_tree()
 
     def create_sales_tab(self):
         frame = ttk.LabelFrame(self.sales_frame, text="Управление продажами", padding=10)
         frame.pack(pady=10, padx=10, fill='both', expand=True)
 
         ttk.Label(frame, text="Цветок:").grid(row=0, column=0, sticky='e')
-        self.sale_flower = ttk.Combobox(frame, width=27)
+        self.sale_flower = AutocompleteCombobox(frame, self.queries, 'flowers', width=27)
         self.sale_flower.grid(row=0, column=1, pady=2)
 
         ttk.Label(frame, text="Количество:").grid(row=1, column=0, sticky='e')
@@ -225,20 +330,22 @@ class FlowerShopApp:
 
         ttk.Button(frame, text="Добавить", command=self.add_sale).grid(row=2, column=0, columnspan=2, pady=10)
 
-        self.sales_tree = ttk.Treeview(self.sales_frame, columns=('ID','Flower','Quantity','Date','Total'), show='headings')
+        self.sales_tree = VirtualTreeview(self.sales_frame, self.conn, SALES_QUERY, columns=('ID','Flower','Quantity','Date','Total'), key='ID', sort_map={'Date': 'Date'})
         self.sales_tree.heading('ID', text='ID')
         self.sales_tree.heading('Flower', text='Цветок')
         self.sales_tree.heading('Quantity', text='Количество')
         self.sales_tree.heading('Date', text='Дата')
         self.sales_tree.heading('Total', text='Сумма')
         self.sales_tree.pack(fill='both', expand=True)
+        self.update_sale_combobox()
+        self.update_sales_tree()
 
     def create_purchases_tab(self):
         frame = ttk.LabelFrame(self.purchases_frame, text="Управление закупками", padding=10)
         frame.pack(pady=10, padx=10, fill='both', expand=True)
 
         ttk.Label(frame, text="Цветок:").grid(row=0, column=0, sticky='e')
-        self.purchase_flower = ttk.Combobox(frame, width=27)
+        self.purchase_flower = AutocompleteCombobox(frame, self.queries, 'flowers', width=27)
         self.purchase_flower.grid(row=0, column=1, pady=2)
 
         ttk.Label(frame, text="Количество:").grid(row=1, column=0, sticky='e')
@@ -246,18 +353,20 @@ class FlowerShopApp:
         self.purchase_quantity.grid(row=1, column=1, pady=2)
 
         ttk.Label(frame, text="Поставщик:").grid(row=2, column=0, sticky='e')
-        self.purchase_supplier = ttk.Combobox(frame, width=27)
+        self.purchase_supplier = AutocompleteCombobox(frame, self.queries, 'suppliers', width=27)
         self.purchase_supplier.grid(row=2, column=1, pady=2)
 
         ttk.Button(frame, text="Добавить", command=self.add_purchase).grid(row=3, column=0, columnspan=2, pady=10)
 
-        self.purchases_tree = ttk.Treeview(self.purchases_frame, columns=('ID','Flower','Quantity','Date','Supplier'), show='headings')
+        self.purchases_tree = VirtualTreeview(self.purchases_frame, self.conn, PURCHASES_QUERY, columns=('ID','Flower','Quantity','Date','Supplier'), key='ID', sort_map={'Date': 'Date'})
         self.purchases_tree.heading('ID', text='ID')
         self.purchases_tree.heading('Flower', text='Цветок')
         self.purchases_tree.heading('Quantity', text='Количество')
         self.purchases_tree.heading('Date', text='Дата')
         self.purchases_tree.heading('Supplier', text='Поставщик')
         self.purchases_tree.pack(fill='both', expand=True)
+        self.update_purchase_comboboxes()
+        self.update_purchases_tree()
 
     def create_reports_tab(self):
         frame = ttk.LabelFrame(self.reports_frame, text="Отчеты", padding=10)
@@ -334,69 +443,59 @@ class FlowerShopApp:
         self.locations_tree.grid(row=4, column=0, columnspan=2, pady=10)
         
         self.locations_tree.bind('<<TreeviewSelect>>', self.load_location_data)
-
-    def load_initial_data(self):
-        self.update_flowers_tree()
-        self.update_suppliers_tree()
-        self.update_employees_tree()
-        self.update_sales_tree()
-        self.update_purchases_tree()
-        self.update_comboboxes()
         self.update_locations_tree()
         self.update_map_markers()
 
-    def update_comboboxes(self):
-        self.cursor.execute("SELECT id, name FROM suppliers")
-        suppliers = self.cursor.fetchall()
-        self.flower_supplier['values'] = [f"{s[0]} - {s[1]}" for s in suppliers]
-        self.purchase_supplier['values'] = [f"{s[0]} - {s[1]}" for s in suppliers]
-        
-        self.cursor.execute("SELECT id, name FROM flowers")
-        flowers = self.cursor.fetchall()
-        self.sale_flower['values'] = [f"{f[0]} - {f[1]}" for f in flowers]
-        self.purchase_flower['values'] = [f"{f[0]} - {f[1]}" for f in flowers]
+    def update_supplier_combobox(self):
+        self.flower_supplier.refresh()
+
+    def update_sale_combobox(self):
+        self.sale_flower.refresh()
+
+    def update_purchase_comboboxes(self):
+        self.purchase_supplier.refresh()
+        self.purchase_flower.refresh()
+
+    def selected_supplier(self):
+        # id поставщика из поля; None - поставщик не указан
+        supplier_id = self.flower_supplier.get_id()
+        if supplier_id is None and self.flower_supplier.get().strip():
+            raise ValueError("Выберите поставщика из списка")
+        return supplier_id
 
     def update_flowers_tree(self):
-        for item in self.flowers_tree.get_children():
-            self.flowers_tree.delete(item)
-        self.cursor.execute("SELECT flowers.id, flowers.name, flowers.quantity, flowers.price, suppliers.name FROM flowers LEFT JOIN suppliers ON flowers.supplier_id = suppliers.id")
-        for row in self.cursor.fetchall():
-            self.flowers_tree.insert('', 'end', values=row)
+        show_loading(self.flowers_tree, keep_rows=True)
+        self.queries.submit('flowers', "SELECT flowers.id, flowers.name, flowers.quantity, flowers.price, suppliers.name, flowers.supplier_id FROM flowers LEFT JOIN suppliers ON flowers.supplier_id = suppliers.id", on_done=self.fill_flowers_tree)
+
+    def fill_flowers_tree(self, rows):
+        sync_tree(self.flowers_tree, rows)
 
     def update_suppliers_tree(self):
-        for item in self.suppliers_tree.get_children():
-            self.suppliers_tree.delete(item)
-        self.cursor.execute("SELECT * FROM suppliers")
-        for row in self.cursor.fetchall():
-            self.suppliers_tree.insert('', 'end', values=row)
+        show_loading(self.suppliers_tree, keep_rows=True)
+        self.queries.submit('suppliers', "SELECT * FROM suppliers", on_done=self.fill_suppliers_tree)
+
+    def fill_suppliers_tree(self, rows):
+        sync_tree(self.suppliers_tree, rows)
 
     def update_employees_tree(self):
-        for item in self.employees_tree.get_children():
-            self.employees_tree.delete(item)
-        self.cursor.execute("SELECT * FROM employees")
-        for row in self.cursor.fetchall():
-            self.employees_tree.insert('', 'end', values=row)
+        show_loading(self.employees_tree, keep_rows=True)
+        self.queries.submit('employees', "SELECT * FROM employees", on_done=self.fill_employees_tree)
+
+    def fill_employees_tree(self, rows):
+        sync_tree(self.employees_tree, rows)
 
     def update_sales_tree(self):
-        for item in self.sales_tree.get_children():
-            self.sales_tree.delete(item)
-        self.cursor.execute("SELECT sales.id, flowers.name, sales.quantity, sales.sale_date, sales.total_price FROM sales JOIN flowers ON sales.flower_id = flowers.id")
-        for row in self.cursor.fetchall():
-            self.sales_tree.insert('', 'end', values=row)
+        self.sales_tree.refresh()
 
     def update_purchases_tree(self):
-        for item in self.purchases_tree.get_children():
-            self.purchases_tree.delete(item)
-        self.cursor.execute("SELECT purchases.id, flowers.name, purchases.quantity, purchases.purchase_date, suppliers.name FROM purchases JOIN flowers ON purchases.flower_id = flowers.id JOIN suppliers ON purchases.supplier_id = suppliers.id")
-        for row in self.cursor.fetchall():
-            self.purchases_tree.insert('', 'end', values=row)
+        self.purchases_tree.refresh()
 
     def update_locations_tree(self):
-        for item in self.locations_tree.get_children():
-            self.locations_tree.delete(item)
-        self.cursor.execute("SELECT * FROM locations")
-        for row in self.cursor.fetchall():
-            self.locations_tree.insert('', 'end', values=row)
+        show_loading(self.locations_tree, keep_rows=True)
+        self.queries.submit('locations', "SELECT * FROM locations", on_done=self.fill_locations_tree)
+
+    def fill_locations_tree(self, rows):
+        sync_tree(self.locations_tree, rows)
 
     def update_map_markers(self):
         self.map_widget.delete_all_marker()
@@ -415,7 +514,7 @@ class FlowerShopApp:
             self.flower_quantity.insert(0, values[2])
             self.flower_price.delete(0, tk.END)
             self.flower_price.insert(0, values[3])
-            self.flower_supplier.set(f"{values[4]}" if values[4] else "")
+            self.flower_supplier.select(values[5] if values[5] != '' else None, values[4])
 
     def load_supplier_data(self, event):
         selected = self.suppliers_tree.selection()
@@ -453,35 +552,35 @@ class FlowerShopApp:
 
     def add_flower(self):
         try:
-            supplier = self.flower_supplier.get().split(' - ')[0]
-            self.cursor.execute("INSERT INTO flowers (name, quantity, price, supplier_id) VALUES (?, ?, ?, ?)",
-                               (self.flower_name.get(), 
-                                int(self.flower_quantity.get()),
-                                float(self.flower_price.get()),
-                                int(supplier) if supplier else None))
-            self.conn.commit()
+            self.service.add_flower(self.flower_name.get(),
+                                    int(self.flower_quantity.get()),
+                                    float(self.flower_price.get()),
+                                    self.selected_supplier())
             self.update_flowers_tree()
-            self.update_comboboxes()
+            self.notebook.mark_stale(self.sales_frame, self.purchases_frame)
             self.clear_flower_fields()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
+    def import_flowers(self):
+        def done(result):
+            self.update_flowers_tree()
+            self.notebook.mark_stale(self.sales_frame, self.purchases_frame)
+        ask_import(self.root, self.queries, 'flowershop.db', on_done=done)
+
     def update_flower(self):
         selected = self.flowers_tree.selection()
         if selected:
             try:
                 item = self.flowers_tree.item(selected[0])
                 flower_id = item['values'][0]
-                supplier = self.flower_supplier.get().split(' - ')[0]
-                self.cursor.execute("UPDATE flowers SET name=?, quantity=?, price=?, supplier_id=? WHERE id=?",
-                                   (self.flower_name.get(),
-                                    int(self.flower_quantity.get()),
-                                    float(self.flower_price.get()),
-                                    int(supplier) if supplier else None,
-                                    flower_id))
-                self.conn.commit()
+                self.service.update_flower(flower_id,
+                                           self.flower_name.get(),
+                                           int(self.flower_quantity.get()),
+                                           float(self.flower_price.get()),
+                                           self.selected_supplier())
                 self.update_flowers_tree()
-                self.update_comboboxes()
+                self.notebook.mark_stale(self.sales_frame, self.purchases_frame)
                 self.clear_flower_fields()
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
@@ -491,10 +590,9 @@ class FlowerShopApp:
         if selected:
             try:
                 flower_id = self.flowers_tree.item(selected[0])['values'][0]
-                self.cursor.execute("DELETE FROM flowers WHERE id=?", (flower_id,))
-                self.conn.commit()
+                self.service.delete_flower(flower_id)
                 self.update_flowers_tree()
-                self.update_comboboxes()
+                self.notebook.mark_stale(self.sales_frame, self.purchases_frame)
                 self.clear_flower_fields()
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
@@ -503,15 +601,13 @@ class FlowerShopApp:
         self.flower_name.delete(0, tk.END)
         self.flower_quantity.delete(0, tk.END)
         self.flower_price.delete(0, tk.END)
-        self.flower_supplier.set('')
+        self.flower_supplier.clear()
 
     def add_supplier(self):
         try:
-            self.cursor.execute("INSERT INTO suppliers (name, contact) VALUES (?, ?)",
-                               (self.supplier_name.get(), self.supplier_contact.get()))
-            self.conn.commit()
+            self.service.add_supplier(self.supplier_name.get(), self.supplier_contact.get())
             self.update_suppliers_tree()
-            self.update_comboboxes()
+            self.notebook.mark_stale(self.flowers_frame, self.purchases_frame)
             self.clear_supplier_fields()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
@@ -521,11 +617,9 @@ class FlowerShopApp:
         if selected:
             try:
                 supplier_id = self.suppliers_tree.item(selected[0])['values'][0]
-                self.cursor.execute("UPDATE suppliers SET name=?, contact=? WHERE id=?",
-                                   (self.supplier_name.get(), self.supplier_contact.get(), supplier_id))
-                self.conn.commit()
+                self.service.update_supplier(supplier_id, self.supplier_name.get(), self.supplier_contact.get())
                 self.update_suppliers_tree()
-                self.update_comboboxes()
+                self.notebook.mark_stale(self.flowers_frame, self.purchases_frame)
                 self.clear_supplier_fields()
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
@@ -535,10 +629,9 @@ class FlowerShopApp:
         if selected:
             try:
                 supplier_id = self.suppliers_tree.item(selected[0])['values'][0]
-                self.cursor.execute("DELETE FROM suppliers WHERE id=?", (supplier_id,))
-                self.conn.commit()
+                self.service.delete_supplier(supplier_id)
                 self.update_suppliers_tree()
-                self.update_comboboxes()
+                self.notebook.mark_stale(self.flowers_frame, self.purchases_frame)
                 self.clear_supplier_fields()
             except Exception as e:
                 messagebox.showerror("Ошибка", str(e))
@@ -549,11 +642,9 @@ class FlowerShopApp:
 
     def add_employee(self):
         try:
-            self.cursor.execute("INSERT INTO employees (full_name, position, salary) VALUES (?, ?, ?)",
-                               (self.employee_name.get(), 
-                                self.employee_position.get(),
-                                float(self.employee_salary.get())))
-            self.conn.commit()
+            self.service.add_employee(self.employee_name.get(),
+                                      self.employee_position.get(),
+                                      float(self.employee_salary.get()))
             self.update_employees_tree()
             self.clear_employee_fields()
         except Exception as e:
@@ -564,12 +655,10 @@ class FlowerShopApp:
         if selected:
             try:
                 employee_id = self.employees_tree.item(selected[0])['values'][0]
-                self.cursor.execute("UPDATE employees SET full_name=?, position=?, salary=? WHERE id=?",
-                                   (self.employee_name.get(),
-                                    self.employee_position.get(),
-                                    float(self.employee_salary.get()),
-                                    employee_id))
-                self.conn.commit()
+                self.service.update_employee(employee_id,
+                                             self.employee_name.get(),
+                                             self.employee_position.get(),
+                                             float(self.employee_salary.get()))
                 self.update_employees_tree()
                 self.clear_employee_fields()
             except Exception as e:
@@ -580,8 +669,7 @@ class FlowerShopApp:
         if selected:
             try:
                 employee_id = self.employees_tree.item(selected[0])['values'][0]
-                self.cursor.execute("DELETE FROM employees WHERE id=?", (employee_id,))
-                self.conn.commit()
+                self.service.delete_employee(employee_id)
                 self.update_employees_tree()
                 self.clear_employee_fields()
             except Exception as e:
@@ -594,52 +682,40 @@ class FlowerShopApp:
 
     def add_sale(self):
         try:
-            flower_id = self.sale_flower.get().split(' - ')[0]
+            flower_id = self.sale_flower.get_id()
+            if flower_id is None:
+                raise ValueError("Выберите цветок из списка")
             quantity = int(self.sale_quantity.get())
             date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            self.cursor.execute("SELECT price FROM flowers WHERE id=?", (flower_id,))
-            price = self.cursor.fetchone()[0]
-            total = price * quantity
-            
-            self.cursor.execute("INSERT INTO sales (flower_id, quantity, sale_date, total_price) VALUES (?, ?, ?, ?)",
-                               (flower_id, quantity, date, total))
-            
-            self.cursor.execute("UPDATE flowers SET quantity = quantity - ? WHERE id=?", (quantity, flower_id))
-            
-            self.conn.commit()
+            self.service.sell(flower_id, quantity, date)
             self.update_sales_tree()
-            self.update_flowers_tree()
+            self.notebook.mark_stale(self.flowers_frame)
             self.clear_sale_fields()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
     def clear_sale_fields(self):
-        self.sale_flower.set('')
+        self.sale_flower.clear()
         self.sale_quantity.delete(0, tk.END)
 
     def add_purchase(self):
         try:
-            flower_id = self.purchase_flower.get().split(' - ')[0]
-            supplier_id = self.purchase_supplier.get().split(' - ')[0]
+            flower_id = self.purchase_flower.get_id()
+            supplier_id = self.purchase_supplier.get_id()
+            if flower_id is None or supplier_id is None:
+                raise ValueError("Выберите цветок и поставщика из списка")
             quantity = int(self.purchase_quantity.get())
             date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            
-            self.cursor.execute("INSERT INTO purchases (flower_id, quantity, purchase_date, supplier_id) VALUES (?, ?, ?, ?)",
-                               (flower_id, quantity, date, supplier_id))
-            
-            self.cursor.execute("UPDATE flowers SET quantity = quantity + ? WHERE id=?", (quantity, flower_id))
-            
-            self.conn.commit()
+            self.service.purchase(flower_id, supplier_id, quantity, date)
             self.update_purchases_tree()
-            self.update_flowers_tree()
+            self.notebook.mark_stale(self.flowers_frame)
             self.clear_purchase_fields()
         except Exception as e:
             messagebox.showerror("Ошибка", str(e))
 
     def clear_purchase_fields(self):
-        self.purchase_flower.set('')
-        self.purchase_supplier.set('')
+        self.purchase_flower.clear()
+        self.purchase_supplier.clear()
         self.purchase_quantity.delete(0, tk.END)
 
     def generate_sales_report(self):
@@ -647,44 +723,40 @@ class FlowerShopApp:
         end_date_str = self.end_date.get()
         start = f"{start_date_str} 00:00:00"
         end = f"{end_date_str} 23:59:59"
-        try:
-            for item in self.report_tree.get_children():
-                self.report_tree.delete(item)
-            self.cursor.execute("""
-                SELECT id, 'Продажа', flower_id || ' - ' || quantity || 'шт', sale_date, total_price 
-                FROM sales 
-                WHERE sale_date BETWEEN ? AND ?
-            """, (start, end))
-            for row in self.cursor.fetchall():
-                self.report_tree.insert('', 'end', values=row)
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
+
+        def query(conn):
+            with spanning(conn, 'sales', start, end, ('id', 'flower_id', 'quantity', 'sale_date', 'total_price')) as sales:
+                return conn.execute(f"""
+                    SELECT id, 'Продажа', flower_id || ' - ' || quantity || 'шт', sale_date, total_price 
+                    FROM {sales} AS sales 
+                    WHERE sale_date BETWEEN ? AND ?
+                """, (start, end)).fetchall()
+
+        show_loading(self.report_tree)
+        self.queries.submit('report', query, on_done=self.fill_report)
 
     def generate_purchases_report(self):
         start_date_str = self.start_date.get()
         end_date_str = self.end_date.get()
         start = f"{start_date_str} 00:00:00"
         end = f"{end_date_str} 23:59:59"
-        try:
-            for item in self.report_tree.get_children():
-                self.report_tree.delete(item)
-            self.cursor.execute("""
+        show_loading(self.report_tree)
+        self.queries.submit('report', """
                 SELECT id, 'Закупка', flower_id || ' - ' || quantity || 'шт', purchase_date, supplier_id 
                 FROM purchases 
                 WHERE purchase_date BETWEEN ? AND ?
-            """, (start, end))
-            for row in self.cursor.fetchall():
-                self.report_tree.insert('', 'end', values=row)
-        except Exception as e:
-            messagebox.showerror("Ошибка", str(e))
+            """, (start, end), on_done=self.fill_report)
+
+    def fill_report(self, rows):
+        clear(self.report_tree)
+        for row in rows:
+            self.report_tree.insert('', 'end', values=row)
 
     def add_location(self):
         try:
-            self.cursor.execute("INSERT INTO locations (address, latitude, longitude) VALUES (?, ?, ?)",
-                              (self.location_address.get(),
-                               float(self.location_lat.get()),
-                               float(self.location_lon.get())))
-            self.conn.commit()
+            self.service.add_location(self.location_address.get(),
+                                      float(self.location_lat.get()),
+                                      float(self.location_lon.get()))
             self.update_locations_tree()
             self.update_map_markers()
             self.clear_location_fields()
@@ -696,12 +768,10 @@ class FlowerShopApp:
         if selected:
             try:
                 loc_id = self.locations_tree.item(selected[0])['values'][0]
-                self.cursor.execute("UPDATE locations SET address=?, latitude=?, longitude=? WHERE id=?",
-                                  (self.location_address.get(),
-                                   float(self.location_lat.get()),
-                                   float(self.location_lon.get()),
-                                   loc_id))
-                self.conn.commit()
+                self.service.update_location(loc_id,
+                                             self.location_address.get(),
+                                             float(self.location_lat.get()),
+                                             float(self.location_lon.get()))
                 self.update_locations_tree()
                 self.update_map_markers()
                 self.clear_location_fields()
@@ -713,8 +783,7 @@ class FlowerShopApp:
         if selected:
             try:
                 loc_id = self.locations_tree.item(selected[0])['values'][0]
-                self.cursor.execute("DELETE FROM locations WHERE id=?", (loc_id,))
-                self.conn.commit()
+                self.service.delete_location(loc_id)
                 self.update_locations_tree()
                 self.update_map_markers()
                 self.clear_location_fields()
@@ -729,4 +798,5 @@ class FlowerShopApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = FlowerShopApp(root)
+    tracing.install(root)
     root.mainloop()
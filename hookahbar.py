@@ -1,12 +1,18 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-from tkcalendar import DateEntry
-import sqlite3
+from lazy_widgets import DateEntry
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+from query_executor import QueryExecutor, show_loading, clear
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 from datetime import datetime
 import time
 import json
 
-conn = sqlite3.connect('hookah.db')
+conn = get_connection('hookah.db')
 c = conn.cursor()
 
 c.execute('''CREATE TABLE IF NOT EXISTS tobaccos
@@ -21,49 +27,80 @@ c.execute('''CREATE TABLE IF NOT EXISTS establishments
              (id INTEGER PRIMARY KEY, name TEXT, hookahs TEXT, quantities TEXT, address TEXT,
               created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
 conn.commit()
+migrate(conn, 'hookah.db')
 
-class HookahApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
+
+class HookahService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_tobacco(self, name, strength, grams):
+        self.add_tobaccos([(name, strength, grams)])
+
+    def add_tobaccos(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO tobaccos (name, strength, grams) VALUES (?, ?, ?)", records))
+
+    def add_hookah(self, name, tobacco_taste, price):
+        self.add_hookahs([(name, tobacco_taste, price)])
+
+    def add_hookahs(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO hookahs (name, tobacco_taste, price) VALUES (?, ?, ?)", records))
+
+    def add_establishment(self, name, hookahs, quantities, address):
+        # hookahs - список названий кальянов, хранится в JSON
+        run_write(self.conn, lambda conn: conn.execute(
+            "INSERT INTO establishments (name, hookahs, quantities, address) VALUES (?, ?, ?, ?)",
+            (name, json.dumps(hookahs), quantities, address)))
+
+
+class HookahApp(tk.Toplevel):
+    def __init__(self, root):
+        super().__init__(root)
         self.title("Управление кальянными")
         self.geometry("1200x800")
         self.configure(bg='#f5f5f5')
         
+        self.queries = QueryExecutor(self, 'hookah.db')
+        self.service = HookahService(conn)
+        
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(self, 'Hookah')
         
-        self.style.configure('TNotebook', background='#ffffff')
-        self.style.configure('TNotebook.Tab', 
+        self.style.configure('Hookah.TNotebook', background='#ffffff')
+        self.style.configure('Hookah.TNotebook.Tab', 
                             font=('Arial', 12, 'bold'),
                             padding=12,
                             background='#e0e0e0',
                             foreground='#333333')
-        self.style.map('TNotebook.Tab', 
+        self.style.map('Hookah.TNotebook.Tab', 
                       background=[('selected', '#4CAF50')],
                       foreground=[('selected', '#ffffff')])
         
-        self.style.configure('TFrame', background='#ffffff')
-        self.style.configure('TLabel', 
+        self.style.configure('Hookah.TFrame', background='#ffffff')
+        self.style.configure('Hookah.TLabel', 
                             font=('Arial', 12),
                             background='#ffffff',
                             foreground='#333333',
                             padding=5)
-        self.style.configure('TButton', 
+        self.style.configure('Hookah.TButton', 
                             font=('Arial', 12, 'bold'),
                             background='#4CAF50',
                             foreground='white',
                             borderwidth=1,
                             padding=10)
-        self.style.map('TButton',
+        self.style.map('Hookah.TButton',
                       background=[('active', '#45a049')])
         
-        self.style.configure('Listbox', 
+        self.style.configure('Hookah.Listbox', 
                             font=('Arial', 11),
                             background='#ffffff',
                             relief='flat',
                             selectbackground='#e0e0e0')
         
-        self.notebook = ttk.Notebook(self)
+        self.notebook = LazyNotebook(self)
         self.tabs = [
             ttk.Frame(self.notebook),
             ttk.Frame(self.notebook),
@@ -71,24 +108,18 @@ class HookahApp(tk.Tk):
             ttk.Frame(self.notebook)
         ]
         
+        builders = [
+            (self.create_tabacco_tab, self.update_tobacco_list),
+            (self.create_hookah_tab, (self.update_tastes, self.update_hookah_list)),
+            (self.create_establishment_tab, (self.update_hookah_select, self.update_establishment_list)),
+            (self.create_report_tab, ())
+        ]
         for i, text in enumerate(["Табак", "Кальяны", "Заведения", "Отчеты"]):
-            self.notebook.add(self.tabs[i], text=text)
+            self.notebook.add_lazy(self.tabs[i], *builders[i], text=text)
+        add_search_tab(self.notebook, self.queries)
         
         self.notebook.pack(expand=True, fill='both', padx=20, pady=20)
         
-        self.create_tabacco_tab()
-        self.create_hookah_tab()
-        self.create_establishment_tab()
-        self.create_report_tab()
-        self.refresh_all()
-        
-    def refresh_all(self):
-        self.update_tobacco_list()
-        self.update_tastes()
-        self.update_hookah_list()
-        self.update_hookah_select()
-        self.update_establishment_list()
-        
     def create_tabacco_tab(self):
         frame = ttk.Frame(self.tabs[0], padding=20)
         frame.pack(fill='both', expand=True)
@@ -113,16 +144,20 @@ class HookahApp(tk.Tk):
         
         self.tobacco_list = tk.Listbox(frame, width=80, height=15, font=('Arial', 11))
         self.tobacco_list.pack(pady=10)
+        self.update_tobacco_list()
         
     def add_tobacco(self):
-        c.execute("INSERT INTO tobaccos (name, strength, grams) VALUES (?, ?, ?)",
-                  (self.t_name.get(), self.t_strength.get(), self.t_grams.get()))
-        conn.commit()
-        self.refresh_all()
+        self.service.add_tobacco(self.t_name.get(), self.t_strength.get(), self.t_grams.get())
+        self.update_tobacco_list()
+        self.notebook.mark_stale(self.tabs[1])
         
     def update_tobacco_list(self):
-        self.tobacco_list.delete(0, tk.END)
-        for row in c.execute("SELECT * FROM tobaccos"):
+        show_loading(self.tobacco_list)
+        self.queries.submit('tobaccos', "SELECT * FROM tobaccos", on_done=self.fill_tobacco_list)
+
+    def fill_tobacco_list(self, rows):
+        clear(self.tobacco_list)
+        for row in rows:
             self.tobacco_list.insert(tk.END, f"{row[1]} | Крепость: {row[2]} | Граммы: {row[3]}")
 
     def create_hookah_tab(self):
@@ -149,19 +184,24 @@ class HookahApp(tk.Tk):
         
         self.hookah_list = tk.Listbox(frame, width=80, height=15, font=('Arial', 11))
         self.hookah_list.pack(pady=10)
+        self.update_tastes()
+        self.update_hookah_list()
         
     def update_tastes(self):
         self.h_taste['values'] = [row[0] for row in c.execute("SELECT name FROM tobaccos")]
         
     def add_hookah(self):
-        c.execute("INSERT INTO hookahs (name, tobacco_taste, price) VALUES (?, ?, ?)",
-                  (self.h_name.get(), self.h_taste.get(), self.h_price.get()))
-        conn.commit()
-        self.refresh_all()
+        self.service.add_hookah(self.h_name.get(), self.h_taste.get(), self.h_price.get())
+        self.update_hookah_list()
+        self.notebook.mark_stale(self.tabs[2])
         
     def update_hookah_list(self):
-        self.hookah_list.delete(0, tk.END)
-        for row in c.execute("SELECT * FROM hookahs"):
+        show_loading(self.hookah_list)
+        self.queries.submit('hookahs', "SELECT * FROM hookahs", on_done=self.fill_hookah_list)
+
+    def fill_hookah_list(self, rows):
+        clear(self.hookah_list)
+        for row in rows:
             self.hookah_list.insert(tk.END, f"{row[1]} | Вкус: {row[2]} | Цена: {row[3]}")
 
     def create_establishment_tab(self):
@@ -192,6 +232,8 @@ class HookahApp(tk.Tk):
         
         self.establishment_list = tk.Listbox(frame, width=80, height=15, font=('Arial', 11))
         self.establishment_list.pack(pady=10)
+        self.update_hookah_select()
+        self.update_establishment_list()
         
     def update_hookah_select(self):
         self.hookah_select.delete(0, tk.END)
@@ -200,14 +242,17 @@ class HookahApp(tk.Tk):
             
     def add_establishment(self):
         selected = [self.hookah_select.get(i) for i in self.hookah_select.curselection()]
-        c.execute("INSERT INTO establishments (name, hookahs, quantities, address) VALUES (?, ?, ?, ?)",
-                  (self.e_name.get(), json.dumps(selected), self.e_quantity.get(), self.e_address.get()))
-        conn.commit()
-        self.refresh_all()
+        self.service.add_establishment(self.e_name.get(), selected, self.e_quantity.get(), self.e_address.get())
+        self.update_establishment_list()
         
     def update_establishment_list(self):
-        self.establishment_list.delete(0, tk.END)
-        for row in c.execute("SELECT * FROM establishments"):
+        show_loading(self.establishment_list)
+        self.queries.submit('establishments', "SELECT * FROM establishments",
+                            on_done=self.fill_establishment_list)
+
+    def fill_establishment_list(self, rows):
+        clear(self.establishment_list)
+        for row in rows:
             self.establishment_list.insert(tk.END, 
                 f"{row[1]} | Адрес: {row[4]} | Кальяны: {json.loads(row[2])} | Кол-во: {row[3]}")
 
@@ -236,23 +281,33 @@ class HookahApp(tk.Tk):
         start = self.start_date.get_date().strftime('%Y-%m-%d')
         end = self.end_date.get_date().strftime('%Y-%m-%d')
         
-        report = []
-        report.append("----- Отчет -----")
-        report.append(f"Табаки добавленные с {start} по {end}:")
-        for row in c.execute("SELECT name FROM tobaccos WHERE date(created_at) BETWEEN ? AND ?", (start, end)):
-            report.append(f"- {row[0]}")
-            
-        report.append("\nКальяны добавленные:")
-        for row in c.execute("SELECT name FROM hookahs WHERE date(created_at) BETWEEN ? AND ?", (start, end)):
-            report.append(f"- {row[0]}")
-            
-        report.append("\nЗаведения добавленные:")
-        for row in c.execute("SELECT name FROM establishments WHERE date(created_at) BETWEEN ? AND ?", (start, end)):
-            report.append(f"- {row[0]}")
+        def query(conn):
+            report = []
+            report.append("----- Отчет -----")
+            report.append(f"Табаки добавленные с {start} по {end}:")
+            for row in conn.execute("SELECT name FROM tobaccos WHERE date(created_at) BETWEEN ? AND ?", (start, end)):
+                report.append(f"- {row[0]}")
+                
+            report.append("\nКальяны добавленные:")
+            for row in conn.execute("SELECT name FROM hookahs WHERE date(created_at) BETWEEN ? AND ?", (start, end)):
+                report.append(f"- {row[0]}")
+                
+            report.append("\nЗаведения добавленные:")
+            for row in conn.execute("SELECT name FROM establishments WHERE date(created_at) BETWEEN ? AND ?", (start, end)):
+                report.append(f"- {row[0]}")
+            return report
             
+        show_loading(self.report_text)
+        self.queries.submit('report', query, on_done=self.show_report)
+
+    def show_report(self, report):
         self.report_text.delete(1.0, tk.END)
         self.report_text.insert(tk.END, '\n'.join(report))
 
 if __name__ == "__main__":
-    app = HookahApp()
-    app.mainloop()
+    root = tk.Tk()
+    root.withdraw()
+    app = HookahApp(root)
+    app.protocol("WM_DELETE_WINDOW", root.destroy)
+    tracing.install(app)
+    root.mainloop()
@@ -0,0 +1,78 @@
+import sys
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+import apps
+import backup
+import themes
+import tracing
+
+# Один процесс для нескольких приложений: интерпретатор, Tk, tkinter/sqlite3 и
+# соединения db_session общие, модули приложений импортируются при первом открытии.
+# Каждое приложение открывается в своем Toplevel; закрытие окна только скрывает его,
+# повторное открытие возвращает то же окно. Тема ttk общая (themes.SHARED):
+# приложения не переключают ее друг у друга и не перерисовывают все открытые окна.
+# Стили у каждого приложения свои, с префиксом (themes.scope_styles): открытое
+# позже приложение не меняет вид уже открытых
+THEME = 'clam'
+COLUMNS = 3
+
+
+class Launcher:
+    def __init__(self, root):
+        self.root = root
+        self.root.title("Приложения")
+        self.root.resizable(False, False)
+        self.windows = {}
+
+        themes.SHARED = THEME
+        themes.use_theme(ttk.Style(root), THEME)
+
+        frame = ttk.Frame(root, padding=10)
+        frame.pack(fill=tk.BOTH, expand=True)
+        for i, app in enumerate(apps.APPS):
+            ttk.Button(frame, text=app.title, width=24, command=lambda app=app: self.open_app(app))\
+                .grid(row=i // COLUMNS, column=i % COLUMNS, padx=4, pady=4, sticky='ew')
+        self.status = ttk.Label(root, text="", anchor='w', padding=(10, 0, 10, 8))
+        self.status.pack(fill=tk.X)
+
+    def open_app(self, app):
+        window = self.windows.get(app.module)
+        if window is not None:
+            window.deiconify()
+            window.lift()
+            window.focus_force()
+            return window
+
+        start = time.perf_counter()
+        host = self.root if app.toplevel else tk.Toplevel(self.root)
+        try:
+            instance = apps.create(app, host)
+        except Exception as e:
+            if host is not self.root:
+                host.destroy()
+            messagebox.showerror("Ошибка", f"Не удалось открыть «{app.title}»: {e}", parent=self.root)
+            return None
+        window = apps.window(app, instance, host)
+        window.protocol("WM_DELETE_WINDOW", window.withdraw)
+        self.windows[app.module] = window
+        window.update_idletasks()
+        self.status.config(text=f"{app.title}: открыто за {(time.perf_counter() - start) * 1000:.0f} мс")
+        return window
+
+
+def main(names):
+    root = tk.Tk()
+    launcher = Launcher(root)
+    for name in names:
+        launcher.open_app(apps.get_app(name))
+    tracing.install(root)
+    # Снимки баз открытых и закрытых приложений раз в backup.INTERVAL_S в фоне
+    backups = backup.BackupScheduler([app.db for app in apps.APPS]).start()
+    root.mainloop()
+    backups.stop()
+
+
+if __name__ == "__main__":
+    main([arg for arg in sys.argv[1:] if not arg.startswith('-')])
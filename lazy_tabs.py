@@ -0,0 +1,81 @@
+from tkinter import ttk
+
+from query_executor import LOADING_TEXT
+
+
+class LazyNotebook(ttk.Notebook):
+    # Вкладки строятся при первом выборе (<<NotebookTabChanged>>), а не в __init__.
+    # build - функция, создающая содержимое вкладки вместе с первой загрузкой данных;
+    # load - функции перезагрузки данных вкладки. Если данные, от которых зависит
+    # вкладка, изменились, она помечается устаревшей (mark_stale) и перезагружается
+    # при следующем показе, а не сразу
+    def __init__(self, master=None, **kw):
+        super().__init__(master, **kw)
+        self._build = {}
+        self._load = {}
+        self._stale = set()
+        self._placeholders = {}
+        self.bind('<<NotebookTabChanged>>', self._on_tab_changed, add='+')
+
+    def add_lazy(self, frame, build, load=(), **options):
+        self.add(frame, **options)
+        key = str(frame)
+        self._build[key] = build
+        self._load[key] = tuple(load) if isinstance(load, (list, tuple)) else (load,)
+        # Первая вкладка видна сразу - строим ее без ожидания события
+        if len(self.tabs()) == 1:
+            self.ensure_built(frame)
+        else:
+            # Заглушка видна, пока строится вкладка (импорт календаря, карты)
+            placeholder = ttk.Label(frame, text=LOADING_TEXT, foreground='#888888')
+            placeholder.pack(expand=True)
+            self._placeholders[key] = placeholder
+        return frame
+
+    def is_built(self, frame):
+        return self._build.get(str(frame)) is None
+
+    def ensure_built(self, frame):
+        key = str(frame)
+        build = self._build.get(key)
+        if build is not None:
+            self._build[key] = None
+            self._stale.discard(key)
+            placeholder = self._placeholders.pop(key, None)
+            if placeholder is not None:
+                placeholder.destroy()
+            build()
+
+    def build_all(self):
+        # Построить все вкладки (утилиты и замеры, которым нужны все виджеты)
+        for key in self.tabs():
+            self.ensure_built(key)
+
+    def mark_stale(self, *frames):
+        # Непостроенные вкладки загрузят свежие данные при построении
+        for frame in frames:
+            key = str(frame)
+            if not self.is_built(key):
+                continue
+            if key == self.select():
+                self.reload(key)
+            else:
+                self._stale.add(key)
+
+    def reload(self, frame):
+        key = str(frame)
+        self._stale.discard(key)
+        for load in self._load.get(key, ()):
+            if load is not None:
+                load()
+
+    def _on_tab_changed(self, event=None):
+        key = self.select()
+        if not key:
+            return
+        if not self.is_built(key):
+            # Сначала отрисовать заглушку выбранной вкладки
+            self.update_idletasks()
+            self.ensure_built(key)
+        elif key in self._stale:
+            self.reload(key)
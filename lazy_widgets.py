@@ -0,0 +1,26 @@
+import importlib
+
+# Виджеты сторонних библиотек (календарь, карта) импортируются при первом создании -
+# обычно при построении вкладки LazyNotebook, а не при запуске приложения.
+# Имена совпадают с классами библиотек, поэтому в приложениях меняется только import
+MODULES = {
+    'DateEntry': 'tkcalendar',
+    'Calendar': 'tkcalendar',
+    'TkinterMapView': 'tkintermapview',
+}
+
+
+def widget_class(name):
+    return getattr(importlib.import_module(MODULES[name]), name)
+
+
+def DateEntry(*args, **kwargs):
+    return widget_class('DateEntry')(*args, **kwargs)
+
+
+def Calendar(*args, **kwargs):
+    return widget_class('Calendar')(*args, **kwargs)
+
+
+def TkinterMapView(*args, **kwargs):
+    return widget_class('TkinterMapView')(*args, **kwargs)
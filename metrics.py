@@ -0,0 +1,223 @@
+import atexit
+import importlib
+import os
+import sys
+import threading
+import time
+import tkinter as tk
+from bisect import bisect_left
+from tkinter import commondialog
+
+import tracing
+
+# Постоянные метрики для эксплуатации в формате Prometheus: счетчики и
+# гистограммы длительности. Включаются переменной окружения KP_METRICS=1 или
+# флагом --metrics. Измеряются действия интерфейса (обработчики Tk: продажи,
+# заказы, отчеты, кнопки "Обновить") и фоновые запросы QueryExecutor по ключу
+# (обновления списков update_*). Время в модальных диалогах (messagebox,
+# выбор файла) из длительности действия вычитается - это ожидание человека.
+# Пропускная способность - rate() от *_count гистограмм.
+# Метрики отдаются по HTTP на 127.0.0.1:KP_METRICS_PORT/metrics или, если задан
+# KP_METRICS_FILE, раз в DUMP_SECONDS записываются в файл (textfile collector
+# node_exporter). Несколько приложений на одном компьютере - разные порты или
+# файлы, либо один launcher. http.server импортируется только при включенных
+# метриках - он тяжелый для запуска каждого приложения
+ENV_VAR = 'KP_METRICS'
+FLAG = '--metrics'
+PORT = int(os.environ.get('KP_METRICS_PORT', '9464'))
+DUMP_FILE = os.environ.get('KP_METRICS_FILE')
+DUMP_SECONDS = 15
+# Границы корзин гистограмм, секунды
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+ENABLED = False
+_local = threading.local()
+_exporter = None
+
+
+def _labels(names, values):
+    if not names:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in values)
+    return '{' + ','.join(f'{name}="{value}"' for name, value in zip(names, escaped)) + '}'
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        lines += [f"{self.name}{_labels(self.labels, labels)} {value}" for labels, value in items]
+        return lines
+
+
+class Histogram:
+    # Счетчики по корзинам хранятся без накопления (одна корзина на наблюдение),
+    # накопленные значения le считаются при выдаче
+    def __init__(self, name, help, labels=(), buckets=BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = labels
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *labels):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += seconds
+            series[2] += 1
+
+    def count(self, *labels):
+        series = self._series.get(labels)
+        return series[2] if series else 0
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((labels, (list(counts), total, count))
+                           for labels, (counts, total, count) in self._series.items())
+        for labels, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket in zip(self.buckets + (float('inf'),), counts):
+                cumulative += bucket
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{self.name}_bucket{_labels(self.labels + ('le',), labels + (le,))} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_labels(self.labels, labels)} {count}")
+        return lines
+
+
+ACTION_SECONDS = Histogram('kp_action_seconds', "Длительность действий интерфейса без модальных диалогов",
+                           ('action',))
+QUERY_SECONDS = Histogram('kp_query_seconds', "Длительность фоновых запросов QueryExecutor", ('db', 'query'))
+QUERY_ERRORS = Counter('kp_query_errors_total', "Фоновые запросы, завершившиеся ошибкой", ('db', 'query'))
+REGISTRY = [ACTION_SECONDS, QUERY_SECONDS, QUERY_ERRORS]
+
+
+def exposition():
+    # Все метрики в текстовом формате Prometheus
+    lines = []
+    for metric in REGISTRY:
+        lines += metric.expose()
+    return '\n'.join(lines) + '\n'
+
+
+def observe_query(path, key, seconds, ok=True):
+    # Вызывается QueryExecutor после каждого запроса. Ключи вида
+    # autocomplete-<виджет> сводятся к autocomplete, чтобы серий было немного
+    database = os.path.basename(path)
+    key = key.split('-', 1)[0]
+    QUERY_SECONDS.observe(seconds, database, key)
+    if not ok:
+        QUERY_ERRORS.inc(database, key)
+
+
+_tk_call = tk.CallWrapper.__call__
+_dialog_show = commondialog.Dialog.show
+
+
+def _measured_call(self, *args):
+    name = tracing._callback_name(self.func)
+    if name.startswith(tracing.IGNORED_CALLBACKS) or getattr(_local, 'depth', 0):
+        return _tk_call(self, *args)
+    _local.depth = 1
+    _local.paused = 0.0
+    start = time.perf_counter()
+    try:
+        return _tk_call(self, *args)
+    finally:
+        _local.depth = 0
+        ACTION_SECONDS.observe(time.perf_counter() - start - _local.paused, name)
+
+
+def _measured_show(self, **options):
+    # Модальный диалог внутри действия: его время не входит в длительность действия
+    start = time.perf_counter()
+    try:
+        return _dialog_show(self, **options)
+    finally:
+        if getattr(_local, 'depth', 0):
+            _local.paused += time.perf_counter() - start
+
+
+def _handler_class(server):
+    class Handler(server.BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path not in ('/metrics', '/'):
+                self.send_error(404)
+                return
+            body = exposition().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    return Handler
+
+
+def dump(path):
+    # Записать метрики в файл целиком (читатель не увидит половину файла)
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        f.write(exposition())
+    os.replace(path + '.tmp', path)
+
+
+def _dump_loop(path):
+    while True:
+        time.sleep(DUMP_SECONDS)
+        dump(path)
+
+
+def serve(port=PORT, host='127.0.0.1'):
+    # HTTP-сервер /metrics в фоновом потоке; port=0 - свободный порт
+    http_server = importlib.import_module('http.server')
+    server = http_server.ThreadingHTTPServer((host, port), _handler_class(http_server))
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name='metrics', daemon=True).start()
+    return server
+
+
+def enable(port=PORT, dump_file=DUMP_FILE):
+    global ENABLED, _tk_call, _exporter
+    if ENABLED:
+        return
+    ENABLED = True
+    # Поверх трассировки, если она включена: оборачивается текущий обработчик
+    _tk_call = tk.CallWrapper.__call__
+    tk.CallWrapper.__call__ = _measured_call
+    commondialog.Dialog.show = _measured_show
+    if dump_file:
+        threading.Thread(target=_dump_loop, args=(dump_file,), name='metrics', daemon=True).start()
+        atexit.register(dump, dump_file)
+    elif port is not None:
+        try:
+            _exporter = serve(port)
+        except OSError as e:
+            print(f"Метрики: порт {port} занят ({e}), задайте KP_METRICS_PORT или KP_METRICS_FILE")
+
+
+if os.environ.get(ENV_VAR, '') not in ('', '0') or FLAG in sys.argv:
+    enable()
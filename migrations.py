@@ -0,0 +1,244 @@
+import os
+import sqlite3
+
+from change_notify import change_counters_sql, day_changes_sql
+from outbox import OUTBOX, epoch_sql, outbox_sql
+from rollups import daily_sales_sql
+from search import SOURCES, search_index_sql
+
+# Миграции схем по файлам баз: имя файла -> список (версия, SQL-скрипт).
+# Таблицы создаются самими приложениями (CREATE TABLE IF NOT EXISTS),
+# здесь - изменения поверх них. Номер последней примененной миграции
+# хранится в PRAGMA user_version.
+MIGRATIONS = {}
+
+
+def register(name, migrations):
+    MIGRATIONS.setdefault(name, []).extend(migrations)
+    MIGRATIONS[name].sort(key=lambda m: m[0])
+
+
+def schema_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def migrate(conn, name):
+    # Применить недостающие миграции; каждая - в своей транзакции
+    # вместе с новым user_version
+    version = schema_version(conn)
+    conn.commit()
+    for number, script in MIGRATIONS.get(os.path.basename(name), []):
+        if number <= version:
+            continue
+        try:
+            conn.executescript(f"BEGIN;\n{script}\nPRAGMA user_version = {int(number)};\nCOMMIT;")
+        except sqlite3.Error:
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+        version = number
+    return version
+
+
+def report_counters(products):
+    # Счетчики для report_cache: изменения заказов по дням и справочника товаров
+    return day_changes_sql('orders', 'created_at') + '\n' + change_counters_sql(products)
+
+
+def report_rollup(product):
+    # Сводка daily_sales для отчетов по диапазону дат; индекс idx_orders_day им больше не нужен
+    return daily_sales_sql('orders', 'created_at', [('product_id', product)], 'quantity') + '\nDROP INDEX IF EXISTS idx_orders_day;'
+
+
+# 1: индексы для соединений и фильтров, которые выполняют приложения.
+# Отчеты фильтруют по date(created_at) - для них индекс по выражению.
+register('bakery.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_item ON orders(item_id);
+CREATE INDEX IF NOT EXISTS idx_orders_day ON orders(date(created_at), item_id, quantity);
+CREATE INDEX IF NOT EXISTS idx_menu_name ON menu(name);
+'''), (2, report_counters(('menu',)))])
+
+register('cleaning.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_service ON orders(service_id);
+CREATE INDEX IF NOT EXISTS idx_orders_employee ON orders(employee_id);
+CREATE INDEX IF NOT EXISTS idx_services_name ON services(name);
+CREATE INDEX IF NOT EXISTS idx_employees_name ON employees(name);
+''')])
+
+register('computer_club.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_bookings_computer ON Bookings(room_id, computer_number, start_time, end_time);
+CREATE INDEX IF NOT EXISTS idx_bookings_start ON Bookings(start_time);
+''')])
+
+register('fitness_club.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_purchases_client ON purchases(client_id);
+CREATE INDEX IF NOT EXISTS idx_purchases_subscription ON purchases(subscription_id);
+CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name);
+CREATE INDEX IF NOT EXISTS idx_subscriptions_name ON subscriptions(name);
+''')])
+
+register('jewelry.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_product ON orders(product_id);
+CREATE INDEX IF NOT EXISTS idx_orders_day ON orders(date(created_at), product_id, quantity);
+CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
+CREATE INDEX IF NOT EXISTS idx_addresses_address ON addresses(address);
+'''), (2, report_counters(('products',)))])
+
+register('service_center.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_requests_client ON requests(client_id);
+CREATE INDEX IF NOT EXISTS idx_requests_equipment ON requests(equipment_id);
+CREATE INDEX IF NOT EXISTS idx_requests_status ON requests(status);
+CREATE INDEX IF NOT EXISTS idx_equipment_client ON equipment(client_id);
+''')])
+
+register('sports_store.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_product ON orders(product_id);
+CREATE INDEX IF NOT EXISTS idx_orders_day ON orders(date(created_at), product_id, quantity);
+CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
+CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name);
+'''), (2, report_counters(('products',)))])
+
+register('warehouse.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_goods_zone ON goods(zone_id);
+CREATE INDEX IF NOT EXISTS idx_goods_supplier ON goods(supplier_id);
+CREATE INDEX IF NOT EXISTS idx_goods_date ON goods(date_added);
+CREATE INDEX IF NOT EXISTS idx_suppliers_name ON suppliers(name);
+CREATE INDEX IF NOT EXISTS idx_zones_name ON zones(name);
+''')])
+
+register('YaCoffeeBAZA.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_employee ON orders(employee_id);
+''')])
+
+register('auto_salon.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_sales_client ON sales(client_id);
+CREATE INDEX IF NOT EXISTS idx_sales_car ON sales(car_id);
+CREATE INDEX IF NOT EXISTS idx_cars_status ON cars(status);
+''')])
+
+register('shop.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_customer ON orders(customer_id);
+CREATE INDEX IF NOT EXISTS idx_orders_product ON orders(product_id);
+CREATE INDEX IF NOT EXISTS idx_products_supplier ON products(supplier_id);
+CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
+CREATE INDEX IF NOT EXISTS idx_customers_name ON customers(name);
+CREATE INDEX IF NOT EXISTS idx_suppliers_name ON suppliers(name);
+''')])
+
+register('flowershop.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_sales_flower ON sales(flower_id);
+CREATE INDEX IF NOT EXISTS idx_sales_date ON sales(sale_date);
+CREATE INDEX IF NOT EXISTS idx_purchases_flower ON purchases(flower_id);
+CREATE INDEX IF NOT EXISTS idx_purchases_supplier ON purchases(supplier_id);
+CREATE INDEX IF NOT EXISTS idx_purchases_date ON purchases(purchase_date);
+CREATE INDEX IF NOT EXISTS idx_flowers_supplier ON flowers(supplier_id);
+''')])
+
+register('hookah.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_tobaccos_day ON tobaccos(date(created_at), name);
+CREATE INDEX IF NOT EXISTS idx_hookahs_day ON hookahs(date(created_at), name);
+CREATE INDEX IF NOT EXISTS idx_establishments_day ON establishments(date(created_at), name);
+''')])
+
+# 2: счетчики изменений таблиц для change_notify (статистика пересчитывается только после записи)
+register('moto_salon.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_sales_client ON sales(client_id);
+CREATE INDEX IF NOT EXISTS idx_sales_bike ON sales(bike_id);
+CREATE INDEX IF NOT EXISTS idx_motorcycles_status ON motorcycles(status);
+'''), (2, change_counters_sql(('clients', 'motorcycles', 'sales')))])
+
+register('music_store.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_sales_product ON sales(product_id, quantity, total);
+CREATE INDEX IF NOT EXISTS idx_sales_customer ON sales(customer_id);
+''')])
+
+register('pharmacy_database.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_sales_records_medicine ON sales_records(medicine_identifier, sold_quantity);
+CREATE INDEX IF NOT EXISTS idx_sales_records_date ON sales_records(transaction_date);
+CREATE INDEX IF NOT EXISTS idx_medicines_name ON medicines_inventory(medicine_name);
+''')])
+
+register('restoration.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_status ON orders(status, deadline_date);
+CREATE INDEX IF NOT EXISTS idx_orders_deadline ON orders(deadline_date);
+CREATE INDEX IF NOT EXISTS idx_reports_order ON reports(order_id);
+''')])
+
+register('vapeshop.db', [(1, '''
+CREATE INDEX IF NOT EXISTS idx_orders_product ON orders(product_type, product_id);
+CREATE INDEX IF NOT EXISTS idx_vapes_name ON vapes(name);
+CREATE INDEX IF NOT EXISTS idx_liquids_name ON liquids(name);
+''')])
+
+# Сводка продаж по дням и товарам (rollups): отчеты и статистика читают daily_sales
+register('bakery.db', [(3, report_rollup('item_id'))])
+register('jewelry.db', [(3, report_rollup('product_id'))])
+register('sports_store.db', [(3, report_rollup('product_id'))])
+register('YaCoffeeBAZA.db', [(2, daily_sales_sql('orders', 'order_date', revenue='total_amount'))])
+register('moto_salon.db', [(3, daily_sales_sql('sales', 'sale_date', [('product_id', 'bike_id')], revenue='amount'))])
+register('music_store.db', [(2, daily_sales_sql('sales', 'date', [('product_id', 'product_id')], 'quantity', 'total'))])
+register('pharmacy_database.db', [(2, daily_sales_sql('sales_records', 'transaction_date', [('product_id', 'medicine_identifier')],
+                                                      'sold_quantity', 'total_amount'))])
+register('vapeshop.db', [(2, daily_sales_sql('orders', 'date', [('product_type', 'product_type'), ('product_id', 'product_id')],
+                                             'quantity', 'total'))])
+
+# Поиск записи по естественному ключу при импорте из CSV (bulk_import)
+register('music_store.db', [(3, '''
+CREATE INDEX IF NOT EXISTS idx_products_name ON products(name);
+''')])
+register('flowershop.db', [(2, '''
+CREATE INDEX IF NOT EXISTS idx_flowers_name ON flowers(name);
+''')])
+
+# Полнотекстовый поиск (search): индекс search_index и триггеры на таблицах-источниках
+register('bakery.db', [(4, search_index_sql(SOURCES['bakery.db']))])
+register('cleaning.db', [(2, search_index_sql(SOURCES['cleaning.db']))])
+register('computer_club.db', [(2, search_index_sql(SOURCES['computer_club.db']))])
+register('fitness_club.db', [(2, search_index_sql(SOURCES['fitness_club.db']))])
+register('jewelry.db', [(4, search_index_sql(SOURCES['jewelry.db']))])
+register('service_center.db', [(2, search_index_sql(SOURCES['service_center.db']))])
+register('sports_store.db', [(4, search_index_sql(SOURCES['sports_store.db']))])
+register('warehouse.db', [(2, search_index_sql(SOURCES['warehouse.db']))])
+register('YaCoffeeBAZA.db', [(3, search_index_sql(SOURCES['YaCoffeeBAZA.db']))])
+register('auto_salon.db', [(2, search_index_sql(SOURCES['auto_salon.db']))])
+register('shop.db', [(2, search_index_sql(SOURCES['shop.db']))])
+register('flowershop.db', [(3, search_index_sql(SOURCES['flowershop.db']))])
+register('hookah.db', [(2, search_index_sql(SOURCES['hookah.db']))])
+register('moto_salon.db', [(4, search_index_sql(SOURCES['moto_salon.db']))])
+register('music_store.db', [(4, search_index_sql(SOURCES['music_store.db']))])
+register('pharmacy_database.db', [(3, search_index_sql(SOURCES['pharmacy_database.db']))])
+register('restoration.db', [(2, search_index_sql(SOURCES['restoration.db']))])
+register('vapeshop.db', [(3, search_index_sql(SOURCES['vapeshop.db']))])
+
+# Подсказки по мере ввода (autocomplete): поиск по префиксу названия диапазоном по индексу
+register('auto_salon.db', [(3, '''
+CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name);
+CREATE INDEX IF NOT EXISTS idx_cars_status_brand ON cars(status, brand);
+DROP INDEX IF EXISTS idx_cars_status;
+''')])
+register('service_center.db', [(3, '''
+CREATE INDEX IF NOT EXISTS idx_clients_name ON clients(name);
+CREATE INDEX IF NOT EXISTS idx_equipment_name ON equipment(name);
+''')])
+register('flowershop.db', [(4, '''
+CREATE INDEX IF NOT EXISTS idx_suppliers_name ON suppliers(name);
+''')])
+
+# Сортировка списка заказов по времени (VirtualTreeview, sort_map) - поиском по индексу
+register('bakery.db', [(5, 'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);')])
+register('jewelry.db', [(5, 'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);')])
+register('sports_store.db', [(5, 'CREATE INDEX IF NOT EXISTS idx_orders_created ON orders(created_at);')])
+
+# Передача продаж в головной офис (replication): outbox и триггеры на таблицах продаж
+register('flowershop.db', [(5, outbox_sql(OUTBOX['flowershop.db']))])
+register('auto_salon.db', [(4, outbox_sql(OUTBOX['auto_salon.db']))])
+register('moto_salon.db', [(5, outbox_sql(OUTBOX['moto_salon.db']))])
+register('music_store.db', [(5, outbox_sql(OUTBOX['music_store.db']))])
+register('vapeshop.db', [(4, outbox_sql(OUTBOX['vapeshop.db']))])
+
+# Эпоха outbox: после восстановления из снимка id outbox повторяются, ключ события у сборщика - с эпохой
+register('flowershop.db', [(6, epoch_sql(OUTBOX['flowershop.db']))])
+register('auto_salon.db', [(5, epoch_sql(OUTBOX['auto_salon.db']))])
+register('moto_salon.db', [(6, epoch_sql(OUTBOX['moto_salon.db']))])
+register('music_store.db', [(6, epoch_sql(OUTBOX['music_store.db']))])
+register('vapeshop.db', [(5, epoch_sql(OUTBOX['vapeshop.db']))])
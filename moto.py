@@ -1,8 +1,51 @@
 import tkinter as tk
 from tkinter import ttk
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+import outbox
+from query_executor import QueryExecutor, show_loading
+from tree_sync import sync_tree, stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
+from change_notify import ChangeWatcher
 from datetime import datetime
-from tkcalendar import DateEntry
+from lazy_widgets import DateEntry
+
+SALES_QUERY = '''SELECT sales.id AS "ID", clients.name AS "Клиент", motorcycles.model AS "Мотоцикл",
+                        sales.sale_date AS "Дата", sales.amount AS "Сумма"
+                 FROM sales 
+                 JOIN clients ON sales.client_id = clients.id
+                 JOIN motorcycles ON sales.bike_id = motorcycles.id'''
+
+class MotoSalonService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_client(self, name, phone, reg_date):
+        self.add_clients([(name, phone, reg_date)])
+
+    def add_clients(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO clients (name, phone, reg_date) VALUES (?, ?, ?)", records))
+
+    def add_motorcycle(self, model, year, price, status):
+        self.add_motorcycles([(model, year, price, status)])
+
+    def add_motorcycles(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO motorcycles (model, year, price, status) VALUES (?, ?, ?, ?)", records))
+
+    def sell(self, client_id, bike_id, sale_date, amount):
+        self.sell_many([(client_id, bike_id, sale_date, amount)])
+
+    def sell_many(self, records):
+        # records - [(клиент, мотоцикл, дата, сумма)]
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO sales (client_id, bike_id, sale_date, amount) VALUES (?, ?, ?, ?)", records))
+
 
 class ModernMotoSalon:
     def __init__(self, root):
@@ -12,7 +55,8 @@ class ModernMotoSalon:
         self.root.minsize(1024, 600)
         
         self.style = ttk.Style()
-        self.style.theme_use("clam")
+        use_theme(self.style, "clam")
+        scope_styles(root, 'Moto')
         
         self.colors = {
             'primary': '#2A3F54',
@@ -21,51 +65,61 @@ class ModernMotoSalon:
             'text': '#333333'
         }
         
-        self.style.configure('TNotebook', background=self.colors['secondary'])
-        self.style.configure('TNotebook.Tab', 
+        self.style.configure('Moto.TNotebook', background=self.colors['secondary'])
+        self.style.configure('Moto.TNotebook.Tab', 
                            font=('Segoe UI', 11, 'bold'),
                            padding=[15, 5],
                            background=self.colors['primary'],
                            foreground='white')
-        self.style.map('TNotebook.Tab', 
+        self.style.map('Moto.TNotebook.Tab', 
                       background=[('selected', self.colors['accent'])])
         
-        self.style.configure('TFrame', background=self.colors['secondary'])
-        self.style.configure('TLabel', 
+        self.style.configure('Moto.TFrame', background=self.colors['secondary'])
+        self.style.configure('Moto.TLabel', 
                            font=('Segoe UI', 10),
                            background=self.colors['secondary'],
                            foreground=self.colors['text'])
-        self.style.configure('TButton', 
+        self.style.configure('Moto.TButton', 
                            font=('Segoe UI', 10, 'bold'),
                            background=self.colors['accent'],
                            foreground='white',
                            padding=10)
-        self.style.map('TButton', 
+        self.style.map('Moto.TButton', 
                       background=[('active', '#169F85')])
         
-        self.style.configure('Treeview', 
+        self.style.configure('Moto.Treeview', 
                            font=('Segoe UI', 10),
                            rowheight=25,
                            background='white',
                            fieldbackground='white')
-        self.style.configure('Treeview.Heading', 
+        self.style.configure('Moto.Treeview.Heading', 
                            font=('Segoe UI', 11, 'bold'),
                            background=self.colors['primary'],
                            foreground='white')
-        self.style.map('Treeview', 
+        self.style.map('Moto.Treeview', 
                      background=[('selected', self.colors['accent'])])
         
-        self.notebook = ttk.Notebook(root)
+        self.notebook = LazyNotebook(root)
         self.notebook.pack(fill=tk.BOTH, expand=True, padx=10, pady=10)
         
         self.create_tables()
-        self.create_clients_tab()
-        self.create_motorcycles_tab()
-        self.create_sales_tab()
-        self.create_stats_tab()
+        self.queries = QueryExecutor(root, "moto_salon.db")
+        outbox.start("moto_salon.db")
+        self.tabs = {text: ttk.Frame(self.notebook) for text in ("Клиенты", "Мотоциклы", "Продажи", "Статистика")}
+        self.notebook.add_lazy(self.tabs["Клиенты"], self.create_clients_tab, self.update_clients_list, text="Клиенты")
+        self.notebook.add_lazy(self.tabs["Мотоциклы"], self.create_motorcycles_tab, self.update_bikes_list,
+                               text="Мотоциклы")
+        self.notebook.add_lazy(self.tabs["Продажи"], self.create_sales_tab, self.update_sales_list, text="Продажи")
+        self.notebook.add_lazy(self.tabs["Статистика"], self.create_stats_tab, self.update_stats, text="Статистика")
+        add_search_tab(self.notebook, self.queries)
+        # Статистика пересчитывается только после записи в ее таблицы, в том числе из других процессов
+        self.changes = ChangeWatcher("moto_salon.db")
+        self.changes.subscribe(("clients", "motorcycles", "sales"),
+                               lambda tables: self.notebook.mark_stale(self.tabs["Статистика"]))
+        self.changes.start(root)
         
     def create_tables(self):
-        self.conn = sqlite3.connect("moto_salon.db")
+        self.conn = get_connection("moto_salon.db")
         self.cursor = self.conn.cursor()
         
         tables = [
@@ -95,6 +149,8 @@ class ModernMotoSalon:
         for table in tables:
             self.cursor.execute(table)
         self.conn.commit()
+        migrate(self.conn, 'moto_salon.db')
+        self.service = MotoSalonService(self.conn)
 
     def create_input_form(self, parent, fields):
         form_frame = ttk.Frame(parent)
@@ -114,8 +170,7 @@ class ModernMotoSalon:
         return entries
 
     def create_clients_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Клиенты")
+        tab = self.tabs["Клиенты"]
         
         fields = {
             'name': 'ФИО:',
@@ -144,8 +199,7 @@ class ModernMotoSalon:
         self.update_clients_list()
 
     def create_motorcycles_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Мотоциклы")
+        tab = self.tabs["Мотоциклы"]
         
         fields = {
             'model': 'Модель:',
@@ -176,8 +230,7 @@ class ModernMotoSalon:
         self.update_bikes_list()
 
     def create_sales_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Продажи")
+        tab = self.tabs["Продажи"]
         
         form_frame = ttk.Frame(tab)
         form_frame.pack(fill=tk.X, padx=20, pady=10)
@@ -205,23 +258,18 @@ class ModernMotoSalon:
         ttk.Button(btn_frame, text="Обновить", command=self.update_sales_list).pack(side=tk.LEFT, padx=5)
         
         columns = ("ID", "Клиент", "Мотоцикл", "Дата", "Сумма")
-        self.sales_tree = ttk.Treeview(tab, columns=columns, show="headings", height=12)
+        self.sales_tree = VirtualTreeview(tab, self.conn, SALES_QUERY, columns=columns, key="ID", height=12)
         
         for col in columns:
             self.sales_tree.heading(col, text=col)
             self.sales_tree.column(col, width=120, anchor=tk.CENTER)
         
-        scrollbar = ttk.Scrollbar(tab, orient=tk.VERTICAL, command=self.sales_tree.yview)
-        self.sales_tree.configure(yscroll=scrollbar.set)
-        
         self.sales_tree.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
         
         self.update_sales_list()
 
     def create_stats_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Статистика")
+        tab = self.tabs["Статистика"]
         
         stats_frame = ttk.Frame(tab)
         stats_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=20)
@@ -250,62 +298,58 @@ class ModernMotoSalon:
             "clients": "SELECT COUNT(*) FROM clients",
             "motorcycles WHERE status='В наличии'": "SELECT COUNT(*) FROM motorcycles WHERE status='В наличии'",
             "motorcycles WHERE status='Продан'": "SELECT COUNT(*) FROM motorcycles WHERE status='Продан'",
-            "sales": "SELECT SUM(amount) FROM sales"
+            "sales": "SELECT SUM(revenue) FROM daily_sales"
         }
+
+        def query(conn):
+            return {key: conn.execute(sql).fetchone()[0] or 0 for key, sql in queries.items()}
         
+        self.queries.submit('stats', query, on_done=self.show_stats)
+
+    def show_stats(self, results):
         for query, label in self.stats_labels.items():
-            self.cursor.execute(queries[query])
-            result = self.cursor.fetchone()[0] or 0
+            result = results[query]
             label.config(text=f"{result:,.2f}" if query == "sales" else result)
-        
-        self.root.after(5000, self.update_stats)
 
     def add_client(self):
-        self.cursor.execute("INSERT INTO clients (name, phone, reg_date) VALUES (?, ?, ?)",
-                          (self.client_entries['name'].get(),
-                           self.client_entries['phone'].get(),
-                           datetime.now().strftime("%Y-%m-%d")))
-        self.conn.commit()
+        self.service.add_client(self.client_entries['name'].get(),
+                                self.client_entries['phone'].get(),
+                                datetime.now().strftime("%Y-%m-%d"))
+        self.changes.check()
         self.update_clients_list()
 
     def update_clients_list(self):
-        self.clients_tree.delete(*self.clients_tree.get_children())
-        for row in self.cursor.execute("SELECT * FROM clients"):
-            self.clients_tree.insert("", tk.END, values=row)
+        show_loading(self.clients_tree, keep_rows=True)
+        stream_tree(self.queries, 'clients', self.clients_tree, "SELECT * FROM clients")
 
     def add_motorcycle(self):
-        self.cursor.execute("INSERT INTO motorcycles (model, year, price, status) VALUES (?, ?, ?, ?)",
-                          (self.bike_entries['model'].get(),
-                           self.bike_entries['year'].get(),
-                           self.bike_entries['price'].get(),
-                           self.bike_entries['status'].get()))
-        self.conn.commit()
+        self.service.add_motorcycle(self.bike_entries['model'].get(),
+                                    self.bike_entries['year'].get(),
+                                    self.bike_entries['price'].get(),
+                                    self.bike_entries['status'].get())
+        self.changes.check()
         self.update_bikes_list()
 
     def update_bikes_list(self):
-        self.bikes_tree.delete(*self.bikes_tree.get_children())
-        for row in self.cursor.execute("SELECT * FROM motorcycles"):
-            self.bikes_tree.insert("", tk.END, values=row)
+        show_loading(self.bikes_tree, keep_rows=True)
+        self.queries.submit('bikes', "SELECT * FROM motorcycles", on_done=self.fill_bikes_list)
+
+    def fill_bikes_list(self, rows):
+        sync_tree(self.bikes_tree, rows)
 
     def add_sale(self):
-        self.cursor.execute("INSERT INTO sales (client_id, bike_id, sale_date, amount) VALUES (?, ?, ?, ?)",
-                          (self.sale_entries['client_id'].get(),
-                           self.sale_entries['bike_id'].get(),
-                           self.sale_date.get_date(),
-                           self.sale_entries['amount'].get()))
-        self.conn.commit()
+        self.service.sell(self.sale_entries['client_id'].get(),
+                          self.sale_entries['bike_id'].get(),
+                          self.sale_date.get_date(),
+                          self.sale_entries['amount'].get())
+        self.changes.check()
         self.update_sales_list()
 
     def update_sales_list(self):
-        self.sales_tree.delete(*self.sales_tree.get_children())
-        query = '''SELECT sales.id, clients.name, motorcycles.model, sales.sale_date, sales.amount 
-                   FROM sales 
-                   JOIN clients ON sales.client_id = clients.id
-                   JOIN motorcycles ON sales.bike_id = motorcycles.id'''
-        for row in self.cursor.execute(query):
-            self.sales_tree.insert("", tk.END, values=row)
+        self.sales_tree.refresh()
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = ModernMotoSalon(root)
+    tracing.install(root)
     root.mainloop()
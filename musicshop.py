@@ -1,33 +1,109 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from bulk_import import ask_import
+import tracing
+import outbox
+from query_executor import QueryExecutor, show_loading, clear
+from tree_sync import sync_tree, stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 from datetime import datetime
 
+SALES_QUERY = '''SELECT sales.id AS ID, products.name AS Product, customers.name AS Customer, sales.date AS Date,
+                        sales.quantity AS Quantity, sales.total AS Total 
+                 FROM sales 
+                 JOIN products ON sales.product_id = products.id
+                 JOIN customers ON sales.customer_id = customers.id'''
+
+class MusicStoreService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_product(self, name, price, quantity):
+        self.add_products([(name, price, quantity)])
+
+    def add_products(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO products (name, price, quantity) VALUES (?, ?, ?)",
+            [(name, float(price), int(quantity)) for name, price, quantity in records]))
+
+    def delete_product(self, product_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM products WHERE id=?", (product_id,)))
+
+    def add_customer(self, name, contact):
+        self.add_customers([(name, contact)])
+
+    def add_customers(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO customers (name, contact) VALUES (?, ?)", records))
+
+    def delete_customer(self, customer_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM customers WHERE id=?", (customer_id,)))
+
+    def sell(self, product_id, customer_id, quantity, date=None):
+        return self.sell_many([(product_id, customer_id, quantity, date)])[0]
+
+    def sell_many(self, sales):
+        # sales - [(товар, покупатель, количество, дата или None - сейчас)] -> суммы
+        def write(conn):
+            totals = []
+            for product_id, customer_id, quantity, date in sales:
+                quantity = int(quantity)
+                row = conn.execute("SELECT quantity, price FROM products WHERE id=?", (product_id,)).fetchone()
+                if row is None:
+                    raise LookupError(f"Товар {product_id} не найден")
+                stock, price = row
+                if quantity <= 0 or quantity > stock:
+                    raise ValueError(f"Недостаточно товара {product_id}: на складе {stock}")
+                total = quantity * price
+                conn.execute("INSERT INTO sales (product_id, customer_id, date, quantity, total) VALUES (?, ?, ?, ?, ?)",
+                             (product_id, customer_id, date or datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                              quantity, total))
+                conn.execute("UPDATE products SET quantity = quantity - ? WHERE id=?", (quantity, product_id))
+                totals.append(total)
+            return totals
+        return run_write(self.conn, write)
+
+
 class MusicStoreApp:
     def __init__(self, master):
         self.master = master
         self.master.title("Управление музыкальным магазином")
         self.style = ttk.Style()
-        self.style.theme_use('default')
-        self.style.configure("TLabel", background="white", foreground="black")
-        self.style.configure("TFrame", background="white")
-        self.style.configure("TButton", background="gray", foreground="black")
-        self.style.configure("Treeview", background="white", foreground="black", fieldbackground="white")
-        self.style.map("Treeview", background=[('selected', 'gray')])
+        use_theme(self.style, 'default')
+        scope_styles(master, 'MusicShop')
+        self.style.configure("MusicShop.TLabel", background="white", foreground="black")
+        self.style.configure("MusicShop.TFrame", background="white")
+        self.style.configure("MusicShop.TButton", background="gray", foreground="black")
+        self.style.configure("MusicShop.Treeview", background="white", foreground="black", fieldbackground="white")
+        self.style.map("MusicShop.Treeview", background=[('selected', 'gray')])
 
         self.create_database()
+        self.queries = QueryExecutor(master, 'music_store.db')
+        outbox.start('music_store.db')
 
-        self.notebook = ttk.Notebook(master)
+        self.notebook = LazyNotebook(master)
         self.notebook.pack(padx=10, pady=10, expand=True, fill='both')
 
-        self.create_products_tab()
-        self.create_customers_tab()
-        self.create_sales_tab()
-        self.create_stats_tab()
+        self.products_frame = ttk.Frame(self.notebook)
+        self.customers_frame = ttk.Frame(self.notebook)
+        self.sales_frame = ttk.Frame(self.notebook)
+        self.stats_frame = ttk.Frame(self.notebook)
+        self.notebook.add_lazy(self.products_frame, self.create_products_tab, self.update_products_list, text="Товары")
+        self.notebook.add_lazy(self.customers_frame, self.create_customers_tab, self.update_customers_list,
+                               text="Клиенты")
+        self.notebook.add_lazy(self.sales_frame, self.create_sales_tab, (self.update_sales_list, self.update_combos),
+                               text="Продажи")
+        self.notebook.add_lazy(self.stats_frame, self.create_stats_tab, self.update_stats, text="Статистика")
+        add_search_tab(self.notebook, self.queries)
 
     def create_database(self):
-        self.conn = sqlite3.connect('music_store.db')
+        self.conn = get_connection('music_store.db')
         self.c = self.conn.cursor()
         self.c.execute('''CREATE TABLE IF NOT EXISTS products (
                             id INTEGER PRIMARY KEY,
@@ -46,11 +122,10 @@ class MusicStoreApp:
                             quantity INTEGER,
                             total REAL)''')
         self.conn.commit()
+        migrate(self.conn, 'music_store.db')
+        self.service = MusicStoreService(self.conn)
 
     def create_products_tab(self):
-        self.products_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.products_frame, text="Товары")
-
         ttk.Label(self.products_frame, text="Название:").grid(row=0, column=0, padx=5, pady=5)
         self.product_name = ttk.Entry(self.products_frame)
         self.product_name.grid(row=0, column=1, padx=5, pady=5, sticky='ew')
@@ -65,6 +140,7 @@ class MusicStoreApp:
 
         ttk.Button(self.products_frame, text="Добавить", command=self.add_product).grid(row=3, column=0, padx=5, pady=5)
         ttk.Button(self.products_frame, text="Удалить", command=self.delete_product).grid(row=3, column=1, padx=5, pady=5)
+        ttk.Button(self.products_frame, text="Импорт из CSV", command=self.import_products).grid(row=3, column=2, padx=5, pady=5)
 
         self.products_tree = ttk.Treeview(self.products_frame, columns=('ID', 'Name', 'Price', 'Quantity'), show='headings')
         self.products_tree.heading('ID', text='ID')
@@ -81,9 +157,6 @@ class MusicStoreApp:
         self.update_products_list()
 
     def create_customers_tab(self):
-        self.customers_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.customers_frame, text="Клиенты")
-
         ttk.Label(self.customers_frame, text="Имя:").grid(row=0, column=0, padx=5, pady=5)
         self.customer_name = ttk.Entry(self.customers_frame)
         self.customer_name.grid(row=0, column=1, padx=5, pady=5, sticky='ew')
@@ -109,9 +182,6 @@ class MusicStoreApp:
         self.update_customers_list()
 
     def create_sales_tab(self):
-        self.sales_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.sales_frame, text="Продажи")
-
         ttk.Label(self.sales_frame, text="Товар:").grid(row=0, column=0, padx=5, pady=5)
         self.product_combo = ttk.Combobox(self.sales_frame)
         self.product_combo.grid(row=0, column=1, padx=5, pady=5, sticky='ew')
@@ -126,7 +196,8 @@ class MusicStoreApp:
 
         ttk.Button(self.sales_frame, text="Оформить продажу", command=self.make_sale).grid(row=3, column=0, columnspan=2, padx=5, pady=10)
 
-        self.sales_tree = ttk.Treeview(self.sales_frame, columns=('ID', 'Product', 'Customer', 'Date', 'Quantity', 'Total'), show='headings')
+        self.sales_tree = VirtualTreeview(self.sales_frame, self.conn, SALES_QUERY,
+                                          columns=('ID', 'Product', 'Customer', 'Date', 'Quantity', 'Total'), key='ID')
         self.sales_tree.heading('ID', text='ID')
         self.sales_tree.heading('Product', text='Товар')
         self.sales_tree.heading('Customer', text='Клиент')
@@ -144,9 +215,6 @@ class MusicStoreApp:
         self.update_combos()
 
     def create_stats_tab(self):
-        self.stats_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.stats_frame, text="Статистика")
-
         ttk.Label(self.stats_frame, text="Общая выручка:").grid(row=0, column=0, padx=5, pady=5)
         self.total_revenue = ttk.Label(self.stats_frame, text="0")
         self.total_revenue.grid(row=0, column=1, padx=5, pady=5)
@@ -174,40 +242,43 @@ class MusicStoreApp:
         quantity = self.product_quantity.get()
         if name and price and quantity:
             try:
-                self.c.execute("INSERT INTO products (name, price, quantity) VALUES (?, ?, ?)", (name, float(price), int(quantity)))
-                self.conn.commit()
+                self.service.add_product(name, price, quantity)
                 self.update_products_list()
-                self.update_combos()
+                self.notebook.mark_stale(self.sales_frame)
                 self.product_name.delete(0, 'end')
                 self.product_price.delete(0, 'end')
                 self.product_quantity.delete(0, 'end')
             except:
                 pass
 
+    def import_products(self):
+        def done(result):
+            self.update_products_list()
+            self.notebook.mark_stale(self.sales_frame)
+        ask_import(self.master, self.queries, 'music_store.db', on_done=done)
+
     def delete_product(self):
         selected = self.products_tree.selection()
         if selected:
             product_id = self.products_tree.item(selected[0], 'values')[0]
-            self.c.execute("DELETE FROM products WHERE id=?", (product_id,))
-            self.conn.commit()
+            self.service.delete_product(product_id)
             self.update_products_list()
-            self.update_combos()
+            self.notebook.mark_stale(self.sales_frame)
 
     def update_products_list(self):
-        for row in self.products_tree.get_children():
-            self.products_tree.delete(row)
-        self.c.execute("SELECT * FROM products")
-        for row in self.c.fetchall():
-            self.products_tree.insert('', 'end', values=row)
+        show_loading(self.products_tree, keep_rows=True)
+        self.queries.submit('products', "SELECT * FROM products", on_done=self.fill_products_list)
+
+    def fill_products_list(self, rows):
+        sync_tree(self.products_tree, rows)
 
     def add_customer(self):
         name = self.customer_name.get()
         contact = self.customer_contact.get()
         if name and contact:
-            self.c.execute("INSERT INTO customers (name, contact) VALUES (?, ?)", (name, contact))
-            self.conn.commit()
+            self.service.add_customer(name, contact)
             self.update_customers_list()
-            self.update_combos()
+            self.notebook.mark_stale(self.sales_frame)
             self.customer_name.delete(0, 'end')
             self.customer_contact.delete(0, 'end')
 
@@ -215,17 +286,13 @@ class MusicStoreApp:
         selected = self.customers_tree.selection()
         if selected:
             customer_id = self.customers_tree.item(selected[0], 'values')[0]
-            self.c.execute("DELETE FROM customers WHERE id=?", (customer_id,))
-            self.conn.commit()
+            self.service.delete_customer(customer_id)
             self.update_customers_list()
-            self.update_combos()
+            self.notebook.mark_stale(self.sales_frame)
 
     def update_customers_list(self):
-        for row in self.customers_tree.get_children():
-            self.customers_tree.delete(row)
-        self.c.execute("SELECT * FROM customers")
-        for row in self.c.fetchall():
-            self.customers_tree.insert('', 'end', values=row)
+        show_loading(self.customers_tree, keep_rows=True)
+        stream_tree(self.queries, 'customers', self.customers_tree, "SELECT * FROM customers")
 
     def make_sale(self):
         product = self.product_combo.get()
@@ -235,32 +302,15 @@ class MusicStoreApp:
             try:
                 product_id = product.split(':')[0]
                 customer_id = customer.split(':')[0]
-                quantity = int(quantity)
-                self.c.execute("SELECT quantity, price FROM products WHERE id=?", (product_id,))
-                stock, price = self.c.fetchone()
-                if quantity <= stock:
-                    total = quantity * price
-                    date = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-                    self.c.execute("INSERT INTO sales (product_id, customer_id, date, quantity, total) VALUES (?, ?, ?, ?, ?)",
-                                  (product_id, customer_id, date, quantity, total))
-                    self.c.execute("UPDATE products SET quantity = quantity - ? WHERE id=?", (quantity, product_id))
-                    self.conn.commit()
-                    self.update_sales_list()
-                    self.update_products_list()
-                    self.update_stats()
-                    self.sale_quantity.delete(0, 'end')
+                self.service.sell(product_id, customer_id, quantity)
+                self.update_sales_list()
+                self.notebook.mark_stale(self.products_frame, self.stats_frame)
+                self.sale_quantity.delete(0, 'end')
             except:
                 pass
 
     def update_sales_list(self):
-        for row in self.sales_tree.get_children():
-            self.sales_tree.delete(row)
-        self.c.execute('''SELECT sales.id, products.name, customers.name, sales.date, sales.quantity, sales.total 
-                          FROM sales 
-                          JOIN products ON sales.product_id = products.id
-                          JOIN customers ON sales.customer_id = customers.id''')
-        for row in self.c.fetchall():
-            self.sales_tree.insert('', 'end', values=row)
+        self.sales_tree.refresh()
 
     def update_combos(self):
         self.c.execute("SELECT id, name FROM products")
@@ -269,27 +319,36 @@ class MusicStoreApp:
         self.customer_combo['values'] = [f"{r[0]}: {r[1]}" for r in self.c.fetchall()]
 
     def update_stats(self):
-        self.c.execute("SELECT SUM(total) FROM sales")
-        total = self.c.fetchone()[0] or 0
+        def query(conn):
+            c = conn.cursor()
+            c.execute("SELECT SUM(revenue) FROM daily_sales")
+            total = c.fetchone()[0] or 0
+
+            c.execute('''SELECT products.name, SUM(daily_sales.quantity) FROM daily_sales 
+                         JOIN products ON daily_sales.product_id = products.id 
+                         GROUP BY product_id 
+                         ORDER BY SUM(daily_sales.quantity) DESC LIMIT 1''')
+            popular = c.fetchone()
+
+            c.execute('''SELECT products.name, SUM(daily_sales.quantity), SUM(daily_sales.revenue) FROM daily_sales 
+                         JOIN products ON daily_sales.product_id = products.id 
+                         GROUP BY product_id ORDER BY SUM(daily_sales.revenue) DESC''')
+            return total, popular, c.fetchall()
+
+        show_loading(self.sales_summary_tree)
+        self.queries.submit('stats', query, on_done=lambda result: self.show_stats(*result))
+
+    def show_stats(self, total, result, summary):
         self.total_revenue.config(text=f"{total:.2f} руб.")
-
-        self.c.execute('''SELECT products.name, SUM(sales.quantity) FROM sales 
-                          JOIN products ON sales.product_id = products.id 
-                          GROUP BY product_id 
-                          ORDER BY SUM(sales.quantity) DESC LIMIT 1''')
-        result = self.c.fetchone()
         self.popular_product.config(text=f"{result[0]} ({result[1]} шт.)" if result else "-")
 
-        for row in self.sales_summary_tree.get_children():
-            self.sales_summary_tree.delete(row)
-        self.c.execute('''SELECT products.name, SUM(sales.quantity), SUM(sales.total) FROM sales 
-                          JOIN products ON sales.product_id = products.id 
-                          GROUP BY product_id ORDER BY SUM(sales.total) DESC''')
-        for row in self.c.fetchall():
+        clear(self.sales_summary_tree)
+        for row in summary:
             self.sales_summary_tree.insert('', 'end', values=row)
 
 if __name__ == "__main__":
     root = tk.Tk()
     root.geometry("900x600")
     app = MusicStoreApp(root)
+    tracing.install(root)
     root.mainloop()
@@ -0,0 +1,76 @@
+import importlib
+import os
+
+# Таблица outbox для передачи продаж в головной офис (replication.py): триггер
+# на таблице продаж в той же транзакции, что и продажа, добавляет строку в
+# outbox. Модуль без зависимостей - его импортируют migrations и приложения при
+# каждом запуске; replication (asyncio, HTTP) загружается, только если задан
+# адрес сборщика.
+# После восстановления из снимка (backup.restore) AUTOINCREMENT outbox
+# откатывается и id повторяются, поэтому у базы есть эпоха (outbox_epoch):
+# случайный идентификатор, создается вместе с outbox и меняется при
+# восстановлении. Строка outbox запоминает эпоху, в которой добавлена, и
+# сборщик различает события по (магазин, база, эпоха, id)
+COLLECTOR_ENV = 'KP_COLLECTOR_URL'
+
+# Файл базы -> {таблица продаж: столбцы, которые уходят в офис}
+OUTBOX = {
+    'flowershop.db': {'sales': ('id', 'flower_id', 'quantity', 'sale_date', 'total_price')},
+    'auto_salon.db': {'sales': ('id', 'client_id', 'car_id', 'sale_date', 'amount')},
+    'moto_salon.db': {'sales': ('id', 'client_id', 'bike_id', 'sale_date', 'amount')},
+    'music_store.db': {'sales': ('id', 'product_id', 'customer_id', 'date', 'quantity', 'total')},
+    'vapeshop.db': {'orders': ('id', 'product_id', 'product_type', 'quantity', 'total', 'date')},
+}
+# Новая эпоха: 16 случайных байт в hex
+NEW_EPOCH = "lower(hex(randomblob(16)))"
+
+
+def _payload(columns, row):
+    return "json_object(" + ', '.join(f"'{column}', {row}{column}" for column in columns) + ")"
+
+
+def outbox_sql(tables):
+    # SQL для миграции: таблица outbox, уже накопленные продажи и триггеры.
+    # AUTOINCREMENT: id удаленных (отправленных) строк не используются повторно
+    lines = ["CREATE TABLE IF NOT EXISTS outbox (id INTEGER PRIMARY KEY AUTOINCREMENT, tbl TEXT NOT NULL, "
+             "row_id INTEGER NOT NULL, payload TEXT NOT NULL, "
+             "created_at TEXT NOT NULL DEFAULT CURRENT_TIMESTAMP);"]
+    for table, columns in tables.items():
+        lines.append(f"INSERT INTO outbox (tbl, row_id, payload) SELECT '{table}', id, {_payload(columns, '')} "
+                     f"FROM {table} ORDER BY id;")
+        lines.append(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_insert_outbox AFTER INSERT ON {table} BEGIN "
+                     f"INSERT INTO outbox (tbl, row_id, payload) VALUES ('{table}', NEW.id, {_payload(columns, 'NEW.')}); "
+                     f"END;")
+    return '\n'.join(lines)
+
+
+def epoch_sql(tables):
+    # SQL для миграции: эпоха базы и столбец epoch в outbox. Строки, накопленные
+    # до миграции, получают пустую эпоху - с ней сборщик хранит уже принятые
+    # события, и повтор их пачки ничего не добавит
+    lines = ["CREATE TABLE IF NOT EXISTS outbox_epoch (epoch TEXT NOT NULL);",
+             f"INSERT INTO outbox_epoch (epoch) SELECT {NEW_EPOCH} WHERE NOT EXISTS (SELECT 1 FROM outbox_epoch);",
+             "ALTER TABLE outbox ADD COLUMN epoch TEXT NOT NULL DEFAULT '';"]
+    for table, columns in tables.items():
+        lines.append(f"DROP TRIGGER IF EXISTS trg_{table}_insert_outbox;")
+        lines.append(f"CREATE TRIGGER trg_{table}_insert_outbox AFTER INSERT ON {table} BEGIN "
+                     f"INSERT INTO outbox (tbl, row_id, payload, epoch) VALUES ('{table}', NEW.id, "
+                     f"{_payload(columns, 'NEW.')}, (SELECT epoch FROM outbox_epoch)); END;")
+    return '\n'.join(lines)
+
+
+def renew_epoch(conn):
+    # Новая эпоха базы (после восстановления из снимка); None, если outbox нет
+    if not conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'outbox_epoch'").fetchone():
+        return None
+    conn.execute(f"UPDATE outbox_epoch SET epoch = {NEW_EPOCH}")
+    return conn.execute("SELECT epoch FROM outbox_epoch").fetchone()[0]
+
+
+def start(path, url=None):
+    # Запустить отправку outbox базы path (replication.start), если задан адрес
+    # сборщика; без адреса ничего не делает и возвращает None
+    url = url or os.environ.get(COLLECTOR_ENV)
+    if not url or os.path.basename(path) not in OUTBOX:
+        return None
+    return importlib.import_module('replication').start(path, url)
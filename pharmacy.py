@@ -1,8 +1,82 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-from tkcalendar import DateEntry
-import sqlite3
+from lazy_widgets import DateEntry
+from db_session import get_connection, run_write, database_path
+from migrations import migrate
+from search import add_search_tab
+from bulk_import import ask_import
+import tracing
+from query_executor import QueryExecutor, show_loading, clear
+from tree_sync import sync_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
+from archive import archives
+
+SALES_HISTORY_QUERY = '''SELECT sales_records.transaction_id AS "ID", medicines_inventory.medicine_name AS "Препарат", 
+                         sales_records.sold_quantity AS "Продано", sales_records.total_amount AS "Сумма", 
+                         sales_records.transaction_date AS "Дата операции" 
+                         FROM sales_records 
+                         JOIN medicines_inventory 
+                         ON sales_records.medicine_identifier = medicines_inventory.medicine_id
+                         WHERE sales_records.transaction_date BETWEEN ? AND ?'''
+
+
+def register_sale(connection, medicine_name, transaction_quantity, transaction_date):
+    # Списание и запись продажи (вызывается внутри run_write: остаток
+    # проверяется под блокировкой записи и не уйдет в минус при двух кассах)
+    medicine_data = connection.execute('''SELECT medicine_id, unit_price, stock_quantity 
+                                          FROM medicines_inventory 
+                                          WHERE medicine_name=?''', (medicine_name,)).fetchone()
+    if not medicine_data:
+        raise LookupError("Препарат не найден")
+    medicine_identifier, unit_price, current_stock = medicine_data
+    if transaction_quantity > current_stock:
+        raise ValueError("Недостаточный остаток на складе")
+    connection.execute('''UPDATE medicines_inventory 
+                          SET stock_quantity = stock_quantity - ? 
+                          WHERE medicine_id=?''', (transaction_quantity, medicine_identifier))
+    connection.execute('''INSERT INTO sales_records 
+                          (medicine_identifier, sold_quantity, transaction_date, total_amount)
+                          VALUES (?, ?, ?, ?)''', 
+                       (medicine_identifier, transaction_quantity, transaction_date, unit_price * transaction_quantity))
+
+
+class PharmacyService:
+    def __init__(self, connection):
+        self.connection = connection
+
+    def add_medicine(self, name, manufacturer, expiration_date, unit_price, stock_quantity):
+        self.add_medicines([(name, manufacturer, expiration_date, unit_price, stock_quantity)])
+
+    def add_medicines(self, records):
+        run_write(self.connection, lambda connection: connection.executemany(
+            '''INSERT INTO medicines_inventory
+               (medicine_name, medicine_manufacturer, expiration_date, unit_price, stock_quantity)
+               VALUES (?, ?, ?, ?, ?)''', records))
+
+    def update_medicine(self, medicine_id, name, manufacturer, expiration_date, unit_price, stock_quantity):
+        run_write(self.connection, lambda connection: connection.execute(
+            '''UPDATE medicines_inventory SET
+               medicine_name=?, medicine_manufacturer=?, expiration_date=?, unit_price=?, stock_quantity=?
+               WHERE medicine_id=?''', (name, manufacturer, expiration_date, unit_price, stock_quantity, medicine_id)))
+
+    def delete_medicine(self, medicine_id):
+        run_write(self.connection, lambda connection: connection.execute(
+            "DELETE FROM medicines_inventory WHERE medicine_id=?", (medicine_id,)))
+
+    def sell(self, medicine_name, quantity, date):
+        self.sell_many([(medicine_name, quantity, date)])
+
+    def sell_many(self, sales):
+        # sales - [(препарат, количество, дата)]; при нехватке остатка
+        # откатывается весь список
+        def write(connection):
+            for medicine_name, quantity, date in sales:
+                register_sale(connection, medicine_name, quantity, date)
+        run_write(self.connection, write)
+
 
 class PharmacyApplication:
     def __init__(self, root_window):
@@ -10,8 +84,9 @@ class PharmacyApplication:
         self.root_window.title("Аптека - Система управления")
         self.configure_styles()
         self.initialize_database_connection()
+        self.queries = QueryExecutor(root_window, 'pharmacy_database.db')
         
-        self.application_notebook = ttk.Notebook(self.root_window)
+        self.application_notebook = LazyNotebook(self.root_window)
         self.application_notebook.pack(padx=15, pady=15, fill='both', expand=True)
 
         self.medicines_tab = ttk.Frame(self.application_notebook)
@@ -19,29 +94,29 @@ class PharmacyApplication:
         self.sales_history_tab = ttk.Frame(self.application_notebook)
         self.statistics_tab = ttk.Frame(self.application_notebook)
 
-        self.application_notebook.add(self.medicines_tab, text='Учёт лекарственных средств')
-        self.application_notebook.add(self.sales_management_tab, text='Управление продажами')
-        self.application_notebook.add(self.sales_history_tab, text='История транзакций')
-        self.application_notebook.add(self.statistics_tab, text='Статистика продаж')
-
-        self.create_medicines_management_interface()
-        self.create_sales_management_interface()
-        self.create_sales_history_interface()
-        self.create_statistics_interface()
-        self.refresh_medicines_list()
+        self.application_notebook.add_lazy(self.medicines_tab, self.create_medicines_management_interface,
+                                           self.refresh_medicines_list, text='Учёт лекарственных средств')
+        self.application_notebook.add_lazy(self.sales_management_tab, self.create_sales_management_interface,
+                                           self.refresh_medicines_list, text='Управление продажами')
+        self.application_notebook.add_lazy(self.sales_history_tab, self.create_sales_history_interface,
+                                           self.refresh_sales_history, text='История транзакций')
+        self.application_notebook.add_lazy(self.statistics_tab, self.create_statistics_interface,
+                                           self.refresh_statistics, text='Статистика продаж')
+        add_search_tab(self.application_notebook, self.queries)
 
     def configure_styles(self):
         self.style = ttk.Style()
-        self.style.theme_use('clam')
-        self.style.configure('TFrame', background='white')
-        self.style.configure('TLabel', background='white', foreground='#2D5D2E')
-        self.style.configure('TButton', background='#4CAF50', foreground='white', bordercolor='#4CAF50')
-        self.style.map('TButton', background=[('active', '#45A049')])
-        self.style.configure('Treeview.Heading', background='#4CAF50', foreground='white')
-        self.style.configure('Treeview', fieldbackground='white', foreground='#2D5D2E')
+        use_theme(self.style, 'clam')
+        scope_styles(self.root_window, 'Pharmacy')
+        self.style.configure('Pharmacy.TFrame', background='white')
+        self.style.configure('Pharmacy.TLabel', background='white', foreground='#2D5D2E')
+        self.style.configure('Pharmacy.TButton', background='#4CAF50', foreground='white', bordercolor='#4CAF50')
+        self.style.map('Pharmacy.TButton', background=[('active', '#45A049')])
+        self.style.configure('Pharmacy.Treeview.Heading', background='#4CAF50', foreground='white')
+        self.style.configure('Pharmacy.Treeview', fieldbackground='white', foreground='#2D5D2E')
 
     def initialize_database_connection(self):
-        self.database_connection = sqlite3.connect('pharmacy_database.db')
+        self.database_connection = get_connection('pharmacy_database.db')
         self.database_cursor = self.database_connection.cursor()
         
         self.database_cursor.execute('''CREATE TABLE IF NOT EXISTS medicines_inventory (
@@ -61,6 +136,8 @@ class PharmacyApplication:
                                       FOREIGN KEY(medicine_identifier) REFERENCES medicines_inventory(medicine_id))''')
         
         self.database_connection.commit()
+        migrate(self.database_connection, 'pharmacy_database.db')
+        self.service = PharmacyService(self.database_connection)
 
     def create_medicines_management_interface(self):
         input_fields_container = ttk.Frame(self.medicines_tab)
@@ -87,6 +164,7 @@ class PharmacyApplication:
         ttk.Button(buttons_container, text="Добавить запись", command=self.add_new_medicine).pack(side='left', padx=6)
         ttk.Button(buttons_container, text="Обновить запись", command=self.update_existing_medicine).pack(side='left', padx=6)
         ttk.Button(buttons_container, text="Удалить запись", command=self.delete_existing_medicine).pack(side='left', padx=6)
+        ttk.Button(buttons_container, text="Импорт из CSV", command=self.import_medicines).pack(side='left', padx=6)
 
         columns = ('ID', 'Наименование', 'Производитель', 'Срок годности', 'Цена', 'Остаток')
         self.medicines_treeview = ttk.Treeview(self.medicines_tab, columns=columns, show='headings', height=12)
@@ -97,6 +175,7 @@ class PharmacyApplication:
             
         self.medicines_treeview.pack(padx=12, pady=12, fill='both', expand=True)
         self.medicines_treeview.bind('<<TreeviewSelect>>', self.load_selected_medicine_data)
+        self.refresh_medicines_list()
 
     def create_sales_management_interface(self):
         sales_container = ttk.Frame(self.sales_management_tab)
@@ -115,6 +194,7 @@ class PharmacyApplication:
         self.transaction_date_picker.grid(row=2, column=1, padx=6, pady=6)
 
         ttk.Button(sales_container, text="Зафиксировать продажу", command=self.process_sale_transaction).grid(row=3, column=0, columnspan=2, pady=12)
+        self.refresh_medicines_list()
 
     def create_sales_history_interface(self):
         filter_container = ttk.Frame(self.sales_history_tab)
@@ -129,9 +209,16 @@ class PharmacyApplication:
         self.history_end_date.pack(side='left', padx=6)
         
         ttk.Button(filter_container, text="Обновить историю", command=self.refresh_sales_history).pack(side='left', padx=12)
+        # История читает только живые продажи: перенесенные в архив годы не показываются
+        self.history_archive_note = ttk.Label(self.sales_history_tab, text="")
+        self.history_archive_note.pack(padx=12, anchor='w')
 
         columns = ('ID', 'Препарат', 'Продано', 'Сумма', 'Дата операции')
-        self.sales_history_treeview = ttk.Treeview(self.sales_history_tab, columns=columns, show='headings', height=15)
+        self.sales_history_treeview = VirtualTreeview(self.sales_history_tab, self.database_connection,
+                                                      SALES_HISTORY_QUERY, columns=columns, key='ID',
+                                                      sort_map={'Дата операции': 'Дата операции'},
+                                                      params=(self.history_start_date.get(), self.history_end_date.get()),
+                                                      height=15)
         
         for column in columns:
             self.sales_history_treeview.heading(column, text=column)
@@ -173,15 +260,16 @@ class PharmacyApplication:
             return
             
         try:
-            self.database_cursor.execute('''INSERT INTO medicines_inventory 
-                                        (medicine_name, medicine_manufacturer, expiration_date, unit_price, stock_quantity)
-                                        VALUES (?, ?, ?, ?, ?)''', input_values)
-            self.database_connection.commit()
+            self.service.add_medicine(*input_values)
             self.refresh_medicines_list()
             self.clear_input_fields()
         except Exception as error:
             messagebox.showerror("Ошибка базы данных", f"Ошибка: {str(error)}")
 
+    def import_medicines(self):
+        ask_import(self.root_window, self.queries, 'pharmacy_database.db',
+                   on_done=lambda result: self.refresh_medicines_list())
+
     def update_existing_medicine(self):
         selected_items = self.medicines_treeview.selection()
         if not selected_items:
@@ -193,15 +281,11 @@ class PharmacyApplication:
             self.medicine_input_fields['Производитель:'].get(),
             self.medicine_input_fields['Дата окончания срока:'].get(),
             self.medicine_input_fields['Цена за единицу:'].get(),
-            self.medicine_input_fields['Количество на складе:'].get(),
-            medicine_identifier
+            self.medicine_input_fields['Количество на складе:'].get()
         ]
                 
         try:
-            self.database_cursor.execute('''UPDATE medicines_inventory SET 
-                                        medicine_name=?, medicine_manufacturer=?, expiration_date=?, unit_price=?, stock_quantity=?
-                                        WHERE medicine_id=?''', updated_values)
-            self.database_connection.commit()
+            self.service.update_medicine(medicine_identifier, *updated_values)
             self.refresh_medicines_list()
         except Exception as error:
             messagebox.showerror("Ошибка обновления", f"Ошибка: {str(error)}")
@@ -213,8 +297,7 @@ class PharmacyApplication:
             
         medicine_identifier = self.medicines_treeview.item(selected_items[0], 'values')[0]
         try:
-            self.database_cursor.execute("DELETE FROM medicines_inventory WHERE medicine_id=?", (medicine_identifier,))
-            self.database_connection.commit()
+            self.service.delete_medicine(medicine_identifier)
             self.refresh_medicines_list()
         except Exception as error:
             messagebox.showerror("Ошибка удаления", f"Ошибка: {str(error)}")
@@ -229,86 +312,79 @@ class PharmacyApplication:
             return
             
         try:
-            self.database_cursor.execute('''SELECT medicine_id, unit_price, stock_quantity 
-                                         FROM medicines_inventory 
-                                         WHERE medicine_name=?''', (selected_medicine,))
-            medicine_data = self.database_cursor.fetchone()
-            
-            if not medicine_data:
-                messagebox.showerror("Ошибка поиска", "Препарат не найден")
-                return
-                
-            medicine_identifier, unit_price, current_stock = medicine_data
             transaction_quantity = int(transaction_quantity)
+        except ValueError:
+            messagebox.showerror("Ошибка операции", "Количество должно быть целым числом")
+            return
             
-            if transaction_quantity > current_stock:
-                messagebox.showerror("Ошибка операции", "Недостаточный остаток на складе")
-                return
-                
-            updated_stock = current_stock - transaction_quantity
-            self.database_cursor.execute('''UPDATE medicines_inventory 
-                                         SET stock_quantity=? 
-                                         WHERE medicine_id=?''', (updated_stock, medicine_identifier))
-            
-            total_transaction_amount = unit_price * transaction_quantity
-            self.database_cursor.execute('''INSERT INTO sales_records 
-                                         (medicine_identifier, sold_quantity, transaction_date, total_amount)
-                                         VALUES (?, ?, ?, ?)''', 
-                                         (medicine_identifier, transaction_quantity, transaction_date, total_transaction_amount))
-            self.database_connection.commit()
-            self.refresh_medicines_list()
-            self.refresh_sales_history()
-            self.refresh_statistics()
-            messagebox.showinfo("Операция успешна", "Продажа зарегистрирована")
-            
+        try:
+            self.service.sell(selected_medicine, transaction_quantity, transaction_date)
+        except LookupError as error:
+            messagebox.showerror("Ошибка поиска", str(error))
+            return
+        except ValueError as error:
+            messagebox.showerror("Ошибка операции", str(error))
+            return
         except Exception as error:
             messagebox.showerror("Ошибка транзакции", f"Ошибка: {str(error)}")
+            return
+            
+        self.refresh_medicines_list()
+        self.application_notebook.mark_stale(self.sales_history_tab, self.statistics_tab)
+        messagebox.showinfo("Операция успешна", "Продажа зарегистрирована")
 
     def refresh_medicines_list(self):
-        self.medicines_treeview.delete(*self.medicines_treeview.get_children())
-        self.database_cursor.execute('''SELECT * FROM medicines_inventory''')
-        for record in self.database_cursor.fetchall():
-            self.medicines_treeview.insert('', 'end', values=record)
+        show_loading(self.medicines_treeview, keep_rows=True)
+        self.queries.submit('medicines', '''SELECT * FROM medicines_inventory''',
+                            on_done=self.fill_medicines_list)
+
+    def fill_medicines_list(self, records):
+        sync_tree(self.medicines_treeview, records)
         
-        self.database_cursor.execute('''SELECT medicine_name FROM medicines_inventory''')
-        medicine_names = [record[0] for record in self.database_cursor.fetchall()]
-        self.medicine_selection_combobox['values'] = medicine_names
+        if self.application_notebook.is_built(self.sales_management_tab):
+            medicine_names = [record[1] for record in records]
+            self.medicine_selection_combobox['values'] = medicine_names
 
     def refresh_sales_history(self):
-        self.sales_history_treeview.delete(*self.sales_history_treeview.get_children())
         start_date_filter = self.history_start_date.get()
         end_date_filter = self.history_end_date.get()
         
-        history_query = '''SELECT sales_records.transaction_id, medicines_inventory.medicine_name, 
-                         sales_records.sold_quantity, sales_records.total_amount, 
-                         sales_records.transaction_date 
-                         FROM sales_records 
-                         JOIN medicines_inventory 
-                         ON sales_records.medicine_identifier = medicines_inventory.medicine_id
-                         WHERE sales_records.transaction_date BETWEEN ? AND ?'''
-                         
-        self.database_cursor.execute(history_query, (start_date_filter, end_date_filter))
-        for historical_record in self.database_cursor.fetchall():
-            self.sales_history_treeview.insert('', 'end', values=historical_record)
+        if self.sales_history_treeview.params == (start_date_filter, end_date_filter):
+            self.sales_history_treeview.refresh()
+        else:
+            self.sales_history_treeview.set_query(SALES_HISTORY_QUERY, (start_date_filter, end_date_filter))
+
+        years = [str(year) for year, path in archives(database_path(self.database_connection))
+                 if int(start_date_filter[:4]) <= year <= int(end_date_filter[:4])]
+        self.history_archive_note.config(
+            text=f"Продажи за {', '.join(years)} перенесены в архив и в истории не показываются" if years else "")
 
     def refresh_statistics(self):
-        self.database_cursor.execute('SELECT SUM(total_amount), SUM(sold_quantity) FROM sales_records')
-        stats = self.database_cursor.fetchone()
+        def query(connection):
+            cursor = connection.cursor()
+            cursor.execute('SELECT SUM(revenue), SUM(quantity) FROM daily_sales')
+            stats = cursor.fetchone()
+            cursor.execute('''SELECT medicines_inventory.medicine_name, SUM(daily_sales.quantity) 
+                              FROM daily_sales 
+                              JOIN medicines_inventory 
+                              ON daily_sales.product_id = medicines_inventory.medicine_id
+                              GROUP BY daily_sales.product_id 
+                              ORDER BY SUM(daily_sales.quantity) DESC 
+                              LIMIT 5''')
+            return stats, cursor.fetchall()
+
+        show_loading(self.top_medicines_treeview)
+        self.queries.submit('statistics', query, on_done=lambda result: self.show_statistics(*result))
+
+    def show_statistics(self, stats, top_medicines):
         total_income = stats[0] if stats[0] else 0
         total_sales = stats[1] if stats[1] else 0
 
         self.total_income_label.config(text=f"Общая выручка: {total_income:.2f} руб.")
         self.total_sales_label.config(text=f"Общее количество продаж: {total_sales}")
 
-        self.top_medicines_treeview.delete(*self.top_medicines_treeview.get_children())
-        self.database_cursor.execute('''SELECT medicines_inventory.medicine_name, SUM(sales_records.sold_quantity) 
-                                         FROM sales_records 
-                                         JOIN medicines_inventory 
-                                         ON sales_records.medicine_identifier = medicines_inventory.medicine_id
-                                         GROUP BY medicine_identifier 
-                                         ORDER BY SUM(sales_records.sold_quantity) DESC 
-                                         LIMIT 5''')
-        for row in self.database_cursor.fetchall():
+        clear(self.top_medicines_treeview)
+        for row in top_medicines:
             self.top_medicines_treeview.insert('', 'end', values=row)
 
     def load_selected_medicine_data(self, event):
@@ -324,15 +400,13 @@ class PharmacyApplication:
 
     def clear_input_fields(self):
         for input_field in self.medicine_input_fields.values():
-            if isinstance(input_field, DateEntry):
+            if hasattr(input_field, 'set_date'):
                 input_field.set_date(None)
             else:
                 input_field.delete(0, 'end')
 
-    def __del__(self):
-        self.database_connection.close()
-
 if __name__ == "__main__":
     main_window = tk.Tk()
     application_instance = PharmacyApplication(main_window)
+    tracing.install(main_window)
     main_window.mainloop()
@@ -0,0 +1,236 @@
+import queue
+import sqlite3
+import threading
+import time
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+import db_session
+import metrics
+import tracing
+
+LOADING_TEXT = "Загрузка..."
+# stream(): строк в пачке и сколько пачек фоновый поток может прочитать
+# вперед, пока главный поток их не вставил
+STREAM_BATCH = 500
+STREAM_AHEAD = 2
+
+
+def show_loading(widget, keep_rows=False):
+    # Легкое состояние "загрузка" на время выполнения запроса.
+    # keep_rows - не очищать заполненное дерево, его обновит sync_tree
+    if isinstance(widget, ttk.Treeview):
+        if keep_rows and widget.get_children():
+            return
+        widget.delete(*widget.get_children())
+        columns = widget['columns'] or ('#0',)
+        widget.insert('', 'end', text=LOADING_TEXT,
+                      values=(LOADING_TEXT,) + ('',) * (len(columns) - 1),
+                      tags=('loading',))
+        widget.tag_configure('loading', foreground='#888888')
+    elif isinstance(widget, tk.Text):
+        widget.delete('1.0', tk.END)
+        widget.insert(tk.END, LOADING_TEXT)
+    elif isinstance(widget, (tk.Label, ttk.Label)):
+        widget.config(text=LOADING_TEXT)
+    elif isinstance(widget, tk.Listbox):
+        widget.delete(0, tk.END)
+        widget.insert(tk.END, LOADING_TEXT)
+
+
+def clear(widget):
+    if isinstance(widget, ttk.Treeview):
+        widget.delete(*widget.get_children())
+    elif isinstance(widget, tk.Text):
+        widget.delete('1.0', tk.END)
+    elif isinstance(widget, tk.Listbox):
+        widget.delete(0, tk.END)
+
+
+def _default_error(error):
+    messagebox.showerror("Ошибка", str(error))
+
+
+class _Stream:
+    # Запрос stream(): SQL, столбец ключа, обработчик пачек и разрешения
+    # прочитать следующую пачку
+    def __init__(self, sql, params, column, on_rows, batch):
+        self.sql = sql
+        self.params = params
+        self.column = column
+        self.on_rows = on_rows
+        self.batch = batch
+        self.credit = threading.Semaphore(STREAM_AHEAD)
+
+
+class _Chunk:
+    def __init__(self, key, generation, stream, rows):
+        self.key = key
+        self.generation = generation
+        self.stream = stream
+        self.rows = rows
+
+
+class QueryExecutor:
+    # Выполняет SELECT в фоновом потоке со своим соединением,
+    # результаты возвращаются в главный поток через after()
+    def __init__(self, widget, path, poll_ms=30):
+        self.widget = widget
+        self.path = path
+        self.poll_ms = poll_ms
+        self._jobs = queue.Queue()
+        self._results = queue.Queue()
+        self._generations = {}
+        self._running = None
+        self._pending = 0
+        self._poll_id = None
+        self._conn = None
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def submit(self, key, query, params=(), on_done=None, on_error=None):
+        # query - строка SQL или функция(conn), выполняемая в фоновом потоке.
+        # Повторный запрос с тем же key отменяет предыдущий
+        generation = self._generations.get(key, 0) + 1
+        self._generations[key] = generation
+        running = self._running
+        if running is not None and running[0] == key and self._conn is not None:
+            self._conn.interrupt()
+        self._pending += 1
+        self._jobs.put((key, generation, query, params, on_done, on_error or _default_error,
+                        tracing.current_action()))
+        if self._poll_id is None:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
+
+    def stream(self, key, query, params=(), column=0, on_rows=None, on_done=None, on_error=None,
+               batch=STREAM_BATCH):
+        # SELECT по частям для длинных списков: фоновый поток читает пачки по batch
+        # строк не больше чем на STREAM_AHEAD пачек вперед, on_rows(rows) вызывается
+        # в главном потоке по одной пачке за тик after_idle - между пачками
+        # обрабатываются события интерфейса. column - номер столбца с уникальным
+        # ключом (id), строки идут по возрастанию ключа. on_done(число строк) -
+        # после последней пачки
+        self.submit(key, _Stream(query, params, column, on_rows, batch), (), on_done, on_error)
+
+    def cancel(self, key):
+        self._generations[key] = self._generations.get(key, 0) + 1
+        running = self._running
+        if running is not None and running[0] == key and self._conn is not None:
+            self._conn.interrupt()
+
+    def close(self):
+        for key in list(self._generations):
+            self.cancel(key)
+        self._jobs.put(None)
+        if self._poll_id is not None:
+            self.widget.after_cancel(self._poll_id)
+            self._poll_id = None
+
+    def busy(self):
+        # Есть запросы, результаты которых еще не обработаны в главном потоке
+        return self._pending > 0
+
+    def _is_current(self, key, generation):
+        return self._generations.get(key) == generation
+
+    def _run(self):
+        self._conn = db_session.open_connection(self.path, check_same_thread=False)
+        while True:
+            job = self._jobs.get()
+            if job is None:
+                break
+            key, generation, query, params, on_done, on_error, action = job
+            if not self._is_current(key, generation):
+                self._results.put(None)
+                continue
+            self._running = (key, generation)
+            start = time.perf_counter()
+            try:
+                # Запросы в трассировке относятся к действию, которое их отправило
+                with tracing.action(action, record=False):
+                    outcome = (True, self._execute(query, params, key, generation))
+            except sqlite3.OperationalError as e:
+                # interrupt() мог задеть соседний запрос - повторяем актуальный
+                if 'interrupt' in str(e) and self._is_current(key, generation):
+                    try:
+                        outcome = (True, self._execute(query, params, key, generation))
+                    except Exception as e2:
+                        outcome = (False, e2)
+                else:
+                    outcome = (False, e)
+            except Exception as e:
+                outcome = (False, e)
+            finally:
+                self._running = None
+            if metrics.ENABLED:
+                metrics.observe_query(self.path, key, time.perf_counter() - start, outcome[0])
+            self._results.put((key, generation, on_done, on_error, outcome))
+        self._conn.close()
+
+    def _execute(self, query, params, key, generation):
+        if isinstance(query, _Stream):
+            return self._stream(query, key, generation)
+        if callable(query):
+            return query(self._conn)
+        return self._conn.execute(query, params).fetchall()
+
+    def _stream(self, stream, key, generation):
+        # Каждая пачка - отдельный запрос по ключу (ключ > последнего, LIMIT batch),
+        # прочитанный до конца. Между пачками не остается открытого оператора и
+        # его блокировки SHARED: запись из интерфейса не ждет, пока список дочитается
+        wrapped = f"SELECT * FROM ({stream.sql})"
+        name = self._conn.execute(f"{wrapped} LIMIT 0", stream.params).description[stream.column][0]
+        column = '"' + name.replace('"', '""') + '"'
+        first = f"{wrapped} ORDER BY {column} LIMIT ?"
+        following = f"{wrapped} WHERE {column} > ? ORDER BY {column} LIMIT ?"
+        params = tuple(stream.params)
+        count = 0
+        while True:
+            # Ждать, пока главный поток не вставит одну из прочитанных пачек
+            while not stream.credit.acquire(timeout=0.1):
+                if not self._is_current(key, generation):
+                    return count
+            if not self._is_current(key, generation):
+                return count
+            if count:
+                rows = self._conn.execute(following, params + (rows[-1][stream.column], stream.batch)).fetchall()
+            else:
+                rows = self._conn.execute(first, params + (stream.batch,)).fetchall()
+            count += len(rows)
+            if rows:
+                self._results.put(_Chunk(key, generation, stream, rows))
+            # Неполная пачка - последняя: строки, добавленные во время загрузки,
+            # не догоняются бесконечно
+            if len(rows) < stream.batch:
+                return count
+
+    def _poll(self):
+        self._poll_id = None
+        while True:
+            try:
+                item = self._results.get_nowait()
+            except queue.Empty:
+                break
+            if isinstance(item, _Chunk):
+                item.stream.credit.release()
+                if not self._is_current(item.key, item.generation):
+                    continue
+                if item.stream.on_rows is not None:
+                    item.stream.on_rows(item.rows)
+                # Следующая пачка - после событий и перерисовки
+                self._poll_id = self.widget.after_idle(self._poll)
+                return
+            self._pending -= 1
+            if item is None:
+                continue
+            key, generation, on_done, on_error, (ok, result) = item
+            # Устаревшие результаты (пользователь уже запросил новые) отбрасываются
+            if not self._is_current(key, generation):
+                continue
+            if ok:
+                if on_done is not None:
+                    on_done(result)
+            else:
+                on_error(result)
+        if self._pending > 0:
+            self._poll_id = self.widget.after(self.poll_ms, self._poll)
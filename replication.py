@@ -0,0 +1,220 @@
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import socket
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque, namedtuple
+from urllib.parse import urlsplit
+
+import apps
+import db_session
+from outbox import COLLECTOR_ENV, OUTBOX
+
+# Передача продаж в головной офис через outbox (таблица и триггеры - outbox.py:
+# продажа и запись для офиса фиксируются или откатываются вместе). Фоновый
+# отправитель на asyncio читает outbox пачками по OUTBOX_BATCH, отправляет пачку сжатой (gzip) POST-ом
+# на сборщик (collector.py) и после ответа 200 удаляет отправленные строки.
+# Пока офис недоступен, пачка повторяется с растущей паузой, продажи копятся в
+# outbox на диске, в памяти - не больше одной пачки. Повтор пачки безопасен:
+# сборщик принимает событие (магазин, база, эпоха, id в outbox) один раз.
+# Включается переменной окружения KP_COLLECTOR_URL=http://host:port/batches,
+# имя магазина - KP_SHOP (по умолчанию имя компьютера)
+SHOP_ENV = 'KP_SHOP'
+OUTBOX_BATCH = 500
+IDLE_DELAY = 2.0
+RETRY_DELAY = 1.0
+MAX_RETRY_DELAY = 60.0
+TIMEOUT = 10.0
+METRICS_KEPT = 100
+
+BatchMetrics = namedtuple('BatchMetrics', 'first last rows raw_bytes sent_bytes attempts seconds')
+
+_senders = {}
+
+
+def encode_batch(shop, database, rows):
+    # Пачка строк outbox -> (тело запроса gzip, размер до сжатия)
+    events = [{'id': id_, 'epoch': epoch, 'table': table, 'row_id': row_id, 'created_at': created_at,
+               'data': json.loads(payload)}
+              for id_, table, row_id, payload, created_at, epoch in rows]
+    raw = json.dumps({'shop': shop, 'db': database, 'events': events}, ensure_ascii=False).encode('utf-8')
+    return gzip.compress(raw, compresslevel=6), len(raw)
+
+
+async def post(url, body, timeout=TIMEOUT):
+    # POST body на url (HTTP/1.1, соединение на запрос) -> (код, тело ответа)
+    parts = urlsplit(url)
+    port = parts.port or 80
+    path = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+
+    async def exchange():
+        reader, writer = await asyncio.open_connection(parts.hostname, port)
+        try:
+            writer.write((f"POST {path} HTTP/1.1\r\nHost: {parts.hostname}:{port}\r\n"
+                          f"Content-Type: application/json\r\nContent-Encoding: gzip\r\n"
+                          f"Content-Length: {len(body)}\r\nConnection: close\r\n\r\n").encode('ascii') + body)
+            await writer.drain()
+            response = await reader.read()
+        finally:
+            writer.close()
+        head, _, content = response.partition(b'\r\n\r\n')
+        status = head.split(b'\r\n', 1)[0].split()
+        if len(status) < 2 or not status[1].isdigit():
+            raise ConnectionError("некорректный ответ сборщика")
+        return int(status[1]), content
+
+    return await asyncio.wait_for(exchange(), timeout)
+
+
+class Sender:
+    # Отправитель outbox одной базы. metrics - последние METRICS_KEPT пачек;
+    # stop() останавливает отправку из любого потока
+    def __init__(self, path, url, shop=None, batch=OUTBOX_BATCH, retry_delay=RETRY_DELAY, log=None):
+        self.path = path
+        self.url = url
+        self.shop = shop or os.environ.get(SHOP_ENV) or socket.gethostname()
+        self.database = os.path.basename(path)
+        self.batch = batch
+        self.retry_delay = retry_delay
+        self.log = log or (lambda message: None)
+        self.metrics = deque(maxlen=METRICS_KEPT)
+        self.sent = 0
+        self.batches = 0
+        self.failures = 0
+        self.stopping = threading.Event()
+        self._conn = None
+
+    def stop(self):
+        self.stopping.set()
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def _read(self):
+        if self._conn is None:
+            self._conn = db_session.open_connection(self.path, check_same_thread=False)
+        return self._conn.execute("SELECT id, tbl, row_id, payload, created_at, epoch FROM outbox ORDER BY id LIMIT ?",
+                                  (self.batch,)).fetchall()
+
+    def _acknowledge(self, last):
+        db_session.run_write(self._conn, lambda conn: conn.execute("DELETE FROM outbox WHERE id <= ?", (last,)))
+
+    async def _deliver(self, body):
+        # Отправлять пачку, пока сборщик не примет ее: число попыток, 0 - остановлено
+        attempts = 0
+        delay = self.retry_delay
+        while not self.stopping.is_set():
+            attempts += 1
+            try:
+                status, content = await post(self.url, body)
+                if status == 200:
+                    return attempts
+                error = f"HTTP {status}: {content[:200].decode('utf-8', 'replace')}"
+            except (OSError, asyncio.TimeoutError) as e:
+                error = str(e) or type(e).__name__
+            self.failures += 1
+            self.log(f"{self.database}: сборщик недоступен ({error}), повтор через {delay:.0f} с")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, MAX_RETRY_DELAY)
+        return 0
+
+    async def send_pending(self):
+        # Отправить все, что накопилось в outbox; число отправленных событий
+        sent = 0
+        while not self.stopping.is_set():
+            rows = await asyncio.to_thread(self._read)
+            if not rows:
+                break
+            start = time.perf_counter()
+            body, raw_bytes = await asyncio.to_thread(encode_batch, self.shop, self.database, rows)
+            attempts = await self._deliver(body)
+            if not attempts:
+                break
+            await asyncio.to_thread(self._acknowledge, rows[-1][0])
+            self.metrics.append(BatchMetrics(rows[0][0], rows[-1][0], len(rows), raw_bytes, len(body), attempts,
+                                             time.perf_counter() - start))
+            sent += len(rows)
+            self.sent += len(rows)
+            self.batches += 1
+        return sent
+
+    async def run(self, idle_delay=IDLE_DELAY):
+        # Отправлять, пока не вызван stop()
+        try:
+            while not self.stopping.is_set():
+                try:
+                    await self.send_pending()
+                except sqlite3.Error as e:
+                    # База занята или недоступна: outbox прочитается в следующий раз
+                    self.log(f"{self.database}: {e}")
+                await asyncio.sleep(idle_delay)
+        finally:
+            self.close()
+
+    def summary(self):
+        batches = list(self.metrics)
+        if not batches:
+            return f"{self.database}: отправлено {self.sent}"
+        rows = sum(b.rows for b in batches)
+        seconds = sum(b.seconds for b in batches)
+        ratio = sum(b.raw_bytes for b in batches) / max(sum(b.sent_bytes for b in batches), 1)
+        return (f"{self.database}: отправлено {self.sent} в {self.batches} пачках, последние {len(batches)}: "
+                f"{rows / max(seconds, 1e-9):.0f} событий/с, сжатие x{ratio:.1f}, "
+                f"повторов {sum(b.attempts - 1 for b in batches)}")
+
+
+def start(path, url=None):
+    # Запустить отправителя базы path в фоновом потоке, если задан адрес
+    # сборщика; без адреса ничего не делает. Возвращает Sender или None
+    url = url or os.environ.get(COLLECTOR_ENV)
+    key = os.path.abspath(path)
+    if not url or os.path.basename(path) not in OUTBOX or key in _senders:
+        return _senders.get(key)
+    sender = Sender(path, url, log=print)
+    thread = threading.Thread(target=asyncio.run, args=(sender.run(),), name=f"replication-{sender.database}",
+                              daemon=True)
+    _senders[key] = sender
+    thread.start()
+    return sender
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Отправка продаж из outbox в головной офис")
+    parser.add_argument('apps', nargs='*', help="модули или файлы баз (по умолчанию: " + ', '.join(OUTBOX) + ")")
+    parser.add_argument('--url', default=os.environ.get(COLLECTOR_ENV), help="адрес сборщика")
+    parser.add_argument('--shop', default=None, help="имя магазина")
+    parser.add_argument('--once', action='store_true', help="отправить накопленное и выйти")
+    args = parser.parse_args()
+    if not args.url:
+        print(f"Не задан адрес сборщика: --url или {COLLECTOR_ENV}")
+        return 1
+
+    paths = [apps.get_app(name).db for name in args.apps] or [db for db in OUTBOX if os.path.exists(db)]
+    senders = [Sender(path, args.url, args.shop, log=print) for path in paths if path in OUTBOX]
+
+    async def run_all():
+        if args.once:
+            for sender in senders:
+                await sender.send_pending()
+                sender.close()
+        else:
+            await asyncio.gather(*(sender.run() for sender in senders))
+
+    try:
+        asyncio.run(run_all())
+    except KeyboardInterrupt:
+        pass
+    for sender in senders:
+        print(sender.summary())
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
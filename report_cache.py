@@ -0,0 +1,79 @@
+import threading
+from collections import OrderedDict
+
+MAXSIZE = 32
+
+
+class ReportCache:
+    # Кэш результатов отчетов по (вид отчета, начало, конец) с вытеснением LRU.
+    # Запись актуальна, пока не менялись строки table внутри ее диапазона дат
+    # (счетчики day_changes) и справочники products (счетчики change_counters);
+    # счетчики ведут триггеры миграций. Пока PRAGMA data_version соединения не
+    # изменился, другие соединения ничего не записали и проверка не нужна.
+    # Соединение должно только читать (соединение QueryExecutor) - свои коммиты
+    # data_version не меняют
+    def __init__(self, table, products=(), maxsize=MAXSIZE):
+        self.table = table
+        self.products = tuple(products)
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+        self.evictions = 0
+
+    def _stamp(self, conn, start, end):
+        days = conn.execute("SELECT COALESCE(SUM(version), 0) FROM day_changes WHERE tbl = ? AND day BETWEEN ? AND ?",
+                            (self.table, str(start), str(end))).fetchone()[0]
+        if not self.products:
+            return days, 0
+        marks = ', '.join('?' * len(self.products))
+        products = conn.execute(f"SELECT COALESCE(SUM(version), 0) FROM change_counters WHERE tbl IN ({marks})",
+                                self.products).fetchone()[0]
+        return days, products
+
+    def get(self, conn, kind, start, end, compute):
+        # compute(conn) выполняется только при промахе
+        key = (kind, str(start), str(end))
+        data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+        with self._lock:
+            entry = self._entries.get(key)
+        stamp = None
+        if entry is not None and entry[0] != data_version:
+            stamp = self._stamp(conn, start, end)
+        with self._lock:
+            if entry is not None and (stamp is None or stamp == entry[1]):
+                if stamp is not None:
+                    self._entries[key] = (data_version, stamp, entry[2])
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[2]
+            if entry is not None:
+                self.invalidations += 1
+            self.misses += 1
+        if stamp is None:
+            stamp = self._stamp(conn, start, end)
+        result = compute(conn)
+        with self._lock:
+            self._entries[key] = (data_version, stamp, result)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return result
+
+    def query(self, kind, start, end, compute):
+        # Функция для QueryExecutor.submit
+        return lambda conn: self.get(conn, kind, start, end, compute)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {'size': len(self._entries), 'hits': self.hits, 'misses': self.misses,
+                    'invalidations': self.invalidations, 'evictions': self.evictions,
+                    'hit_rate': self.hits / total if total else 0.0}
@@ -1,39 +1,81 @@
 import tkinter as tk
 from tkinter import ttk
 from tkinter import messagebox
-from tkcalendar import Calendar, DateEntry
-import sqlite3
+from lazy_widgets import Calendar, DateEntry
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+import tracing
+from query_executor import QueryExecutor, show_loading, clear
+from tree_sync import stream_tree
+from virtual_tree import VirtualTreeview
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
 from datetime import datetime
 
+ORDERS_QUERY = "SELECT id, client_name, order_date, deadline_date AS deadline, status FROM orders"
+
+class RestorationService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def save_order(self, client_name, phone, description, order_date, deadline_date):
+        self.save_orders([(client_name, phone, description, order_date, deadline_date)])
+
+    def save_orders(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            '''INSERT INTO orders (client_name, phone, description, order_date, deadline_date)
+               VALUES (?, ?, ?, ?, ?)''', records))
+
+    def update_status(self, order_id, status):
+        run_write(self.conn, lambda conn: conn.execute("UPDATE orders SET status = ? WHERE id = ?",
+                                                       (status, order_id)))
+
+    def save_report(self, order_id, report_text, report_date=None):
+        self.save_reports([(order_id, report_text, report_date)])
+
+    def save_reports(self, records):
+        # records - [(заказ, текст, дата или None - сейчас)]
+        now = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO reports (order_id, report_text, report_date) VALUES (?, ?, ?)",
+            [(order_id, text, date or now) for order_id, text, date in records]))
+
+
 class FurnitureRestorationApp:
     def __init__(self, master):
         self.master = master
         self.master.title("Сервис реставрации мебели")
         self.master.geometry("900x600")
         self.style = ttk.Style()
-        self.style.theme_use('clam')
+        use_theme(self.style, 'clam')
+        scope_styles(master, 'Restoration')
         self.configure_styles()
         
-        self.conn = sqlite3.connect('restoration.db')
+        self.conn = get_connection('restoration.db')
         self.create_tables()
+        self.queries = QueryExecutor(master, 'restoration.db')
         
-        self.notebook = ttk.Notebook(master)
+        self.notebook = LazyNotebook(master)
         self.notebook.pack(pady=10, expand=True, fill='both')
         
-        self.create_order_tab()
-        self.create_orders_list_tab()
-        self.create_calendar_tab()
-        self.create_reports_tab()
-        
-        self.update_orders_list()
-        self.load_calendar_events()
+        self.tabs = {text: ttk.Frame(self.notebook)
+                     for text in ("Новый заказ", "Список заказов", "Календарь сроков", "Отчеты")}
+        self.notebook.add_lazy(self.tabs["Новый заказ"], self.create_order_tab, text="Новый заказ")
+        self.notebook.add_lazy(self.tabs["Список заказов"], self.create_orders_list_tab, self.update_orders_list,
+                               text="Список заказов")
+        self.notebook.add_lazy(self.tabs["Календарь сроков"], self.create_calendar_tab, self.load_calendar_events,
+                               text="Календарь сроков")
+        self.notebook.add_lazy(self.tabs["Отчеты"], self.create_reports_tab,
+                               (self.update_report_orders, self.update_reports_list), text="Отчеты")
+        add_search_tab(self.notebook, self.queries)
     
     def configure_styles(self):
-        self.style.configure('TFrame', background='#f0f0f0')
-        self.style.configure('TLabel', background='#f0f0f0', font=('Arial', 10))
-        self.style.configure('TButton', font=('Arial', 10), padding=5)
-        self.style.configure('Treeview', rowheight=25)
-        self.style.map('Treeview', background=[('selected', '#0078D7')])
+        self.style.configure('Restoration.TFrame', background='#f0f0f0')
+        self.style.configure('Restoration.TLabel', background='#f0f0f0', font=('Arial', 10))
+        self.style.configure('Restoration.TButton', font=('Arial', 10), padding=5)
+        self.style.configure('Restoration.Treeview', rowheight=25)
+        self.style.map('Restoration.Treeview', background=[('selected', '#0078D7')])
     
     def create_tables(self):
         cursor = self.conn.cursor()
@@ -53,10 +95,11 @@ class FurnitureRestorationApp:
                         report_date TEXT NOT NULL,
                         FOREIGN KEY(order_id) REFERENCES orders(id))''')
         self.conn.commit()
+        migrate(self.conn, 'restoration.db')
+        self.service = RestorationService(self.conn)
     
     def create_order_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Новый заказ")
+        tab = self.tabs["Новый заказ"]
         
         fields_frame = ttk.Frame(tab)
         fields_frame.pack(pady=20, padx=20, fill='both')
@@ -80,8 +123,7 @@ class FurnitureRestorationApp:
         ttk.Button(tab, text="Сохранить заказ", command=self.save_order).pack(pady=10)
     
     def create_orders_list_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Список заказов")
+        tab = self.tabs["Список заказов"]
         
         filter_frame = ttk.Frame(tab)
         filter_frame.pack(pady=10, fill='x')
@@ -93,7 +135,7 @@ class FurnitureRestorationApp:
         self.filter_var.trace('w', lambda *args: self.update_orders_list())
         
         columns = ('id', 'client_name', 'order_date', 'deadline', 'status')
-        self.tree = ttk.Treeview(tab, columns=columns, show='headings')
+        self.tree = VirtualTreeview(tab, self.conn, ORDERS_QUERY, columns=columns, sort_map={'deadline': 'deadline'})
         
         for col in columns:
             self.tree.heading(col, text=col.capitalize().replace('_', ' '))
@@ -102,17 +144,12 @@ class FurnitureRestorationApp:
         self.tree.column('id', width=50)
         self.tree.column('client_name', width=200)
         
-        scrollbar = ttk.Scrollbar(tab, orient='vertical', command=self.tree.yview)
-        self.tree.configure(yscrollcommand=scrollbar.set)
-        
         self.tree.pack(side='left', fill='both', expand=True)
-        scrollbar.pack(side='right', fill='y')
         
         self.tree.bind('<Double-1>', self.show_order_details)
     
     def create_calendar_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Календарь сроков")
+        tab = self.tabs["Календарь сроков"]
         
         self.calendar = Calendar(tab, selectmode='day', date_pattern='dd.mm.yyyy')
         self.calendar.pack(pady=10, padx=10, fill='both', expand=True)
@@ -122,10 +159,10 @@ class FurnitureRestorationApp:
         self.calendar_orders_tree.heading('client', text='Клиент')
         self.calendar_orders_tree.heading('deadline', text='Срок выполнения')
         self.calendar_orders_tree.pack(pady=10, padx=10, fill='both', expand=True)
+        self.load_calendar_events()
     
     def create_reports_tab(self):
-        tab = ttk.Frame(self.notebook)
-        self.notebook.add(tab, text="Отчеты")
+        tab = self.tabs["Отчеты"]
         
         report_frame = ttk.Frame(tab)
         report_frame.pack(pady=10, fill='x')
@@ -171,35 +208,25 @@ class FurnitureRestorationApp:
             return
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''INSERT INTO orders 
-                          (client_name, phone, description, order_date, deadline_date)
-                          VALUES (?, ?, ?, ?, ?)''', data)
-            self.conn.commit()
+            self.service.save_order(*data)
             messagebox.showinfo("Успех", "Заказ успешно сохранен!")
-            self.update_orders_list()
-            self.load_calendar_events()
-            self.update_report_orders()
+            self.notebook.mark_stale(self.tabs["Список заказов"], self.tabs["Календарь сроков"], self.tabs["Отчеты"])
         except Exception as e:
             messagebox.showerror("Ошибка", f"Ошибка базы данных: {str(e)}")
     
     def update_orders_list(self):
-        for row in self.tree.get_children():
-            self.tree.delete(row)
-        
         filter_status = self.filter_var.get()
-        query = "SELECT id, client_name, order_date, deadline_date, status FROM orders"
+        query = ORDERS_QUERY
         params = ()
         
         if filter_status != 'все':
             query += " WHERE status = ?"
             params = (filter_status,)
         
-        cursor = self.conn.cursor()
-        cursor.execute(query, params)
-        
-        for row in cursor.fetchall():
-            self.tree.insert('', 'end', values=row)
+        if query == self.tree.query and params == self.tree.params:
+            self.tree.refresh()
+        else:
+            self.tree.set_query(query, params)
     
     def load_calendar_events(self):
         self.calendar.calevent_remove('all')
@@ -225,15 +252,14 @@ class FurnitureRestorationApp:
     def update_calendar_orders(self, event=None):
         selected_date = datetime.strptime(self.calendar.get_date(), '%d.%m.%Y').strftime('%Y-%m-%d')
         
-        for row in self.calendar_orders_tree.get_children():
-            self.calendar_orders_tree.delete(row)
-        
-        cursor = self.conn.cursor()
-        cursor.execute('''SELECT client_name, deadline_date 
+        show_loading(self.calendar_orders_tree)
+        self.queries.submit('calendar_orders', '''SELECT client_name, deadline_date 
                        FROM orders WHERE deadline_date = ?''', 
-                       (selected_date,))
-        
-        for row in cursor.fetchall():
+                       (selected_date,), on_done=self.fill_calendar_orders)
+
+    def fill_calendar_orders(self, rows):
+        clear(self.calendar_orders_tree)
+        for row in rows:
             self.calendar_orders_tree.insert('', 'end', values=(
                 row[0],
                 datetime.strptime(row[1], '%Y-%m-%d').strftime('%d.%m.%Y')
@@ -266,13 +292,10 @@ class FurnitureRestorationApp:
                   command=lambda: self.update_status(order_id, status_var.get(), detail_window)).pack(pady=10)
     
     def update_status(self, order_id, new_status, window):
-        cursor = self.conn.cursor()
-        cursor.execute('''UPDATE orders SET status = ? WHERE id = ?''', 
-                     (new_status, order_id))
-        self.conn.commit()
+        self.service.update_status(order_id, new_status)
         window.destroy()
         self.update_orders_list()
-        self.load_calendar_events()
+        self.notebook.mark_stale(self.tabs["Календарь сроков"])
     
     def update_report_orders(self):
         cursor = self.conn.cursor()
@@ -292,15 +315,9 @@ class FurnitureRestorationApp:
             return
         
         order_id = order.split(' - ')[0]
-        report_date = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
         
         try:
-            cursor = self.conn.cursor()
-            cursor.execute('''INSERT INTO reports 
-                          (order_id, report_text, report_date)
-                          VALUES (?, ?, ?)''', 
-                          (order_id, report_text, report_date))
-            self.conn.commit()
+            self.service.save_report(order_id, report_text)
             messagebox.showinfo("Успех", "Отчет сохранен!")
             self.update_reports_list()
             self.report_text.delete("1.0", tk.END)
@@ -308,18 +325,12 @@ class FurnitureRestorationApp:
             messagebox.showerror("Ошибка", f"Ошибка базы данных: {str(e)}")
     
     def update_reports_list(self):
-        for row in self.reports_tree.get_children():
-            self.reports_tree.delete(row)
-        
-        cursor = self.conn.cursor()
-        cursor.execute('''SELECT order_id, report_date, report_text FROM reports''')
-        for row in cursor.fetchall():
-            self.reports_tree.insert('', 'end', values=row)
-    
-    def __del__(self):
-        self.conn.close()
+        show_loading(self.reports_tree, keep_rows=True)
+        stream_tree(self.queries, 'reports', self.reports_tree,
+                    '''SELECT id, order_id, report_date, report_text FROM reports''', values=lambda row: row[1:])
 
 if __name__ == "__main__":
     root = tk.Tk()
     app = FurnitureRestorationApp(root)
+    tracing.install(root)
     root.mainloop()
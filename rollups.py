@@ -0,0 +1,44 @@
+# Сводка продаж по дням: daily_sales ведут триггеры на таблице продаж, поэтому
+# отчеты читают строки "день x товар" вместо всех продаж.
+# Столбцы сводки: day (date(столбец даты), '' если дата не разбирается), ключи
+# (товар, тип товара...), orders - число продаж, quantity и revenue - суммы
+
+
+def daily_sales_sql(table, day, keys=(), quantity=None, revenue=None):
+    # SQL для миграции: таблица daily_sales, заполнение из уже накопленных продаж
+    # и триггеры. keys - [(столбец сводки, столбец table)]
+    names = ['day'] + [name for name, column in keys]
+
+    def values(row):
+        day_value = f"COALESCE(date({row}{day}), '')"
+        key_values = [f"COALESCE({row}{column}, '')" for name, column in keys]
+        quantity_value = f"COALESCE({row}{quantity}, 0)" if quantity else '1'
+        revenue_value = f"COALESCE({row}{revenue}, 0)" if revenue else '0'
+        return [day_value] + key_values, quantity_value, revenue_value
+
+    def change(row, sign):
+        key_values, quantity_value, revenue_value = values(row + '.')
+        upsert = (f"INSERT INTO daily_sales ({', '.join(names)}, orders, quantity, revenue) "
+                  f"VALUES ({', '.join(key_values)}, {sign}1, {sign}{quantity_value}, {sign}{revenue_value}) "
+                  f"ON CONFLICT ({', '.join(names)}) DO UPDATE SET orders = orders + excluded.orders, "
+                  f"quantity = quantity + excluded.quantity, revenue = revenue + excluded.revenue;")
+        if sign == '+':
+            return upsert
+        match = ' AND '.join(f"{name} = {value}" for name, value in zip(names, key_values))
+        return upsert + f" DELETE FROM daily_sales WHERE {match} AND orders = 0;"
+
+    key_columns = ''.join(f"{name} NOT NULL, " for name in names[1:])
+    key_values, quantity_value, revenue_value = values('')
+    lines = [
+        f"CREATE TABLE IF NOT EXISTS daily_sales (day TEXT NOT NULL, {key_columns}orders INTEGER NOT NULL, "
+        f"quantity NUMERIC NOT NULL, revenue NUMERIC NOT NULL, PRIMARY KEY ({', '.join(names)})) WITHOUT ROWID;",
+        f"INSERT INTO daily_sales ({', '.join(names)}, orders, quantity, revenue) "
+        f"SELECT {', '.join(key_values)}, COUNT(*), SUM({quantity_value}), SUM({revenue_value}) FROM {table} "
+        f"GROUP BY {', '.join(str(i + 1) for i in range(len(names)))};",
+    ]
+    for event, body in (('INSERT', change('NEW', '+')),
+                        ('UPDATE', change('OLD', '-') + ' ' + change('NEW', '+')),
+                        ('DELETE', change('OLD', '-'))):
+        lines.append(f"CREATE TRIGGER IF NOT EXISTS trg_{table}_{event.lower()}_daily_sales AFTER {event} ON {table} "
+                     f"BEGIN {body} END;")
+    return '\n'.join(lines)
@@ -0,0 +1,169 @@
+import os
+import re
+import tkinter as tk
+from collections import namedtuple
+from tkinter import ttk
+
+from tree_sync import sync_tree
+
+# Полнотекстовый поиск по сущностям приложения: одна таблица FTS5 search_index
+# на базу, ее ведут триггеры на таблицах-источниках. rowid записи индекса -
+# id строки * KINDS + номер источника, поэтому триггер удаляет запись по rowid.
+# Запрос разбивается на слова, каждое ищется по префиксу ("ива 912" найдет
+# "Иванов, +7 912 ..."); результаты упорядочены по bm25, совпадение в заголовке
+# весит TITLE_WEIGHT совпадений в остальных столбцах
+KINDS = 16
+SEARCH_LIMIT = 50
+TITLE_WEIGHT = 10.0
+DEBOUNCE_MS = 150
+# Телефоны дополнительно индексируются одними цифрами (столбец phones): "89121234567" найдет "8 (912) 123-45-67"
+PHONE_COLUMNS = ('phone', 'contact')
+
+Source = namedtuple('Source', 'kind table key title body')
+
+CLIENTS = Source("Клиент", 'clients', 'id', ('name',), ('phone',))
+SOURCES = {
+    'bakery.db': [Source("Меню", 'menu', 'id', ('name',), ())],
+    'cleaning.db': [Source("Услуга", 'services', 'id', ('name',), ()),
+                    Source("Сотрудник", 'employees', 'id', ('name',), ('phone',)),
+                    Source("Заказ", 'orders', 'id', ('client',), ('status',))],
+    'computer_club.db': [Source("Компьютер", 'Computers', 'id', ('name',), ('description',)),
+                         Source("Зал", 'Rooms', 'id', ('name',), ())],
+    'fitness_club.db': [CLIENTS, Source("Абонемент", 'subscriptions', 'id', ('name',), ('type',))],
+    'jewelry.db': [Source("Товар", 'products', 'id', ('name',), ('description',)),
+                   Source("Адрес", 'addresses', 'id', ('address',), ())],
+    'service_center.db': [CLIENTS._replace(body=('phone', 'email')),
+                          Source("Оборудование", 'equipment', 'id', ('name',), ('serial_number',)),
+                          Source("Заявка", 'requests', 'id', ('description',), ('status',))],
+    'sports_store.db': [Source("Товар", 'products', 'id', ('name',), ()), CLIENTS._replace(body=('phone', 'email'))],
+    'warehouse.db': [Source("Товар", 'goods', 'id', ('name',), ()),
+                     Source("Поставщик", 'suppliers', 'id', ('name',), ('contact',)),
+                     Source("Зона", 'zones', 'id', ('name',), ())],
+    'YaCoffeeBAZA.db': [Source("Сотрудник", 'employees', 'id', ('name',), ('position',)),
+                        Source("Товар", 'inventory', 'id', ('item_name',), ()),
+                        Source("Точка", 'points', 'id', ('name',), ())],
+    'auto_salon.db': [CLIENTS,
+                      Source("Автомобиль", 'cars', 'id', ('brand', 'model'),
+                             ('year', 'color', 'engine_type', 'trim_level', 'status'))],
+    'shop.db': [Source("Товар", 'products', 'id', ('name',), ()),
+                Source("Покупатель", 'customers', 'id', ('name',), ('phone', 'email')),
+                Source("Поставщик", 'suppliers', 'id', ('name',), ('contact',))],
+    'flowershop.db': [Source("Цветок", 'flowers', 'id', ('name',), ()),
+                      Source("Поставщик", 'suppliers', 'id', ('name',), ('contact',)),
+                      Source("Сотрудник", 'employees', 'id', ('full_name',), ('position',)),
+                      Source("Адрес", 'locations', 'id', ('address',), ())],
+    'hookah.db': [Source("Табак", 'tobaccos', 'id', ('name',), ()),
+                  Source("Кальян", 'hookahs', 'id', ('name',), ('tobacco_taste',)),
+                  Source("Заведение", 'establishments', 'id', ('name',), ('address', 'hookahs'))],
+    'moto_salon.db': [CLIENTS, Source("Мотоцикл", 'motorcycles', 'id', ('model',), ('year', 'status'))],
+    'music_store.db': [Source("Товар", 'products', 'id', ('name',), ()),
+                       Source("Покупатель", 'customers', 'id', ('name',), ('contact',))],
+    'pharmacy_database.db': [Source("Препарат", 'medicines_inventory', 'medicine_id', ('medicine_name',),
+                                    ('medicine_manufacturer',))],
+    'restoration.db': [Source("Заказ", 'orders', 'id', ('client_name',), ('phone', 'description', 'status')),
+                       Source("Отчет", 'reports', 'id', ('report_text',), ())],
+    'vapeshop.db': [Source("Вейп", 'vapes', 'id', ('name',), ()),
+                    Source("Жидкость", 'liquids', 'id', ('name',), ('flavor',))],
+}
+
+
+def _digits(value):
+    for char in ' -()+':
+        value = f"replace({value}, '{char}', '')"
+    return value
+
+
+def search_index_sql(sources):
+    # SQL для миграции: таблица search_index, заполнение из существующих строк
+    # и триггеры на каждом источнике
+    def values(source, row):
+        def text(parts, separator):
+            return f" || '{separator}' || ".join(parts) if parts else "''"
+        title = [f"COALESCE({row}{column}, '')" for column in source.title]
+        body = [f"COALESCE({row}{column}, '')" for column in source.body]
+        phones = [_digits(f"COALESCE({row}{column}, '')") for column in source.body if column in PHONE_COLUMNS]
+        return (f"{row}{source.key} * {KINDS} + {sources.index(source)}, {text(title, ' ')}, {text(body, ', ')}, "
+                f"{text(phones, ' ')}, '{source.table}', {row}{source.key}")
+
+    columns = "rowid, title, body, phones, kind, ref"
+    lines = ["CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5(title, body, phones, kind UNINDEXED, "
+             "ref UNINDEXED, tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3');"]
+    for source in sources:
+        insert = f"INSERT INTO search_index ({columns}) VALUES ({values(source, 'NEW.')});"
+        delete = f"DELETE FROM search_index WHERE rowid = OLD.{source.key} * {KINDS} + {sources.index(source)};"
+        indexed = ', '.join(source.title + source.body)
+        lines.append(f"INSERT INTO search_index ({columns}) SELECT {values(source, '')} FROM {source.table};")
+        for event, of, body in (('INSERT', '', insert),
+                                ('UPDATE', f' OF {indexed}', delete + ' ' + insert),
+                                ('DELETE', '', delete)):
+            lines.append(f"CREATE TRIGGER IF NOT EXISTS trg_{source.table}_{event.lower()}_search "
+                         f"AFTER {event}{of} ON {source.table} BEGIN {body} END;")
+    return '\n'.join(lines)
+
+
+def match_query(text):
+    # Строка пользователя -> выражение MATCH: все слова, каждое по префиксу
+    return ' '.join(f'"{word}"*' for word in re.findall(r'\w+', text.lower()))
+
+
+def search(conn, text, limit=SEARCH_LIMIT):
+    # [(kind, ref, title, body)] по убыванию релевантности
+    query = match_query(text)
+    if not query:
+        return []
+    return conn.execute(f'''SELECT kind, ref, title, body FROM search_index WHERE search_index MATCH ?
+                            ORDER BY bm25(search_index, {TITLE_WEIGHT}, 1.0, 1.0) LIMIT ?''', (query, limit)).fetchall()
+
+
+class SearchPanel(ttk.Frame):
+    # Строка поиска и результаты; запрос уходит в QueryExecutor приложения
+    # через DEBOUNCE_MS после последнего нажатия клавиши
+    def __init__(self, master, queries):
+        super().__init__(master)
+        self.queries = queries
+        self.labels = {source.table: source.kind for source in SOURCES.get(os.path.basename(queries.path), [])}
+        self._after_id = None
+
+        self.text = tk.StringVar()
+        entry = ttk.Entry(self, textvariable=self.text)
+        entry.pack(fill='x', padx=10, pady=(10, 4))
+        entry.focus_set()
+        self.status = ttk.Label(self, foreground='#888888')
+        self.status.pack(fill='x', padx=10)
+
+        self.tree = ttk.Treeview(self, columns=('kind', 'title', 'body'), show='headings')
+        self.tree.heading('kind', text="Раздел")
+        self.tree.heading('title', text="Название")
+        self.tree.heading('body', text="Подробности")
+        self.tree.column('kind', width=110, stretch=False)
+        self.tree.column('title', width=260)
+        self.tree.pack(fill='both', expand=True, padx=10, pady=10)
+
+        self.text.trace_add('write', lambda *args: self._schedule())
+        entry.bind('<Return>', lambda e: self.run())
+
+    def _schedule(self):
+        if self._after_id is not None:
+            self.after_cancel(self._after_id)
+        self._after_id = self.after(DEBOUNCE_MS, self.run)
+
+    def run(self):
+        self._after_id = None
+        text = self.text.get()
+        if not match_query(text):
+            self.queries.cancel('search')
+            self.fill([])
+            return
+        self.queries.submit('search', lambda conn: search(conn, text), on_done=self.fill)
+
+    def fill(self, rows):
+        sync_tree(self.tree, rows, key=lambda row: f"{row[0]}:{row[1]}",
+                  values=lambda row: (self.labels.get(row[0], row[0]), row[2], row[3]))
+        self.status.config(text=f"Найдено: {len(rows)}" + (" (показаны первые)" if len(rows) >= SEARCH_LIMIT else ""))
+
+
+def add_search_tab(notebook, queries):
+    # Вкладка "Поиск" в LazyNotebook приложения
+    frame = ttk.Frame(notebook)
+    notebook.add_lazy(frame, lambda: SearchPanel(frame, queries).pack(fill='both', expand=True), text="Поиск")
+    return frame
@@ -0,0 +1,27 @@
+# Тема ttk приложений. Переключение темы (даже на ту же) заново оформляет все
+# окна процесса, поэтому use_theme меняет ее, только если текущая другая.
+# launcher задает SHARED - одну тему для всех открытых в нем приложений
+SHARED = None
+
+# Стили ttk тоже общие на процесс: настройка TButton одного приложения меняет
+# кнопки всех открытых окон. Поэтому приложение настраивает свои стили с
+# префиксом (Bakery.TButton, Header.Bakery.TLabel - наследует Bakery.TLabel),
+# а scope_styles через базу опций Tk делает их стилями по умолчанию виджетов
+# окна приложения, в том числе диалогов (export, search). Классы - виджеты без
+# ориентации: у Horizontal./Vertical. стилей свои имена
+CLASSES = ('TButton', 'TCheckbutton', 'TCombobox', 'TEntry', 'TFrame', 'TLabel', 'TLabelframe',
+           'TMenubutton', 'TNotebook', 'TRadiobutton', 'TSpinbox', 'Treeview')
+
+
+def use_theme(style, name):
+    name = SHARED or name
+    if style.theme_use() != name:
+        style.theme_use(name)
+
+
+def scope_styles(window, prefix):
+    # Виджеты ttk внутри window, созданные после вызова, по умолчанию получают
+    # стиль prefix.<класс>; без настройки он такой же, как <класс>
+    path = str(window).lstrip('.')
+    for name in CLASSES:
+        window.option_add(f"*{path}*{name}.style" if path else f"*{name}.style", f"{prefix}.{name}")
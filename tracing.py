@@ -0,0 +1,305 @@
+import atexit
+import os
+import sqlite3
+import sys
+import threading
+import time
+import tkinter as tk
+from contextlib import contextmanager
+
+# Режим трассировки включается переменной окружения KP_TRACE=1 или флагом --trace.
+# Записываются SQL-запросы (текст, длительность с выборкой строк, число строк)
+# и действия интерфейса (обработчики Tk), во время которых они выполнялись
+ENV_VAR = 'KP_TRACE'
+FLAG = '--trace'
+LOG_FILE = os.environ.get('KP_TRACE_LOG', 'sql_trace.log')
+TOP_N = 10
+REFRESH_MS = 1000
+# Обработчики, которые не считаются действиями пользователя (таймеры after)
+IGNORED_CALLBACKS = ('Misc.after.',)
+
+_local = threading.local()
+_lock = threading.Lock()
+_statements = {}
+_actions = {}
+_log = None
+ENABLED = False
+
+
+def _normalize(sql):
+    return ' '.join(sql.split())
+
+
+def current_action():
+    stack = getattr(_local, 'actions', None)
+    return stack[0] if stack else None
+
+
+@contextmanager
+def action(name, record=True):
+    # Действие интерфейса; запросы внутри него относятся к самому внешнему действию
+    stack = getattr(_local, 'actions', None)
+    if stack is None:
+        stack = _local.actions = []
+    stack.append(name)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        stack.pop()
+        if record and not stack and name is not None:
+            _record_action(name, (time.perf_counter() - start) * 1000)
+
+
+def _record_action(name, ms):
+    with _lock:
+        stats = _actions.setdefault(name, [0, 0.0, 0.0])
+        stats[0] += 1
+        stats[1] += ms
+        stats[2] = max(stats[2], ms)
+    _write(f"ACTION {ms:9.1f} ms  {name}")
+
+
+def _record_statement(sql, text, ms, rows, action_name):
+    with _lock:
+        stats = _statements.setdefault((sql, action_name), [0, 0.0, 0.0, 0])
+        stats[0] += 1
+        stats[1] += ms
+        stats[2] = max(stats[2], ms)
+        stats[3] += rows
+    _write(f"SQL    {ms:9.1f} ms  {rows:>7} rows  [{action_name or '-'}] {text}")
+
+
+def _write(line):
+    if _log is not None:
+        with _lock:
+            _log.write(f"{time.strftime('%H:%M:%S')} {line}\n")
+
+
+def _trace(sql):
+    # set_trace_callback: фактически выполненный текст с подставленными параметрами
+    _local.traced = sql
+
+
+class _Statement:
+    def __init__(self, sql):
+        self.sql = _normalize(sql)
+        self.action = current_action()
+        self.ms = 0.0
+        self.rows = 0
+        self.text = None
+        _local.traced = None
+
+    def executed(self, start):
+        # Текст берется сразу после выполнения - до вложенных запросов
+        self.ms += (time.perf_counter() - start) * 1000
+        self.text = getattr(_local, 'traced', None)
+
+    def finish(self):
+        _record_statement(self.sql, _normalize(self.text or self.sql), self.ms, self.rows, self.action)
+
+
+class TracedCursor(sqlite3.Cursor):
+    # Время запроса = execute + все выборки строк
+    _statement = None
+
+    def _finish(self):
+        statement, self._statement = self._statement, None
+        if statement is not None:
+            statement.finish()
+
+    def _run(self, method, sql, *args):
+        self._finish()
+        statement = _Statement(sql)
+        start = time.perf_counter()
+        try:
+            method(sql, *args)
+        finally:
+            statement.executed(start)
+            if self.description is None:
+                statement.rows = max(self.rowcount, 0)
+                statement.finish()
+            else:
+                self._statement = statement
+        return self
+
+    def execute(self, sql, parameters=()):
+        return self._run(super().execute, sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self._run(super().executemany, sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self._run(super().executescript, sql_script)
+
+    def _fetch(self, method, *args):
+        start = time.perf_counter()
+        try:
+            return method(*args)
+        finally:
+            if self._statement is not None:
+                self._statement.ms += (time.perf_counter() - start) * 1000
+
+    def fetchone(self):
+        row = self._fetch(super().fetchone)
+        if row is None:
+            self._finish()
+        elif self._statement is not None:
+            self._statement.rows += 1
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._fetch(super().fetchmany, self.arraysize if size is None else size)
+        if self._statement is not None:
+            self._statement.rows += len(rows)
+        if not rows:
+            self._finish()
+        return rows
+
+    def fetchall(self):
+        rows = self._fetch(super().fetchall)
+        if self._statement is not None:
+            self._statement.rows += len(rows)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        try:
+            row = self._fetch(super().__next__)
+        except StopIteration:
+            self._finish()
+            raise
+        if self._statement is not None:
+            self._statement.rows += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+
+class TracedConnection(sqlite3.Connection):
+    # Connection.execute в sqlite3 не вызывает cursor(), поэтому методы переопределены
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.set_trace_callback(_trace)
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def commit(self):
+        statement = _Statement('COMMIT')
+        start = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            statement.executed(start)
+            statement.finish()
+
+
+def connection_factory():
+    return TracedConnection if ENABLED else sqlite3.Connection
+
+
+def _callback_name(func):
+    # Имя действия: метод приложения; для lambda - последний вызываемый в ней метод
+    name = getattr(func, '__qualname__', None) or repr(func)
+    if getattr(func, '__name__', '') == '<lambda>' and func.__code__.co_names:
+        owner = name.split('.')[0]
+        name = f"{owner}.{func.__code__.co_names[-1]}"
+    return name
+
+
+_tk_call = tk.CallWrapper.__call__
+
+
+def _traced_call(self, *args):
+    name = _callback_name(self.func)
+    if name.startswith(IGNORED_CALLBACKS):
+        return _tk_call(self, *args)
+    with action(name):
+        return _tk_call(self, *args)
+
+
+def top_statements(count=TOP_N):
+    with _lock:
+        items = [(stats[2], stats[1] / stats[0], stats[0], stats[3], action_name, sql)
+                 for (sql, action_name), stats in _statements.items()]
+    return sorted(items, key=lambda item: item[0], reverse=True)[:count]
+
+
+def top_actions(count=TOP_N):
+    with _lock:
+        items = [(stats[2], stats[1] / stats[0], stats[0], name) for name, stats in _actions.items()]
+    return sorted(items, key=lambda item: item[0], reverse=True)[:count]
+
+
+def summary(count=TOP_N):
+    lines = ["Самые медленные действия (макс / сред, мс):"]
+    for max_ms, avg_ms, calls, name in top_actions(count):
+        lines.append(f"{max_ms:9.1f} {avg_ms:9.1f}  x{calls:<5} {name}")
+    lines.append("Самые медленные запросы (макс / сред, мс, строк всего):")
+    for max_ms, avg_ms, calls, rows, action_name, sql in top_statements(count):
+        lines.append(f"{max_ms:9.1f} {avg_ms:9.1f}  x{calls:<5} {rows:>8}  [{action_name or '-'}] {sql[:150]}")
+    return '\n'.join(lines)
+
+
+class Overlay(tk.Toplevel):
+    # Небольшое окно поверх приложения с top-N медленных действий и запросов
+    def __init__(self, master):
+        super().__init__(master)
+        self.title("Трассировка SQL")
+        self.attributes('-topmost', True)
+        self.geometry("760x320")
+        self.text = tk.Text(self, font=('Consolas', 9), wrap='none')
+        self.text.pack(fill='both', expand=True)
+        self.protocol("WM_DELETE_WINDOW", self.withdraw)
+        self.refresh()
+
+    def refresh(self):
+        self.text.delete('1.0', tk.END)
+        self.text.insert(tk.END, summary())
+        self.after(REFRESH_MS, self.refresh)
+
+
+def enable(log_file=LOG_FILE):
+    global ENABLED, _log
+    if ENABLED:
+        return
+    ENABLED = True
+    tk.CallWrapper.__call__ = _traced_call
+    if log_file:
+        _log = open(log_file, 'a', encoding='utf-8', buffering=1)
+        _write(f"START {' '.join(sys.argv)}")
+        atexit.register(_close_log)
+
+
+def _close_log():
+    global _log
+    if _log is not None:
+        _write("SUMMARY\n" + summary())
+        _log.close()
+        _log = None
+
+
+def install(root):
+    # Вызывается приложением после создания окна; без трассировки ничего не делает
+    if ENABLED:
+        return Overlay(root)
+    return None
+
+
+if os.environ.get(ENV_VAR, '') not in ('', '0') or FLAG in sys.argv:
+    enable()
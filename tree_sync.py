@@ -0,0 +1,96 @@
+import weakref
+
+# Последние значения строк для каждого дерева: iid -> values
+_values = weakref.WeakKeyDictionary()
+
+
+def sync_tree(tree, rows, key=0, values=None):
+    # Обновить Treeview по первичному ключу вместо удаления и вставки всех строк:
+    # добавляются новые, изменяются отличающиеся, удаляются пропавшие строки,
+    # порядок выравнивается одним set_children. Выделение и прокрутка сохраняются.
+    # key - индекс ключа в строке или функция(row); values - функция(row),
+    # возвращающая отображаемые значения (по умолчанию вся строка)
+    cached = _values.get(tree, {})
+    fresh = {}
+    order = []
+    for row in rows:
+        iid = str(key(row) if callable(key) else row[key])
+        fresh[iid] = tuple(values(row)) if values is not None else tuple(row)
+        order.append(iid)
+
+    old = tree.get_children()
+    stale = [iid for iid in old if iid not in fresh]
+    if stale:
+        tree.delete(*stale)
+    present = set(old).difference(stale)
+
+    for iid in order:
+        row_values = fresh[iid]
+        if iid not in present:
+            tree.insert('', 'end', iid=iid, values=row_values)
+        elif cached.get(iid) != row_values:
+            tree.item(iid, values=row_values)
+
+    if tree.get_children() != tuple(order):
+        tree.set_children('', *order)
+    _values[tree] = fresh
+
+
+class TreeFill:
+    # sync_tree по частям (для QueryExecutor.stream): add(rows) для каждой пачки,
+    # finish() после последней. Строки, которые уже есть в дереве, остаются на
+    # экране, пока список загружается; в памяти - пачка и ключи строк
+    def __init__(self, tree, key=0, values=None):
+        self.tree = tree
+        self.key = key
+        self.values = values
+        self.cached = _values.setdefault(tree, {})
+        self.order = []
+        self.seen = set()
+        self._first = True
+
+    def add(self, rows):
+        tree = self.tree
+        if self._first:
+            # Строка "Загрузка..." (show_loading) не нужна после первой пачки
+            self._first = False
+            loading = tree.tag_has('loading')
+            if loading:
+                tree.delete(*loading)
+        for row in rows:
+            iid = str(self.key(row) if callable(self.key) else row[self.key])
+            if iid in self.seen:
+                continue
+            row_values = tuple(self.values(row)) if self.values is not None else tuple(row)
+            self.seen.add(iid)
+            self.order.append(iid)
+            if not tree.exists(iid):
+                tree.insert('', 'end', iid=iid, values=row_values)
+            elif self.cached.get(iid) != row_values:
+                tree.item(iid, values=row_values)
+            self.cached[iid] = row_values
+
+    def finish(self):
+        tree = self.tree
+        self.add([])
+        stale = [iid for iid in tree.get_children() if iid not in self.seen]
+        if stale:
+            tree.delete(*stale)
+        for iid in set(self.cached).difference(self.seen):
+            del self.cached[iid]
+        if tree.get_children() != tuple(self.order):
+            tree.set_children('', *self.order)
+
+
+def stream_tree(queries, name, tree, query, params=(), key=0, values=None, on_done=None):
+    # Загрузить результат query в tree пачками через queries.stream(name, ...);
+    # key - номер столбца с уникальным ключом строки, по нему же читаются пачки.
+    # on_done(число строк) - после последней пачки
+    fill = TreeFill(tree, key, values)
+
+    def done(count):
+        fill.finish()
+        if on_done is not None:
+            on_done(count)
+
+    queries.stream(name, query, params, column=key, on_rows=fill.add, on_done=done)
@@ -1,6 +1,82 @@
 import tkinter as tk
 from tkinter import ttk, messagebox
-import sqlite3
+from db_session import get_connection, run_write
+from migrations import migrate
+from search import add_search_tab
+from export import ask_export
+import tracing
+import outbox
+from query_executor import QueryExecutor, show_loading
+from tree_sync import sync_tree
+from lazy_tabs import LazyNotebook
+from themes import use_theme, scope_styles
+
+# Продажи по дням и товарам для выгрузки
+REPORT_EXPORT_QUERY = '''SELECT d.day AS day, d.product_type AS product_type, COALESCE(v.name, l.name) AS product,
+                                d.orders AS orders, d.quantity AS quantity, d.revenue AS revenue
+                         FROM daily_sales d
+                         LEFT JOIN vapes v ON d.product_type = 'vape' AND d.product_id = v.id
+                         LEFT JOIN liquids l ON d.product_type = 'liquid' AND d.product_id = l.id
+                         ORDER BY d.day, d.product_type, product'''
+
+
+def checkout_cart(conn, cart):
+    # Списать товары корзины и записать заказы (вызывается внутри run_write)
+    for item in cart:
+        if item['type'] == 'vape':
+            conn.execute("UPDATE vapes SET quantity = quantity - 1 WHERE name = ?", (item['name'],))
+            conn.execute("INSERT INTO orders (product_id, product_type, quantity, total) VALUES ((SELECT id FROM vapes WHERE name = ?), 'vape', 1, ?)", 
+                         (item['name'], item['price']))
+        else:
+            conn.execute("UPDATE liquids SET quantity = quantity - 1 WHERE name = ?", (item['name'],))
+            conn.execute("INSERT INTO orders (product_id, product_type, quantity, total) VALUES ((SELECT id FROM liquids WHERE name = ?), 'liquid', 1, ?)", 
+                         (item['name'], item['price']))
+
+
+class VapeShopService:
+    def __init__(self, conn):
+        self.conn = conn
+
+    def add_vape(self, name, price, quantity):
+        self.add_vapes([(name, price, quantity)])
+
+    def add_vapes(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO vapes (name, price, quantity) VALUES (?, ?, ?)", records))
+
+    def update_vape(self, vape_id, name, price, quantity):
+        run_write(self.conn, lambda conn: conn.execute(
+            "UPDATE vapes SET name=?, price=?, quantity=? WHERE id=?", (name, price, quantity, vape_id)))
+
+    def delete_vape(self, vape_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM vapes WHERE id=?", (vape_id,)))
+
+    def add_liquid(self, name, price, flavor, volume, nicotine, quantity):
+        self.add_liquids([(name, price, flavor, volume, nicotine, quantity)])
+
+    def add_liquids(self, records):
+        run_write(self.conn, lambda conn: conn.executemany(
+            "INSERT INTO liquids (name, price, flavor, volume, nicotine, quantity) VALUES (?, ?, ?, ?, ?, ?)",
+            records))
+
+    def update_liquid(self, liquid_id, name, price, flavor, volume, nicotine, quantity):
+        run_write(self.conn, lambda conn: conn.execute(
+            "UPDATE liquids SET name=?, price=?, flavor=?, volume=?, nicotine=?, quantity=? WHERE id=?",
+            (name, price, flavor, volume, nicotine, quantity, liquid_id)))
+
+    def delete_liquid(self, liquid_id):
+        run_write(self.conn, lambda conn: conn.execute("DELETE FROM liquids WHERE id=?", (liquid_id,)))
+
+    def checkout(self, cart):
+        self.checkout_many([cart])
+
+    def checkout_many(self, carts):
+        # carts - список корзин [{'name', 'price', 'type'}], все одной транзакцией
+        def write(conn):
+            for cart in carts:
+                checkout_cart(conn, cart)
+        run_write(self.conn, write)
+
 
 class VapeShopApp:
     def __init__(self, root):
@@ -10,30 +86,38 @@ class VapeShopApp:
         self.root.configure(bg="#e6f0ff")
 
         style = ttk.Style()
-        style.theme_use("clam")
-        style.configure("TNotebook", background="#e6f0ff")
-        style.configure("TNotebook.Tab", background="#b3d1ff", foreground="#003366", font=("Arial", 12, "bold"))
-        style.map("TNotebook.Tab", background=[("selected", "#6699cc")])
-        style.configure("Treeview", background="#ffffff", foreground="#000000", rowheight=25, fieldbackground="#e6f0ff")
-        style.configure("Treeview.Heading", font=("Arial", 11, "bold"), background="#cce0ff", foreground="#003366")
-        style.configure("TButton", font=("Arial", 11), padding=6, background="#b3d1ff", foreground="#003366")
-        style.map("TButton", background=[("active", "#99c2ff")])
-        style.configure("TLabel", background="#e6f0ff", font=("Arial", 11))
+        use_theme(style, "clam")
+        scope_styles(root, 'VapeShop')
+        style.configure("VapeShop.TNotebook", background="#e6f0ff")
+        style.configure("VapeShop.TNotebook.Tab", background="#b3d1ff", foreground="#003366", font=("Arial", 12, "bold"))
+        style.map("VapeShop.TNotebook.Tab", background=[("selected", "#6699cc")])
+        style.configure("VapeShop.Treeview", background="#ffffff", foreground="#000000", rowheight=25, fieldbackground="#e6f0ff")
+        style.configure("VapeShop.Treeview.Heading", font=("Arial", 11, "bold"), background="#cce0ff", foreground="#003366")
+        style.configure("VapeShop.TButton", font=("Arial", 11), padding=6, background="#b3d1ff", foreground="#003366")
+        style.map("VapeShop.TButton", background=[("active", "#99c2ff")])
+        style.configure("VapeShop.TLabel", background="#e6f0ff", font=("Arial", 11))
 
         self.create_db()
+        self.queries = QueryExecutor(root, 'vapeshop.db')
+        outbox.start('vapeshop.db')
 
-        self.notebook = ttk.Notebook(root)
+        self.notebook = LazyNotebook(root)
         self.notebook.pack(fill='both', expand=True)
 
-        self.create_order_tab()
-        self.create_vapes_tab()
-        self.create_liquids_tab()
-        self.create_report_tab()
+        self.order_frame = ttk.Frame(self.notebook)
+        self.vapes_tab = ttk.Frame(self.notebook)
+        self.liquids_tab = ttk.Frame(self.notebook)
+        self.report_tab = ttk.Frame(self.notebook)
+        self.notebook.add_lazy(self.order_frame, self.create_order_tab, self.update_order_trees, text='Заказ')
+        self.notebook.add_lazy(self.vapes_tab, self.create_vapes_tab, self.update_vapes_list, text='Вейпы')
+        self.notebook.add_lazy(self.liquids_tab, self.create_liquids_tab, self.update_liquids_list, text='Жидкости')
+        self.notebook.add_lazy(self.report_tab, self.create_report_tab, text='Отчет')
+        add_search_tab(self.notebook, self.queries)
 
         self.cart = []
         
     def create_db(self):
-        self.conn = sqlite3.connect('vapeshop.db')
+        self.conn = get_connection('vapeshop.db')
         self.c = self.conn.cursor()
         
         self.c.execute('''CREATE TABLE IF NOT EXISTS vapes
@@ -59,11 +143,10 @@ class VapeShopApp:
                      total REAL,
                      date TIMESTAMP DEFAULT CURRENT_TIMESTAMP)''')
         self.conn.commit()
+        migrate(self.conn, 'vapeshop.db')
+        self.service = VapeShopService(self.conn)
         
     def create_order_tab(self):
-        self.order_frame = ttk.Frame(self.notebook)
-        self.notebook.add(self.order_frame, text='Заказ')
-
         self.vapes_tree = ttk.Treeview(self.order_frame, columns=('name', 'price', 'quantity'), show='headings')
         for col in ('name', 'price', 'quantity'):
             self.vapes_tree.heading(col, text=col.capitalize())
@@ -97,9 +180,6 @@ class VapeShopApp:
         self.update_order_trees()
         
     def create_vapes_tab(self):
-        self.vapes_tab = ttk.Frame(self.notebook)
-        self.notebook.add(self.vapes_tab, text='Вейпы')
-
         fields = [('Название:', 0), ('Цена:', 1), ('Количество:', 2)]
         self.vape_entries = {}
         for label, row in fields:
@@ -129,9 +209,6 @@ class VapeShopApp:
         self.update_vapes_list()
 
     def create_liquids_tab(self):
-        self.liquids_tab = ttk.Frame(self.notebook)
-        self.notebook.add(self.liquids_tab, text='Жидкости')
-
         labels = ['Название:', 'Цена:', 'Вкус:', 'Объем:', 'Никотин:', 'Количество:']
         self.liquid_entries = {}
         for i, label in enumerate(labels):
@@ -161,27 +238,23 @@ class VapeShopApp:
         self.update_liquids_list()
 
     def create_report_tab(self):
-        self.report_tab = ttk.Frame(self.notebook)
-        self.notebook.add(self.report_tab, text='Отчет')
-
         self.report_text = tk.Text(self.report_tab, bg="#f0f8ff", fg="#000066", font=("Courier", 12))
         self.report_text.pack(fill='both', expand=True, padx=10, pady=10)
 
         self.generate_report_btn = ttk.Button(self.report_tab, text='Сгенерировать отчет', command=self.generate_report)
         self.generate_report_btn.pack(pady=10)
+        ttk.Button(self.report_tab, text='Экспорт в CSV/NDJSON', command=self.export_report).pack(pady=(0, 10))
         
     def update_order_trees(self):
-        for row in self.vapes_tree.get_children():
-            self.vapes_tree.delete(row)
-        self.c.execute("SELECT name, price, quantity FROM vapes")
-        for row in self.c.fetchall():
-            self.vapes_tree.insert('', 'end', values=row)
-            
-        for row in self.liquids_tree.get_children():
-            self.liquids_tree.delete(row)
-        self.c.execute("SELECT name, price, flavor, quantity FROM liquids")
-        for row in self.c.fetchall():
-            self.liquids_tree.insert('', 'end', values=row)
+        show_loading(self.vapes_tree, keep_rows=True)
+        self.queries.submit('order_vapes', "SELECT id, name, price, quantity FROM vapes",
+                            on_done=lambda rows: self.fill_order_tree(self.vapes_tree, rows))
+        show_loading(self.liquids_tree, keep_rows=True)
+        self.queries.submit('order_liquids', "SELECT id, name, price, flavor, quantity FROM liquids",
+                            on_done=lambda rows: self.fill_order_tree(self.liquids_tree, rows))
+
+    def fill_order_tree(self, tree, rows):
+        sync_tree(tree, rows, values=lambda row: row[1:])
             
     def add_to_cart(self, product_type):
         tree = self.vapes_tree if product_type == 'vape' else self.liquids_tree
@@ -202,32 +275,22 @@ class VapeShopApp:
             return
         
         try:
-            for item in self.cart:
-                if item['type'] == 'vape':
-                    self.c.execute("UPDATE vapes SET quantity = quantity - 1 WHERE name = ?", (item['name'],))
-                    self.c.execute("INSERT INTO orders (product_id, product_type, quantity, total) VALUES ((SELECT id FROM vapes WHERE name = ?), 'vape', 1, ?)", 
-                                 (item['name'], item['price']))
-                else:
-                    self.c.execute("UPDATE liquids SET quantity = quantity - 1 WHERE name = ?", (item['name'],))
-                    self.c.execute("INSERT INTO orders (product_id, product_type, quantity, total) VALUES ((SELECT id FROM liquids WHERE name = ?), 'liquid', 1, ?)", 
-                                 (item['name'], item['price']))
-            self.conn.commit()
+            self.service.checkout(self.cart)
             self.cart = []
             self.cart_combo.set('')
             self.total_label.config(text='Итого: 0 руб')
             self.update_order_trees()
-            self.update_vapes_list()
-            self.update_liquids_list()
+            self.notebook.mark_stale(self.vapes_tab, self.liquids_tab)
             messagebox.showinfo('Успех', 'Заказ оформлен')
         except Exception as e:
             messagebox.showerror('Ошибка', str(e))
             
     def update_vapes_list(self):
-        for row in self.vapes_list_tree.get_children():
-            self.vapes_list_tree.delete(row)
-        self.c.execute("SELECT * FROM vapes")
-        for row in self.c.fetchall():
-            self.vapes_list_tree.insert('', 'end', values=row)
+        show_loading(self.vapes_list_tree, keep_rows=True)
+        self.queries.submit('vapes', "SELECT * FROM vapes", on_done=self.fill_vapes_list)
+
+    def fill_vapes_list(self, rows):
+        sync_tree(self.vapes_list_tree, rows)
             
     def select_vape(self, event):
         selected = self.vapes_list_tree.selection()
@@ -246,11 +309,9 @@ class VapeShopApp:
         quantity = self.vape_entries['Количество:'].get()
         if not all([name, price, quantity]):
             return
-        self.c.execute("INSERT INTO vapes (name, price, quantity) VALUES (?, ?, ?)", 
-                     (name, float(price), int(quantity)))
-        self.conn.commit()
+        self.service.add_vape(name, float(price), int(quantity))
         self.update_vapes_list()
-        self.update_order_trees()
+        self.notebook.mark_stale(self.order_frame)
         
     def update_vape(self):
         selected = self.vapes_list_tree.selection()
@@ -262,28 +323,25 @@ class VapeShopApp:
         quantity = self.vape_entries['Количество:'].get()
         if not all([name, price, quantity]):
             return
-        self.c.execute("UPDATE vapes SET name=?, price=?, quantity=? WHERE id=?", 
-                     (name, float(price), int(quantity), item[0]))
-        self.conn.commit()
+        self.service.update_vape(item[0], name, float(price), int(quantity))
         self.update_vapes_list()
-        self.update_order_trees()
+        self.notebook.mark_stale(self.order_frame)
         
     def delete_vape(self):
         selected = self.vapes_list_tree.selection()
         if not selected:
             return
         item = self.vapes_list_tree.item(selected[0])['values']
-        self.c.execute("DELETE FROM vapes WHERE id=?", (item[0],))
-        self.conn.commit()
+        self.service.delete_vape(item[0])
         self.update_vapes_list()
-        self.update_order_trees()
+        self.notebook.mark_stale(self.order_frame)
         
     def update_liquids_list(self):
-        for row in self.liquids_list_tree.get_children():
-            self.liquids_list_tree.delete(row)
-        self.c.execute("SELECT * FROM liquids")
-        for row in self.c.fetchall():
-            self.liquids_list_tree.insert('', 'end', values=row)
+        show_loading(self.liquids_list_tree, keep_rows=True)
+        self.queries.submit('liquids', "SELECT * FROM liquids", on_done=self.fill_liquids_list)
+
+    def fill_liquids_list(self, rows):
+        sync_tree(self.liquids_list_tree, rows)
             
     def select_liquid(self, event):
         selected = self.liquids_list_tree.selection()
@@ -311,11 +369,9 @@ class VapeShopApp:
         quantity = self.liquid_entries['Количество:'].get()
         if not all([name, price, flavor, volume, nicotine, quantity]):
             return
-        self.c.execute("INSERT INTO liquids (name, price, flavor, volume, nicotine, quantity) VALUES (?, ?, ?, ?, ?, ?)", 
-                     (name, float(price), flavor, int(volume), int(nicotine), int(quantity)))
-        self.conn.commit()
+        self.service.add_liquid(name, float(price), flavor, int(volume), int(nicotine), int(quantity))
         self.update_liquids_list()
-        self.update_order_trees()
+        self.notebook.mark_stale(self.order_frame)
         
     def update_liquid(self):
         selected = self.liquids_list_tree.selection()
@@ -330,44 +386,50 @@ class VapeShopApp:
         quantity = self.liquid_quantity.get()
         if not all([name, price, flavor, volume, nicotine, quantity]):
             return
-        self.c.execute("UPDATE liquids SET name=?, price=?, flavor=?, volume=?, nicotine=?, quantity=? WHERE id=?", 
-                     (name, float(price), flavor, int(volume), int(nicotine), int(quantity), item[0]))
-        self.conn.commit()
+        self.service.update_liquid(item[0], name, float(price), flavor, int(volume), int(nicotine), int(quantity))
         self.update_liquids_list()
-        self.update_order_trees()
+        self.notebook.mark_stale(self.order_frame)
         
     def delete_liquid(self):
         selected = self.liquids_list_tree.selection()
         if not selected:
             return
         item = self.liquids_list_tree.item(selected[0])['values']
-        self.c.execute("DELETE FROM liquids WHERE id=?", (item[0],))
-        self.conn.commit()
+        self.service.delete_liquid(item[0])
         self.update_liquids_list()
-        self.update_order_trees()
+        self.notebook.mark_stale(self.order_frame)
         
+    def export_report(self):
+        ask_export(self.root, 'vapeshop.db', REPORT_EXPORT_QUERY, title="Экспорт отчета")
+
     def generate_report(self):
-        self.c.execute("SELECT product_type, COUNT(*), SUM(total) FROM orders GROUP BY product_type")
-        sales = self.c.fetchall()
-        
-        self.c.execute("""SELECT v.name, COUNT(*) as cnt 
-                        FROM orders o 
-                        JOIN vapes v ON o.product_id = v.id 
-                        WHERE o.product_type = 'vape' 
-                        GROUP BY v.name 
-                        ORDER BY cnt DESC 
-                        LIMIT 1""")
-        top_vape = self.c.fetchone()
-        
-        self.c.execute("""SELECT l.name, COUNT(*) as cnt 
-                        FROM orders o 
-                        JOIN liquids l ON o.product_id = l.id 
-                        WHERE o.product_type = 'liquid' 
-                        GROUP BY l.name 
-                        ORDER BY cnt DESC 
-                        LIMIT 1""")
-        top_liquid = self.c.fetchone()
-        
+        def query(conn):
+            c = conn.cursor()
+            c.execute("SELECT product_type, SUM(orders), SUM(revenue) FROM daily_sales GROUP BY product_type")
+            sales = c.fetchall()
+            
+            c.execute("""SELECT v.name, SUM(d.orders) as cnt 
+                         FROM daily_sales d 
+                         JOIN vapes v ON d.product_id = v.id 
+                         WHERE d.product_type = 'vape' 
+                         GROUP BY v.name 
+                         ORDER BY cnt DESC 
+                         LIMIT 1""")
+            top_vape = c.fetchone()
+            
+            c.execute("""SELECT l.name, SUM(d.orders) as cnt 
+                         FROM daily_sales d 
+                         JOIN liquids l ON d.product_id = l.id 
+                         WHERE d.product_type = 'liquid' 
+                         GROUP BY l.name 
+                         ORDER BY cnt DESC 
+                         LIMIT 1""")
+            return sales, top_vape, c.fetchone()
+
+        show_loading(self.report_text)
+        self.queries.submit('report', query, on_done=lambda result: self.show_report(*result))
+
+    def show_report(self, sales, top_vape, top_liquid):
         report = "Отчет о продажах:\n\n"
         for line in sales:
             report += f"{line[0]}: {line[1]} шт. на сумму {line[2]} руб\n"
@@ -384,4 +446,5 @@ class VapeShopApp:
 if __name__ == "__main__":
     root = tk.Tk()
     app = VapeShopApp(root)
+    tracing.install(root)
     root.mainloop()
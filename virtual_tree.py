@@ -0,0 +1,395 @@
+import tkinter as tk
+from tkinter import ttk, messagebox
+
+from db_session import database_path
+from export import ask_export
+from query_executor import QueryExecutor
+
+# Переход ползунком (moveto) идет от опорных строк - каждой MARK_STEP-й строки
+# в порядке сортировки. Их собирают в фоне пачками по MARK_CHUNK строк: между
+# пачками запись из интерфейса не ждет чтения
+MARK_STEP = 200
+MARK_CHUNK = 100 * MARK_STEP
+
+
+def _seek(conn, view, boundary, forward, limit, select='*'):
+    # Строки после boundary = (значение сортировки, ключ) в порядке отображения
+    # (forward) или перед ним. Пара (sort, key) > (?, ?) - поиск по индексу
+    # столбца сортировки; строки с NULL в нем читаются отдельным запросом
+    query, params, sort, key, descending = view
+    ascending = forward != descending
+    op = '>' if ascending else '<'
+    direction = 'ASC' if ascending else 'DESC'
+    sort_sql, key_sql = f'v."{sort}"', f'v."{key}"'
+
+    parts = [('', [])]
+    if sort == key:
+        order = f"{key_sql} {direction}"
+        if boundary is not None:
+            parts = [(f"{key_sql} {op} ?", [boundary[1]])]
+    else:
+        order = f"{sort_sql} {direction}, {key_sql} {direction}"
+        if boundary is not None and boundary[0] is None:
+            # NULL в SQLite меньше любого значения
+            parts = [(f"{sort_sql} IS NULL AND {key_sql} {op} ?", [boundary[1]])]
+            if ascending:
+                parts.append((f"{sort_sql} IS NOT NULL", []))
+        elif boundary is not None:
+            parts = [(f"({sort_sql}, {key_sql}) {op} (?, ?)", list(boundary))]
+            if not ascending:
+                parts.append((f"{sort_sql} IS NULL", []))
+
+    rows = []
+    for where, args in parts:
+        sql = f"SELECT {select} FROM ({query}) AS v {'WHERE ' + where if where else ''} ORDER BY {order} LIMIT ?"
+        rows += conn.execute(sql, [*params, *args, limit - len(rows)]).fetchall()
+        if len(rows) >= limit:
+            break
+    return rows if forward else rows[::-1]
+
+
+def _landmarks(conn, view):
+    # (значение сортировки, ключ) строк с номерами MARK_STEP - 1, 2 * MARK_STEP - 1, ...
+    select = f'v."{view[2]}", v."{view[3]}"'
+    marks, boundary = [], None
+    while True:
+        rows = _seek(conn, view, boundary, True, MARK_CHUNK, select)
+        marks += rows[MARK_STEP - 1::MARK_STEP]
+        if len(rows) < MARK_CHUNK:
+            return marks
+        boundary = rows[-1]
+
+
+class VirtualTreeview(ttk.Frame):
+    # Treeview, в котором материализовано только видимое окно строк.
+    # Страницы подгружаются из SQLite по ключу (keyset) при прокрутке,
+    # сортировка по заголовку колонки выполняется через ORDER BY.
+    # Счетчик строк и страницы читаются в фоновом потоке (QueryExecutor).
+    #
+    # query - SELECT, у которого имена колонок результата совпадают с columns;
+    # после видимых колонок можно выбрать скрытые (например, сырую дату
+    # для сортировки, см. sort_map). Сортировать можно по key и по колонкам
+    # sort_map: колонка -> столбец результата, у которого есть индекс
+    def __init__(self, master, conn, query, columns, params=(), key='id',
+                 sort_map=None, format_row=None, height=15, **kwargs):
+        super().__init__(master)
+        self.conn = conn
+        self.queries = QueryExecutor(self, database_path(conn))
+        self.columns = tuple(columns)
+        self.key = key
+        self.sort_map = sort_map or {}
+        self.format_row = format_row
+        self.page_size = height
+        self.sort_column = key
+        self.descending = False
+        self.rows = []
+        self.offset = 0
+        self.total = 0
+        self._selected = set()
+        self._names = None
+        self._loading = None
+        self._delta = 0
+        self._marks = None
+        self._marks_pending = False
+        self._target = None
+
+        self.tree = ttk.Treeview(self, columns=self.columns, show='headings',
+                                 height=height, **kwargs)
+        self.scrollbar = ttk.Scrollbar(self, orient='vertical', command=self._on_scrollbar)
+        self.tree.grid(row=0, column=0, sticky='nsew')
+        self.scrollbar.grid(row=0, column=1, sticky='ns')
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+
+        for column in self.columns:
+            if self.sortable(column):
+                self.tree.heading(column, command=lambda c=column: self.sort_by(c))
+
+        self.tree.bind('<MouseWheel>', self._on_wheel)
+        self.tree.bind('<Button-4>', lambda e: self._scroll_event(-3))
+        self.tree.bind('<Button-5>', lambda e: self._scroll_event(3))
+        self.tree.bind('<Down>', self._on_down)
+        self.tree.bind('<Up>', self._on_up)
+        self.tree.bind('<Next>', lambda e: self._scroll_event(self.page_size))
+        self.tree.bind('<Prior>', lambda e: self._scroll_event(-self.page_size))
+        self.tree.bind('<Configure>', self._on_configure)
+        self.tree.bind('<Button-3>', self._on_menu)
+        super().bind('<Destroy>', self._on_destroy, '+')
+
+        self.set_query(query, params)
+
+    # Методы Treeview, которые используют приложения
+    def heading(self, column, option=None, **kw):
+        if self.sortable(column) and option is None and 'command' not in kw:
+            kw['command'] = lambda c=column: self.sort_by(c)
+        return self.tree.heading(column, option, **kw)
+
+    def column(self, column, option=None, **kw):
+        return self.tree.column(column, option, **kw)
+
+    def selection(self):
+        return self.tree.selection()
+
+    def item(self, item, option=None, **kw):
+        return self.tree.item(item, option, **kw)
+
+    def focus(self, item=None):
+        return self.tree.focus(item)
+
+    def get_children(self, item=None):
+        return self.tree.get_children(item)
+
+    def identify_row(self, y):
+        return self.tree.identify_row(y)
+
+    def tag_configure(self, tagname, option=None, **kw):
+        return self.tree.tag_configure(tagname, option, **kw)
+
+    def bind(self, sequence=None, func=None, add=None):
+        return self.tree.bind(sequence, func, add)
+
+    # Данные
+    def set_query(self, query, params=()):
+        self.query = query
+        self.params = tuple(params)
+        self.offset = 0
+        self._selected.clear()
+        self.reload()
+
+    def sortable(self, column):
+        return column == self.key or column in self.sort_map
+
+    def _view(self):
+        # Снимок запроса и порядка для фонового потока
+        sort = self.sort_map.get(self.sort_column, self.sort_column)
+        return self.query, self.params, sort, self.key, self.descending
+
+    def _boundary(self, row):
+        _, _, sort, key, _ = self._view()
+        return row[self._names.index(sort)], row[self._names.index(key)]
+
+    def _submit(self, job, on_done, loading=None):
+        # Страницы - под одним ключом: новая загрузка отменяет прежнюю.
+        # Пока идет reload/refresh (loading), прокрутка ее не перебивает
+        def done(result):
+            self._loading = None
+            self._delta = 0
+            on_done(result)
+
+        def failed(error):
+            self._loading = None
+            self._delta = 0
+            messagebox.showerror("Ошибка", str(error))
+        self._loading = loading
+        self._delta = 0
+        self.queries.submit('page', job, on_done=done, on_error=failed)
+
+    def _forget_marks(self):
+        self._marks = None
+        self._marks_pending = False
+        self._target = None
+        self.queries.cancel('marks')
+
+    def reload(self):
+        view, size = self._view(), self.page_size
+        self._forget_marks()
+
+        def job(conn):
+            query, params = view[0], view[1]
+            names = [d[0] for d in conn.execute(f"SELECT * FROM ({query}) LIMIT 0", params).description]
+            total = conn.execute(f"SELECT COUNT(*) FROM ({query})", params).fetchone()[0]
+            return names, total, _seek(conn, view, None, True, size)
+
+        def done(result):
+            self._names, self.total, self.rows = result
+            self.offset = 0
+            self._render()
+        self._submit(job, done, 'reload')
+
+    def refresh(self):
+        # Перечитать данные, сохранив позицию прокрутки
+        if not self.rows or self._loading == 'reload':
+            self.reload()
+            return
+        view, first, size = self._view(), self._boundary(self.rows[0]), self.page_size
+        pair = f'v."{view[2]}", v."{view[3]}"'
+
+        def job(conn):
+            total = conn.execute(f"SELECT COUNT(*) FROM ({view[0]})", view[1]).fetchone()[0]
+            before = _seek(conn, view, first, False, 1, pair)
+            return total, _seek(conn, view, before[0] if before else None, True, size)
+
+        def done(result):
+            total, self.rows = result
+            if total != self.total:
+                self._forget_marks()
+            self.total = total
+            self.offset = min(self.offset, max(self.total - len(self.rows), 0))
+            self._render()
+        self._submit(job, done, 'refresh')
+
+    def sort_by(self, column):
+        if not self.sortable(column):
+            return
+        if self.sort_column == column:
+            self.descending = not self.descending
+        else:
+            self.sort_column = column
+            self.descending = False
+        for c in self.columns:
+            text = self.tree.heading(c, 'text').rstrip(' ▲▼')
+            if c == column:
+                text += ' ▼' if self.descending else ' ▲'
+            self.tree.heading(c, text=text)
+        self.reload()
+
+    # Выгрузка всего списка в текущем порядке сортировки (контекстное меню)
+    def export(self, title="Экспорт списка"):
+        sort = self.sort_map.get(self.sort_column, self.sort_column)
+        direction = 'DESC' if self.descending else 'ASC'
+        order = f'v."{sort}" {direction}' + (f', v."{self.key}" {direction}' if sort != self.key else '')
+        query = f"SELECT * FROM ({self.query}) AS v ORDER BY {order}"
+        return ask_export(self, database_path(self.conn), query, self.params, title, total=self.total)
+
+    def _on_menu(self, event):
+        menu = tk.Menu(self, tearoff=0)
+        menu.add_command(label="Экспорт в CSV/NDJSON...", command=self.export)
+        menu.tk_popup(event.x_root, event.y_root)
+
+    # Прокрутка
+    def scroll(self, delta, then=None):
+        # Сдвиги, пришедшие до ответа фонового потока, складываются
+        # в один запрос от текущего окна строк
+        if not delta or not self.rows or self._loading:
+            return
+        delta += self._delta
+        view = self._view()
+        first, last = self._boundary(self.rows[0]), self._boundary(self.rows[-1])
+
+        def job(conn):
+            if delta > 0:
+                return _seek(conn, view, last, True, delta)
+            return _seek(conn, view, first, False, -delta) if delta < 0 else []
+
+        def done(rows):
+            if delta > 0 and rows:
+                combined = self.rows + rows
+                self.rows = combined[max(len(combined) - self.page_size, 0):]
+                self.offset += len(combined) - len(self.rows)
+            elif delta < 0 and rows:
+                self.rows = (rows + self.rows)[:self.page_size]
+                self.offset = max(self.offset - len(rows), 0)
+            else:
+                return
+            self._render()
+            if then is not None:
+                then()
+        self._submit(job, done)
+        self._delta = delta
+
+    def moveto(self, fraction):
+        if not self.total or self._loading:
+            return
+        if self._marks is None:
+            # Опорные строки еще не собраны - переход после них
+            self._target = fraction
+            if not self._marks_pending:
+                self._marks_pending = True
+                view = self._view()
+                self.queries.submit('marks', lambda conn: _landmarks(conn, view), on_done=self._marks_ready)
+            return
+        offset = int(float(fraction) * self.total)
+        offset = max(0, min(offset, self.total - self.page_size))
+        index = min(offset // MARK_STEP, len(self._marks))
+        boundary = self._marks[index - 1] if index else None
+        skip = offset - index * MARK_STEP
+        view, size = self._view(), self.page_size
+
+        def done(rows):
+            self.rows = rows
+            self.offset = offset
+            self._render()
+        self._submit(lambda conn: _seek(conn, view, boundary, True, skip + size)[skip:], done)
+
+    def _marks_ready(self, marks):
+        self._marks = marks
+        self._marks_pending = False
+        target, self._target = self._target, None
+        if target is not None:
+            self.moveto(target)
+
+    def _on_scrollbar(self, action, value, unit=None):
+        if action == 'moveto':
+            self.moveto(value)
+        elif action == 'scroll':
+            step = int(value) * (self.page_size if unit == 'pages' else 1)
+            self.scroll(step)
+
+    def _scroll_event(self, delta):
+        self.scroll(delta)
+        return 'break'
+
+    def _on_wheel(self, event):
+        return self._scroll_event(-3 if event.delta > 0 else 3)
+
+    def _focus_edge(self, index):
+        children = self.tree.get_children()
+        if children:
+            self.tree.focus(children[index])
+            self.tree.selection_set(children[index])
+
+    def _on_down(self, event):
+        children = self.tree.get_children()
+        if children and self.tree.focus() == children[-1]:
+            self.scroll(1, lambda: self._focus_edge(-1))
+            return 'break'
+
+    def _on_up(self, event):
+        children = self.tree.get_children()
+        if children and self.tree.focus() == children[0]:
+            self.scroll(-1, lambda: self._focus_edge(0))
+            return 'break'
+
+    def _on_configure(self, event):
+        children = self.tree.get_children()
+        if not children:
+            return
+        bbox = self.tree.bbox(children[0])
+        if not bbox:
+            return
+        size = max((self.tree.winfo_height() - bbox[1]) // bbox[3], 1)
+        if size == self.page_size:
+            return
+        self.page_size = size
+        if len(self.rows) < size:
+            # Окно выросло - дочитать строки с той же позиции
+            self.refresh()
+        else:
+            self.rows = self.rows[:size]
+            self._render()
+
+    def _on_destroy(self, event):
+        if event.widget is self:
+            self.queries.close()
+
+    def _render(self):
+        visible = set(self.tree.get_children())
+        self._selected = (self._selected - visible) | set(self.tree.selection())
+        self.tree.delete(*self.tree.get_children())
+        key_idx = self._names.index(self.key)
+        count = len(self.columns)
+        for row in self.rows:
+            iid = str(row[key_idx])
+            values = row[:count]
+            if self.format_row is not None:
+                values = self.format_row(values)
+            self.tree.insert('', 'end', iid=iid, values=values)
+        keep = [iid for iid in self._selected if self.tree.exists(iid)]
+        if keep:
+            self.tree.selection_set(keep)
+        if self.total:
+            first = self.offset / self.total
+            last = min((self.offset + len(self.rows)) / self.total, 1.0)
+            self.scrollbar.set(first, last)
+        else:
+            self.scrollbar.set(0, 1)